@@ -0,0 +1,225 @@
+"""多周期K线合成。
+
+逐笔行情进来后按合约增量更新 1 秒、1 分钟、5 分钟等时间K线以及 N 笔K线，每笔行情的开销是 O(1)，
+不需要每次都从逐笔行情列表重新计算。
+
+    - 成交量取累计成交量 Volume 的增量，换交易日时重新起算。
+    - 只接受交易时段日历（config.get_trading_calendar）中交易时段内的行情，K线不会跨越两个交易时段；
+      跨午夜的夜盘（如 cu 的 21:00-01:00）按同一个交易时段处理。
+    - 落在交易时段结束时刻的行情（如 10:15:00 的收盘行情）归入该时段的最后一根K线。
+"""
+from collections import deque
+from datetime import timedelta
+
+from config import get_trading_calendar
+from session_calendar import trading_seconds
+from tick_snapshot import tick_seconds, tick_datetime
+
+
+def interval_label(seconds):
+    """K线周期名称，如 60 -> '1m'"""
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+
+class Bar:
+    """一根K线。
+
+    Attributes:
+        instrument_id (str): 合约代码。
+        period (str): 周期，如 '1m'、'100t'。
+        trading_day (str): 交易日。
+        start (datetime): 开始时间（交易所时间）。
+        open, high, low, close (float): 开高低收。
+        volume (int): 成交量。
+        turnover (float): 成交额。
+        open_interest (float): 最后一笔行情的持仓量。
+        tick_count (int): 行情笔数。
+    """
+    __slots__ = ('instrument_id', 'period', 'trading_day', 'start', 'open', 'high', 'low', 'close',
+                 'volume', 'turnover', 'open_interest', 'tick_count', '_key')
+
+    def __init__(self, instrument_id, period, trading_day, start, key, price):
+        self.instrument_id = instrument_id
+        self.period = period
+        self.trading_day = trading_day
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = 0
+        self.turnover = 0.0
+        self.open_interest = 0.0
+        self.tick_count = 0
+        self._key = key
+
+    def update(self, price, volume, turnover, open_interest):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.turnover += turnover
+        self.open_interest = open_interest
+        self.tick_count += 1
+
+    def __repr__(self):
+        return (f"Bar({self.instrument_id} {self.period} {self.start} O={self.open} H={self.high} "
+                f"L={self.low} C={self.close} V={self.volume})")
+
+
+class _InstrumentState:
+    """单个合约的合成状态"""
+    __slots__ = ('sessions', 'trading_day', 'last_volume', 'last_turnover', 'time_bars', 'tick_bars')
+
+    def __init__(self, sessions, n_intervals, n_tick_bars):
+        self.sessions = sessions  # ProductSessions
+        self.trading_day = None
+        self.last_volume = None
+        self.last_turnover = None
+        self.time_bars = [None] * n_intervals
+        self.tick_bars = [None] * n_tick_bars
+
+
+class BarAggregator:
+    """按合约增量合成多周期K线。"""
+
+    def __init__(self, intervals=(1, 60, 300), tick_bar_sizes=(), on_bar=None, history=1000, calendar=None):
+        """初始化K线合成器。
+
+        Args:
+            intervals (tuple): 时间K线周期，单位秒，如 (1, 60, 300)。
+            tick_bar_sizes (tuple): N 笔K线的笔数，如 (100,)。
+            on_bar (callable): K线完成时的回调，参数为 Bar。
+            history (int): 每个合约每个周期保留的已完成K线数量。
+            calendar (TradingCalendar): 交易时段日历，默认为 config.get_trading_calendar()。
+        """
+        self.intervals = tuple(intervals)
+        self.tick_bar_sizes = tuple(tick_bar_sizes)
+        self.labels = [interval_label(seconds) for seconds in self.intervals] + \
+                      [f"{size}t" for size in self.tick_bar_sizes]
+        self.on_bar = on_bar
+        self.history = history
+        self.calendar = calendar if calendar is not None else get_trading_calendar()
+        self._states = {}  # InstrumentID -> _InstrumentState
+        self._completed = {}  # (InstrumentID, 周期) -> deque[Bar]
+
+    def _state(self, instrument_id):
+        sessions = self.calendar.sessions(instrument_id)
+        if sessions is None:
+            return None  # 没有配置交易时段的合约不合成K线
+        state = self._states[instrument_id] = _InstrumentState(
+            sessions, len(self.intervals), len(self.tick_bar_sizes))
+        return state
+
+    def update(self, tick):
+        """用一笔行情更新K线。
+
+        Args:
+            tick: TickSnapshot 或 CThostFtdcDepthMarketDataField。
+
+        Returns:
+            bool: 行情是否在交易时段内并被采用。
+        """
+        instrument_id = tick.InstrumentID
+        state = self._states.get(instrument_id)
+        if state is None:
+            state = self._state(instrument_id)
+            if state is None:
+                return False
+
+        # 查表得到行情所在的交易时段，时段结束时刻的行情归入最后一根K线
+        seconds = tick_seconds(tick)
+        session_index = state.sessions.table[seconds] - 1
+        if session_index < 0:
+            return False
+        start, end = state.sessions.sessions[session_index]
+        sec = trading_seconds(seconds)
+        bucket_sec = sec - 1 if sec == end and sec > start else sec
+
+        # 成交量和成交额取累计值的增量，换交易日时重新起算
+        volume = tick.Volume
+        turnover = tick.Turnover
+        if state.trading_day != tick.TradingDay:
+            for i, bar in enumerate(state.tick_bars):  # N 笔K线不跨交易日
+                if bar is not None:
+                    self._complete(bar)
+                    state.tick_bars[i] = None
+            volume_delta = volume if state.trading_day is not None else 0
+            turnover_delta = turnover if state.trading_day is not None else 0.0
+            state.trading_day = tick.TradingDay
+        else:
+            volume_delta = max(volume - state.last_volume, 0)
+            turnover_delta = max(turnover - state.last_turnover, 0.0)
+        state.last_volume = volume
+        state.last_turnover = turnover
+
+        price = tick.LastPrice
+        open_interest = tick.OpenInterest
+        tick_time = None
+        time_bars = state.time_bars
+        for i, seconds in enumerate(self.intervals):
+            bucket = max(bucket_sec - bucket_sec % seconds, start)
+            key = (tick.TradingDay, session_index, bucket)
+            bar = time_bars[i]
+            if bar is None or bar._key != key:
+                if bar is not None:
+                    self._complete(bar)
+                if tick_time is None:
+                    tick_time = tick_datetime(tick).replace(microsecond=0)
+                bar = time_bars[i] = Bar(instrument_id, self.labels[i], tick.TradingDay,
+                                         tick_time - timedelta(seconds=sec - bucket), key, price)
+            bar.update(price, volume_delta, turnover_delta, open_interest)
+
+        tick_bars = state.tick_bars
+        offset = len(self.intervals)
+        for i, size in enumerate(self.tick_bar_sizes):
+            bar = tick_bars[i]
+            if bar is None:
+                if tick_time is None:
+                    tick_time = tick_datetime(tick).replace(microsecond=0)
+                bar = tick_bars[i] = Bar(instrument_id, self.labels[offset + i], tick.TradingDay,
+                                         tick_time, None, price)
+            bar.update(price, volume_delta, turnover_delta, open_interest)
+            if bar.tick_count >= size:
+                self._complete(bar)
+                tick_bars[i] = None
+        return True
+
+    def _complete(self, bar):
+        key = (bar.instrument_id, bar.period)
+        completed = self._completed.get(key)
+        if completed is None:
+            completed = self._completed[key] = deque(maxlen=self.history)
+        completed.append(bar)
+        if self.on_bar is not None:
+            self.on_bar(bar)
+
+    def current(self, instrument_id, period):
+        """正在合成中的K线，没有时返回 None"""
+        state = self._states.get(instrument_id)
+        if state is None:
+            return None
+        i = self.labels.index(period)
+        if i < len(self.intervals):
+            return state.time_bars[i]
+        return state.tick_bars[i - len(self.intervals)]
+
+    def bars(self, instrument_id, period):
+        """已完成的K线，按时间先后排列"""
+        return list(self._completed.get((instrument_id, period), ()))
+
+    def flush(self, instrument_id=None):
+        """把正在合成中的K线当作已完成输出，例如收盘后或回放结束时调用"""
+        instrument_ids = [instrument_id] if instrument_id is not None else list(self._states)
+        for instrument in instrument_ids:
+            state = self._states.get(instrument)
+            if state is None:
+                continue
+            for bars in (state.time_bars, state.tick_bars):
+                for i, bar in enumerate(bars):
+                    if bar is not None:
+                        self._complete(bar)
+                        bars[i] = None
@@ -1,5 +1,6 @@
 import yaml
 from datetime import time as dtime
+from session_calendar import TradingCalendar
 
 environment = "first_set"
 group = 'dianxin1'  # 您可以"first_set"选择'dianxin1', 'dianxin2' 或 'yidong'，根据需要调整
@@ -72,4 +73,33 @@ def get_trading_sessions(product_id, yaml_file='SimNowID.yaml'):
     return [
         (dtime(start_hour, start_minute), dtime(end_hour, end_minute))
         for start_hour, start_minute, end_hour, end_minute in sessions.get(product_id, [])
-    ]
\ No newline at end of file
+    ]
+
+def get_volume_multiples(yaml_file='SimNowID.yaml'):
+    """获取各产品的合约乘数。
+
+    Args:
+        yaml_file (str): YAML 文件路径。
+
+    Returns:
+        dict: 产品ID -> 合约乘数，未配置时返回空字典。
+    """
+    with open(yaml_file, 'r', encoding='utf-8') as file:
+        data = yaml.safe_load(file)
+    return data.get('volume_multiples') or {}
+
+_trading_calendars = {}  # yaml_file -> TradingCalendar
+
+def get_trading_calendar(yaml_file='SimNowID.yaml'):
+    """获取编译好的交易时段日历，同一个配置文件只编译一次。
+
+    Args:
+        yaml_file (str): YAML 文件路径。
+
+    Returns:
+        TradingCalendar: 交易时段日历，可按产品ID或合约代码查询 is_trading/next_open/next_close。
+    """
+    calendar = _trading_calendars.get(yaml_file)
+    if calendar is None:
+        calendar = _trading_calendars[yaml_file] = TradingCalendar.from_yaml(yaml_file)
+    return calendar
@@ -0,0 +1,6000 @@
+"""CTP 结构体的 NumPy 结构化 dtype。
+
+由 traderapi672python38/gen_struct_methods.py 根据 ThostFtdcUserApiStruct.h 生成，不要手工修改。
+
+每个 dtype 与 C++ 结构体的内存布局完全一致（按自然对齐，包含 reserve* 保留字段），
+结构体的 raw() 返回其内存的 memoryview，一次 memcpy 即可拷贝进结构化数组，不需要逐个字段读取：
+    records = np.empty(n, dtype=STRUCT_DTYPES['CThostFtdcDepthMarketDataField'])
+    rows = byte_rows(records)
+    copy_into(rows, i, pDepthMarketData)
+字符串字段是头文件约定的 GB18030 字节（numpy.bytes_），需要时再 decode('gb18030')。
+"""
+import numpy as np
+
+
+def struct_dtype(struct):
+    """结构体对应的 dtype。
+
+    Args:
+        struct: 结构体类、结构体对象或结构体类名。
+
+    Returns:
+        numpy.dtype: 结构化 dtype。
+    """
+    if not isinstance(struct, str):
+        struct = struct.__name__ if isinstance(struct, type) else type(struct).__name__
+    return STRUCT_DTYPES[struct]
+
+
+def to_record(obj):
+    """把结构体拷贝成一条 NumPy 记录（numpy.void），回调返回后仍然有效"""
+    return np.frombuffer(obj.raw(), dtype=struct_dtype(obj))[0].copy()
+
+
+def byte_rows(records):
+    """结构化数组的字节视图（不拷贝），每行对应一条记录，供 copy_into 使用"""
+    return records.view(np.uint8).reshape(len(records), records.dtype.itemsize)
+
+
+def copy_into(rows, index, obj):
+    """把结构体按字节拷贝到第 index 行。
+
+    Args:
+        rows (numpy.ndarray): byte_rows() 返回的字节视图，对应数组的 dtype 为 struct_dtype(obj)。
+        index (int): 行号。
+        obj: 结构体对象。
+    """
+    rows[index] = obj.raw()
+
+
+STRUCT_DTYPES = {
+    'CThostFtdcDisseminationField': np.dtype([
+        ('SequenceSeries', 'i2'),
+        ('SequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcReqUserLoginField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('Password', 'S41'),
+        ('UserProductInfo', 'S11'),
+        ('InterfaceProductInfo', 'S11'),
+        ('ProtocolInfo', 'S11'),
+        ('MacAddress', 'S21'),
+        ('OneTimePassword', 'S41'),
+        ('reserve1', 'S16'),
+        ('LoginRemark', 'S36'),
+        ('ClientIPPort', 'i4'),
+        ('ClientIPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcRspUserLoginField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('LoginTime', 'S9'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('SystemName', 'S41'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('MaxOrderRef', 'S13'),
+        ('SHFETime', 'S9'),
+        ('DCETime', 'S9'),
+        ('CZCETime', 'S9'),
+        ('FFEXTime', 'S9'),
+        ('INETime', 'S9'),
+        ('SysVersion', 'S41'),
+        ('GFEXTime', 'S9'),
+    ], align=True),
+    'CThostFtdcUserLogoutField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcForceUserLogoutField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcReqAuthenticateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('UserProductInfo', 'S11'),
+        ('AuthCode', 'S17'),
+        ('AppID', 'S33'),
+    ], align=True),
+    'CThostFtdcRspAuthenticateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('UserProductInfo', 'S11'),
+        ('AppID', 'S33'),
+        ('AppType', 'S1'),
+    ], align=True),
+    'CThostFtdcAuthenticationInfoField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('UserProductInfo', 'S11'),
+        ('AuthInfo', 'S129'),
+        ('IsResult', 'i4'),
+        ('AppID', 'S33'),
+        ('AppType', 'S1'),
+        ('reserve1', 'S16'),
+        ('ClientIPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcRspUserLogin2Field': np.dtype([
+        ('TradingDay', 'S9'),
+        ('LoginTime', 'S9'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('SystemName', 'S41'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('MaxOrderRef', 'S13'),
+        ('SHFETime', 'S9'),
+        ('DCETime', 'S9'),
+        ('CZCETime', 'S9'),
+        ('FFEXTime', 'S9'),
+        ('INETime', 'S9'),
+        ('RandomString', 'S17'),
+    ], align=True),
+    'CThostFtdcTransferHeaderField': np.dtype([
+        ('Version', 'S4'),
+        ('TradeCode', 'S7'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('TradeSerial', 'S9'),
+        ('FutureID', 'S11'),
+        ('BankID', 'S4'),
+        ('BankBrchID', 'S5'),
+        ('OperNo', 'S17'),
+        ('DeviceID', 'S3'),
+        ('RecordNum', 'S7'),
+        ('SessionID', 'i4'),
+        ('RequestID', 'i4'),
+    ], align=True),
+    'CThostFtdcTransferBankToFutureReqField': np.dtype([
+        ('FutureAccount', 'S13'),
+        ('FuturePwdFlag', 'S1'),
+        ('FutureAccPwd', 'S17'),
+        ('TradeAmt', 'f8'),
+        ('CustFee', 'f8'),
+        ('CurrencyCode', 'S4'),
+    ], align=True),
+    'CThostFtdcTransferBankToFutureRspField': np.dtype([
+        ('RetCode', 'S5'),
+        ('RetInfo', 'S129'),
+        ('FutureAccount', 'S13'),
+        ('TradeAmt', 'f8'),
+        ('CustFee', 'f8'),
+        ('CurrencyCode', 'S4'),
+    ], align=True),
+    'CThostFtdcTransferFutureToBankReqField': np.dtype([
+        ('FutureAccount', 'S13'),
+        ('FuturePwdFlag', 'S1'),
+        ('FutureAccPwd', 'S17'),
+        ('TradeAmt', 'f8'),
+        ('CustFee', 'f8'),
+        ('CurrencyCode', 'S4'),
+    ], align=True),
+    'CThostFtdcTransferFutureToBankRspField': np.dtype([
+        ('RetCode', 'S5'),
+        ('RetInfo', 'S129'),
+        ('FutureAccount', 'S13'),
+        ('TradeAmt', 'f8'),
+        ('CustFee', 'f8'),
+        ('CurrencyCode', 'S4'),
+    ], align=True),
+    'CThostFtdcTransferQryBankReqField': np.dtype([
+        ('FutureAccount', 'S13'),
+        ('FuturePwdFlag', 'S1'),
+        ('FutureAccPwd', 'S17'),
+        ('CurrencyCode', 'S4'),
+    ], align=True),
+    'CThostFtdcTransferQryBankRspField': np.dtype([
+        ('RetCode', 'S5'),
+        ('RetInfo', 'S129'),
+        ('FutureAccount', 'S13'),
+        ('TradeAmt', 'f8'),
+        ('UseAmt', 'f8'),
+        ('FetchAmt', 'f8'),
+        ('CurrencyCode', 'S4'),
+    ], align=True),
+    'CThostFtdcTransferQryDetailReqField': np.dtype([
+        ('FutureAccount', 'S13'),
+    ], align=True),
+    'CThostFtdcTransferQryDetailRspField': np.dtype([
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('TradeCode', 'S7'),
+        ('FutureSerial', 'i4'),
+        ('FutureID', 'S11'),
+        ('FutureAccount', 'S22'),
+        ('BankSerial', 'i4'),
+        ('BankID', 'S4'),
+        ('BankBrchID', 'S5'),
+        ('BankAccount', 'S41'),
+        ('CertCode', 'S21'),
+        ('CurrencyCode', 'S4'),
+        ('TxAmount', 'f8'),
+        ('Flag', 'S1'),
+    ], align=True),
+    'CThostFtdcRspInfoField': np.dtype([
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+    ], align=True),
+    'CThostFtdcExchangeField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ExchangeName', 'S61'),
+        ('ExchangeProperty', 'S1'),
+    ], align=True),
+    'CThostFtdcProductField': np.dtype([
+        ('reserve1', 'S31'),
+        ('ProductName', 'S21'),
+        ('ExchangeID', 'S9'),
+        ('ProductClass', 'S1'),
+        ('VolumeMultiple', 'i4'),
+        ('PriceTick', 'f8'),
+        ('MaxMarketOrderVolume', 'i4'),
+        ('MinMarketOrderVolume', 'i4'),
+        ('MaxLimitOrderVolume', 'i4'),
+        ('MinLimitOrderVolume', 'i4'),
+        ('PositionType', 'S1'),
+        ('PositionDateType', 'S1'),
+        ('CloseDealType', 'S1'),
+        ('TradeCurrencyID', 'S4'),
+        ('MortgageFundUseRange', 'S1'),
+        ('reserve2', 'S31'),
+        ('UnderlyingMultiple', 'f8'),
+        ('ProductID', 'S81'),
+        ('ExchangeProductID', 'S81'),
+        ('OpenLimitControlLevel', 'S1'),
+        ('OrderFreqControlLevel', 'S1'),
+    ], align=True),
+    'CThostFtdcInstrumentField': np.dtype([
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentName', 'S21'),
+        ('reserve2', 'S31'),
+        ('reserve3', 'S31'),
+        ('ProductClass', 'S1'),
+        ('DeliveryYear', 'i4'),
+        ('DeliveryMonth', 'i4'),
+        ('MaxMarketOrderVolume', 'i4'),
+        ('MinMarketOrderVolume', 'i4'),
+        ('MaxLimitOrderVolume', 'i4'),
+        ('MinLimitOrderVolume', 'i4'),
+        ('VolumeMultiple', 'i4'),
+        ('PriceTick', 'f8'),
+        ('CreateDate', 'S9'),
+        ('OpenDate', 'S9'),
+        ('ExpireDate', 'S9'),
+        ('StartDelivDate', 'S9'),
+        ('EndDelivDate', 'S9'),
+        ('InstLifePhase', 'S1'),
+        ('IsTrading', 'i4'),
+        ('PositionType', 'S1'),
+        ('PositionDateType', 'S1'),
+        ('LongMarginRatio', 'f8'),
+        ('ShortMarginRatio', 'f8'),
+        ('MaxMarginSideAlgorithm', 'S1'),
+        ('reserve4', 'S31'),
+        ('StrikePrice', 'f8'),
+        ('OptionsType', 'S1'),
+        ('UnderlyingMultiple', 'f8'),
+        ('CombinationType', 'S1'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+        ('ProductID', 'S81'),
+        ('UnderlyingInstrID', 'S81'),
+    ], align=True),
+    'CThostFtdcBrokerField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('BrokerAbbr', 'S9'),
+        ('BrokerName', 'S81'),
+        ('IsActive', 'i4'),
+    ], align=True),
+    'CThostFtdcTraderField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+        ('ParticipantID', 'S11'),
+        ('Password', 'S41'),
+        ('InstallCount', 'i4'),
+        ('BrokerID', 'S11'),
+        ('OrderCancelAlg', 'S1'),
+        ('TradeInstallCount', 'i4'),
+        ('MDInstallCount', 'i4'),
+    ], align=True),
+    'CThostFtdcInvestorField': np.dtype([
+        ('InvestorID', 'S13'),
+        ('BrokerID', 'S11'),
+        ('InvestorGroupID', 'S13'),
+        ('InvestorName', 'S81'),
+        ('IdentifiedCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('IsActive', 'i4'),
+        ('Telephone', 'S41'),
+        ('Address', 'S101'),
+        ('OpenDate', 'S9'),
+        ('Mobile', 'S41'),
+        ('CommModelID', 'S13'),
+        ('MarginModelID', 'S13'),
+        ('IsOrderFreq', 'S1'),
+        ('IsOpenVolLimit', 'S1'),
+    ], align=True),
+    'CThostFtdcTradingCodeField': np.dtype([
+        ('InvestorID', 'S13'),
+        ('BrokerID', 'S11'),
+        ('ExchangeID', 'S9'),
+        ('ClientID', 'S11'),
+        ('IsActive', 'i4'),
+        ('ClientIDType', 'S1'),
+        ('BranchID', 'S9'),
+        ('BizType', 'S1'),
+        ('InvestUnitID', 'S17'),
+    ], align=True),
+    'CThostFtdcPartBrokerField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('IsActive', 'i4'),
+    ], align=True),
+    'CThostFtdcSuperUserField': np.dtype([
+        ('UserID', 'S16'),
+        ('UserName', 'S81'),
+        ('Password', 'S41'),
+        ('IsActive', 'i4'),
+    ], align=True),
+    'CThostFtdcSuperUserFunctionField': np.dtype([
+        ('UserID', 'S16'),
+        ('FunctionCode', 'S1'),
+    ], align=True),
+    'CThostFtdcInvestorGroupField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorGroupID', 'S13'),
+        ('InvestorGroupName', 'S41'),
+    ], align=True),
+    'CThostFtdcTradingAccountField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('PreMortgage', 'f8'),
+        ('PreCredit', 'f8'),
+        ('PreDeposit', 'f8'),
+        ('PreBalance', 'f8'),
+        ('PreMargin', 'f8'),
+        ('InterestBase', 'f8'),
+        ('Interest', 'f8'),
+        ('Deposit', 'f8'),
+        ('Withdraw', 'f8'),
+        ('FrozenMargin', 'f8'),
+        ('FrozenCash', 'f8'),
+        ('FrozenCommission', 'f8'),
+        ('CurrMargin', 'f8'),
+        ('CashIn', 'f8'),
+        ('Commission', 'f8'),
+        ('CloseProfit', 'f8'),
+        ('PositionProfit', 'f8'),
+        ('Balance', 'f8'),
+        ('Available', 'f8'),
+        ('WithdrawQuota', 'f8'),
+        ('Reserve', 'f8'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('Credit', 'f8'),
+        ('Mortgage', 'f8'),
+        ('ExchangeMargin', 'f8'),
+        ('DeliveryMargin', 'f8'),
+        ('ExchangeDeliveryMargin', 'f8'),
+        ('ReserveBalance', 'f8'),
+        ('CurrencyID', 'S4'),
+        ('PreFundMortgageIn', 'f8'),
+        ('PreFundMortgageOut', 'f8'),
+        ('FundMortgageIn', 'f8'),
+        ('FundMortgageOut', 'f8'),
+        ('FundMortgageAvailable', 'f8'),
+        ('MortgageableFund', 'f8'),
+        ('SpecProductMargin', 'f8'),
+        ('SpecProductFrozenMargin', 'f8'),
+        ('SpecProductCommission', 'f8'),
+        ('SpecProductFrozenCommission', 'f8'),
+        ('SpecProductPositionProfit', 'f8'),
+        ('SpecProductCloseProfit', 'f8'),
+        ('SpecProductPositionProfitByAlg', 'f8'),
+        ('SpecProductExchangeMargin', 'f8'),
+        ('BizType', 'S1'),
+        ('FrozenSwap', 'f8'),
+        ('RemainSwap', 'f8'),
+    ], align=True),
+    'CThostFtdcInvestorPositionField': np.dtype([
+        ('reserve1', 'S31'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('PosiDirection', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('PositionDate', 'S1'),
+        ('YdPosition', 'i4'),
+        ('Position', 'i4'),
+        ('LongFrozen', 'i4'),
+        ('ShortFrozen', 'i4'),
+        ('LongFrozenAmount', 'f8'),
+        ('ShortFrozenAmount', 'f8'),
+        ('OpenVolume', 'i4'),
+        ('CloseVolume', 'i4'),
+        ('OpenAmount', 'f8'),
+        ('CloseAmount', 'f8'),
+        ('PositionCost', 'f8'),
+        ('PreMargin', 'f8'),
+        ('UseMargin', 'f8'),
+        ('FrozenMargin', 'f8'),
+        ('FrozenCash', 'f8'),
+        ('FrozenCommission', 'f8'),
+        ('CashIn', 'f8'),
+        ('Commission', 'f8'),
+        ('CloseProfit', 'f8'),
+        ('PositionProfit', 'f8'),
+        ('PreSettlementPrice', 'f8'),
+        ('SettlementPrice', 'f8'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('OpenCost', 'f8'),
+        ('ExchangeMargin', 'f8'),
+        ('CombPosition', 'i4'),
+        ('CombLongFrozen', 'i4'),
+        ('CombShortFrozen', 'i4'),
+        ('CloseProfitByDate', 'f8'),
+        ('CloseProfitByTrade', 'f8'),
+        ('TodayPosition', 'i4'),
+        ('MarginRateByMoney', 'f8'),
+        ('MarginRateByVolume', 'f8'),
+        ('StrikeFrozen', 'i4'),
+        ('StrikeFrozenAmount', 'f8'),
+        ('AbandonFrozen', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('YdStrikeFrozen', 'i4'),
+        ('InvestUnitID', 'S17'),
+        ('PositionCostOffset', 'f8'),
+        ('TasPosition', 'i4'),
+        ('TasPositionCost', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcInstrumentMarginRateField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('HedgeFlag', 'S1'),
+        ('LongMarginRatioByMoney', 'f8'),
+        ('LongMarginRatioByVolume', 'f8'),
+        ('ShortMarginRatioByMoney', 'f8'),
+        ('ShortMarginRatioByVolume', 'f8'),
+        ('IsRelative', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcInstrumentCommissionRateField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OpenRatioByMoney', 'f8'),
+        ('OpenRatioByVolume', 'f8'),
+        ('CloseRatioByMoney', 'f8'),
+        ('CloseRatioByVolume', 'f8'),
+        ('CloseTodayRatioByMoney', 'f8'),
+        ('CloseTodayRatioByVolume', 'f8'),
+        ('ExchangeID', 'S9'),
+        ('BizType', 'S1'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcDepthMarketDataField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('reserve2', 'S31'),
+        ('LastPrice', 'f8'),
+        ('PreSettlementPrice', 'f8'),
+        ('PreClosePrice', 'f8'),
+        ('PreOpenInterest', 'f8'),
+        ('OpenPrice', 'f8'),
+        ('HighestPrice', 'f8'),
+        ('LowestPrice', 'f8'),
+        ('Volume', 'i4'),
+        ('Turnover', 'f8'),
+        ('OpenInterest', 'f8'),
+        ('ClosePrice', 'f8'),
+        ('SettlementPrice', 'f8'),
+        ('UpperLimitPrice', 'f8'),
+        ('LowerLimitPrice', 'f8'),
+        ('PreDelta', 'f8'),
+        ('CurrDelta', 'f8'),
+        ('UpdateTime', 'S9'),
+        ('UpdateMillisec', 'i4'),
+        ('BidPrice1', 'f8'),
+        ('BidVolume1', 'i4'),
+        ('AskPrice1', 'f8'),
+        ('AskVolume1', 'i4'),
+        ('BidPrice2', 'f8'),
+        ('BidVolume2', 'i4'),
+        ('AskPrice2', 'f8'),
+        ('AskVolume2', 'i4'),
+        ('BidPrice3', 'f8'),
+        ('BidVolume3', 'i4'),
+        ('AskPrice3', 'f8'),
+        ('AskVolume3', 'i4'),
+        ('BidPrice4', 'f8'),
+        ('BidVolume4', 'i4'),
+        ('AskPrice4', 'f8'),
+        ('AskVolume4', 'i4'),
+        ('BidPrice5', 'f8'),
+        ('BidVolume5', 'i4'),
+        ('AskPrice5', 'f8'),
+        ('AskVolume5', 'i4'),
+        ('AveragePrice', 'f8'),
+        ('ActionDay', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+        ('BandingUpperPrice', 'f8'),
+        ('BandingLowerPrice', 'f8'),
+    ], align=True),
+    'CThostFtdcInstrumentTradingRightField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('TradingRight', 'S1'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcBrokerUserField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('UserName', 'S81'),
+        ('UserType', 'S1'),
+        ('IsActive', 'i4'),
+        ('IsUsingOTP', 'i4'),
+        ('IsAuthForce', 'i4'),
+    ], align=True),
+    'CThostFtdcBrokerUserPasswordField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('Password', 'S41'),
+        ('LastUpdateTime', 'S17'),
+        ('LastLoginTime', 'S17'),
+        ('ExpireDate', 'S9'),
+        ('WeakExpireDate', 'S9'),
+    ], align=True),
+    'CThostFtdcBrokerUserFunctionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('BrokerFunctionCode', 'S1'),
+    ], align=True),
+    'CThostFtdcTraderOfferField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+        ('ParticipantID', 'S11'),
+        ('Password', 'S41'),
+        ('InstallID', 'i4'),
+        ('OrderLocalID', 'S13'),
+        ('TraderConnectStatus', 'S1'),
+        ('ConnectRequestDate', 'S9'),
+        ('ConnectRequestTime', 'S9'),
+        ('LastReportDate', 'S9'),
+        ('LastReportTime', 'S9'),
+        ('ConnectDate', 'S9'),
+        ('ConnectTime', 'S9'),
+        ('StartDate', 'S9'),
+        ('StartTime', 'S9'),
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('MaxTradeID', 'S21'),
+        ('MaxOrderMessageReference', 'S7'),
+        ('OrderCancelAlg', 'S1'),
+    ], align=True),
+    'CThostFtdcSettlementInfoField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('SequenceNo', 'i4'),
+        ('Content', 'S501'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcInstrumentMarginRateAdjustField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('HedgeFlag', 'S1'),
+        ('LongMarginRatioByMoney', 'f8'),
+        ('LongMarginRatioByVolume', 'f8'),
+        ('ShortMarginRatioByMoney', 'f8'),
+        ('ShortMarginRatioByVolume', 'f8'),
+        ('IsRelative', 'i4'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcExchangeMarginRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('reserve1', 'S31'),
+        ('HedgeFlag', 'S1'),
+        ('LongMarginRatioByMoney', 'f8'),
+        ('LongMarginRatioByVolume', 'f8'),
+        ('ShortMarginRatioByMoney', 'f8'),
+        ('ShortMarginRatioByVolume', 'f8'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcExchangeMarginRateAdjustField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('reserve1', 'S31'),
+        ('HedgeFlag', 'S1'),
+        ('LongMarginRatioByMoney', 'f8'),
+        ('LongMarginRatioByVolume', 'f8'),
+        ('ShortMarginRatioByMoney', 'f8'),
+        ('ShortMarginRatioByVolume', 'f8'),
+        ('ExchLongMarginRatioByMoney', 'f8'),
+        ('ExchLongMarginRatioByVolume', 'f8'),
+        ('ExchShortMarginRatioByMoney', 'f8'),
+        ('ExchShortMarginRatioByVolume', 'f8'),
+        ('NoLongMarginRatioByMoney', 'f8'),
+        ('NoLongMarginRatioByVolume', 'f8'),
+        ('NoShortMarginRatioByMoney', 'f8'),
+        ('NoShortMarginRatioByVolume', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcExchangeRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('FromCurrencyID', 'S4'),
+        ('FromCurrencyUnit', 'f8'),
+        ('ToCurrencyID', 'S4'),
+        ('ExchangeRate', 'f8'),
+    ], align=True),
+    'CThostFtdcSettlementRefField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+    ], align=True),
+    'CThostFtdcCurrentTimeField': np.dtype([
+        ('CurrDate', 'S9'),
+        ('CurrTime', 'S9'),
+        ('CurrMillisec', 'i4'),
+        ('ActionDay', 'S9'),
+    ], align=True),
+    'CThostFtdcCommPhaseField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('CommPhaseNo', 'i2'),
+        ('SystemID', 'S21'),
+    ], align=True),
+    'CThostFtdcLoginInfoField': np.dtype([
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('LoginDate', 'S9'),
+        ('LoginTime', 'S9'),
+        ('reserve1', 'S16'),
+        ('UserProductInfo', 'S11'),
+        ('InterfaceProductInfo', 'S11'),
+        ('ProtocolInfo', 'S11'),
+        ('SystemName', 'S41'),
+        ('PasswordDeprecated', 'S41'),
+        ('MaxOrderRef', 'S13'),
+        ('SHFETime', 'S9'),
+        ('DCETime', 'S9'),
+        ('CZCETime', 'S9'),
+        ('FFEXTime', 'S9'),
+        ('MacAddress', 'S21'),
+        ('OneTimePassword', 'S41'),
+        ('INETime', 'S9'),
+        ('IsQryControl', 'i4'),
+        ('LoginRemark', 'S36'),
+        ('Password', 'S41'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcLogoutAllField': np.dtype([
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('SystemName', 'S41'),
+    ], align=True),
+    'CThostFtdcFrontStatusField': np.dtype([
+        ('FrontID', 'i4'),
+        ('LastReportDate', 'S9'),
+        ('LastReportTime', 'S9'),
+        ('IsActive', 'i4'),
+    ], align=True),
+    'CThostFtdcUserPasswordUpdateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('OldPassword', 'S41'),
+        ('NewPassword', 'S41'),
+    ], align=True),
+    'CThostFtdcInputOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('OrderRef', 'S13'),
+        ('UserID', 'S16'),
+        ('OrderPriceType', 'S1'),
+        ('Direction', 'S1'),
+        ('CombOffsetFlag', 'S5'),
+        ('CombHedgeFlag', 'S5'),
+        ('LimitPrice', 'f8'),
+        ('VolumeTotalOriginal', 'i4'),
+        ('TimeCondition', 'S1'),
+        ('GTDDate', 'S9'),
+        ('VolumeCondition', 'S1'),
+        ('MinVolume', 'i4'),
+        ('ContingentCondition', 'S1'),
+        ('StopPrice', 'f8'),
+        ('ForceCloseReason', 'S1'),
+        ('IsAutoSuspend', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('RequestID', 'i4'),
+        ('UserForceClose', 'i4'),
+        ('IsSwapOrder', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('OrderRef', 'S13'),
+        ('UserID', 'S16'),
+        ('OrderPriceType', 'S1'),
+        ('Direction', 'S1'),
+        ('CombOffsetFlag', 'S5'),
+        ('CombHedgeFlag', 'S5'),
+        ('LimitPrice', 'f8'),
+        ('VolumeTotalOriginal', 'i4'),
+        ('TimeCondition', 'S1'),
+        ('GTDDate', 'S9'),
+        ('VolumeCondition', 'S1'),
+        ('MinVolume', 'i4'),
+        ('ContingentCondition', 'S1'),
+        ('StopPrice', 'f8'),
+        ('ForceCloseReason', 'S1'),
+        ('IsAutoSuspend', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('RequestID', 'i4'),
+        ('OrderLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderSubmitStatus', 'S1'),
+        ('NotifySequence', 'i4'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('OrderSysID', 'S21'),
+        ('OrderSource', 'S1'),
+        ('OrderStatus', 'S1'),
+        ('OrderType', 'S1'),
+        ('VolumeTraded', 'i4'),
+        ('VolumeTotal', 'i4'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('ActiveTime', 'S9'),
+        ('SuspendTime', 'S9'),
+        ('UpdateTime', 'S9'),
+        ('CancelTime', 'S9'),
+        ('ActiveTraderID', 'S21'),
+        ('ClearingPartID', 'S11'),
+        ('SequenceNo', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('UserProductInfo', 'S11'),
+        ('StatusMsg', 'S81'),
+        ('UserForceClose', 'i4'),
+        ('ActiveUserID', 'S16'),
+        ('BrokerOrderSeq', 'i4'),
+        ('RelativeOrderSysID', 'S21'),
+        ('ZCETotalTradedVolume', 'i4'),
+        ('IsSwapOrder', 'i4'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('reserve3', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcExchangeOrderField': np.dtype([
+        ('OrderPriceType', 'S1'),
+        ('Direction', 'S1'),
+        ('CombOffsetFlag', 'S5'),
+        ('CombHedgeFlag', 'S5'),
+        ('LimitPrice', 'f8'),
+        ('VolumeTotalOriginal', 'i4'),
+        ('TimeCondition', 'S1'),
+        ('GTDDate', 'S9'),
+        ('VolumeCondition', 'S1'),
+        ('MinVolume', 'i4'),
+        ('ContingentCondition', 'S1'),
+        ('StopPrice', 'f8'),
+        ('ForceCloseReason', 'S1'),
+        ('IsAutoSuspend', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('RequestID', 'i4'),
+        ('OrderLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderSubmitStatus', 'S1'),
+        ('NotifySequence', 'i4'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('OrderSysID', 'S21'),
+        ('OrderSource', 'S1'),
+        ('OrderStatus', 'S1'),
+        ('OrderType', 'S1'),
+        ('VolumeTraded', 'i4'),
+        ('VolumeTotal', 'i4'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('ActiveTime', 'S9'),
+        ('SuspendTime', 'S9'),
+        ('UpdateTime', 'S9'),
+        ('CancelTime', 'S9'),
+        ('ActiveTraderID', 'S21'),
+        ('ClearingPartID', 'S11'),
+        ('SequenceNo', 'i4'),
+        ('BranchID', 'S9'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcExchangeOrderInsertErrorField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderLocalID', 'S13'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+    ], align=True),
+    'CThostFtdcInputOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OrderActionRef', 'i4'),
+        ('OrderRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('OrderSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('LimitPrice', 'f8'),
+        ('VolumeChange', 'i4'),
+        ('UserID', 'S16'),
+        ('reserve1', 'S31'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OrderActionRef', 'i4'),
+        ('OrderRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('OrderSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('LimitPrice', 'f8'),
+        ('VolumeChange', 'i4'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderLocalID', 'S13'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('StatusMsg', 'S81'),
+        ('reserve1', 'S31'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcExchangeOrderActionField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('OrderSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('LimitPrice', 'f8'),
+        ('VolumeChange', 'i4'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderLocalID', 'S13'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('BranchID', 'S9'),
+        ('reserve1', 'S16'),
+        ('MacAddress', 'S21'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcExchangeOrderActionErrorField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('OrderSysID', 'S21'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderLocalID', 'S13'),
+        ('ActionLocalID', 'S13'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+    ], align=True),
+    'CThostFtdcExchangeTradeField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('TradeID', 'S21'),
+        ('Direction', 'S1'),
+        ('OrderSysID', 'S21'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('TradingRole', 'S1'),
+        ('reserve1', 'S31'),
+        ('OffsetFlag', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('Price', 'f8'),
+        ('Volume', 'i4'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('TradeType', 'S1'),
+        ('PriceSource', 'S1'),
+        ('TraderID', 'S21'),
+        ('OrderLocalID', 'S13'),
+        ('ClearingPartID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('SequenceNo', 'i4'),
+        ('TradeSource', 'S1'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcTradeField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('OrderRef', 'S13'),
+        ('UserID', 'S16'),
+        ('ExchangeID', 'S9'),
+        ('TradeID', 'S21'),
+        ('Direction', 'S1'),
+        ('OrderSysID', 'S21'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('TradingRole', 'S1'),
+        ('reserve2', 'S31'),
+        ('OffsetFlag', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('Price', 'f8'),
+        ('Volume', 'i4'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('TradeType', 'S1'),
+        ('PriceSource', 'S1'),
+        ('TraderID', 'S21'),
+        ('OrderLocalID', 'S13'),
+        ('ClearingPartID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('SequenceNo', 'i4'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('BrokerOrderSeq', 'i4'),
+        ('TradeSource', 'S1'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcUserSessionField': np.dtype([
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('LoginDate', 'S9'),
+        ('LoginTime', 'S9'),
+        ('reserve1', 'S16'),
+        ('UserProductInfo', 'S11'),
+        ('InterfaceProductInfo', 'S11'),
+        ('ProtocolInfo', 'S11'),
+        ('MacAddress', 'S21'),
+        ('LoginRemark', 'S36'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryMaxOrderVolumeField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('Direction', 'S1'),
+        ('OffsetFlag', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('MaxVolume', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcSettlementInfoConfirmField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ConfirmDate', 'S9'),
+        ('ConfirmTime', 'S9'),
+        ('SettlementID', 'i4'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcSyncDepositField': np.dtype([
+        ('DepositSeqNo', 'S15'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('Deposit', 'f8'),
+        ('IsForce', 'i4'),
+        ('CurrencyID', 'S4'),
+        ('IsFromSopt', 'i4'),
+        ('TradingPassword', 'S41'),
+    ], align=True),
+    'CThostFtdcSyncFundMortgageField': np.dtype([
+        ('MortgageSeqNo', 'S15'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('FromCurrencyID', 'S4'),
+        ('MortgageAmount', 'f8'),
+        ('ToCurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcBrokerSyncField': np.dtype([
+        ('BrokerID', 'S11'),
+    ], align=True),
+    'CThostFtdcSyncingInvestorField': np.dtype([
+        ('InvestorID', 'S13'),
+        ('BrokerID', 'S11'),
+        ('InvestorGroupID', 'S13'),
+        ('InvestorName', 'S81'),
+        ('IdentifiedCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('IsActive', 'i4'),
+        ('Telephone', 'S41'),
+        ('Address', 'S101'),
+        ('OpenDate', 'S9'),
+        ('Mobile', 'S41'),
+        ('CommModelID', 'S13'),
+        ('MarginModelID', 'S13'),
+        ('IsOrderFreq', 'S1'),
+        ('IsOpenVolLimit', 'S1'),
+    ], align=True),
+    'CThostFtdcSyncingTradingCodeField': np.dtype([
+        ('InvestorID', 'S13'),
+        ('BrokerID', 'S11'),
+        ('ExchangeID', 'S9'),
+        ('ClientID', 'S11'),
+        ('IsActive', 'i4'),
+        ('ClientIDType', 'S1'),
+    ], align=True),
+    'CThostFtdcSyncingInvestorGroupField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorGroupID', 'S13'),
+        ('InvestorGroupName', 'S41'),
+    ], align=True),
+    'CThostFtdcSyncingTradingAccountField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('PreMortgage', 'f8'),
+        ('PreCredit', 'f8'),
+        ('PreDeposit', 'f8'),
+        ('PreBalance', 'f8'),
+        ('PreMargin', 'f8'),
+        ('InterestBase', 'f8'),
+        ('Interest', 'f8'),
+        ('Deposit', 'f8'),
+        ('Withdraw', 'f8'),
+        ('FrozenMargin', 'f8'),
+        ('FrozenCash', 'f8'),
+        ('FrozenCommission', 'f8'),
+        ('CurrMargin', 'f8'),
+        ('CashIn', 'f8'),
+        ('Commission', 'f8'),
+        ('CloseProfit', 'f8'),
+        ('PositionProfit', 'f8'),
+        ('Balance', 'f8'),
+        ('Available', 'f8'),
+        ('WithdrawQuota', 'f8'),
+        ('Reserve', 'f8'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('Credit', 'f8'),
+        ('Mortgage', 'f8'),
+        ('ExchangeMargin', 'f8'),
+        ('DeliveryMargin', 'f8'),
+        ('ExchangeDeliveryMargin', 'f8'),
+        ('ReserveBalance', 'f8'),
+        ('CurrencyID', 'S4'),
+        ('PreFundMortgageIn', 'f8'),
+        ('PreFundMortgageOut', 'f8'),
+        ('FundMortgageIn', 'f8'),
+        ('FundMortgageOut', 'f8'),
+        ('FundMortgageAvailable', 'f8'),
+        ('MortgageableFund', 'f8'),
+        ('SpecProductMargin', 'f8'),
+        ('SpecProductFrozenMargin', 'f8'),
+        ('SpecProductCommission', 'f8'),
+        ('SpecProductFrozenCommission', 'f8'),
+        ('SpecProductPositionProfit', 'f8'),
+        ('SpecProductCloseProfit', 'f8'),
+        ('SpecProductPositionProfitByAlg', 'f8'),
+        ('SpecProductExchangeMargin', 'f8'),
+        ('FrozenSwap', 'f8'),
+        ('RemainSwap', 'f8'),
+    ], align=True),
+    'CThostFtdcSyncingInvestorPositionField': np.dtype([
+        ('reserve1', 'S31'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('PosiDirection', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('PositionDate', 'S1'),
+        ('YdPosition', 'i4'),
+        ('Position', 'i4'),
+        ('LongFrozen', 'i4'),
+        ('ShortFrozen', 'i4'),
+        ('LongFrozenAmount', 'f8'),
+        ('ShortFrozenAmount', 'f8'),
+        ('OpenVolume', 'i4'),
+        ('CloseVolume', 'i4'),
+        ('OpenAmount', 'f8'),
+        ('CloseAmount', 'f8'),
+        ('PositionCost', 'f8'),
+        ('PreMargin', 'f8'),
+        ('UseMargin', 'f8'),
+        ('FrozenMargin', 'f8'),
+        ('FrozenCash', 'f8'),
+        ('FrozenCommission', 'f8'),
+        ('CashIn', 'f8'),
+        ('Commission', 'f8'),
+        ('CloseProfit', 'f8'),
+        ('PositionProfit', 'f8'),
+        ('PreSettlementPrice', 'f8'),
+        ('SettlementPrice', 'f8'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('OpenCost', 'f8'),
+        ('ExchangeMargin', 'f8'),
+        ('CombPosition', 'i4'),
+        ('CombLongFrozen', 'i4'),
+        ('CombShortFrozen', 'i4'),
+        ('CloseProfitByDate', 'f8'),
+        ('CloseProfitByTrade', 'f8'),
+        ('TodayPosition', 'i4'),
+        ('MarginRateByMoney', 'f8'),
+        ('MarginRateByVolume', 'f8'),
+        ('StrikeFrozen', 'i4'),
+        ('StrikeFrozenAmount', 'f8'),
+        ('AbandonFrozen', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('YdStrikeFrozen', 'i4'),
+        ('InvestUnitID', 'S17'),
+        ('PositionCostOffset', 'f8'),
+        ('TasPosition', 'i4'),
+        ('TasPositionCost', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcSyncingInstrumentMarginRateField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('HedgeFlag', 'S1'),
+        ('LongMarginRatioByMoney', 'f8'),
+        ('LongMarginRatioByVolume', 'f8'),
+        ('ShortMarginRatioByMoney', 'f8'),
+        ('ShortMarginRatioByVolume', 'f8'),
+        ('IsRelative', 'i4'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcSyncingInstrumentCommissionRateField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OpenRatioByMoney', 'f8'),
+        ('OpenRatioByVolume', 'f8'),
+        ('CloseRatioByMoney', 'f8'),
+        ('CloseRatioByVolume', 'f8'),
+        ('CloseTodayRatioByMoney', 'f8'),
+        ('CloseTodayRatioByVolume', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcSyncingInstrumentTradingRightField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('TradingRight', 'S1'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('OrderSysID', 'S21'),
+        ('InsertTimeStart', 'S9'),
+        ('InsertTimeEnd', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryTradeField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('TradeID', 'S21'),
+        ('TradeTimeStart', 'S9'),
+        ('TradeTimeEnd', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryInvestorPositionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryTradingAccountField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('BizType', 'S1'),
+        ('AccountID', 'S13'),
+    ], align=True),
+    'CThostFtdcQryInvestorField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+    ], align=True),
+    'CThostFtdcQryTradingCodeField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ClientID', 'S11'),
+        ('ClientIDType', 'S1'),
+        ('InvestUnitID', 'S17'),
+    ], align=True),
+    'CThostFtdcQryInvestorGroupField': np.dtype([
+        ('BrokerID', 'S11'),
+    ], align=True),
+    'CThostFtdcQryInstrumentMarginRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('HedgeFlag', 'S1'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryInstrumentCommissionRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryInstrumentTradingRightField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryBrokerField': np.dtype([
+        ('BrokerID', 'S11'),
+    ], align=True),
+    'CThostFtdcQryTraderField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('TraderID', 'S21'),
+    ], align=True),
+    'CThostFtdcQrySuperUserFunctionField': np.dtype([
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcQryUserSessionField': np.dtype([
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcQryPartBrokerField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('ParticipantID', 'S11'),
+    ], align=True),
+    'CThostFtdcQryFrontStatusField': np.dtype([
+        ('FrontID', 'i4'),
+    ], align=True),
+    'CThostFtdcQryExchangeOrderField': np.dtype([
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+    ], align=True),
+    'CThostFtdcQryExchangeOrderActionField': np.dtype([
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+    ], align=True),
+    'CThostFtdcQrySuperUserField': np.dtype([
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcQryExchangeField': np.dtype([
+        ('ExchangeID', 'S9'),
+    ], align=True),
+    'CThostFtdcQryProductField': np.dtype([
+        ('reserve1', 'S31'),
+        ('ProductClass', 'S1'),
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryInstrumentField': np.dtype([
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('reserve2', 'S31'),
+        ('reserve3', 'S31'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+        ('ProductID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryDepthMarketDataField': np.dtype([
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryBrokerUserField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcQryBrokerUserFunctionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcQryTraderOfferField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('TraderID', 'S21'),
+    ], align=True),
+    'CThostFtdcQrySyncDepositField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('DepositSeqNo', 'S15'),
+    ], align=True),
+    'CThostFtdcQrySettlementInfoField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('TradingDay', 'S9'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcQryExchangeMarginRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('reserve1', 'S31'),
+        ('HedgeFlag', 'S1'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryExchangeMarginRateAdjustField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('reserve1', 'S31'),
+        ('HedgeFlag', 'S1'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryExchangeRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('FromCurrencyID', 'S4'),
+        ('ToCurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcQrySyncFundMortgageField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('MortgageSeqNo', 'S15'),
+    ], align=True),
+    'CThostFtdcQryHisOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('OrderSysID', 'S21'),
+        ('InsertTimeStart', 'S9'),
+        ('InsertTimeEnd', 'S9'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcOptionInstrMiniMarginField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('MinMargin', 'f8'),
+        ('ValueMethod', 'S1'),
+        ('IsRelative', 'i4'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcOptionInstrMarginAdjustField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('SShortMarginRatioByMoney', 'f8'),
+        ('SShortMarginRatioByVolume', 'f8'),
+        ('HShortMarginRatioByMoney', 'f8'),
+        ('HShortMarginRatioByVolume', 'f8'),
+        ('AShortMarginRatioByMoney', 'f8'),
+        ('AShortMarginRatioByVolume', 'f8'),
+        ('IsRelative', 'i4'),
+        ('MShortMarginRatioByMoney', 'f8'),
+        ('MShortMarginRatioByVolume', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcOptionInstrCommRateField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OpenRatioByMoney', 'f8'),
+        ('OpenRatioByVolume', 'f8'),
+        ('CloseRatioByMoney', 'f8'),
+        ('CloseRatioByVolume', 'f8'),
+        ('CloseTodayRatioByMoney', 'f8'),
+        ('CloseTodayRatioByVolume', 'f8'),
+        ('StrikeRatioByMoney', 'f8'),
+        ('StrikeRatioByVolume', 'f8'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcOptionInstrTradeCostField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('HedgeFlag', 'S1'),
+        ('FixedMargin', 'f8'),
+        ('MiniMargin', 'f8'),
+        ('Royalty', 'f8'),
+        ('ExchFixedMargin', 'f8'),
+        ('ExchMiniMargin', 'f8'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryOptionInstrTradeCostField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('HedgeFlag', 'S1'),
+        ('InputPrice', 'f8'),
+        ('UnderlyingPrice', 'f8'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryOptionInstrCommRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcIndexPriceField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('reserve1', 'S31'),
+        ('ClosePrice', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcInputExecOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExecOrderRef', 'S13'),
+        ('UserID', 'S16'),
+        ('Volume', 'i4'),
+        ('RequestID', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('OffsetFlag', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('ActionType', 'S1'),
+        ('PosiDirection', 'S1'),
+        ('ReservePositionFlag', 'S1'),
+        ('CloseFlag', 'S1'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcInputExecOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExecOrderActionRef', 'i4'),
+        ('ExecOrderRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('ExecOrderSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('UserID', 'S16'),
+        ('reserve1', 'S31'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcExecOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExecOrderRef', 'S13'),
+        ('UserID', 'S16'),
+        ('Volume', 'i4'),
+        ('RequestID', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('OffsetFlag', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('ActionType', 'S1'),
+        ('PosiDirection', 'S1'),
+        ('ReservePositionFlag', 'S1'),
+        ('CloseFlag', 'S1'),
+        ('ExecOrderLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderSubmitStatus', 'S1'),
+        ('NotifySequence', 'i4'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('ExecOrderSysID', 'S21'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('CancelTime', 'S9'),
+        ('ExecResult', 'S1'),
+        ('ClearingPartID', 'S11'),
+        ('SequenceNo', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('UserProductInfo', 'S11'),
+        ('StatusMsg', 'S81'),
+        ('ActiveUserID', 'S16'),
+        ('BrokerExecOrderSeq', 'i4'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('reserve3', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcExecOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExecOrderActionRef', 'i4'),
+        ('ExecOrderRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('ExecOrderSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('ExecOrderLocalID', 'S13'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('ActionType', 'S1'),
+        ('StatusMsg', 'S81'),
+        ('reserve1', 'S31'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryExecOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('ExecOrderSysID', 'S21'),
+        ('InsertTimeStart', 'S9'),
+        ('InsertTimeEnd', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcExchangeExecOrderField': np.dtype([
+        ('Volume', 'i4'),
+        ('RequestID', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('OffsetFlag', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('ActionType', 'S1'),
+        ('PosiDirection', 'S1'),
+        ('ReservePositionFlag', 'S1'),
+        ('CloseFlag', 'S1'),
+        ('ExecOrderLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderSubmitStatus', 'S1'),
+        ('NotifySequence', 'i4'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('ExecOrderSysID', 'S21'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('CancelTime', 'S9'),
+        ('ExecResult', 'S1'),
+        ('ClearingPartID', 'S11'),
+        ('SequenceNo', 'i4'),
+        ('BranchID', 'S9'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryExchangeExecOrderField': np.dtype([
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryExecOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+    ], align=True),
+    'CThostFtdcExchangeExecOrderActionField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ExecOrderSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('ExecOrderLocalID', 'S13'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('ActionType', 'S1'),
+        ('BranchID', 'S9'),
+        ('reserve1', 'S16'),
+        ('MacAddress', 'S21'),
+        ('reserve2', 'S31'),
+        ('Volume', 'i4'),
+        ('IPAddress', 'S33'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryExchangeExecOrderActionField': np.dtype([
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+    ], align=True),
+    'CThostFtdcErrExecOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExecOrderRef', 'S13'),
+        ('UserID', 'S16'),
+        ('Volume', 'i4'),
+        ('RequestID', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('OffsetFlag', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('ActionType', 'S1'),
+        ('PosiDirection', 'S1'),
+        ('ReservePositionFlag', 'S1'),
+        ('CloseFlag', 'S1'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryErrExecOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+    ], align=True),
+    'CThostFtdcErrExecOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExecOrderActionRef', 'i4'),
+        ('ExecOrderRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('ExecOrderSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('UserID', 'S16'),
+        ('reserve1', 'S31'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryErrExecOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+    ], align=True),
+    'CThostFtdcOptionInstrTradingRightField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('Direction', 'S1'),
+        ('TradingRight', 'S1'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryOptionInstrTradingRightField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('Direction', 'S1'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcInputForQuoteField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ForQuoteRef', 'S13'),
+        ('UserID', 'S16'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcForQuoteField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ForQuoteRef', 'S13'),
+        ('UserID', 'S16'),
+        ('ForQuoteLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('ForQuoteStatus', 'S1'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('StatusMsg', 'S81'),
+        ('ActiveUserID', 'S16'),
+        ('BrokerForQutoSeq', 'i4'),
+        ('InvestUnitID', 'S17'),
+        ('reserve3', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryForQuoteField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InsertTimeStart', 'S9'),
+        ('InsertTimeEnd', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcExchangeForQuoteField': np.dtype([
+        ('ForQuoteLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('ForQuoteStatus', 'S1'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryExchangeForQuoteField': np.dtype([
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcInputQuoteField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('QuoteRef', 'S13'),
+        ('UserID', 'S16'),
+        ('AskPrice', 'f8'),
+        ('BidPrice', 'f8'),
+        ('AskVolume', 'i4'),
+        ('BidVolume', 'i4'),
+        ('RequestID', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('AskOffsetFlag', 'S1'),
+        ('BidOffsetFlag', 'S1'),
+        ('AskHedgeFlag', 'S1'),
+        ('BidHedgeFlag', 'S1'),
+        ('AskOrderRef', 'S13'),
+        ('BidOrderRef', 'S13'),
+        ('ForQuoteSysID', 'S21'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+        ('ReplaceSysID', 'S21'),
+        ('TimeCondition', 'S1'),
+    ], align=True),
+    'CThostFtdcInputQuoteActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('QuoteActionRef', 'i4'),
+        ('QuoteRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('QuoteSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('UserID', 'S16'),
+        ('reserve1', 'S31'),
+        ('InvestUnitID', 'S17'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQuoteField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('QuoteRef', 'S13'),
+        ('UserID', 'S16'),
+        ('AskPrice', 'f8'),
+        ('BidPrice', 'f8'),
+        ('AskVolume', 'i4'),
+        ('BidVolume', 'i4'),
+        ('RequestID', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('AskOffsetFlag', 'S1'),
+        ('BidOffsetFlag', 'S1'),
+        ('AskHedgeFlag', 'S1'),
+        ('BidHedgeFlag', 'S1'),
+        ('QuoteLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('NotifySequence', 'i4'),
+        ('OrderSubmitStatus', 'S1'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('QuoteSysID', 'S21'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('CancelTime', 'S9'),
+        ('QuoteStatus', 'S1'),
+        ('ClearingPartID', 'S11'),
+        ('SequenceNo', 'i4'),
+        ('AskOrderSysID', 'S21'),
+        ('BidOrderSysID', 'S21'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('UserProductInfo', 'S11'),
+        ('StatusMsg', 'S81'),
+        ('ActiveUserID', 'S16'),
+        ('BrokerQuoteSeq', 'i4'),
+        ('AskOrderRef', 'S13'),
+        ('BidOrderRef', 'S13'),
+        ('ForQuoteSysID', 'S21'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('reserve3', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+        ('ReplaceSysID', 'S21'),
+        ('TimeCondition', 'S1'),
+    ], align=True),
+    'CThostFtdcQuoteActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('QuoteActionRef', 'i4'),
+        ('QuoteRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('QuoteSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('QuoteLocalID', 'S13'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('StatusMsg', 'S81'),
+        ('reserve1', 'S31'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryQuoteField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('QuoteSysID', 'S21'),
+        ('InsertTimeStart', 'S9'),
+        ('InsertTimeEnd', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcExchangeQuoteField': np.dtype([
+        ('AskPrice', 'f8'),
+        ('BidPrice', 'f8'),
+        ('AskVolume', 'i4'),
+        ('BidVolume', 'i4'),
+        ('RequestID', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('AskOffsetFlag', 'S1'),
+        ('BidOffsetFlag', 'S1'),
+        ('AskHedgeFlag', 'S1'),
+        ('BidHedgeFlag', 'S1'),
+        ('QuoteLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('NotifySequence', 'i4'),
+        ('OrderSubmitStatus', 'S1'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('QuoteSysID', 'S21'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('CancelTime', 'S9'),
+        ('QuoteStatus', 'S1'),
+        ('ClearingPartID', 'S11'),
+        ('SequenceNo', 'i4'),
+        ('AskOrderSysID', 'S21'),
+        ('BidOrderSysID', 'S21'),
+        ('ForQuoteSysID', 'S21'),
+        ('BranchID', 'S9'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+        ('TimeCondition', 'S1'),
+    ], align=True),
+    'CThostFtdcQryExchangeQuoteField': np.dtype([
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryQuoteActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+    ], align=True),
+    'CThostFtdcExchangeQuoteActionField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('QuoteSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('QuoteLocalID', 'S13'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('reserve1', 'S16'),
+        ('MacAddress', 'S21'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryExchangeQuoteActionField': np.dtype([
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+    ], align=True),
+    'CThostFtdcOptionInstrDeltaField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('Delta', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcForQuoteRspField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('reserve1', 'S31'),
+        ('ForQuoteSysID', 'S21'),
+        ('ForQuoteTime', 'S9'),
+        ('ActionDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcStrikeOffsetField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('Offset', 'f8'),
+        ('OffsetType', 'S1'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryStrikeOffsetField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcInputBatchOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OrderActionRef', 'i4'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('UserID', 'S16'),
+        ('InvestUnitID', 'S17'),
+        ('reserve1', 'S16'),
+        ('MacAddress', 'S21'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcBatchOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OrderActionRef', 'i4'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('StatusMsg', 'S81'),
+        ('InvestUnitID', 'S17'),
+        ('reserve1', 'S16'),
+        ('MacAddress', 'S21'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcExchangeBatchOrderActionField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('reserve1', 'S16'),
+        ('MacAddress', 'S21'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryBatchOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+    ], align=True),
+    'CThostFtdcCombInstrumentGuardField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('reserve1', 'S31'),
+        ('GuarantRatio', 'f8'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryCombInstrumentGuardField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcInputCombActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('CombActionRef', 'S13'),
+        ('UserID', 'S16'),
+        ('Direction', 'S1'),
+        ('Volume', 'i4'),
+        ('CombDirection', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('ExchangeID', 'S9'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InvestUnitID', 'S17'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcCombActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('CombActionRef', 'S13'),
+        ('UserID', 'S16'),
+        ('Direction', 'S1'),
+        ('Volume', 'i4'),
+        ('CombDirection', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('ActionLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('ActionStatus', 'S1'),
+        ('NotifySequence', 'i4'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('SequenceNo', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('UserProductInfo', 'S11'),
+        ('StatusMsg', 'S81'),
+        ('reserve3', 'S16'),
+        ('MacAddress', 'S21'),
+        ('ComTradeID', 'S21'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryCombActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcExchangeCombActionField': np.dtype([
+        ('Direction', 'S1'),
+        ('Volume', 'i4'),
+        ('CombDirection', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('ActionLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('ActionStatus', 'S1'),
+        ('NotifySequence', 'i4'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('SequenceNo', 'i4'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('ComTradeID', 'S21'),
+        ('BranchID', 'S9'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryExchangeCombActionField': np.dtype([
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcProductExchRateField': np.dtype([
+        ('reserve1', 'S31'),
+        ('QuoteCurrencyID', 'S4'),
+        ('ExchangeRate', 'f8'),
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryProductExchRateField': np.dtype([
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryForQuoteParamField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcForQuoteParamField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('LastPrice', 'f8'),
+        ('PriceInterval', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcMMOptionInstrCommRateField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OpenRatioByMoney', 'f8'),
+        ('OpenRatioByVolume', 'f8'),
+        ('CloseRatioByMoney', 'f8'),
+        ('CloseRatioByVolume', 'f8'),
+        ('CloseTodayRatioByMoney', 'f8'),
+        ('CloseTodayRatioByVolume', 'f8'),
+        ('StrikeRatioByMoney', 'f8'),
+        ('StrikeRatioByVolume', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryMMOptionInstrCommRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcMMInstrumentCommissionRateField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OpenRatioByMoney', 'f8'),
+        ('OpenRatioByVolume', 'f8'),
+        ('CloseRatioByMoney', 'f8'),
+        ('CloseRatioByVolume', 'f8'),
+        ('CloseTodayRatioByMoney', 'f8'),
+        ('CloseTodayRatioByVolume', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryMMInstrumentCommissionRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcInstrumentOrderCommRateField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('HedgeFlag', 'S1'),
+        ('OrderCommByVolume', 'f8'),
+        ('OrderActionCommByVolume', 'f8'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+        ('OrderCommByTrade', 'f8'),
+        ('OrderActionCommByTrade', 'f8'),
+    ], align=True),
+    'CThostFtdcQryInstrumentOrderCommRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcTradeParamField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('TradeParamID', 'S1'),
+        ('TradeParamValue', 'S256'),
+        ('Memo', 'S161'),
+    ], align=True),
+    'CThostFtdcInstrumentMarginRateULField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('HedgeFlag', 'S1'),
+        ('LongMarginRatioByMoney', 'f8'),
+        ('LongMarginRatioByVolume', 'f8'),
+        ('ShortMarginRatioByMoney', 'f8'),
+        ('ShortMarginRatioByVolume', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcFutureLimitPosiParamField': np.dtype([
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('SpecOpenVolume', 'i4'),
+        ('ArbiOpenVolume', 'i4'),
+        ('OpenVolume', 'i4'),
+        ('ProductID', 'S81'),
+    ], align=True),
+    'CThostFtdcLoginForbiddenIPField': np.dtype([
+        ('reserve1', 'S16'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcIPListField': np.dtype([
+        ('reserve1', 'S16'),
+        ('IsWhite', 'i4'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcInputOptionSelfCloseField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('OptionSelfCloseRef', 'S13'),
+        ('UserID', 'S16'),
+        ('Volume', 'i4'),
+        ('RequestID', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('HedgeFlag', 'S1'),
+        ('OptSelfCloseFlag', 'S1'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcInputOptionSelfCloseActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OptionSelfCloseActionRef', 'i4'),
+        ('OptionSelfCloseRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('OptionSelfCloseSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('UserID', 'S16'),
+        ('reserve1', 'S31'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcOptionSelfCloseField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('OptionSelfCloseRef', 'S13'),
+        ('UserID', 'S16'),
+        ('Volume', 'i4'),
+        ('RequestID', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('HedgeFlag', 'S1'),
+        ('OptSelfCloseFlag', 'S1'),
+        ('OptionSelfCloseLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderSubmitStatus', 'S1'),
+        ('NotifySequence', 'i4'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('OptionSelfCloseSysID', 'S21'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('CancelTime', 'S9'),
+        ('ExecResult', 'S1'),
+        ('ClearingPartID', 'S11'),
+        ('SequenceNo', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('UserProductInfo', 'S11'),
+        ('StatusMsg', 'S81'),
+        ('ActiveUserID', 'S16'),
+        ('BrokerOptionSelfCloseSeq', 'i4'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('reserve3', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcOptionSelfCloseActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OptionSelfCloseActionRef', 'i4'),
+        ('OptionSelfCloseRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('OptionSelfCloseSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OptionSelfCloseLocalID', 'S13'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('StatusMsg', 'S81'),
+        ('reserve1', 'S31'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryOptionSelfCloseField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('OptionSelfCloseSysID', 'S21'),
+        ('InsertTimeStart', 'S9'),
+        ('InsertTimeEnd', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcExchangeOptionSelfCloseField': np.dtype([
+        ('Volume', 'i4'),
+        ('RequestID', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('HedgeFlag', 'S1'),
+        ('OptSelfCloseFlag', 'S1'),
+        ('OptionSelfCloseLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve1', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderSubmitStatus', 'S1'),
+        ('NotifySequence', 'i4'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('OptionSelfCloseSysID', 'S21'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('CancelTime', 'S9'),
+        ('ExecResult', 'S1'),
+        ('ClearingPartID', 'S11'),
+        ('SequenceNo', 'i4'),
+        ('BranchID', 'S9'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryOptionSelfCloseActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+    ], align=True),
+    'CThostFtdcExchangeOptionSelfCloseActionField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('OptionSelfCloseSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OptionSelfCloseLocalID', 'S13'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('BranchID', 'S9'),
+        ('reserve1', 'S16'),
+        ('MacAddress', 'S21'),
+        ('reserve2', 'S31'),
+        ('OptSelfCloseFlag', 'S1'),
+        ('IPAddress', 'S33'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcSyncDelaySwapField': np.dtype([
+        ('DelaySwapSeqNo', 'S15'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('FromCurrencyID', 'S4'),
+        ('FromAmount', 'f8'),
+        ('FromFrozenSwap', 'f8'),
+        ('FromRemainSwap', 'f8'),
+        ('ToCurrencyID', 'S4'),
+        ('ToAmount', 'f8'),
+        ('IsManualSwap', 'i4'),
+        ('IsAllRemainSetZero', 'i4'),
+    ], align=True),
+    'CThostFtdcQrySyncDelaySwapField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('DelaySwapSeqNo', 'S15'),
+    ], align=True),
+    'CThostFtdcInvestUnitField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('InvestUnitID', 'S17'),
+        ('InvestorUnitName', 'S81'),
+        ('InvestorGroupID', 'S13'),
+        ('CommModelID', 'S13'),
+        ('MarginModelID', 'S13'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcQryInvestUnitField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('InvestUnitID', 'S17'),
+    ], align=True),
+    'CThostFtdcSecAgentCheckModeField': np.dtype([
+        ('InvestorID', 'S13'),
+        ('BrokerID', 'S11'),
+        ('CurrencyID', 'S4'),
+        ('BrokerSecAgentID', 'S13'),
+        ('CheckSelfAccount', 'i4'),
+    ], align=True),
+    'CThostFtdcSecAgentTradeInfoField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('BrokerSecAgentID', 'S13'),
+        ('InvestorID', 'S13'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcMarketDataField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('reserve2', 'S31'),
+        ('LastPrice', 'f8'),
+        ('PreSettlementPrice', 'f8'),
+        ('PreClosePrice', 'f8'),
+        ('PreOpenInterest', 'f8'),
+        ('OpenPrice', 'f8'),
+        ('HighestPrice', 'f8'),
+        ('LowestPrice', 'f8'),
+        ('Volume', 'i4'),
+        ('Turnover', 'f8'),
+        ('OpenInterest', 'f8'),
+        ('ClosePrice', 'f8'),
+        ('SettlementPrice', 'f8'),
+        ('UpperLimitPrice', 'f8'),
+        ('LowerLimitPrice', 'f8'),
+        ('PreDelta', 'f8'),
+        ('CurrDelta', 'f8'),
+        ('UpdateTime', 'S9'),
+        ('UpdateMillisec', 'i4'),
+        ('ActionDay', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcMarketDataBaseField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('PreSettlementPrice', 'f8'),
+        ('PreClosePrice', 'f8'),
+        ('PreOpenInterest', 'f8'),
+        ('PreDelta', 'f8'),
+    ], align=True),
+    'CThostFtdcMarketDataStaticField': np.dtype([
+        ('OpenPrice', 'f8'),
+        ('HighestPrice', 'f8'),
+        ('LowestPrice', 'f8'),
+        ('ClosePrice', 'f8'),
+        ('UpperLimitPrice', 'f8'),
+        ('LowerLimitPrice', 'f8'),
+        ('SettlementPrice', 'f8'),
+        ('CurrDelta', 'f8'),
+    ], align=True),
+    'CThostFtdcMarketDataLastMatchField': np.dtype([
+        ('LastPrice', 'f8'),
+        ('Volume', 'i4'),
+        ('Turnover', 'f8'),
+        ('OpenInterest', 'f8'),
+    ], align=True),
+    'CThostFtdcMarketDataBestPriceField': np.dtype([
+        ('BidPrice1', 'f8'),
+        ('BidVolume1', 'i4'),
+        ('AskPrice1', 'f8'),
+        ('AskVolume1', 'i4'),
+    ], align=True),
+    'CThostFtdcMarketDataBid23Field': np.dtype([
+        ('BidPrice2', 'f8'),
+        ('BidVolume2', 'i4'),
+        ('BidPrice3', 'f8'),
+        ('BidVolume3', 'i4'),
+    ], align=True),
+    'CThostFtdcMarketDataAsk23Field': np.dtype([
+        ('AskPrice2', 'f8'),
+        ('AskVolume2', 'i4'),
+        ('AskPrice3', 'f8'),
+        ('AskVolume3', 'i4'),
+    ], align=True),
+    'CThostFtdcMarketDataBid45Field': np.dtype([
+        ('BidPrice4', 'f8'),
+        ('BidVolume4', 'i4'),
+        ('BidPrice5', 'f8'),
+        ('BidVolume5', 'i4'),
+    ], align=True),
+    'CThostFtdcMarketDataAsk45Field': np.dtype([
+        ('AskPrice4', 'f8'),
+        ('AskVolume4', 'i4'),
+        ('AskPrice5', 'f8'),
+        ('AskVolume5', 'i4'),
+    ], align=True),
+    'CThostFtdcMarketDataUpdateTimeField': np.dtype([
+        ('reserve1', 'S31'),
+        ('UpdateTime', 'S9'),
+        ('UpdateMillisec', 'i4'),
+        ('ActionDay', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcMarketDataBandingPriceField': np.dtype([
+        ('BandingUpperPrice', 'f8'),
+        ('BandingLowerPrice', 'f8'),
+    ], align=True),
+    'CThostFtdcMarketDataExchangeField': np.dtype([
+        ('ExchangeID', 'S9'),
+    ], align=True),
+    'CThostFtdcSpecificInstrumentField': np.dtype([
+        ('reserve1', 'S31'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcInstrumentStatusField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('reserve1', 'S31'),
+        ('SettlementGroupID', 'S9'),
+        ('reserve2', 'S31'),
+        ('InstrumentStatus', 'S1'),
+        ('TradingSegmentSN', 'i4'),
+        ('EnterTime', 'S9'),
+        ('EnterReason', 'S1'),
+        ('ExchangeInstID', 'S81'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryInstrumentStatusField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('reserve1', 'S31'),
+        ('ExchangeInstID', 'S81'),
+    ], align=True),
+    'CThostFtdcInvestorAccountField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcPositionProfitAlgorithmField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('Algorithm', 'S1'),
+        ('Memo', 'S161'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcDiscountField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorRange', 'S1'),
+        ('InvestorID', 'S13'),
+        ('Discount', 'f8'),
+    ], align=True),
+    'CThostFtdcQryTransferBankField': np.dtype([
+        ('BankID', 'S4'),
+        ('BankBrchID', 'S5'),
+    ], align=True),
+    'CThostFtdcTransferBankField': np.dtype([
+        ('BankID', 'S4'),
+        ('BankBrchID', 'S5'),
+        ('BankName', 'S101'),
+        ('IsActive', 'i4'),
+    ], align=True),
+    'CThostFtdcQryInvestorPositionDetailField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcInvestorPositionDetailField': np.dtype([
+        ('reserve1', 'S31'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('HedgeFlag', 'S1'),
+        ('Direction', 'S1'),
+        ('OpenDate', 'S9'),
+        ('TradeID', 'S21'),
+        ('Volume', 'i4'),
+        ('OpenPrice', 'f8'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('TradeType', 'S1'),
+        ('reserve2', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('CloseProfitByDate', 'f8'),
+        ('CloseProfitByTrade', 'f8'),
+        ('PositionProfitByDate', 'f8'),
+        ('PositionProfitByTrade', 'f8'),
+        ('Margin', 'f8'),
+        ('ExchMargin', 'f8'),
+        ('MarginRateByMoney', 'f8'),
+        ('MarginRateByVolume', 'f8'),
+        ('LastSettlementPrice', 'f8'),
+        ('SettlementPrice', 'f8'),
+        ('CloseVolume', 'i4'),
+        ('CloseAmount', 'f8'),
+        ('TimeFirstVolume', 'i4'),
+        ('InvestUnitID', 'S17'),
+        ('SpecPosiType', 'S1'),
+        ('InstrumentID', 'S81'),
+        ('CombInstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcTradingAccountPasswordField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcMDTraderOfferField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+        ('ParticipantID', 'S11'),
+        ('Password', 'S41'),
+        ('InstallID', 'i4'),
+        ('OrderLocalID', 'S13'),
+        ('TraderConnectStatus', 'S1'),
+        ('ConnectRequestDate', 'S9'),
+        ('ConnectRequestTime', 'S9'),
+        ('LastReportDate', 'S9'),
+        ('LastReportTime', 'S9'),
+        ('ConnectDate', 'S9'),
+        ('ConnectTime', 'S9'),
+        ('StartDate', 'S9'),
+        ('StartTime', 'S9'),
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('MaxTradeID', 'S21'),
+        ('MaxOrderMessageReference', 'S7'),
+        ('OrderCancelAlg', 'S1'),
+    ], align=True),
+    'CThostFtdcQryMDTraderOfferField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('TraderID', 'S21'),
+    ], align=True),
+    'CThostFtdcQryNoticeField': np.dtype([
+        ('BrokerID', 'S11'),
+    ], align=True),
+    'CThostFtdcNoticeField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('Content', 'S501'),
+        ('SequenceLabel', 'S2'),
+    ], align=True),
+    'CThostFtdcUserRightField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('UserRightType', 'S1'),
+        ('IsForbidden', 'i4'),
+    ], align=True),
+    'CThostFtdcQrySettlementInfoConfirmField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcLoadSettlementInfoField': np.dtype([
+        ('BrokerID', 'S11'),
+    ], align=True),
+    'CThostFtdcBrokerWithdrawAlgorithmField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('WithdrawAlgorithm', 'S1'),
+        ('UsingRatio', 'f8'),
+        ('IncludeCloseProfit', 'S1'),
+        ('AllWithoutTrade', 'S1'),
+        ('AvailIncludeCloseProfit', 'S1'),
+        ('IsBrokerUserEvent', 'i4'),
+        ('CurrencyID', 'S4'),
+        ('FundMortgageRatio', 'f8'),
+        ('BalanceAlgorithm', 'S1'),
+    ], align=True),
+    'CThostFtdcTradingAccountPasswordUpdateV1Field': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OldPassword', 'S41'),
+        ('NewPassword', 'S41'),
+    ], align=True),
+    'CThostFtdcTradingAccountPasswordUpdateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('OldPassword', 'S41'),
+        ('NewPassword', 'S41'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcQryCombinationLegField': np.dtype([
+        ('reserve1', 'S31'),
+        ('LegID', 'i4'),
+        ('reserve2', 'S31'),
+        ('CombInstrumentID', 'S81'),
+        ('LegInstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQrySyncStatusField': np.dtype([
+        ('TradingDay', 'S9'),
+    ], align=True),
+    'CThostFtdcCombinationLegField': np.dtype([
+        ('reserve1', 'S31'),
+        ('LegID', 'i4'),
+        ('reserve2', 'S31'),
+        ('Direction', 'S1'),
+        ('LegMultiple', 'i4'),
+        ('ImplyLevel', 'i4'),
+        ('CombInstrumentID', 'S81'),
+        ('LegInstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcSyncStatusField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('DataSyncStatus', 'S1'),
+    ], align=True),
+    'CThostFtdcQryLinkManField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+    ], align=True),
+    'CThostFtdcLinkManField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('PersonType', 'S1'),
+        ('IdentifiedCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('PersonName', 'S81'),
+        ('Telephone', 'S41'),
+        ('Address', 'S101'),
+        ('ZipCode', 'S7'),
+        ('Priority', 'i4'),
+        ('UOAZipCode', 'S11'),
+        ('PersonFullName', 'S101'),
+    ], align=True),
+    'CThostFtdcQryBrokerUserEventField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('UserEventType', 'S1'),
+    ], align=True),
+    'CThostFtdcBrokerUserEventField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('UserEventType', 'S1'),
+        ('EventSequenceNo', 'i4'),
+        ('EventDate', 'S9'),
+        ('EventTime', 'S9'),
+        ('UserEventInfo', 'S1025'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('InstrumentID', 'S81'),
+        ('DRIdentityID', 'i4'),
+        ('TradingDay', 'S9'),
+    ], align=True),
+    'CThostFtdcQryContractBankField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('BankID', 'S4'),
+        ('BankBrchID', 'S5'),
+    ], align=True),
+    'CThostFtdcContractBankField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('BankID', 'S4'),
+        ('BankBrchID', 'S5'),
+        ('BankName', 'S101'),
+    ], align=True),
+    'CThostFtdcInvestorPositionCombineDetailField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('OpenDate', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('SettlementID', 'i4'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ComTradeID', 'S21'),
+        ('TradeID', 'S21'),
+        ('reserve1', 'S31'),
+        ('HedgeFlag', 'S1'),
+        ('Direction', 'S1'),
+        ('TotalAmt', 'i4'),
+        ('Margin', 'f8'),
+        ('ExchMargin', 'f8'),
+        ('MarginRateByMoney', 'f8'),
+        ('MarginRateByVolume', 'f8'),
+        ('LegID', 'i4'),
+        ('LegMultiple', 'i4'),
+        ('reserve2', 'S31'),
+        ('TradeGroupID', 'i4'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+        ('CombInstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcParkedOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('OrderRef', 'S13'),
+        ('UserID', 'S16'),
+        ('OrderPriceType', 'S1'),
+        ('Direction', 'S1'),
+        ('CombOffsetFlag', 'S5'),
+        ('CombHedgeFlag', 'S5'),
+        ('LimitPrice', 'f8'),
+        ('VolumeTotalOriginal', 'i4'),
+        ('TimeCondition', 'S1'),
+        ('GTDDate', 'S9'),
+        ('VolumeCondition', 'S1'),
+        ('MinVolume', 'i4'),
+        ('ContingentCondition', 'S1'),
+        ('StopPrice', 'f8'),
+        ('ForceCloseReason', 'S1'),
+        ('IsAutoSuspend', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('RequestID', 'i4'),
+        ('UserForceClose', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('ParkedOrderID', 'S13'),
+        ('UserType', 'S1'),
+        ('Status', 'S1'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('IsSwapOrder', 'i4'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('ClientID', 'S11'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcParkedOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OrderActionRef', 'i4'),
+        ('OrderRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('OrderSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('LimitPrice', 'f8'),
+        ('VolumeChange', 'i4'),
+        ('UserID', 'S16'),
+        ('reserve1', 'S31'),
+        ('ParkedOrderActionID', 'S13'),
+        ('UserType', 'S1'),
+        ('Status', 'S1'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryParkedOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryParkedOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcRemoveParkedOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ParkedOrderID', 'S13'),
+        ('InvestUnitID', 'S17'),
+    ], align=True),
+    'CThostFtdcRemoveParkedOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ParkedOrderActionID', 'S13'),
+        ('InvestUnitID', 'S17'),
+    ], align=True),
+    'CThostFtdcInvestorWithdrawAlgorithmField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorRange', 'S1'),
+        ('InvestorID', 'S13'),
+        ('UsingRatio', 'f8'),
+        ('CurrencyID', 'S4'),
+        ('FundMortgageRatio', 'f8'),
+    ], align=True),
+    'CThostFtdcQryInvestorPositionCombineDetailField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('CombInstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcMarketDataAveragePriceField': np.dtype([
+        ('AveragePrice', 'f8'),
+    ], align=True),
+    'CThostFtdcVerifyInvestorPasswordField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('Password', 'S41'),
+    ], align=True),
+    'CThostFtdcUserIPField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('reserve1', 'S16'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('IPAddress', 'S33'),
+        ('IPMask', 'S33'),
+    ], align=True),
+    'CThostFtdcTradingNoticeInfoField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('SendTime', 'S9'),
+        ('FieldContent', 'S501'),
+        ('SequenceSeries', 'i2'),
+        ('SequenceNo', 'i4'),
+        ('InvestUnitID', 'S17'),
+    ], align=True),
+    'CThostFtdcTradingNoticeField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorRange', 'S1'),
+        ('InvestorID', 'S13'),
+        ('SequenceSeries', 'i2'),
+        ('UserID', 'S16'),
+        ('SendTime', 'S9'),
+        ('SequenceNo', 'i4'),
+        ('FieldContent', 'S501'),
+        ('InvestUnitID', 'S17'),
+    ], align=True),
+    'CThostFtdcQryTradingNoticeField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('InvestUnitID', 'S17'),
+    ], align=True),
+    'CThostFtdcQryErrOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+    ], align=True),
+    'CThostFtdcErrOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('OrderRef', 'S13'),
+        ('UserID', 'S16'),
+        ('OrderPriceType', 'S1'),
+        ('Direction', 'S1'),
+        ('CombOffsetFlag', 'S5'),
+        ('CombHedgeFlag', 'S5'),
+        ('LimitPrice', 'f8'),
+        ('VolumeTotalOriginal', 'i4'),
+        ('TimeCondition', 'S1'),
+        ('GTDDate', 'S9'),
+        ('VolumeCondition', 'S1'),
+        ('MinVolume', 'i4'),
+        ('ContingentCondition', 'S1'),
+        ('StopPrice', 'f8'),
+        ('ForceCloseReason', 'S1'),
+        ('IsAutoSuspend', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('RequestID', 'i4'),
+        ('UserForceClose', 'i4'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('IsSwapOrder', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcErrorConditionalOrderField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('OrderRef', 'S13'),
+        ('UserID', 'S16'),
+        ('OrderPriceType', 'S1'),
+        ('Direction', 'S1'),
+        ('CombOffsetFlag', 'S5'),
+        ('CombHedgeFlag', 'S5'),
+        ('LimitPrice', 'f8'),
+        ('VolumeTotalOriginal', 'i4'),
+        ('TimeCondition', 'S1'),
+        ('GTDDate', 'S9'),
+        ('VolumeCondition', 'S1'),
+        ('MinVolume', 'i4'),
+        ('ContingentCondition', 'S1'),
+        ('StopPrice', 'f8'),
+        ('ForceCloseReason', 'S1'),
+        ('IsAutoSuspend', 'i4'),
+        ('BusinessUnit', 'S21'),
+        ('RequestID', 'i4'),
+        ('OrderLocalID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('reserve2', 'S31'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderSubmitStatus', 'S1'),
+        ('NotifySequence', 'i4'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('OrderSysID', 'S21'),
+        ('OrderSource', 'S1'),
+        ('OrderStatus', 'S1'),
+        ('OrderType', 'S1'),
+        ('VolumeTraded', 'i4'),
+        ('VolumeTotal', 'i4'),
+        ('InsertDate', 'S9'),
+        ('InsertTime', 'S9'),
+        ('ActiveTime', 'S9'),
+        ('SuspendTime', 'S9'),
+        ('UpdateTime', 'S9'),
+        ('CancelTime', 'S9'),
+        ('ActiveTraderID', 'S21'),
+        ('ClearingPartID', 'S11'),
+        ('SequenceNo', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('UserProductInfo', 'S11'),
+        ('StatusMsg', 'S81'),
+        ('UserForceClose', 'i4'),
+        ('ActiveUserID', 'S16'),
+        ('BrokerOrderSeq', 'i4'),
+        ('RelativeOrderSysID', 'S21'),
+        ('ZCETotalTradedVolume', 'i4'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('IsSwapOrder', 'i4'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('reserve3', 'S16'),
+        ('MacAddress', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeInstID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryErrOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+    ], align=True),
+    'CThostFtdcErrOrderActionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OrderActionRef', 'i4'),
+        ('OrderRef', 'S13'),
+        ('RequestID', 'i4'),
+        ('FrontID', 'i4'),
+        ('SessionID', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('OrderSysID', 'S21'),
+        ('ActionFlag', 'S1'),
+        ('LimitPrice', 'f8'),
+        ('VolumeChange', 'i4'),
+        ('ActionDate', 'S9'),
+        ('ActionTime', 'S9'),
+        ('TraderID', 'S21'),
+        ('InstallID', 'i4'),
+        ('OrderLocalID', 'S13'),
+        ('ActionLocalID', 'S13'),
+        ('ParticipantID', 'S11'),
+        ('ClientID', 'S11'),
+        ('BusinessUnit', 'S21'),
+        ('OrderActionStatus', 'S1'),
+        ('UserID', 'S16'),
+        ('StatusMsg', 'S81'),
+        ('reserve1', 'S31'),
+        ('BranchID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('reserve2', 'S16'),
+        ('MacAddress', 'S21'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('InstrumentID', 'S81'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryExchangeSequenceField': np.dtype([
+        ('ExchangeID', 'S9'),
+    ], align=True),
+    'CThostFtdcExchangeSequenceField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('SequenceNo', 'i4'),
+        ('MarketStatus', 'S1'),
+    ], align=True),
+    'CThostFtdcQryMaxOrderVolumeWithPriceField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('Direction', 'S1'),
+        ('OffsetFlag', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('MaxVolume', 'i4'),
+        ('Price', 'f8'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryBrokerTradingParamsField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('AccountID', 'S13'),
+    ], align=True),
+    'CThostFtdcBrokerTradingParamsField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('MarginPriceType', 'S1'),
+        ('Algorithm', 'S1'),
+        ('AvailIncludeCloseProfit', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('OptionRoyaltyPriceType', 'S1'),
+        ('AccountID', 'S13'),
+    ], align=True),
+    'CThostFtdcQryBrokerTradingAlgosField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('ExchangeID', 'S9'),
+        ('reserve1', 'S31'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcBrokerTradingAlgosField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('ExchangeID', 'S9'),
+        ('reserve1', 'S31'),
+        ('HandlePositionAlgoID', 'S1'),
+        ('FindMarginRateAlgoID', 'S1'),
+        ('HandleTradingAccountAlgoID', 'S1'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQueryBrokerDepositField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('ExchangeID', 'S9'),
+    ], align=True),
+    'CThostFtdcBrokerDepositField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('ParticipantID', 'S11'),
+        ('ExchangeID', 'S9'),
+        ('PreBalance', 'f8'),
+        ('CurrMargin', 'f8'),
+        ('CloseProfit', 'f8'),
+        ('Balance', 'f8'),
+        ('Deposit', 'f8'),
+        ('Withdraw', 'f8'),
+        ('Available', 'f8'),
+        ('Reserve', 'f8'),
+        ('FrozenMargin', 'f8'),
+    ], align=True),
+    'CThostFtdcQryCFMMCBrokerKeyField': np.dtype([
+        ('BrokerID', 'S11'),
+    ], align=True),
+    'CThostFtdcCFMMCBrokerKeyField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('ParticipantID', 'S11'),
+        ('CreateDate', 'S9'),
+        ('CreateTime', 'S9'),
+        ('KeyID', 'i4'),
+        ('CurrentKey', 'S21'),
+        ('KeyKind', 'S1'),
+    ], align=True),
+    'CThostFtdcCFMMCTradingAccountKeyField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('ParticipantID', 'S11'),
+        ('AccountID', 'S13'),
+        ('KeyID', 'i4'),
+        ('CurrentKey', 'S21'),
+    ], align=True),
+    'CThostFtdcQryCFMMCTradingAccountKeyField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+    ], align=True),
+    'CThostFtdcBrokerUserOTPParamField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('OTPVendorsID', 'S2'),
+        ('SerialNumber', 'S17'),
+        ('AuthKey', 'S41'),
+        ('LastDrift', 'i4'),
+        ('LastSuccess', 'i4'),
+        ('OTPType', 'S1'),
+    ], align=True),
+    'CThostFtdcManualSyncBrokerUserOTPField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('OTPType', 'S1'),
+        ('FirstOTP', 'S41'),
+        ('SecondOTP', 'S41'),
+    ], align=True),
+    'CThostFtdcCommRateModelField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('CommModelID', 'S13'),
+        ('CommModelName', 'S161'),
+    ], align=True),
+    'CThostFtdcQryCommRateModelField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('CommModelID', 'S13'),
+    ], align=True),
+    'CThostFtdcMarginModelField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('MarginModelID', 'S13'),
+        ('MarginModelName', 'S161'),
+    ], align=True),
+    'CThostFtdcQryMarginModelField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('MarginModelID', 'S13'),
+    ], align=True),
+    'CThostFtdcEWarrantOffsetField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('reserve1', 'S31'),
+        ('Direction', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('Volume', 'i4'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryEWarrantOffsetField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('reserve1', 'S31'),
+        ('InvestUnitID', 'S17'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryInvestorProductGroupMarginField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('reserve1', 'S31'),
+        ('HedgeFlag', 'S1'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('ProductGroupID', 'S81'),
+    ], align=True),
+    'CThostFtdcInvestorProductGroupMarginField': np.dtype([
+        ('reserve1', 'S31'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('FrozenMargin', 'f8'),
+        ('LongFrozenMargin', 'f8'),
+        ('ShortFrozenMargin', 'f8'),
+        ('UseMargin', 'f8'),
+        ('LongUseMargin', 'f8'),
+        ('ShortUseMargin', 'f8'),
+        ('ExchMargin', 'f8'),
+        ('LongExchMargin', 'f8'),
+        ('ShortExchMargin', 'f8'),
+        ('CloseProfit', 'f8'),
+        ('FrozenCommission', 'f8'),
+        ('Commission', 'f8'),
+        ('FrozenCash', 'f8'),
+        ('CashIn', 'f8'),
+        ('PositionProfit', 'f8'),
+        ('OffsetAmount', 'f8'),
+        ('LongOffsetAmount', 'f8'),
+        ('ShortOffsetAmount', 'f8'),
+        ('ExchOffsetAmount', 'f8'),
+        ('LongExchOffsetAmount', 'f8'),
+        ('ShortExchOffsetAmount', 'f8'),
+        ('HedgeFlag', 'S1'),
+        ('ExchangeID', 'S9'),
+        ('InvestUnitID', 'S17'),
+        ('ProductGroupID', 'S81'),
+    ], align=True),
+    'CThostFtdcQueryCFMMCTradingAccountTokenField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('InvestUnitID', 'S17'),
+    ], align=True),
+    'CThostFtdcCFMMCTradingAccountTokenField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('ParticipantID', 'S11'),
+        ('AccountID', 'S13'),
+        ('KeyID', 'i4'),
+        ('Token', 'S21'),
+    ], align=True),
+    'CThostFtdcQryProductGroupField': np.dtype([
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S81'),
+    ], align=True),
+    'CThostFtdcProductGroupField': np.dtype([
+        ('reserve1', 'S31'),
+        ('ExchangeID', 'S9'),
+        ('reserve2', 'S31'),
+        ('ProductID', 'S81'),
+        ('ProductGroupID', 'S81'),
+    ], align=True),
+    'CThostFtdcBulletinField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('TradingDay', 'S9'),
+        ('BulletinID', 'i4'),
+        ('SequenceNo', 'i4'),
+        ('NewsType', 'S3'),
+        ('NewsUrgency', 'S1'),
+        ('SendTime', 'S9'),
+        ('Abstract', 'S81'),
+        ('ComeFrom', 'S21'),
+        ('Content', 'S501'),
+        ('URLLink', 'S201'),
+        ('MarketID', 'S31'),
+    ], align=True),
+    'CThostFtdcQryBulletinField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BulletinID', 'i4'),
+        ('SequenceNo', 'i4'),
+        ('NewsType', 'S3'),
+        ('NewsUrgency', 'S1'),
+    ], align=True),
+    'CThostFtdcMulticastInstrumentField': np.dtype([
+        ('TopicID', 'i4'),
+        ('reserve1', 'S31'),
+        ('InstrumentNo', 'i4'),
+        ('CodePrice', 'f8'),
+        ('VolumeMultiple', 'i4'),
+        ('PriceTick', 'f8'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryMulticastInstrumentField': np.dtype([
+        ('TopicID', 'i4'),
+        ('reserve1', 'S31'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcAppIDAuthAssignField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AppID', 'S33'),
+        ('DRIdentityID', 'i4'),
+    ], align=True),
+    'CThostFtdcReqOpenAccountField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('Gender', 'S1'),
+        ('CountryCode', 'S21'),
+        ('CustType', 'S1'),
+        ('Address', 'S101'),
+        ('ZipCode', 'S7'),
+        ('Telephone', 'S41'),
+        ('MobilePhone', 'S21'),
+        ('Fax', 'S41'),
+        ('EMail', 'S41'),
+        ('MoneyAccountStatus', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('InstallID', 'i4'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('CashExchangeCode', 'S1'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('TID', 'i4'),
+        ('UserID', 'S16'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcReqCancelAccountField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('Gender', 'S1'),
+        ('CountryCode', 'S21'),
+        ('CustType', 'S1'),
+        ('Address', 'S101'),
+        ('ZipCode', 'S7'),
+        ('Telephone', 'S41'),
+        ('MobilePhone', 'S21'),
+        ('Fax', 'S41'),
+        ('EMail', 'S41'),
+        ('MoneyAccountStatus', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('InstallID', 'i4'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('CashExchangeCode', 'S1'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('TID', 'i4'),
+        ('UserID', 'S16'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcReqChangeAccountField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('Gender', 'S1'),
+        ('CountryCode', 'S21'),
+        ('CustType', 'S1'),
+        ('Address', 'S101'),
+        ('ZipCode', 'S7'),
+        ('Telephone', 'S41'),
+        ('MobilePhone', 'S21'),
+        ('Fax', 'S41'),
+        ('EMail', 'S41'),
+        ('MoneyAccountStatus', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('NewBankAccount', 'S41'),
+        ('NewBankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('BankAccType', 'S1'),
+        ('InstallID', 'i4'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('TID', 'i4'),
+        ('Digest', 'S36'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcReqTransferField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustType', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('InstallID', 'i4'),
+        ('FutureSerial', 'i4'),
+        ('UserID', 'S16'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('TradeAmount', 'f8'),
+        ('FutureFetchAmount', 'f8'),
+        ('FeePayFlag', 'S1'),
+        ('CustFee', 'f8'),
+        ('BrokerFee', 'f8'),
+        ('Message', 'S129'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('TransferStatus', 'S1'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcRspTransferField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustType', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('InstallID', 'i4'),
+        ('FutureSerial', 'i4'),
+        ('UserID', 'S16'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('TradeAmount', 'f8'),
+        ('FutureFetchAmount', 'f8'),
+        ('FeePayFlag', 'S1'),
+        ('CustFee', 'f8'),
+        ('BrokerFee', 'f8'),
+        ('Message', 'S129'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('TransferStatus', 'S1'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcReqRepealField': np.dtype([
+        ('RepealTimeInterval', 'i4'),
+        ('RepealedTimes', 'i4'),
+        ('BankRepealFlag', 'S1'),
+        ('BrokerRepealFlag', 'S1'),
+        ('PlateRepealSerial', 'i4'),
+        ('BankRepealSerial', 'S13'),
+        ('FutureRepealSerial', 'i4'),
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustType', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('InstallID', 'i4'),
+        ('FutureSerial', 'i4'),
+        ('UserID', 'S16'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('TradeAmount', 'f8'),
+        ('FutureFetchAmount', 'f8'),
+        ('FeePayFlag', 'S1'),
+        ('CustFee', 'f8'),
+        ('BrokerFee', 'f8'),
+        ('Message', 'S129'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('TransferStatus', 'S1'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcRspRepealField': np.dtype([
+        ('RepealTimeInterval', 'i4'),
+        ('RepealedTimes', 'i4'),
+        ('BankRepealFlag', 'S1'),
+        ('BrokerRepealFlag', 'S1'),
+        ('PlateRepealSerial', 'i4'),
+        ('BankRepealSerial', 'S13'),
+        ('FutureRepealSerial', 'i4'),
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustType', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('InstallID', 'i4'),
+        ('FutureSerial', 'i4'),
+        ('UserID', 'S16'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('TradeAmount', 'f8'),
+        ('FutureFetchAmount', 'f8'),
+        ('FeePayFlag', 'S1'),
+        ('CustFee', 'f8'),
+        ('BrokerFee', 'f8'),
+        ('Message', 'S129'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('TransferStatus', 'S1'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcReqQueryAccountField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustType', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('FutureSerial', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcRspQueryAccountField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustType', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('FutureSerial', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('BankUseAmount', 'f8'),
+        ('BankFetchAmount', 'f8'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcFutureSignIOField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('Digest', 'S36'),
+        ('CurrencyID', 'S4'),
+        ('DeviceID', 'S3'),
+        ('BrokerIDByBank', 'S33'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+    ], align=True),
+    'CThostFtdcRspFutureSignInField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('Digest', 'S36'),
+        ('CurrencyID', 'S4'),
+        ('DeviceID', 'S3'),
+        ('BrokerIDByBank', 'S33'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('PinKey', 'S129'),
+        ('MacKey', 'S129'),
+    ], align=True),
+    'CThostFtdcReqFutureSignOutField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('Digest', 'S36'),
+        ('CurrencyID', 'S4'),
+        ('DeviceID', 'S3'),
+        ('BrokerIDByBank', 'S33'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+    ], align=True),
+    'CThostFtdcRspFutureSignOutField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('Digest', 'S36'),
+        ('CurrencyID', 'S4'),
+        ('DeviceID', 'S3'),
+        ('BrokerIDByBank', 'S33'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+    ], align=True),
+    'CThostFtdcReqQueryTradeResultBySerialField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('Reference', 'i4'),
+        ('RefrenceIssureType', 'S1'),
+        ('RefrenceIssure', 'S36'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustType', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('CurrencyID', 'S4'),
+        ('TradeAmount', 'f8'),
+        ('Digest', 'S36'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcRspQueryTradeResultBySerialField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('Reference', 'i4'),
+        ('RefrenceIssureType', 'S1'),
+        ('RefrenceIssure', 'S36'),
+        ('OriginReturnCode', 'S7'),
+        ('OriginDescrInfoForReturnCode', 'S129'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('CurrencyID', 'S4'),
+        ('TradeAmount', 'f8'),
+        ('Digest', 'S36'),
+    ], align=True),
+    'CThostFtdcReqDayEndFileReadyField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('FileBusinessCode', 'S1'),
+        ('Digest', 'S36'),
+    ], align=True),
+    'CThostFtdcReturnResultField': np.dtype([
+        ('ReturnCode', 'S7'),
+        ('DescrInfoForReturnCode', 'S129'),
+    ], align=True),
+    'CThostFtdcVerifyFuturePasswordField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('InstallID', 'i4'),
+        ('TID', 'i4'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcVerifyCustInfoField': np.dtype([
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustType', 'S1'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcVerifyFuturePasswordAndCustInfoField': np.dtype([
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustType', 'S1'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('CurrencyID', 'S4'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcDepositResultInformField': np.dtype([
+        ('DepositSeqNo', 'S15'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('Deposit', 'f8'),
+        ('RequestID', 'i4'),
+        ('ReturnCode', 'S7'),
+        ('DescrInfoForReturnCode', 'S129'),
+    ], align=True),
+    'CThostFtdcReqSyncKeyField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('Message', 'S129'),
+        ('DeviceID', 'S3'),
+        ('BrokerIDByBank', 'S33'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+    ], align=True),
+    'CThostFtdcRspSyncKeyField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('Message', 'S129'),
+        ('DeviceID', 'S3'),
+        ('BrokerIDByBank', 'S33'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+    ], align=True),
+    'CThostFtdcNotifyQueryAccountField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustType', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('FutureSerial', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('BankUseAmount', 'f8'),
+        ('BankFetchAmount', 'f8'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcTransferSerialField': np.dtype([
+        ('PlateSerial', 'i4'),
+        ('TradeDate', 'S9'),
+        ('TradingDay', 'S9'),
+        ('TradeTime', 'S9'),
+        ('TradeCode', 'S7'),
+        ('SessionID', 'i4'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BankAccType', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankSerial', 'S13'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('FutureAccType', 'S1'),
+        ('AccountID', 'S13'),
+        ('InvestorID', 'S13'),
+        ('FutureSerial', 'i4'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CurrencyID', 'S4'),
+        ('TradeAmount', 'f8'),
+        ('CustFee', 'f8'),
+        ('BrokerFee', 'f8'),
+        ('AvailabilityFlag', 'S1'),
+        ('OperatorCode', 'S17'),
+        ('BankNewAccount', 'S41'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+    ], align=True),
+    'CThostFtdcQryTransferSerialField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('BankID', 'S4'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcNotifyFutureSignInField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('Digest', 'S36'),
+        ('CurrencyID', 'S4'),
+        ('DeviceID', 'S3'),
+        ('BrokerIDByBank', 'S33'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('PinKey', 'S129'),
+        ('MacKey', 'S129'),
+    ], align=True),
+    'CThostFtdcNotifyFutureSignOutField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('Digest', 'S36'),
+        ('CurrencyID', 'S4'),
+        ('DeviceID', 'S3'),
+        ('BrokerIDByBank', 'S33'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+    ], align=True),
+    'CThostFtdcNotifySyncKeyField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('InstallID', 'i4'),
+        ('UserID', 'S16'),
+        ('Message', 'S129'),
+        ('DeviceID', 'S3'),
+        ('BrokerIDByBank', 'S33'),
+        ('OperNo', 'S17'),
+        ('RequestID', 'i4'),
+        ('TID', 'i4'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+    ], align=True),
+    'CThostFtdcQryAccountregisterField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcAccountregisterField': np.dtype([
+        ('TradeDay', 'S9'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BankAccount', 'S41'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('AccountID', 'S13'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('CustomerName', 'S51'),
+        ('CurrencyID', 'S4'),
+        ('OpenOrDestroy', 'S1'),
+        ('RegDate', 'S9'),
+        ('OutDate', 'S9'),
+        ('TID', 'i4'),
+        ('CustType', 'S1'),
+        ('BankAccType', 'S1'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcOpenAccountField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('Gender', 'S1'),
+        ('CountryCode', 'S21'),
+        ('CustType', 'S1'),
+        ('Address', 'S101'),
+        ('ZipCode', 'S7'),
+        ('Telephone', 'S41'),
+        ('MobilePhone', 'S21'),
+        ('Fax', 'S41'),
+        ('EMail', 'S41'),
+        ('MoneyAccountStatus', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('InstallID', 'i4'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('CashExchangeCode', 'S1'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('TID', 'i4'),
+        ('UserID', 'S16'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcCancelAccountField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('Gender', 'S1'),
+        ('CountryCode', 'S21'),
+        ('CustType', 'S1'),
+        ('Address', 'S101'),
+        ('ZipCode', 'S7'),
+        ('Telephone', 'S41'),
+        ('MobilePhone', 'S21'),
+        ('Fax', 'S41'),
+        ('EMail', 'S41'),
+        ('MoneyAccountStatus', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('InstallID', 'i4'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('CashExchangeCode', 'S1'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('DeviceID', 'S3'),
+        ('BankSecuAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankSecuAcc', 'S41'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('OperNo', 'S17'),
+        ('TID', 'i4'),
+        ('UserID', 'S16'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcChangeAccountField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S51'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('Gender', 'S1'),
+        ('CountryCode', 'S21'),
+        ('CustType', 'S1'),
+        ('Address', 'S101'),
+        ('ZipCode', 'S7'),
+        ('Telephone', 'S41'),
+        ('MobilePhone', 'S21'),
+        ('Fax', 'S41'),
+        ('EMail', 'S41'),
+        ('MoneyAccountStatus', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('NewBankAccount', 'S41'),
+        ('NewBankPassWord', 'S41'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('BankAccType', 'S1'),
+        ('InstallID', 'i4'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('BrokerIDByBank', 'S33'),
+        ('BankPwdFlag', 'S1'),
+        ('SecuPwdFlag', 'S1'),
+        ('TID', 'i4'),
+        ('Digest', 'S36'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+        ('LongCustomerName', 'S161'),
+    ], align=True),
+    'CThostFtdcSecAgentACIDMapField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+        ('BrokerSecAgentID', 'S13'),
+    ], align=True),
+    'CThostFtdcQrySecAgentACIDMapField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('AccountID', 'S13'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcUserRightsAssignField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('DRIdentityID', 'i4'),
+    ], align=True),
+    'CThostFtdcBrokerUserRightAssignField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('DRIdentityID', 'i4'),
+        ('Tradeable', 'i4'),
+    ], align=True),
+    'CThostFtdcDRTransferField': np.dtype([
+        ('OrigDRIdentityID', 'i4'),
+        ('DestDRIdentityID', 'i4'),
+        ('OrigBrokerID', 'S11'),
+        ('DestBrokerID', 'S11'),
+    ], align=True),
+    'CThostFtdcFensUserInfoField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('LoginMode', 'S1'),
+    ], align=True),
+    'CThostFtdcCurrTransferIdentityField': np.dtype([
+        ('IdentityID', 'i4'),
+    ], align=True),
+    'CThostFtdcLoginForbiddenUserField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('reserve1', 'S16'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryLoginForbiddenUserField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcTradingAccountReserveField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('Reserve', 'f8'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcQryLoginForbiddenIPField': np.dtype([
+        ('reserve1', 'S16'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryIPListField': np.dtype([
+        ('reserve1', 'S16'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryUserRightsAssignField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcReserveOpenAccountConfirmField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S161'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('Gender', 'S1'),
+        ('CountryCode', 'S21'),
+        ('CustType', 'S1'),
+        ('Address', 'S101'),
+        ('ZipCode', 'S7'),
+        ('Telephone', 'S41'),
+        ('MobilePhone', 'S21'),
+        ('Fax', 'S41'),
+        ('EMail', 'S41'),
+        ('MoneyAccountStatus', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('InstallID', 'i4'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('TID', 'i4'),
+        ('AccountID', 'S13'),
+        ('Password', 'S41'),
+        ('BankReserveOpenSeq', 'S13'),
+        ('BookDate', 'S9'),
+        ('BookPsw', 'S41'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+    ], align=True),
+    'CThostFtdcReserveOpenAccountField': np.dtype([
+        ('TradeCode', 'S7'),
+        ('BankID', 'S4'),
+        ('BankBranchID', 'S5'),
+        ('BrokerID', 'S11'),
+        ('BrokerBranchID', 'S31'),
+        ('TradeDate', 'S9'),
+        ('TradeTime', 'S9'),
+        ('BankSerial', 'S13'),
+        ('TradingDay', 'S9'),
+        ('PlateSerial', 'i4'),
+        ('LastFragment', 'S1'),
+        ('SessionID', 'i4'),
+        ('CustomerName', 'S161'),
+        ('IdCardType', 'S1'),
+        ('IdentifiedCardNo', 'S51'),
+        ('Gender', 'S1'),
+        ('CountryCode', 'S21'),
+        ('CustType', 'S1'),
+        ('Address', 'S101'),
+        ('ZipCode', 'S7'),
+        ('Telephone', 'S41'),
+        ('MobilePhone', 'S21'),
+        ('Fax', 'S41'),
+        ('EMail', 'S41'),
+        ('MoneyAccountStatus', 'S1'),
+        ('BankAccount', 'S41'),
+        ('BankPassWord', 'S41'),
+        ('InstallID', 'i4'),
+        ('VerifyCertNoFlag', 'S1'),
+        ('CurrencyID', 'S4'),
+        ('Digest', 'S36'),
+        ('BankAccType', 'S1'),
+        ('BrokerIDByBank', 'S33'),
+        ('TID', 'i4'),
+        ('ReserveOpenAccStas', 'S1'),
+        ('ErrorID', 'i4'),
+        ('ErrorMsg', 'S81'),
+    ], align=True),
+    'CThostFtdcAccountPropertyField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('BankID', 'S4'),
+        ('BankAccount', 'S41'),
+        ('OpenName', 'S101'),
+        ('OpenBank', 'S101'),
+        ('IsActive', 'i4'),
+        ('AccountSourceType', 'S1'),
+        ('OpenDate', 'S9'),
+        ('CancelDate', 'S9'),
+        ('OperatorID', 'S65'),
+        ('OperateDate', 'S9'),
+        ('OperateTime', 'S9'),
+        ('CurrencyID', 'S4'),
+    ], align=True),
+    'CThostFtdcQryCurrDRIdentityField': np.dtype([
+        ('DRIdentityID', 'i4'),
+    ], align=True),
+    'CThostFtdcCurrDRIdentityField': np.dtype([
+        ('DRIdentityID', 'i4'),
+    ], align=True),
+    'CThostFtdcQrySecAgentCheckModeField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+    ], align=True),
+    'CThostFtdcQrySecAgentTradeInfoField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('BrokerSecAgentID', 'S13'),
+    ], align=True),
+    'CThostFtdcReqUserAuthMethodField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcRspUserAuthMethodField': np.dtype([
+        ('UsableAuthMethod', 'i4'),
+    ], align=True),
+    'CThostFtdcReqGenUserCaptchaField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcRspGenUserCaptchaField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('CaptchaInfoLen', 'i4'),
+        ('CaptchaInfo', 'S2561'),
+    ], align=True),
+    'CThostFtdcReqGenUserTextField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcRspGenUserTextField': np.dtype([
+        ('UserTextSeq', 'i4'),
+    ], align=True),
+    'CThostFtdcReqUserLoginWithCaptchaField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('Password', 'S41'),
+        ('UserProductInfo', 'S11'),
+        ('InterfaceProductInfo', 'S11'),
+        ('ProtocolInfo', 'S11'),
+        ('MacAddress', 'S21'),
+        ('reserve1', 'S16'),
+        ('LoginRemark', 'S36'),
+        ('Captcha', 'S41'),
+        ('ClientIPPort', 'i4'),
+        ('ClientIPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcReqUserLoginWithTextField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('Password', 'S41'),
+        ('UserProductInfo', 'S11'),
+        ('InterfaceProductInfo', 'S11'),
+        ('ProtocolInfo', 'S11'),
+        ('MacAddress', 'S21'),
+        ('reserve1', 'S16'),
+        ('LoginRemark', 'S36'),
+        ('Text', 'S41'),
+        ('ClientIPPort', 'i4'),
+        ('ClientIPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcReqUserLoginWithOTPField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('Password', 'S41'),
+        ('UserProductInfo', 'S11'),
+        ('InterfaceProductInfo', 'S11'),
+        ('ProtocolInfo', 'S11'),
+        ('MacAddress', 'S21'),
+        ('reserve1', 'S16'),
+        ('LoginRemark', 'S36'),
+        ('OTPPassword', 'S41'),
+        ('ClientIPPort', 'i4'),
+        ('ClientIPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcReqApiHandshakeField': np.dtype([
+        ('CryptoKeyVersion', 'S31'),
+    ], align=True),
+    'CThostFtdcRspApiHandshakeField': np.dtype([
+        ('FrontHandshakeDataLen', 'i4'),
+        ('FrontHandshakeData', 'S301'),
+        ('IsApiAuthEnabled', 'i4'),
+    ], align=True),
+    'CThostFtdcReqVerifyApiKeyField': np.dtype([
+        ('ApiHandshakeDataLen', 'i4'),
+        ('ApiHandshakeData', 'S301'),
+    ], align=True),
+    'CThostFtdcDepartmentUserField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('InvestorRange', 'S1'),
+        ('InvestorID', 'S13'),
+    ], align=True),
+    'CThostFtdcQueryFreqField': np.dtype([
+        ('QueryFreq', 'i4'),
+    ], align=True),
+    'CThostFtdcAuthForbiddenIPField': np.dtype([
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryAuthForbiddenIPField': np.dtype([
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcSyncDelaySwapFrozenField': np.dtype([
+        ('DelaySwapSeqNo', 'S15'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('FromCurrencyID', 'S4'),
+        ('FromRemainSwap', 'f8'),
+        ('IsManualSwap', 'i4'),
+    ], align=True),
+    'CThostFtdcUserSystemInfoField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('ClientSystemInfoLen', 'i4'),
+        ('ClientSystemInfo', 'S273'),
+        ('reserve1', 'S16'),
+        ('ClientIPPort', 'i4'),
+        ('ClientLoginTime', 'S9'),
+        ('ClientAppID', 'S33'),
+        ('ClientPublicIP', 'S33'),
+        ('ClientLoginRemark', 'S151'),
+    ], align=True),
+    'CThostFtdcAuthUserIDField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AppID', 'S33'),
+        ('UserID', 'S16'),
+        ('AuthType', 'S1'),
+    ], align=True),
+    'CThostFtdcAuthIPField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AppID', 'S33'),
+        ('IPAddress', 'S33'),
+    ], align=True),
+    'CThostFtdcQryClassifiedInstrumentField': np.dtype([
+        ('InstrumentID', 'S81'),
+        ('ExchangeID', 'S9'),
+        ('ExchangeInstID', 'S81'),
+        ('ProductID', 'S81'),
+        ('TradingType', 'S1'),
+        ('ClassType', 'S1'),
+    ], align=True),
+    'CThostFtdcQryCombPromotionParamField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcCombPromotionParamField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('CombHedgeFlag', 'S5'),
+        ('Xparameter', 'f8'),
+    ], align=True),
+    'CThostFtdcReqUserLoginSCField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('Password', 'S41'),
+        ('UserProductInfo', 'S11'),
+        ('InterfaceProductInfo', 'S11'),
+        ('ProtocolInfo', 'S11'),
+        ('MacAddress', 'S21'),
+        ('OneTimePassword', 'S41'),
+        ('ClientIPAddress', 'S33'),
+        ('LoginRemark', 'S36'),
+        ('ClientIPPort', 'i4'),
+        ('AuthCode', 'S17'),
+        ('AppID', 'S33'),
+    ], align=True),
+    'CThostFtdcQryRiskSettleInvstPositionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryRiskSettleProductStatusField': np.dtype([
+        ('ProductID', 'S81'),
+    ], align=True),
+    'CThostFtdcRiskSettleInvstPositionField': np.dtype([
+        ('InstrumentID', 'S81'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('PosiDirection', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('PositionDate', 'S1'),
+        ('YdPosition', 'i4'),
+        ('Position', 'i4'),
+        ('LongFrozen', 'i4'),
+        ('ShortFrozen', 'i4'),
+        ('LongFrozenAmount', 'f8'),
+        ('ShortFrozenAmount', 'f8'),
+        ('OpenVolume', 'i4'),
+        ('CloseVolume', 'i4'),
+        ('OpenAmount', 'f8'),
+        ('CloseAmount', 'f8'),
+        ('PositionCost', 'f8'),
+        ('PreMargin', 'f8'),
+        ('UseMargin', 'f8'),
+        ('FrozenMargin', 'f8'),
+        ('FrozenCash', 'f8'),
+        ('FrozenCommission', 'f8'),
+        ('CashIn', 'f8'),
+        ('Commission', 'f8'),
+        ('CloseProfit', 'f8'),
+        ('PositionProfit', 'f8'),
+        ('PreSettlementPrice', 'f8'),
+        ('SettlementPrice', 'f8'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('OpenCost', 'f8'),
+        ('ExchangeMargin', 'f8'),
+        ('CombPosition', 'i4'),
+        ('CombLongFrozen', 'i4'),
+        ('CombShortFrozen', 'i4'),
+        ('CloseProfitByDate', 'f8'),
+        ('CloseProfitByTrade', 'f8'),
+        ('TodayPosition', 'i4'),
+        ('MarginRateByMoney', 'f8'),
+        ('MarginRateByVolume', 'f8'),
+        ('StrikeFrozen', 'i4'),
+        ('StrikeFrozenAmount', 'f8'),
+        ('AbandonFrozen', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('YdStrikeFrozen', 'i4'),
+        ('InvestUnitID', 'S17'),
+        ('PositionCostOffset', 'f8'),
+        ('TasPosition', 'i4'),
+        ('TasPositionCost', 'f8'),
+    ], align=True),
+    'CThostFtdcRiskSettleProductStatusField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S81'),
+        ('ProductStatus', 'S1'),
+    ], align=True),
+    'CThostFtdcSyncDeltaInfoField': np.dtype([
+        ('SyncDeltaSequenceNo', 'i4'),
+        ('SyncDeltaStatus', 'S1'),
+        ('SyncDescription', 'S257'),
+        ('IsOnlyTrdDelta', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaProductStatusField': np.dtype([
+        ('SyncDeltaSequenceNo', 'i4'),
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S81'),
+        ('ProductStatus', 'S1'),
+    ], align=True),
+    'CThostFtdcSyncDeltaInvstPosDtlField': np.dtype([
+        ('InstrumentID', 'S81'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('HedgeFlag', 'S1'),
+        ('Direction', 'S1'),
+        ('OpenDate', 'S9'),
+        ('TradeID', 'S21'),
+        ('Volume', 'i4'),
+        ('OpenPrice', 'f8'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('TradeType', 'S1'),
+        ('CombInstrumentID', 'S81'),
+        ('ExchangeID', 'S9'),
+        ('CloseProfitByDate', 'f8'),
+        ('CloseProfitByTrade', 'f8'),
+        ('PositionProfitByDate', 'f8'),
+        ('PositionProfitByTrade', 'f8'),
+        ('Margin', 'f8'),
+        ('ExchMargin', 'f8'),
+        ('MarginRateByMoney', 'f8'),
+        ('MarginRateByVolume', 'f8'),
+        ('LastSettlementPrice', 'f8'),
+        ('SettlementPrice', 'f8'),
+        ('CloseVolume', 'i4'),
+        ('CloseAmount', 'f8'),
+        ('TimeFirstVolume', 'i4'),
+        ('SpecPosiType', 'S1'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaInvstPosCombDtlField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('OpenDate', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('SettlementID', 'i4'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ComTradeID', 'S21'),
+        ('TradeID', 'S21'),
+        ('InstrumentID', 'S81'),
+        ('HedgeFlag', 'S1'),
+        ('Direction', 'S1'),
+        ('TotalAmt', 'i4'),
+        ('Margin', 'f8'),
+        ('ExchMargin', 'f8'),
+        ('MarginRateByMoney', 'f8'),
+        ('MarginRateByVolume', 'f8'),
+        ('LegID', 'i4'),
+        ('LegMultiple', 'i4'),
+        ('TradeGroupID', 'i4'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaTradingAccountField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('PreMortgage', 'f8'),
+        ('PreCredit', 'f8'),
+        ('PreDeposit', 'f8'),
+        ('PreBalance', 'f8'),
+        ('PreMargin', 'f8'),
+        ('InterestBase', 'f8'),
+        ('Interest', 'f8'),
+        ('Deposit', 'f8'),
+        ('Withdraw', 'f8'),
+        ('FrozenMargin', 'f8'),
+        ('FrozenCash', 'f8'),
+        ('FrozenCommission', 'f8'),
+        ('CurrMargin', 'f8'),
+        ('CashIn', 'f8'),
+        ('Commission', 'f8'),
+        ('CloseProfit', 'f8'),
+        ('PositionProfit', 'f8'),
+        ('Balance', 'f8'),
+        ('Available', 'f8'),
+        ('WithdrawQuota', 'f8'),
+        ('Reserve', 'f8'),
+        ('TradingDay', 'S9'),
+        ('SettlementID', 'i4'),
+        ('Credit', 'f8'),
+        ('Mortgage', 'f8'),
+        ('ExchangeMargin', 'f8'),
+        ('DeliveryMargin', 'f8'),
+        ('ExchangeDeliveryMargin', 'f8'),
+        ('ReserveBalance', 'f8'),
+        ('CurrencyID', 'S4'),
+        ('PreFundMortgageIn', 'f8'),
+        ('PreFundMortgageOut', 'f8'),
+        ('FundMortgageIn', 'f8'),
+        ('FundMortgageOut', 'f8'),
+        ('FundMortgageAvailable', 'f8'),
+        ('MortgageableFund', 'f8'),
+        ('SpecProductMargin', 'f8'),
+        ('SpecProductFrozenMargin', 'f8'),
+        ('SpecProductCommission', 'f8'),
+        ('SpecProductFrozenCommission', 'f8'),
+        ('SpecProductPositionProfit', 'f8'),
+        ('SpecProductCloseProfit', 'f8'),
+        ('SpecProductPositionProfitByAlg', 'f8'),
+        ('SpecProductExchangeMargin', 'f8'),
+        ('FrozenSwap', 'f8'),
+        ('RemainSwap', 'f8'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaInitInvstMarginField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('LastRiskTotalInvstMargin', 'f8'),
+        ('LastRiskTotalExchMargin', 'f8'),
+        ('ThisSyncInvstMargin', 'f8'),
+        ('ThisSyncExchMargin', 'f8'),
+        ('RemainRiskInvstMargin', 'f8'),
+        ('RemainRiskExchMargin', 'f8'),
+        ('LastRiskSpecTotalInvstMargin', 'f8'),
+        ('LastRiskSpecTotalExchMargin', 'f8'),
+        ('ThisSyncSpecInvstMargin', 'f8'),
+        ('ThisSyncSpecExchMargin', 'f8'),
+        ('RemainRiskSpecInvstMargin', 'f8'),
+        ('RemainRiskSpecExchMargin', 'f8'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaDceCombInstrumentField': np.dtype([
+        ('CombInstrumentID', 'S81'),
+        ('ExchangeID', 'S9'),
+        ('ExchangeInstID', 'S81'),
+        ('TradeGroupID', 'i4'),
+        ('CombHedgeFlag', 'S1'),
+        ('CombinationType', 'S1'),
+        ('Direction', 'S1'),
+        ('ProductID', 'S81'),
+        ('Xparameter', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaInvstMarginRateField': np.dtype([
+        ('InstrumentID', 'S81'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('HedgeFlag', 'S1'),
+        ('LongMarginRatioByMoney', 'f8'),
+        ('LongMarginRatioByVolume', 'f8'),
+        ('ShortMarginRatioByMoney', 'f8'),
+        ('ShortMarginRatioByVolume', 'f8'),
+        ('IsRelative', 'i4'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaExchMarginRateField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InstrumentID', 'S81'),
+        ('HedgeFlag', 'S1'),
+        ('LongMarginRatioByMoney', 'f8'),
+        ('LongMarginRatioByVolume', 'f8'),
+        ('ShortMarginRatioByMoney', 'f8'),
+        ('ShortMarginRatioByVolume', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaOptExchMarginField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InstrumentID', 'S81'),
+        ('SShortMarginRatioByMoney', 'f8'),
+        ('SShortMarginRatioByVolume', 'f8'),
+        ('HShortMarginRatioByMoney', 'f8'),
+        ('HShortMarginRatioByVolume', 'f8'),
+        ('AShortMarginRatioByMoney', 'f8'),
+        ('AShortMarginRatioByVolume', 'f8'),
+        ('MShortMarginRatioByMoney', 'f8'),
+        ('MShortMarginRatioByVolume', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaOptInvstMarginField': np.dtype([
+        ('InstrumentID', 'S81'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('SShortMarginRatioByMoney', 'f8'),
+        ('SShortMarginRatioByVolume', 'f8'),
+        ('HShortMarginRatioByMoney', 'f8'),
+        ('HShortMarginRatioByVolume', 'f8'),
+        ('AShortMarginRatioByMoney', 'f8'),
+        ('AShortMarginRatioByVolume', 'f8'),
+        ('IsRelative', 'i4'),
+        ('MShortMarginRatioByMoney', 'f8'),
+        ('MShortMarginRatioByVolume', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaInvstMarginRateULField': np.dtype([
+        ('InstrumentID', 'S81'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('HedgeFlag', 'S1'),
+        ('LongMarginRatioByMoney', 'f8'),
+        ('LongMarginRatioByVolume', 'f8'),
+        ('ShortMarginRatioByMoney', 'f8'),
+        ('ShortMarginRatioByVolume', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaOptInvstCommRateField': np.dtype([
+        ('InstrumentID', 'S81'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OpenRatioByMoney', 'f8'),
+        ('OpenRatioByVolume', 'f8'),
+        ('CloseRatioByMoney', 'f8'),
+        ('CloseRatioByVolume', 'f8'),
+        ('CloseTodayRatioByMoney', 'f8'),
+        ('CloseTodayRatioByVolume', 'f8'),
+        ('StrikeRatioByMoney', 'f8'),
+        ('StrikeRatioByVolume', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaInvstCommRateField': np.dtype([
+        ('InstrumentID', 'S81'),
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('OpenRatioByMoney', 'f8'),
+        ('OpenRatioByVolume', 'f8'),
+        ('CloseRatioByMoney', 'f8'),
+        ('CloseRatioByVolume', 'f8'),
+        ('CloseTodayRatioByMoney', 'f8'),
+        ('CloseTodayRatioByVolume', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaProductExchRateField': np.dtype([
+        ('ProductID', 'S81'),
+        ('QuoteCurrencyID', 'S4'),
+        ('ExchangeRate', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaDepthMarketDataField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('ExchangeID', 'S9'),
+        ('ExchangeInstID', 'S81'),
+        ('LastPrice', 'f8'),
+        ('PreSettlementPrice', 'f8'),
+        ('PreClosePrice', 'f8'),
+        ('PreOpenInterest', 'f8'),
+        ('OpenPrice', 'f8'),
+        ('HighestPrice', 'f8'),
+        ('LowestPrice', 'f8'),
+        ('Volume', 'i4'),
+        ('Turnover', 'f8'),
+        ('OpenInterest', 'f8'),
+        ('ClosePrice', 'f8'),
+        ('SettlementPrice', 'f8'),
+        ('UpperLimitPrice', 'f8'),
+        ('LowerLimitPrice', 'f8'),
+        ('PreDelta', 'f8'),
+        ('CurrDelta', 'f8'),
+        ('UpdateTime', 'S9'),
+        ('UpdateMillisec', 'i4'),
+        ('BidPrice1', 'f8'),
+        ('BidVolume1', 'i4'),
+        ('AskPrice1', 'f8'),
+        ('AskVolume1', 'i4'),
+        ('BidPrice2', 'f8'),
+        ('BidVolume2', 'i4'),
+        ('AskPrice2', 'f8'),
+        ('AskVolume2', 'i4'),
+        ('BidPrice3', 'f8'),
+        ('BidVolume3', 'i4'),
+        ('AskPrice3', 'f8'),
+        ('AskVolume3', 'i4'),
+        ('BidPrice4', 'f8'),
+        ('BidVolume4', 'i4'),
+        ('AskPrice4', 'f8'),
+        ('AskVolume4', 'i4'),
+        ('BidPrice5', 'f8'),
+        ('BidVolume5', 'i4'),
+        ('AskPrice5', 'f8'),
+        ('AskVolume5', 'i4'),
+        ('AveragePrice', 'f8'),
+        ('ActionDay', 'S9'),
+        ('BandingUpperPrice', 'f8'),
+        ('BandingLowerPrice', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaIndexPriceField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InstrumentID', 'S81'),
+        ('ClosePrice', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaEWarrantOffsetField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('Direction', 'S1'),
+        ('HedgeFlag', 'S1'),
+        ('Volume', 'i4'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSPBMFutureParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('ProdFamilyCode', 'S81'),
+        ('Cvf', 'i4'),
+        ('TimeRange', 'S1'),
+        ('MarginRate', 'f8'),
+        ('LockRateX', 'f8'),
+        ('AddOnRate', 'f8'),
+        ('PreSettlementPrice', 'f8'),
+        ('AddOnLockRateX2', 'f8'),
+    ], align=True),
+    'CThostFtdcSPBMOptionParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('ProdFamilyCode', 'S81'),
+        ('Cvf', 'i4'),
+        ('DownPrice', 'f8'),
+        ('Delta', 'f8'),
+        ('SlimiDelta', 'f8'),
+        ('PreSettlementPrice', 'f8'),
+    ], align=True),
+    'CThostFtdcSPBMIntraParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProdFamilyCode', 'S81'),
+        ('IntraRateY', 'f8'),
+        ('AddOnIntraRateY2', 'f8'),
+    ], align=True),
+    'CThostFtdcSPBMInterParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('SpreadId', 'i4'),
+        ('InterRateZ', 'f8'),
+        ('Leg1ProdFamilyCode', 'S81'),
+        ('Leg2ProdFamilyCode', 'S81'),
+    ], align=True),
+    'CThostFtdcSyncSPBMParameterEndField': np.dtype([
+        ('TradingDay', 'S9'),
+    ], align=True),
+    'CThostFtdcQrySPBMFutureParameterField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('ProdFamilyCode', 'S81'),
+    ], align=True),
+    'CThostFtdcQrySPBMOptionParameterField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('ProdFamilyCode', 'S81'),
+    ], align=True),
+    'CThostFtdcQrySPBMIntraParameterField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ProdFamilyCode', 'S81'),
+    ], align=True),
+    'CThostFtdcQrySPBMInterParameterField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('Leg1ProdFamilyCode', 'S81'),
+        ('Leg2ProdFamilyCode', 'S81'),
+    ], align=True),
+    'CThostFtdcSPBMPortfDefinitionField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('PortfolioDefID', 'i4'),
+        ('ProdFamilyCode', 'S81'),
+        ('IsSPBM', 'i4'),
+    ], align=True),
+    'CThostFtdcSPBMInvestorPortfDefField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('PortfolioDefID', 'i4'),
+    ], align=True),
+    'CThostFtdcInvestorPortfMarginRatioField': np.dtype([
+        ('InvestorRange', 'S1'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+        ('MarginRatio', 'f8'),
+    ], align=True),
+    'CThostFtdcQrySPBMPortfDefinitionField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('PortfolioDefID', 'i4'),
+        ('ProdFamilyCode', 'S81'),
+    ], align=True),
+    'CThostFtdcQrySPBMInvestorPortfDefField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+    ], align=True),
+    'CThostFtdcQryInvestorPortfMarginRatioField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ExchangeID', 'S9'),
+    ], align=True),
+    'CThostFtdcInvestorProdSPBMDetailField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ProdFamilyCode', 'S81'),
+        ('IntraInstrMargin', 'f8'),
+        ('BCollectingMargin', 'f8'),
+        ('SCollectingMargin', 'f8'),
+        ('IntraProdMargin', 'f8'),
+        ('NetMargin', 'f8'),
+        ('InterProdMargin', 'f8'),
+        ('SingleMargin', 'f8'),
+        ('AddOnMargin', 'f8'),
+        ('DeliveryMargin', 'f8'),
+        ('CallOptionMinRisk', 'f8'),
+        ('PutOptionMinRisk', 'f8'),
+        ('OptionMinRisk', 'f8'),
+        ('OptionValueOffset', 'f8'),
+        ('OptionRoyalty', 'f8'),
+        ('RealOptionValueOffset', 'f8'),
+        ('Margin', 'f8'),
+        ('ExchMargin', 'f8'),
+    ], align=True),
+    'CThostFtdcQryInvestorProdSPBMDetailField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ProdFamilyCode', 'S81'),
+    ], align=True),
+    'CThostFtdcPortfTradeParamSettingField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('Portfolio', 'S1'),
+        ('IsActionVerify', 'i4'),
+        ('IsCloseVerify', 'i4'),
+    ], align=True),
+    'CThostFtdcInvestorTradingRightField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('InvstTradingRight', 'S1'),
+    ], align=True),
+    'CThostFtdcMortgageParamField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('MortgageBalance', 'f8'),
+        ('CheckMortgageRatio', 'i4'),
+    ], align=True),
+    'CThostFtdcWithDrawParamField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('AccountID', 'S13'),
+        ('WithDrawParamID', 'S1'),
+        ('WithDrawParamValue', 'S41'),
+    ], align=True),
+    'CThostFtdcThostUserFunctionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+        ('ThostFunctionCode', 'i4'),
+    ], align=True),
+    'CThostFtdcQryThostUserFunctionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('UserID', 'S16'),
+    ], align=True),
+    'CThostFtdcSPBMAddOnInterParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('SpreadId', 'i4'),
+        ('AddOnInterRateZ2', 'f8'),
+        ('Leg1ProdFamilyCode', 'S81'),
+        ('Leg2ProdFamilyCode', 'S81'),
+    ], align=True),
+    'CThostFtdcQrySPBMAddOnInterParameterField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('Leg1ProdFamilyCode', 'S81'),
+        ('Leg2ProdFamilyCode', 'S81'),
+    ], align=True),
+    'CThostFtdcQryInvestorCommoditySPMMMarginField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('CommodityID', 'S41'),
+    ], align=True),
+    'CThostFtdcQryInvestorCommodityGroupSPMMMarginField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('CommodityGroupID', 'S41'),
+    ], align=True),
+    'CThostFtdcQrySPMMInstParamField': np.dtype([
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQrySPMMProductParamField': np.dtype([
+        ('ProductID', 'S41'),
+    ], align=True),
+    'CThostFtdcInvestorCommoditySPMMMarginField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('CommodityID', 'S41'),
+        ('MarginBeforeDiscount', 'f8'),
+        ('MarginNoDiscount', 'f8'),
+        ('LongPosRisk', 'f8'),
+        ('LongOpenFrozenRisk', 'f8'),
+        ('LongCloseFrozenRisk', 'f8'),
+        ('ShortPosRisk', 'f8'),
+        ('ShortOpenFrozenRisk', 'f8'),
+        ('ShortCloseFrozenRisk', 'f8'),
+        ('IntraCommodityRate', 'f8'),
+        ('OptionDiscountRate', 'f8'),
+        ('PosDiscount', 'f8'),
+        ('OpenFrozenDiscount', 'f8'),
+        ('NetRisk', 'f8'),
+        ('CloseFrozenMargin', 'f8'),
+        ('FrozenCommission', 'f8'),
+        ('Commission', 'f8'),
+        ('FrozenCash', 'f8'),
+        ('CashIn', 'f8'),
+        ('StrikeFrozenMargin', 'f8'),
+    ], align=True),
+    'CThostFtdcInvestorCommodityGroupSPMMMarginField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('CommodityGroupID', 'S41'),
+        ('MarginBeforeDiscount', 'f8'),
+        ('MarginNoDiscount', 'f8'),
+        ('LongRisk', 'f8'),
+        ('ShortRisk', 'f8'),
+        ('CloseFrozenMargin', 'f8'),
+        ('InterCommodityRate', 'f8'),
+        ('MiniMarginRatio', 'f8'),
+        ('AdjustRatio', 'f8'),
+        ('IntraCommodityDiscount', 'f8'),
+        ('InterCommodityDiscount', 'f8'),
+        ('ExchMargin', 'f8'),
+        ('InvestorMargin', 'f8'),
+        ('FrozenCommission', 'f8'),
+        ('Commission', 'f8'),
+        ('FrozenCash', 'f8'),
+        ('CashIn', 'f8'),
+        ('StrikeFrozenMargin', 'f8'),
+    ], align=True),
+    'CThostFtdcSPMMInstParamField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('InstMarginCalID', 'S1'),
+        ('CommodityID', 'S41'),
+        ('CommodityGroupID', 'S41'),
+    ], align=True),
+    'CThostFtdcSPMMProductParamField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S41'),
+        ('CommodityID', 'S41'),
+        ('CommodityGroupID', 'S41'),
+    ], align=True),
+    'CThostFtdcQryTraderAssignField': np.dtype([
+        ('TraderID', 'S21'),
+    ], align=True),
+    'CThostFtdcTraderAssignField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('ExchangeID', 'S9'),
+        ('TraderID', 'S21'),
+        ('ParticipantID', 'S11'),
+        ('DRIdentityID', 'i4'),
+    ], align=True),
+    'CThostFtdcInvestorInfoCntSettingField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ProductID', 'S41'),
+        ('IsCalInfoComm', 'i4'),
+        ('IsLimitInfoMax', 'i4'),
+        ('InfoMaxLimit', 'i4'),
+    ], align=True),
+    'CThostFtdcRCAMSCombProductInfoField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S41'),
+        ('CombProductID', 'S41'),
+        ('ProductGroupID', 'S41'),
+    ], align=True),
+    'CThostFtdcRCAMSInstrParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S41'),
+        ('HedgeRate', 'f8'),
+    ], align=True),
+    'CThostFtdcRCAMSIntraParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('CombProductID', 'S41'),
+        ('HedgeRate', 'f8'),
+    ], align=True),
+    'CThostFtdcRCAMSInterParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProductGroupID', 'S41'),
+        ('Priority', 'i4'),
+        ('CreditRate', 'f8'),
+        ('CombProduct1', 'S41'),
+        ('CombProduct2', 'S41'),
+    ], align=True),
+    'CThostFtdcRCAMSShortOptAdjustParamField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('CombProductID', 'S41'),
+        ('HedgeFlag', 'S1'),
+        ('AdjustValue', 'f8'),
+    ], align=True),
+    'CThostFtdcRCAMSInvestorCombPositionField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('InstrumentID', 'S81'),
+        ('HedgeFlag', 'S1'),
+        ('PosiDirection', 'S1'),
+        ('CombInstrumentID', 'S81'),
+        ('LegID', 'i4'),
+        ('ExchangeInstID', 'S81'),
+        ('TotalAmt', 'i4'),
+        ('ExchMargin', 'f8'),
+        ('Margin', 'f8'),
+    ], align=True),
+    'CThostFtdcInvestorProdRCAMSMarginField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('CombProductID', 'S41'),
+        ('HedgeFlag', 'S1'),
+        ('ProductGroupID', 'S41'),
+        ('RiskBeforeDiscount', 'f8'),
+        ('IntraInstrRisk', 'f8'),
+        ('BPosRisk', 'f8'),
+        ('SPosRisk', 'f8'),
+        ('IntraProdRisk', 'f8'),
+        ('NetRisk', 'f8'),
+        ('InterProdRisk', 'f8'),
+        ('ShortOptRiskAdj', 'f8'),
+        ('OptionRoyalty', 'f8'),
+        ('MMSACloseFrozenMargin', 'f8'),
+        ('CloseCombFrozenMargin', 'f8'),
+        ('CloseFrozenMargin', 'f8'),
+        ('MMSAOpenFrozenMargin', 'f8'),
+        ('DeliveryOpenFrozenMargin', 'f8'),
+        ('OpenFrozenMargin', 'f8'),
+        ('UseFrozenMargin', 'f8'),
+        ('MMSAExchMargin', 'f8'),
+        ('DeliveryExchMargin', 'f8'),
+        ('CombExchMargin', 'f8'),
+        ('ExchMargin', 'f8'),
+        ('UseMargin', 'f8'),
+    ], align=True),
+    'CThostFtdcQryRCAMSCombProductInfoField': np.dtype([
+        ('ProductID', 'S41'),
+        ('CombProductID', 'S41'),
+        ('ProductGroupID', 'S41'),
+    ], align=True),
+    'CThostFtdcQryRCAMSInstrParameterField': np.dtype([
+        ('ProductID', 'S41'),
+    ], align=True),
+    'CThostFtdcQryRCAMSIntraParameterField': np.dtype([
+        ('CombProductID', 'S41'),
+    ], align=True),
+    'CThostFtdcQryRCAMSInterParameterField': np.dtype([
+        ('ProductGroupID', 'S41'),
+        ('CombProduct1', 'S41'),
+        ('CombProduct2', 'S41'),
+    ], align=True),
+    'CThostFtdcQryRCAMSShortOptAdjustParamField': np.dtype([
+        ('CombProductID', 'S41'),
+    ], align=True),
+    'CThostFtdcQryRCAMSInvestorCombPositionField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('InstrumentID', 'S81'),
+        ('CombInstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryInvestorProdRCAMSMarginField': np.dtype([
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('CombProductID', 'S41'),
+        ('ProductGroupID', 'S41'),
+    ], align=True),
+    'CThostFtdcRULEInstrParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('InstrumentClass', 'S1'),
+        ('StdInstrumentID', 'S81'),
+        ('BSpecRatio', 'f8'),
+        ('SSpecRatio', 'f8'),
+        ('BHedgeRatio', 'f8'),
+        ('SHedgeRatio', 'f8'),
+        ('BAddOnMargin', 'f8'),
+        ('SAddOnMargin', 'f8'),
+        ('CommodityGroupID', 'i4'),
+    ], align=True),
+    'CThostFtdcRULEIntraParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProdFamilyCode', 'S81'),
+        ('StdInstrumentID', 'S81'),
+        ('StdInstrMargin', 'f8'),
+        ('UsualIntraRate', 'f8'),
+        ('DeliveryIntraRate', 'f8'),
+    ], align=True),
+    'CThostFtdcRULEInterParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('SpreadId', 'i4'),
+        ('InterRate', 'f8'),
+        ('Leg1ProdFamilyCode', 'S81'),
+        ('Leg2ProdFamilyCode', 'S81'),
+        ('Leg1PropFactor', 'i4'),
+        ('Leg2PropFactor', 'i4'),
+        ('CommodityGroupID', 'i4'),
+        ('CommodityGroupName', 'S21'),
+    ], align=True),
+    'CThostFtdcQryRULEInstrParameterField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+    ], align=True),
+    'CThostFtdcQryRULEIntraParameterField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ProdFamilyCode', 'S81'),
+    ], align=True),
+    'CThostFtdcQryRULEInterParameterField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('Leg1ProdFamilyCode', 'S81'),
+        ('Leg2ProdFamilyCode', 'S81'),
+        ('CommodityGroupID', 'i4'),
+    ], align=True),
+    'CThostFtdcInvestorProdRULEMarginField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ProdFamilyCode', 'S81'),
+        ('InstrumentClass', 'S1'),
+        ('CommodityGroupID', 'i4'),
+        ('BStdPosition', 'f8'),
+        ('SStdPosition', 'f8'),
+        ('BStdOpenFrozen', 'f8'),
+        ('SStdOpenFrozen', 'f8'),
+        ('BStdCloseFrozen', 'f8'),
+        ('SStdCloseFrozen', 'f8'),
+        ('IntraProdStdPosition', 'f8'),
+        ('NetStdPosition', 'f8'),
+        ('InterProdStdPosition', 'f8'),
+        ('SingleStdPosition', 'f8'),
+        ('IntraProdMargin', 'f8'),
+        ('InterProdMargin', 'f8'),
+        ('SingleMargin', 'f8'),
+        ('NonCombMargin', 'f8'),
+        ('AddOnMargin', 'f8'),
+        ('ExchMargin', 'f8'),
+        ('AddOnFrozenMargin', 'f8'),
+        ('OpenFrozenMargin', 'f8'),
+        ('CloseFrozenMargin', 'f8'),
+        ('Margin', 'f8'),
+        ('FrozenMargin', 'f8'),
+    ], align=True),
+    'CThostFtdcQryInvestorProdRULEMarginField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('ProdFamilyCode', 'S81'),
+        ('CommodityGroupID', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaSPBMPortfDefinitionField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('PortfolioDefID', 'i4'),
+        ('ProdFamilyCode', 'S81'),
+        ('IsSPBM', 'i4'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaSPBMInvstPortfDefField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('PortfolioDefID', 'i4'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaSPBMFutureParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('ProdFamilyCode', 'S81'),
+        ('Cvf', 'i4'),
+        ('TimeRange', 'S1'),
+        ('MarginRate', 'f8'),
+        ('LockRateX', 'f8'),
+        ('AddOnRate', 'f8'),
+        ('PreSettlementPrice', 'f8'),
+        ('AddOnLockRateX2', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaSPBMOptionParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('ProdFamilyCode', 'S81'),
+        ('Cvf', 'i4'),
+        ('DownPrice', 'f8'),
+        ('Delta', 'f8'),
+        ('SlimiDelta', 'f8'),
+        ('PreSettlementPrice', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaSPBMIntraParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProdFamilyCode', 'S81'),
+        ('IntraRateY', 'f8'),
+        ('AddOnIntraRateY2', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaSPBMInterParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('SpreadId', 'i4'),
+        ('InterRateZ', 'f8'),
+        ('Leg1ProdFamilyCode', 'S81'),
+        ('Leg2ProdFamilyCode', 'S81'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaSPBMAddOnInterParamField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('SpreadId', 'i4'),
+        ('AddOnInterRateZ2', 'f8'),
+        ('Leg1ProdFamilyCode', 'S81'),
+        ('Leg2ProdFamilyCode', 'S81'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaSPMMInstParamField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('InstMarginCalID', 'S1'),
+        ('CommodityID', 'S41'),
+        ('CommodityGroupID', 'S41'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaSPMMProductParamField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S41'),
+        ('CommodityID', 'S41'),
+        ('CommodityGroupID', 'S41'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaInvestorSPMMModelField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('SPMMModelID', 'S33'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaSPMMModelParamField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('SPMMModelID', 'S33'),
+        ('CommodityGroupID', 'S41'),
+        ('IntraCommodityRate', 'f8'),
+        ('InterCommodityRate', 'f8'),
+        ('OptionDiscountRate', 'f8'),
+        ('MiniMarginRatio', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaRCAMSCombProdInfoField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S41'),
+        ('CombProductID', 'S41'),
+        ('ProductGroupID', 'S41'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaRCAMSInstrParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProductID', 'S41'),
+        ('HedgeRate', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaRCAMSIntraParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('CombProductID', 'S41'),
+        ('HedgeRate', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaRCAMSInterParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProductGroupID', 'S41'),
+        ('Priority', 'i4'),
+        ('CreditRate', 'f8'),
+        ('CombProduct1', 'S41'),
+        ('CombProduct2', 'S41'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaRCAMSSOptAdjParamField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('CombProductID', 'S41'),
+        ('HedgeFlag', 'S1'),
+        ('AdjustValue', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaRCAMSCombRuleDtlField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProdGroup', 'S41'),
+        ('RuleId', 'S51'),
+        ('Priority', 'i4'),
+        ('HedgeFlag', 'S1'),
+        ('CombMargin', 'f8'),
+        ('ExchangeInstID', 'S81'),
+        ('LegID', 'i4'),
+        ('LegInstrumentID', 'S81'),
+        ('Direction', 'S1'),
+        ('LegMultiple', 'i4'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaRCAMSInvstCombPosField': np.dtype([
+        ('ExchangeID', 'S9'),
+        ('BrokerID', 'S11'),
+        ('InvestorID', 'S13'),
+        ('InstrumentID', 'S81'),
+        ('HedgeFlag', 'S1'),
+        ('PosiDirection', 'S1'),
+        ('CombInstrumentID', 'S81'),
+        ('LegID', 'i4'),
+        ('ExchangeInstID', 'S81'),
+        ('TotalAmt', 'i4'),
+        ('ExchMargin', 'f8'),
+        ('Margin', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaRULEInstrParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('InstrumentID', 'S81'),
+        ('InstrumentClass', 'S1'),
+        ('StdInstrumentID', 'S81'),
+        ('BSpecRatio', 'f8'),
+        ('SSpecRatio', 'f8'),
+        ('BHedgeRatio', 'f8'),
+        ('SHedgeRatio', 'f8'),
+        ('BAddOnMargin', 'f8'),
+        ('SAddOnMargin', 'f8'),
+        ('CommodityGroupID', 'i4'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaRULEIntraParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('ProdFamilyCode', 'S81'),
+        ('StdInstrumentID', 'S81'),
+        ('StdInstrMargin', 'f8'),
+        ('UsualIntraRate', 'f8'),
+        ('DeliveryIntraRate', 'f8'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+    'CThostFtdcSyncDeltaRULEInterParameterField': np.dtype([
+        ('TradingDay', 'S9'),
+        ('ExchangeID', 'S9'),
+        ('SpreadId', 'i4'),
+        ('InterRate', 'f8'),
+        ('Leg1ProdFamilyCode', 'S81'),
+        ('Leg2ProdFamilyCode', 'S81'),
+        ('Leg1PropFactor', 'i4'),
+        ('Leg2PropFactor', 'i4'),
+        ('CommodityGroupID', 'i4'),
+        ('CommodityGroupName', 'S21'),
+        ('ActionDirection', 'S1'),
+        ('SyncDeltaSequenceNo', 'i4'),
+    ], align=True),
+}
@@ -0,0 +1,639 @@
+"""本地 CTP 前置模拟器。
+
+纯 Python 实现的 CThostFtdcMdApi / CThostFtdcTraderApi 替身，方法与真实 API 一致
+（RegisterFront、RegisterSpi、Init、Join、Release、ReqUserLogin、SubscribeMarketData、
+ReqOrderInsert、ReqOrderAction、ReqQryInvestorPosition 等），不需要连接 SimNow 前置，
+就能按设定的速率驱动现有 SPI 的回调，用于确定性的回归测试以及在笔记本上测量端到端吞吐和延迟。
+
+    - 每个 API 实例有一个回调线程，回调按请求顺序依次执行，与真实 API 一致。
+    - 行情按 tick_rate（每秒笔数）生成随机游走行情，或回放给定的行情序列（如 iter_journal_ticks()）。
+      行情时间使用模拟的交易所时间，从 start_time 开始每笔前进 tick_interval 秒。
+    - 报单交给 matching_engine.MatchingEngine 按价格-时间优先与行情撮合，挂单按排队位置成交。
+    - 查询：持仓按模拟成交累计；其他 ReqQry* 请求直接返回空结果。
+
+用法：
+    sim = CTPSimulator(instruments=['rb2410'], tick_rate=1000)
+    MdSpiImpl.api_class = sim  # 或给某个 SPI 实例设置 api_class
+    auto_trade = AutoTradeSpi("螺纹钢", md_api=sim.CreateFtdcMdApi(), td_api=sim.CreateFtdcTraderApi())
+"""
+import itertools
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from tick_snapshot import TickSnapshot, DEPTH_MARKET_DATA_FIELDS
+from matching_engine import MatchingEngine, ORDER_ALL_TRADED, ORDER_PART_TRADED_QUEUEING, \
+    ORDER_NO_TRADE_QUEUEING, ORDER_CANCELED, DIRECTION_BUY, DIRECTION_SELL
+
+# 报单提交状态（THOST_FTDC_OSS_*）
+SUBMIT_ACCEPTED = '3'
+OFFSET_OPEN = '0'
+
+_STATUS_MSG = {
+    ORDER_ALL_TRADED: "全部成交",
+    ORDER_PART_TRADED_QUEUEING: "部分成交",
+    ORDER_NO_TRADE_QUEUEING: "未成交",
+    ORDER_CANCELED: "已撤单",
+}
+
+
+def _rsp_info(error_id=0, error_msg="正确"):
+    return SimpleNamespace(ErrorID=error_id, ErrorMsg=error_msg)
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class _FakeApi:
+    """模拟 API 的公共部分：注册、回调线程和生命周期。"""
+
+    def __init__(self, simulator, flow_path=""):
+        self.simulator = simulator
+        self.flow_path = flow_path
+        self.fronts = []
+        self.spi = None
+        self.request_count = 0
+        self._events = queue.Queue()
+        self._thread = None
+        self._released = threading.Event()
+
+    def RegisterFront(self, pszFrontAddress):
+        self.fronts.append(pszFrontAddress)
+
+    def RegisterNameServer(self, pszNsAddress):
+        self.fronts.append(pszNsAddress)
+
+    def RegisterSpi(self, pSpi):
+        self.spi = pSpi
+
+    def Init(self):
+        """启动回调线程，随后回调 OnFrontConnected"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        self._post('OnFrontConnected')
+
+    def Join(self):
+        """阻塞直到 Release"""
+        self._released.wait()
+        return 0
+
+    def Release(self):
+        self._released.set()
+        self._events.put(None)
+
+    def GetTradingDay(self):
+        return self.simulator.trading_day
+
+    def GetApiVersion(self):
+        return "ctp_simulator"
+
+    def _post(self, callback, *args):
+        """把一次回调放进回调线程的队列"""
+        self._events.put((callback, args))
+
+    def wait_idle(self):
+        """阻塞直到队列中的回调都已执行完"""
+        self._events.join()
+
+    def _run(self):
+        events = self._events
+        while True:
+            event = events.get()
+            if event is None:
+                events.task_done()
+                return
+            callback, args = event
+            handler = getattr(self.spi, callback, None)
+            try:
+                if handler is not None:
+                    handler(*args)
+            finally:
+                events.task_done()
+
+
+class FakeMdApi(_FakeApi):
+    """模拟行情 API。"""
+
+    def __init__(self, simulator, flow_path=""):
+        super().__init__(simulator, flow_path)
+        self.subscribed = set()
+
+    def ReqUserLogin(self, pReqUserLoginField, nRequestID):
+        self.request_count += 1
+        self._post('OnRspUserLogin', self.simulator._rsp_user_login(pReqUserLoginField), _rsp_info(),
+                   nRequestID, True)
+        return 0
+
+    def ReqUserLogout(self, pUserLogout, nRequestID):
+        self.request_count += 1
+        self._post('OnRspUserLogout', pUserLogout, _rsp_info(), nRequestID, True)
+        return 0
+
+    def SubscribeMarketData(self, ppInstrumentID, nCount):
+        self.request_count += 1
+        instruments = [_decode(instrument) for instrument in ppInstrumentID[:nCount]]
+        for i, instrument in enumerate(instruments):
+            self.subscribed.add(instrument)
+            self._post('OnRspSubMarketData', SimpleNamespace(InstrumentID=instrument), _rsp_info(),
+                       0, i == len(instruments) - 1)
+        self.simulator._on_subscribe(instruments)
+        return 0
+
+    def UnSubscribeMarketData(self, ppInstrumentID, nCount):
+        self.request_count += 1
+        instruments = [_decode(instrument) for instrument in ppInstrumentID[:nCount]]
+        for i, instrument in enumerate(instruments):
+            self.subscribed.discard(instrument)
+            self._post('OnRspUnSubMarketData', SimpleNamespace(InstrumentID=instrument), _rsp_info(),
+                       0, i == len(instruments) - 1)
+        return 0
+
+    def Init(self):
+        super().Init()
+        self.simulator._start_feed()
+
+
+class FakeTraderApi(_FakeApi):
+    """模拟交易 API。"""
+
+    def __init__(self, simulator, flow_path=""):
+        super().__init__(simulator, flow_path)
+        self.front_id = 1
+        self.session_id = simulator._next_session_id()
+
+    def SubscribePublicTopic(self, nResumeType):
+        pass
+
+    def SubscribePrivateTopic(self, nResumeType):
+        pass
+
+    def ReqAuthenticate(self, pReqAuthenticateField, nRequestID):
+        self.request_count += 1
+        rsp = SimpleNamespace(BrokerID=pReqAuthenticateField.BrokerID, UserID=pReqAuthenticateField.UserID,
+                              AppID=pReqAuthenticateField.AppID, UserProductInfo="", AppType='1')
+        self._post('OnRspAuthenticate', rsp, _rsp_info(), nRequestID, True)
+        return 0
+
+    def ReqUserLogin(self, pReqUserLoginField, nRequestID):
+        self.request_count += 1
+        rsp = self.simulator._rsp_user_login(pReqUserLoginField, self)
+        self._post('OnRspUserLogin', rsp, _rsp_info(), nRequestID, True)
+        return 0
+
+    def ReqUserLogout(self, pUserLogout, nRequestID):
+        self.request_count += 1
+        self._post('OnRspUserLogout', pUserLogout, _rsp_info(), nRequestID, True)
+        return 0
+
+    def ReqSettlementInfoConfirm(self, pSettlementInfoConfirm, nRequestID):
+        self.request_count += 1
+        self._post('OnRspSettlementInfoConfirm', pSettlementInfoConfirm, _rsp_info(), nRequestID, True)
+        return 0
+
+    def ReqOrderInsert(self, pInputOrder, nRequestID):
+        self.request_count += 1
+        self.simulator._order_insert(self, pInputOrder, nRequestID)
+        return 0
+
+    def ReqOrderAction(self, pInputOrderAction, nRequestID):
+        self.request_count += 1
+        self.simulator._order_action(self, pInputOrderAction, nRequestID)
+        return 0
+
+    def ReqBatchOrderAction(self, pInputBatchOrderAction, nRequestID):
+        self.request_count += 1
+        self.simulator._batch_order_action(self, pInputBatchOrderAction, nRequestID)
+        return 0
+
+    def ReqQryInvestorPosition(self, pQryInvestorPosition, nRequestID):
+        self.request_count += 1
+        positions = self.simulator._query_positions(_decode(pQryInvestorPosition.InstrumentID or ""))
+        self._post_rows('OnRspQryInvestorPosition', positions, nRequestID)
+        return 0
+
+    def ReqQryOrder(self, pQryOrder, nRequestID):
+        self.request_count += 1
+        self._post_rows('OnRspQryOrder', self.simulator._query_orders(self), nRequestID)
+        return 0
+
+    def ReqQryTrade(self, pQryTrade, nRequestID):
+        self.request_count += 1
+        self._post_rows('OnRspQryTrade', self.simulator._query_trades(self), nRequestID)
+        return 0
+
+    def ReqQryTradingAccount(self, pQryTradingAccount, nRequestID):
+        self.request_count += 1
+        self._post_rows('OnRspQryTradingAccount', [self.simulator._trading_account()], nRequestID)
+        return 0
+
+    def _post_rows(self, callback, rows, nRequestID):
+        """查询结果逐条回调，最后一条 bIsLast 为 True；没有结果时回调一次空记录"""
+        if not rows:
+            self._post(callback, None, None, nRequestID, True)
+            return
+        for i, row in enumerate(rows):
+            self._post(callback, row, None, nRequestID, i == len(rows) - 1)
+
+    def __getattr__(self, name):
+        # 其他查询请求返回空结果，其他请求返回成功
+        if name.startswith('ReqQry'):
+            callback = 'OnRspQry' + name[len('ReqQry'):]
+
+            def query(pQry, nRequestID):
+                self.request_count += 1
+                self._post(callback, None, None, nRequestID, True)
+                return 0
+            return query
+        raise AttributeError(name)
+
+
+class _SimOrder:
+    __slots__ = ('api', 'order', 'trades', 'request_id', 'engine_order')
+
+    def __init__(self, api, order, request_id):
+        self.api = api
+        self.order = order  # 回调给 SPI 的报单字段
+        self.trades = []
+        self.request_id = request_id
+        self.engine_order = None
+
+
+class CTPSimulator:
+    """模拟的 CTP 前置，同时充当 CThostFtdcMdApi / CThostFtdcTraderApi 的创建类。
+
+    Attributes:
+        ticks_sent (int): 已推送的行情数。
+        orders (int): 收到的报单数。
+        trades (int): 模拟成交数。
+        latencies (list): 每笔报单距该合约最近一笔行情生成的时间，单位秒，用于衡量行情到报单的延迟。
+    """
+
+    def __init__(self, instruments=('rb2410',), tick_rate=2.0, script=None, max_ticks=None,
+                 base_price=3500.0, price_tick=1.0, exchange_id='SHFE', start_time=None, tick_interval=0.5,
+                 seed=None):
+        """初始化模拟器。
+
+        Args:
+            instruments (tuple): 生成随机行情的合约，只推送已订阅的合约。
+            tick_rate (float): 每秒推送的行情笔数，None 表示不自动推送（只用 push_tick 手动推送），
+                float('inf') 表示不限速。
+            script: 行情序列，给定时按顺序回放这些行情，不再生成随机行情。
+            max_ticks (int): 推送这么多笔行情后停止，None 表示不限制。
+            base_price (float): 随机行情的起始价格。
+            price_tick (float): 最小变动价位。
+            exchange_id (str): 交易所代码。
+            start_time (datetime): 模拟交易所时间的起点，默认为当天 09:00:00。
+            tick_interval (float): 每笔随机行情前进的交易所时间，单位秒。
+            seed (int): 随机数种子，给定时结果可复现。
+        """
+        self.instruments = tuple(instruments)
+        self.tick_rate = tick_rate
+        self.script = script
+        self.max_ticks = max_ticks
+        self.price_tick = price_tick
+        self.exchange_id = exchange_id
+        if start_time is None:
+            start_time = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.exchange_time = start_time
+        self.trading_day = start_time.strftime('%Y%m%d')
+        self.tick_interval = timedelta(seconds=tick_interval)
+        self._random = random.Random(seed)
+        self._prices = {instrument: base_price for instrument in self.instruments}
+        self._volumes = {instrument: 0 for instrument in self.instruments}
+        self._quotes = {}  # InstrumentID -> 最新一笔行情
+        self._tick_times = {}  # InstrumentID -> 最新一笔行情生成时的 perf_counter
+        self._md_apis = []
+        self._lock = threading.RLock()
+        self._session_ids = itertools.count(1)
+        self._order_sys_ids = itertools.count(1)
+        self._trade_ids = itertools.count(1)
+        self._order_refs = {}  # SessionID -> 最大报单引用
+        self._orders = {}  # (FrontID, SessionID, OrderRef) -> _SimOrder
+        self.engine = MatchingEngine(on_order=self._on_engine_order, on_trade=self._on_engine_trade)
+        self._positions = {}  # (InstrumentID, 持仓方向) -> 手数
+        self._feed_thread = None
+        self._stop = threading.Event()
+        self.finished = threading.Event()  # 推送完 max_ticks 或 script 后置位
+        self.ticks_sent = 0
+        self.orders = 0
+        self.trades = 0
+        self.latencies = []
+
+    # ---------- 充当 API 创建类 ----------
+
+    def CreateFtdcMdApi(self, pszFlowPath="", *args):
+        api = FakeMdApi(self, pszFlowPath)
+        with self._lock:
+            self._md_apis.append(api)
+        return api
+
+    def CreateFtdcTraderApi(self, pszFlowPath="", *args):
+        return FakeTraderApi(self, pszFlowPath)
+
+    # ---------- 行情 ----------
+
+    def push_tick(self, tick):
+        """推送一笔行情给所有订阅了该合约的行情 API，并撮合挂单。
+
+        Args:
+            tick: TickSnapshot 或其他带行情字段的对象。
+        """
+        instrument = tick.InstrumentID
+        with self._lock:
+            self._quotes[instrument] = tick
+            self._tick_times[instrument] = time.perf_counter()
+            md_apis = [api for api in self._md_apis if instrument in api.subscribed]
+            self.ticks_sent += 1
+            for api in md_apis:
+                api._post('OnRtnDepthMarketData', tick)
+            self.engine.on_quote(tick)  # 行情先送出，挂单的成交回报排在这笔行情之后
+
+    def _on_subscribe(self, instruments):
+        with self._lock:
+            for instrument in instruments:
+                if instrument not in self._prices:
+                    self._prices[instrument] = next(iter(self._prices.values()), 3500.0)
+                    self._volumes[instrument] = 0
+                    self.instruments += (instrument,)
+
+    def _start_feed(self):
+        with self._lock:
+            if self._feed_thread is not None or self.tick_rate is None:
+                return
+            self._feed_thread = threading.Thread(target=self._feed, name='CTPSimulatorFeed', daemon=True)
+            self._feed_thread.start()
+
+    def stop(self):
+        """停止推送行情"""
+        self._stop.set()
+        if self._feed_thread is not None and self._feed_thread is not threading.current_thread():
+            self._feed_thread.join()
+
+    def _feed(self):
+        """按 tick_rate 推送行情"""
+        ticks = iter(self.script) if self.script is not None else self._generate()
+        interval = 0.0 if self.tick_rate == float('inf') else 1.0 / self.tick_rate
+        target = time.perf_counter()
+        count = 0
+        for tick in ticks:
+            if self._stop.is_set() or (self.max_ticks is not None and count >= self.max_ticks):
+                break
+            if interval:
+                target += interval
+                delay = target - time.perf_counter()
+                if delay > 0.001:  # 积累到 1 毫秒以上再休眠，高速率时不会每笔都进入 sleep
+                    time.sleep(delay)
+            self.push_tick(tick)
+            count += 1
+        self.finished.set()
+
+    def _generate(self):
+        """按合约轮流生成随机游走行情，只生成已订阅的合约"""
+        rnd = self._random
+        price_tick = self.price_tick
+        while not self._stop.is_set():
+            subscribed = set()
+            with self._lock:
+                for api in self._md_apis:
+                    subscribed.update(api.subscribed)
+            instruments = [instrument for instrument in self.instruments if instrument in subscribed]
+            if not instruments:
+                time.sleep(0.01)
+                continue
+            for instrument in instruments:
+                price = self._prices[instrument] + rnd.choice((-price_tick, 0.0, 0.0, price_tick))
+                self._prices[instrument] = price
+                self._volumes[instrument] += rnd.randint(0, 10)
+                yield self._make_tick(instrument, price, self._volumes[instrument])
+            self.exchange_time += self.tick_interval
+
+    def _make_tick(self, instrument, price, volume):
+        rnd = self._random
+        price_tick = self.price_tick
+        exchange_time = self.exchange_time
+        bid = price - price_tick * rnd.randint(0, 1)
+        ask = bid + price_tick
+        values = dict.fromkeys(DEPTH_MARKET_DATA_FIELDS, 0.0)
+        values.update(
+            TradingDay=self.trading_day, ExchangeID=self.exchange_id, InstrumentID=instrument,
+            ExchangeInstID=instrument, ActionDay=exchange_time.strftime('%Y%m%d'),
+            UpdateTime=exchange_time.strftime('%H:%M:%S'), UpdateMillisec=exchange_time.microsecond // 1000,
+            LastPrice=price, Volume=volume, Turnover=volume * price * 10, OpenInterest=100000.0,
+            PreSettlementPrice=price, PreClosePrice=price, OpenPrice=price, HighestPrice=price,
+            LowestPrice=price, AveragePrice=price * 10, UpperLimitPrice=price * 1.1, LowerLimitPrice=price * 0.9,
+        )
+        for level in range(1, 6):
+            values[f'BidPrice{level}'] = bid - price_tick * (level - 1)
+            values[f'AskPrice{level}'] = ask + price_tick * (level - 1)
+            values[f'BidVolume{level}'] = rnd.randint(1, 50)
+            values[f'AskVolume{level}'] = rnd.randint(1, 50)
+        return TickSnapshot(**values)
+
+    # ---------- 交易 ----------
+
+    def _next_session_id(self):
+        return next(self._session_ids)
+
+    def _rsp_user_login(self, req, td_api=None):
+        rsp = SimpleNamespace(TradingDay=self.trading_day, LoginTime=datetime.now().strftime('%H:%M:%S'),
+                              BrokerID=req.BrokerID, UserID=req.UserID, SystemName="ctp_simulator",
+                              FrontID=0, SessionID=0, MaxOrderRef="", SHFETime="", DCETime="",
+                              CZCETime="", FFEXTime="", INETime="")
+        if td_api is not None:
+            with self._lock:
+                max_order_ref = self._order_refs.setdefault(td_api.session_id, 0)
+            rsp.FrontID = td_api.front_id
+            rsp.SessionID = td_api.session_id
+            rsp.MaxOrderRef = str(max_order_ref)
+        return rsp
+
+    def _order_insert(self, api, req, request_id):
+        now = self.exchange_time.strftime('%H:%M:%S')
+        with self._lock:
+            self.orders += 1
+            instrument = _decode(req.InstrumentID)
+            tick_time = self._tick_times.get(instrument)
+            if tick_time is not None:
+                self.latencies.append(time.perf_counter() - tick_time)
+            order_ref = req.OrderRef
+            if not order_ref:  # 与真实 API 一致，未填报单引用时自动分配
+                order_ref = str(self._order_refs.get(api.session_id, 0) + 1)
+            if order_ref.isdigit():
+                self._order_refs[api.session_id] = max(self._order_refs.get(api.session_id, 0), int(order_ref))
+            order = SimpleNamespace(
+                BrokerID=req.BrokerID, InvestorID=req.InvestorID, InstrumentID=instrument,
+                ExchangeID=self.exchange_id, OrderRef=order_ref, FrontID=api.front_id, SessionID=api.session_id,
+                OrderSysID=f"{next(self._order_sys_ids):12d}", Direction=req.Direction,
+                CombOffsetFlag=req.CombOffsetFlag, CombHedgeFlag=req.CombHedgeFlag, LimitPrice=req.LimitPrice,
+                OrderPriceType=req.OrderPriceType, TimeCondition=req.TimeCondition,
+                VolumeCondition=req.VolumeCondition, VolumeTotalOriginal=req.VolumeTotalOriginal,
+                VolumeTraded=0, VolumeTotal=req.VolumeTotalOriginal, OrderStatus=ORDER_NO_TRADE_QUEUEING,
+                OrderSubmitStatus=SUBMIT_ACCEPTED, TradingDay=self.trading_day, InsertDate=self.trading_day,
+                InsertTime=now, UpdateTime=now, CancelTime="", StatusMsg="未成交", RequestID=request_id,
+            )
+            sim_order = self._orders[(api.front_id, api.session_id, order_ref)] = _SimOrder(api, order, request_id)
+            api._post('OnRtnOrder', _copy(order))
+            req_order = SimpleNamespace(InstrumentID=instrument, Direction=req.Direction, LimitPrice=req.LimitPrice,
+                                        VolumeTotalOriginal=req.VolumeTotalOriginal,
+                                        OrderPriceType=req.OrderPriceType, TimeCondition=req.TimeCondition,
+                                        VolumeCondition=req.VolumeCondition)
+            sim_order.engine_order = self.engine.insert(req_order, sim_order)
+
+    def _order_action(self, api, req, request_id):
+        with self._lock:
+            sim_order = None
+            if req.OrderRef:
+                front_id = req.FrontID or api.front_id
+                session_id = req.SessionID or api.session_id
+                sim_order = self._orders.get((front_id, session_id, req.OrderRef))
+            if sim_order is None and req.OrderSysID:
+                for candidate in self._orders.values():
+                    if candidate.order.OrderSysID.strip() == req.OrderSysID.strip():
+                        sim_order = candidate
+                        break
+            if sim_order is None or not self.engine.cancel(sim_order.engine_order):
+                error = _rsp_info(26, "CTP:报单已全成交或已撤销，不能再撤") if sim_order is not None \
+                    else _rsp_info(25, "CTP:撤单找不到相应报单")
+                api._post('OnRspOrderAction', req, error, request_id, True)
+                api._post('OnErrRtnOrderAction', req, error)
+
+    def _batch_order_action(self, api, req, request_id):
+        # 撤销该会话在该交易所的全部挂单
+        front_id = req.FrontID or api.front_id
+        session_id = req.SessionID or api.session_id
+        with self._lock:
+            for (order_front_id, order_session_id, _), sim_order in list(self._orders.items()):
+                if order_front_id != front_id or order_session_id != session_id:
+                    continue
+                if req.ExchangeID and sim_order.order.ExchangeID != req.ExchangeID:
+                    continue
+                self.engine.cancel(sim_order.engine_order)
+
+    def _on_engine_order(self, engine_order):
+        """撮合引擎中报单状态变化（成交、撤单），回报 OnRtnOrder"""
+        sim_order = engine_order.owner
+        order = sim_order.order
+        order.VolumeTraded = engine_order.traded
+        order.VolumeTotal = engine_order.volume - engine_order.traded
+        order.OrderStatus = engine_order.status
+        order.StatusMsg = _STATUS_MSG[engine_order.status]
+        order.UpdateTime = self.exchange_time.strftime('%H:%M:%S')
+        if engine_order.status == ORDER_CANCELED:
+            order.CancelTime = order.UpdateTime
+        sim_order.api._post('OnRtnOrder', _copy(order))
+
+    def _on_engine_trade(self, engine_order, price, volume):
+        """撮合引擎成交，回报 OnRtnTrade 并更新持仓"""
+        sim_order = engine_order.owner
+        order = sim_order.order
+        trade = SimpleNamespace(
+            BrokerID=order.BrokerID, InvestorID=order.InvestorID, InstrumentID=order.InstrumentID,
+            ExchangeID=order.ExchangeID, OrderRef=order.OrderRef, OrderSysID=order.OrderSysID,
+            TradeID=f"{next(self._trade_ids):12d}", Direction=order.Direction, OffsetFlag=order.CombOffsetFlag[:1],
+            HedgeFlag=order.CombHedgeFlag[:1], Price=price, Volume=volume, TradingDay=self.trading_day,
+            TradeDate=self.trading_day, TradeTime=order.UpdateTime,
+        )
+        sim_order.trades.append(trade)
+        self.trades += 1
+        self._update_position(trade)
+        sim_order.api._post('OnRtnTrade', trade)
+
+    def _update_position(self, trade):
+        # 开仓：买开为多头、卖开为空头；平仓：卖平减多头、买平减空头。持仓方向与 THOST_FTDC_PD_* 一致
+        if trade.OffsetFlag == OFFSET_OPEN:
+            key = (trade.InstrumentID, '2' if trade.Direction == DIRECTION_BUY else '3')
+            self._positions[key] = self._positions.get(key, 0) + trade.Volume
+        else:
+            key = (trade.InstrumentID, '2' if trade.Direction == DIRECTION_SELL else '3')
+            self._positions[key] = max(self._positions.get(key, 0) - trade.Volume, 0)
+
+    def _query_positions(self, instrument=""):
+        with self._lock:
+            rows = []
+            for (instrument_id, direction), volume in self._positions.items():
+                if volume <= 0 or (instrument and instrument != instrument_id):
+                    continue
+                quote = self._quotes.get(instrument_id)
+                price = quote.LastPrice if quote is not None else 0.0
+                rows.append(SimpleNamespace(
+                    InstrumentID=instrument_id, ExchangeID=self.exchange_id, PosiDirection=direction,
+                    HedgeFlag='1', PositionDate='1', Position=volume, TodayPosition=volume, YdPosition=0,
+                    PositionCost=price * volume * 10, OpenCost=price * volume * 10, TradingDay=self.trading_day,
+                ))
+            return rows
+
+    def _query_orders(self, api):
+        with self._lock:
+            return [_copy(sim_order.order) for sim_order in self._orders.values()
+                    if sim_order.api.session_id == api.session_id]
+
+    def _query_trades(self, api):
+        with self._lock:
+            return [trade for sim_order in self._orders.values() if sim_order.api.session_id == api.session_id
+                    for trade in sim_order.trades]
+
+    def _trading_account(self):
+        return SimpleNamespace(TradingDay=self.trading_day, Balance=1000000.0, Available=1000000.0,
+                               CurrMargin=0.0, CloseProfit=0.0, PositionProfit=0.0, Commission=0.0)
+
+    def stats(self):
+        """模拟器统计：行情数、报单数、成交数，以及行情到报单延迟的中位数和 99 分位（秒）"""
+        with self._lock:
+            latencies = sorted(self.latencies)
+        result = {'ticks': self.ticks_sent, 'orders': self.orders, 'trades': self.trades}
+        if latencies:
+            result['latency_p50'] = latencies[len(latencies) // 2]
+            result['latency_p99'] = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+        return result
+
+
+def _copy(order):
+    """回调给 SPI 的报单是当时状态的拷贝，与真实 API 每次回调一个新结构体一致"""
+    return SimpleNamespace(**vars(order))
+
+
+def benchmark(product_name="螺纹钢", ticks=20000, tick_rate=float('inf')):
+    """用模拟器驱动 quant_trade.AutoTradeSpi，测量端到端吞吐和延迟。
+
+    Args:
+        product_name (str): 产品名称。
+        ticks (int): 推送的行情笔数。
+        tick_rate (float): 每秒推送的行情笔数，默认不限速。
+
+    Returns:
+        dict: 模拟器统计加上策略线程处理的行情数和每秒处理笔数。
+    """
+    from quant_trade import AutoTradeSpi
+    from config import get_product_id, get_mainproduct_id
+
+    instrument = get_mainproduct_id(get_product_id(product_name))
+    sim = CTPSimulator(instruments=(instrument,), tick_rate=tick_rate, max_ticks=ticks, seed=1)
+    auto_trade = AutoTradeSpi(product_name, md_api=sim.CreateFtdcMdApi(), td_api=sim.CreateFtdcTraderApi())
+    auto_trade.clock = lambda: sim.exchange_time
+    auto_trade.md_spi.verbose = False  # 逐笔打印和日志会成为瓶颈，测到的是终端输出而不是策略处理
+    started = time.perf_counter()
+    auto_trade.initialize()
+    sim.finished.wait()
+    auto_trade.md_api.wait_idle()  # 推送完成时大部分行情还在行情 API 的回调队列里
+    while not auto_trade.strategy_thread.idle:  # 再等策略线程处理完放入队列的全部行情
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    auto_trade.strategy_thread.stop()
+    auto_trade.timer_thread.stop()
+    auto_trade.md_api.Release()
+    auto_trade.td_api.Release()
+    result = sim.stats()
+    result['processed'] = auto_trade.tick_buffer.popped
+    result['elapsed'] = elapsed
+    result['ticks_per_second'] = result['processed'] / elapsed if elapsed > 0 else float('inf')
+    return result
+
+
+if __name__ == "__main__":
+    print(benchmark())
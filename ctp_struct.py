@@ -0,0 +1,66 @@
+"""CTP 结构体快照。
+
+回调参数是 SWIG 代理对象，只在回调期间有效，回调返回后底层内存即被 API 复用。
+copy_struct() 把任意 CThostFtdc*Field 拷贝成一个 namedtuple，回调返回后仍然有效，可以交给其他线程。
+
+重新编译过的 SWIG 模块为每个结构体生成了 fields（字段顺序）和 to_tuple()（一次本地调用取出全部字段），
+见 traderapi672python38/gen_struct_methods.py；旧版本的模块没有这两个成员时，字段列表从 SWIG 生成的 property
+中读取，再逐字段读取。字段列表和 namedtuple 类型按结构体类缓存；深度行情使用 tick_snapshot 中的 TickSnapshot。
+"""
+from collections import namedtuple
+from types import SimpleNamespace
+
+from tick_snapshot import snapshot
+
+_types = {}  # 结构体类 -> (字段名元组, namedtuple 类型)
+
+
+def struct_fields(cls):
+    """结构体类的字段名，按 SWIG 生成代码中的声明顺序排列。
+
+    Args:
+        cls: CThostFtdc*Field 类。
+
+    Returns:
+        tuple: 字段名元组。
+    """
+    return _struct_type(cls)[0]
+
+
+def _struct_type(cls):
+    entry = _types.get(cls)
+    if entry is None:
+        fields = getattr(cls, 'fields', None)
+        if not isinstance(fields, tuple):
+            fields = []
+            for klass in reversed(cls.__mro__):
+                for name, value in vars(klass).items():
+                    if isinstance(value, property) and name != 'thisown' and not name.startswith('_') \
+                            and name not in fields:
+                        fields.append(name)
+            fields = tuple(fields)
+        name = cls.__name__ if cls.__name__.isidentifier() else 'CtpStruct'
+        entry = _types[cls] = (fields, namedtuple(name, fields, rename=True))
+    return entry
+
+
+def copy_struct(obj):
+    """把 CTP 结构体拷贝成 namedtuple。
+
+    Args:
+        obj: CThostFtdc*Field、已经拷贝过的快照，或 None。
+
+    Returns:
+        namedtuple: 与结构体同名、字段相同的快照（模拟器的 SimpleNamespace 返回其副本）；obj 为 None 时返回 None。
+    """
+    if obj is None or isinstance(obj, tuple):
+        return obj
+    if type(obj).__name__ == 'CThostFtdcDepthMarketDataField':
+        return snapshot(obj)
+    if isinstance(obj, SimpleNamespace):
+        return SimpleNamespace(**vars(obj))  # 模拟器使用的结构体
+    fields, struct_type = _struct_type(type(obj))
+    to_tuple = getattr(obj, 'to_tuple', None)
+    if to_tuple is not None:
+        return struct_type._make(to_tuple())
+    return struct_type._make([getattr(obj, name) for name in fields])
@@ -1,8 +1,16 @@
 import os
+import asyncio
 import logging  # 导入 logging 模块
+from datetime import datetime
 from thostmduserapi import CThostFtdcMdApi, CThostFtdcMdSpi, CThostFtdcReqUserLoginField
 from thosttraderapi import CThostFtdcTraderApi, CThostFtdcTraderSpi, CThostFtdcReqAuthenticateField, \
-    CThostFtdcReqUserLoginField
+    CThostFtdcReqUserLoginField, CThostFtdcQryInstrumentField, CThostFtdcQryInvestorPositionField, \
+    CThostFtdcQryTradingAccountField, CThostFtdcQryInstrumentCommissionRateField, CThostFtdcQryInstrumentMarginRateField
+from tick_journal import TickJournal
+from tick_snapshot import TickSnapshot
+from subscription_manager import SubscriptionManager
+from query_scheduler import QueryScheduler
+from request_manager import RequestManager
 from config import MARKET_DATA_ADDRESS, TRADING_ADDRESS, BROKER_ID, USER_ID, PASSWORD, INVESTOR_ID, APP_ID, AUTH_CODE
 
 # %% 设置工作目录
@@ -27,11 +35,67 @@ td_logger.addHandler(td_handler)
 
 class MdSpiImpl(CThostFtdcMdSpi):
     """行情API"""
+    api_class = CThostFtdcMdApi  # 创建API的类，测试和压测时可替换为 ctp_simulator.CTPSimulator 实例
 
     def __init__(self, log_path="logs"):
         super().__init__()
         self.api = None  # 声明类中要用的变量：api变量
         self.log_path = log_path  # 日志文件夹路径
+        self.journal = None  # 行情记录器，开启记录模式后才创建
+        self.batch_spi = None  # 原生层的行情过滤与批量投递，开启后代替本 SPI 注册给行情API
+        self.clock = datetime.now  # 时钟，回放时替换为行情自身的交易所时间
+        self.requests = RequestManager()  # 分配请求ID
+        self.subscriptions = SubscriptionManager(self._send_subscribe, self._send_unsubscribe)  # 订阅管理
+
+    def enable_recorder(self, journal_dir=None, capacity=100000):
+        """开启记录模式，逐笔行情按交易日写入定长二进制日志文件。
+
+        Args:
+            journal_dir (str): 日志目录，默认为 <log_path>/market_data/ticks。
+            capacity (int): 每个文件预先分配的记录数。
+        """
+        if journal_dir is None:
+            journal_dir = os.path.join(self.log_path, "market_data", "ticks")
+        self.journal = TickJournal(journal_dir, capacity)
+
+    def disable_recorder(self):
+        """关闭记录模式并关闭日志文件"""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def enable_batching(self, instruments=None, max_latency=0.005, max_batch=1024):
+        """开启原生层的行情过滤和批量投递，需要在 initialize() 之前调用。
+
+        开启后深度行情不再逐笔进入 Python：C++ 层按合约白名单过滤后放进队列，队列中最早一笔行情等待
+        max_latency 秒或攒够 max_batch 笔后，一次调用 OnRtnDepthMarketDataBatch(ticks)；其他回调照常转交本 SPI。
+        之后可以用 self.batch_spi.SetInstruments(instruments) 修改白名单。
+
+        Args:
+            instruments (iterable): 合约白名单，None 表示不过滤。
+            max_latency (float): 行情在队列中的最长等待时间，单位秒。
+            max_batch (int): 攒够这么多笔行情立即投递。
+        """
+        from thostmduserapi import CtpBatchingMdSpi  # 重新编译过的 thostmduserapi 才有
+        self.batch_spi = CtpBatchingMdSpi(self, self.OnRtnDepthMarketDataBatch, int(max_latency * 1e6), max_batch)
+        self.batch_spi.SetInstruments(instruments)
+
+    def disable_batching(self):
+        """停止原生层的投递线程（先投递完队列中的行情）并释放批量 SPI，需要在行情API Release() 之后调用。
+
+        批量 SPI 持有 OnRtnDepthMarketDataBatch 这个绑定方法，与本 SPI 互相引用，不停止就不会被回收。
+        """
+        if self.batch_spi is not None:
+            self.batch_spi.Stop()
+            self.batch_spi = None
+
+    def close(self):
+        """释放行情API，再停止批量投递、关闭行情日志"""
+        if self.api is not None:
+            self.api.Release()
+            self.api = None
+        self.disable_batching()
+        self.disable_recorder()
 
     def initialize(self):
         md_log_path = os.path.join(self.log_path, "market_data")  # 行情日志文件夹
@@ -40,9 +104,9 @@ class MdSpiImpl(CThostFtdcMdSpi):
         flow_path = os.path.join(md_log_path, "flow_logs", USER_ID)
         if not os.path.exists(flow_path):
             os.makedirs(flow_path)  # 创建用户日志文件夹
-        self.api = CThostFtdcMdApi.CreateFtdcMdApi(flow_path)  # 初始化API并指定日志文件夹路径
+        self.api = self.api_class.CreateFtdcMdApi(flow_path)  # 初始化API并指定日志文件夹路径
         self.api.RegisterFront(MARKET_DATA_ADDRESS)  # 注册行情前置地址
-        self.api.RegisterSpi(self)  # 注册行情SPI
+        self.api.RegisterSpi(self if self.batch_spi is None else self.batch_spi)  # 注册行情SPI
         self.api.Init()  # 初始化行情API
 
     def OnFrontConnected(self):
@@ -59,7 +123,33 @@ class MdSpiImpl(CThostFtdcMdSpi):
             return
         print("行情API登录成功.")
         md_logger.info("行情API登录成功。")
+        self.subscriptions.on_login()  # 登录（含断线重连后的登录）后按差集补订阅
+
+    def OnFrontDisconnected(self, nReason):
+        """连接断开，API 会自动重连，重连登录后再重新订阅"""
+        print(f"行情API连接断开, 原因: {nReason}")
+        md_logger.warning(f"行情API连接断开, 原因: {nReason}")
+        self.subscriptions.on_disconnected()
+
+    def OnRspSubMarketData(self, pSpecificInstrument, pRspInfo, nRequestID, bIsLast):
+        """订阅行情应答"""
+        if pSpecificInstrument is None:
+            return
+        if pRspInfo is not None and pRspInfo.ErrorID != 0:
+            md_logger.error(f"订阅行情失败: {pSpecificInstrument.InstrumentID}, {pRspInfo.ErrorMsg}")
+            self.subscriptions.on_rsp_sub(pSpecificInstrument.InstrumentID, pRspInfo.ErrorID, pRspInfo.ErrorMsg)
+            return
+        self.subscriptions.on_rsp_sub(pSpecificInstrument.InstrumentID)
 
+    def OnRtnDepthMarketDataBatch(self, ticks):
+        """批量行情回报，开启 enable_batching 后由原生层的投递线程调用，默认逐笔转交 OnRtnDepthMarketData。
+
+        Args:
+            ticks (list): 行情元组列表，字段顺序与 tick_snapshot.DEPTH_MARKET_DATA_FIELDS 一致。
+        """
+        on_tick = self.OnRtnDepthMarketData
+        for tick in ticks:
+            on_tick(TickSnapshot._make(tick))
 
     def OnRspError(self, pRspInfo, nRequestID, bIsLast):
         """错误响应"""
@@ -71,22 +161,44 @@ class MdSpiImpl(CThostFtdcMdSpi):
         req.BrokerID = BROKER_ID  # 设置经纪公司ID
         req.UserID = USER_ID  # 设置用户ID
         req.Password = PASSWORD  # 设置用户密码
-        self.api.ReqUserLogin(req, 0)  # 发送登录请求
+        self.api.ReqUserLogin(req, self.requests.next_id())  # 发送登录请求
 
     def SubscribeMarketData(self, instruments_id):
+        """订阅行情。合约交给订阅管理器去重、分批发送，登录前调用时会等登录成功后再发送。
+
+        Args:
+            instruments_id (list): 合约代码列表。
+        """
+        self.subscriptions.subscribe(instruments_id)
+
+    def UnSubscribeMarketData(self, instruments_id):
+        """退订行情"""
+        self.subscriptions.unsubscribe(instruments_id)
+
+    def _send_subscribe(self, instruments_id):
         if self.api is None:
             raise RuntimeError("API is not initialized.")
         instruments = [x.encode('utf-8') for x in instruments_id]  # 定义要订阅的合约ID列表，并进行UTF-8编码
-        self.api.SubscribeMarketData(instruments, len(instruments))  # 订阅行情数据
+        return self.api.SubscribeMarketData(instruments, len(instruments))  # 订阅行情数据
+
+    def _send_unsubscribe(self, instruments_id):
+        if self.api is None:
+            raise RuntimeError("API is not initialized.")
+        instruments = [x.encode('utf-8') for x in instruments_id]
+        return self.api.UnSubscribeMarketData(instruments, len(instruments))
 
 
 
 # 创建交易API实例
 class TdSpiImpl(CThostFtdcTraderSpi):
+    api_class = CThostFtdcTraderApi  # 创建API的类，测试和压测时可替换为 ctp_simulator.CTPSimulator 实例
+
     def __init__(self, log_path="logs"):
         super().__init__()
         self.api = None  # 声明API变量
         self.log_path = log_path  # 日志文件夹路径
+        self.requests = RequestManager()  # 分配请求ID，把应答汇总到 Future
+        self.queries = QueryScheduler(self._send_query, requests=self.requests)  # 查询调度，按流控排队发送全部 ReqQry*
 
     def initialize(self):
         td_log_path = os.path.join(self.log_path, "trading_data")  # 交易日志文件夹
@@ -95,7 +207,7 @@ class TdSpiImpl(CThostFtdcTraderSpi):
         flow_path = os.path.join(td_log_path, "flow_logs", USER_ID)
         if not os.path.exists(flow_path):
             os.makedirs(flow_path)  # 创建用户日志文件夹
-        self.api = CThostFtdcTraderApi.CreateFtdcTraderApi(flow_path)  # 初始化交易API并传递日志文件夹路径
+        self.api = self.api_class.CreateFtdcTraderApi(flow_path)  # 初始化交易API并传递日志文件夹路径
         # 注册交易前置地址和SPI
         self.api.RegisterFront(TRADING_ADDRESS)  # 注册交易前置地址
         self.api.RegisterSpi(self)  # 注册交易SPI
@@ -139,15 +251,75 @@ class TdSpiImpl(CThostFtdcTraderSpi):
         if pRspInfo:
             print("登录响应", pRspInfo.ErrorID, pRspInfo.ErrorMsg)
             td_logger.info(f"登录响应: {pRspInfo.ErrorID}, {pRspInfo.ErrorMsg}")
+        if pRspInfo is None or pRspInfo.ErrorID == 0:
+            self.queries.on_login()  # 登录（含断线重连后的登录）后开始发送排队中的查询
         # super().OnRspUserLogin(pRspUserLogin, pRspInfo, nRequestID, bIsLast)  # 调用父类方法
 
+    def OnFrontDisconnected(self, nReason):
+        """连接断开，API 会自动重连，在途的查询在重新登录后重发"""
+        print(f"交易API连接断开, 原因: {nReason}")
+        td_logger.warning(f"交易API连接断开, 原因: {nReason}")
+        self.queries.on_disconnected()
+
+    def _send_query(self, method, req, request_id):
+        return getattr(self.api, method)(req, request_id)
+
+    def query(self, method, req=None):
+        """提交一个查询，登录之前提交的查询在登录成功后发送。
+
+        Args:
+            method (str): 查询方法名，如 'ReqQryInvestorPosition'。
+            req: 查询请求结构体。
+
+        Returns:
+            Future: 以应答快照列表完成的 concurrent.futures.Future，失败时抛出 RequestError。
+        """
+        return self.queries.submit(method, req).future
+
+    async def aquery(self, method, req=None):
+        """query() 的 asyncio 版本，等待并返回应答快照列表"""
+        return await asyncio.wrap_future(self.query(method, req))
+
+    def bootstrap(self, callback=None):
+        """启动时查询合约、持仓、资金和费率，由查询调度器按流控依次发送。
+
+        应答仍由各个 OnRspQry* 回调处理；子类重写这些回调时需要调用父类方法，查询调度器才能知道查询已完成。
+
+        Args:
+            callback (callable): 每个查询完成时调用，参数为 QueryRequest。
+
+        Returns:
+            list: QueryRequest 列表，可以用 self.queries.join() 等待全部完成。
+        """
+        instrument = CThostFtdcQryInstrumentField()
+        position = CThostFtdcQryInvestorPositionField()
+        position.BrokerID = BROKER_ID
+        position.InvestorID = INVESTOR_ID
+        account = CThostFtdcQryTradingAccountField()
+        account.BrokerID = BROKER_ID
+        account.InvestorID = INVESTOR_ID
+        commission = CThostFtdcQryInstrumentCommissionRateField()
+        commission.BrokerID = BROKER_ID
+        commission.InvestorID = INVESTOR_ID
+        margin = CThostFtdcQryInstrumentMarginRateField()
+        margin.BrokerID = BROKER_ID
+        margin.InvestorID = INVESTOR_ID
+        margin.HedgeFlag = '1'  # 投机
+        return [
+            self.queries.submit('ReqQryInstrument', instrument, callback),
+            self.queries.submit('ReqQryInvestorPosition', position, callback),
+            self.queries.submit('ReqQryTradingAccount', account, callback),
+            self.queries.submit('ReqQryInstrumentCommissionRate', commission, callback),
+            self.queries.submit('ReqQryInstrumentMarginRate', margin, callback),
+        ]
+
     def ReqAuthenticate(self):
         req = CThostFtdcReqAuthenticateField()  # 创建认证请求结构体
         req.BrokerID = BROKER_ID  # 设置经纪公司ID
         req.UserID = USER_ID  # 设置用户ID
         req.AppID = APP_ID  # 设置应用ID
         req.AuthCode = AUTH_CODE  # 设置认证码
-        self.api.ReqAuthenticate(req, 0)  # 发送认证请求
+        self.api.ReqAuthenticate(req, self.requests.next_id())  # 发送认证请求
 
     def UserLogin(self):
         req = CThostFtdcReqUserLoginField()  # 创建用户登录请求结构体
@@ -155,7 +327,23 @@ class TdSpiImpl(CThostFtdcTraderSpi):
         req.UserID = USER_ID  # 设置用户ID
         req.Password = PASSWORD  # 设置用户密码
         req.InvestorID = INVESTOR_ID  # 设置投资者ID
-        self.api.ReqUserLogin(req, 0)  # 发送登录请求
+        self.api.ReqUserLogin(req, self.requests.next_id())  # 发送登录请求
+
+def _query_forwarder(name):
+    def forward(self, pData, pRspInfo, nRequestID, bIsLast):
+        if self.queries.on_rsp(nRequestID, pRspInfo, bIsLast, pData) is None:
+            self.requests.on_rsp(pData, pRspInfo, nRequestID, bIsLast)  # 不经查询调度器直接发送的查询
+    forward.__name__ = name
+    forward.__doc__ = "查询应答，转交给查询调度器汇总"
+    return forward
+
+
+# 为全部 ReqQry* 对应的 OnRspQry* 生成默认实现，汇总应答并释放查询调度器的在途名额
+QUERY_METHODS = tuple(name for name in dir(CThostFtdcTraderApi) if name.startswith('ReqQry'))
+for _method in QUERY_METHODS:
+    _callback = 'OnRspQry' + _method[len('ReqQry'):]
+    setattr(TdSpiImpl, _callback, _query_forwarder(_callback))
+
 
 if __name__ == "__main__":
     # ———————————— 运行行情API ————————————
@@ -0,0 +1,227 @@
+"""批量撤单。
+
+行情剧烈变化时需要在几毫秒内撤掉几百笔挂单。MassCanceller 按过滤条件（合约、策略、买卖方向）
+从 OrderManager 的挂单集合中选出本进程发出的报单（include_foreign=True 时也包括其他会话、其他进程的报单），然后：
+    - 撤本会话在某个交易所的全部挂单、且该交易所支持批量操作时，用一个 ReqBatchOrderAction 撤掉；
+    - 否则逐笔连续发送 ReqOrderAction，不等待任何应答，撤单请求结构体只创建一次，每笔只改报单相关的字段。
+
+撤单是否成功由 OrderManager 的报单状态机确认：报单进入 CANCELLED（或先全部成交）即完成；
+撤单被拒绝时 OrderManager 清除撤单标记，可以再次撤单。批量撤单被拒绝时（OnRspBatchOrderAction /
+OnErrRtnBatchOrderAction）自动退回逐笔撤单。
+
+用法：
+    canceller = MassCanceller(td_api, order_manager)
+    batch = canceller.cancel(instrument_id='rb2410', direction='0')
+    batch.outstanding()  # 尚未确认撤销的报单
+"""
+import logging
+import threading
+from datetime import datetime
+
+from thosttraderapi import CThostFtdcInputOrderActionField, CThostFtdcInputBatchOrderActionField
+from request_manager import RequestManager
+
+logger = logging.getLogger('trading_data_logger')
+
+ACTION_DELETE = '0'  # THOST_FTDC_AF_Delete
+# 支持 ReqBatchOrderAction 的交易所，以期货公司柜台的实际支持情况为准
+BATCH_ACTION_EXCHANGES = frozenset(('CFFEX',))
+
+
+class CancelBatch:
+    """一次批量撤单涉及的报单。
+
+    Attributes:
+        orders (list): 发出撤单请求的 ManagedOrder 列表。
+        batch_requests (int): 使用 ReqBatchOrderAction 的请求数。
+        order_requests (int): 逐笔发送的 ReqOrderAction 数。
+    """
+
+    def __init__(self):
+        self.orders = []
+        self.batch_requests = 0
+        self.order_requests = 0
+
+    def outstanding(self):
+        """尚未完成（未撤销也未全部成交）的报单"""
+        return [order for order in self.orders if order.is_working]
+
+    @property
+    def done(self):
+        """全部报单都已完成"""
+        return not any(order.is_working for order in self.orders)
+
+    def __len__(self):
+        return len(self.orders)
+
+
+class MassCanceller:
+    """按过滤条件撤单，线程安全（策略线程、定时器线程都可以调用）。"""
+
+    def __init__(self, td_api, order_manager, broker_id="", investor_id="", user_id="",
+                 batch_exchanges=BATCH_ACTION_EXCHANGES, clock=datetime.now, requests=None):
+        """初始化批量撤单。
+
+        Args:
+            td_api: 交易API实例。
+            order_manager (OrderManager): 报单管理器。
+            broker_id (str): 经纪公司代码。
+            investor_id (str): 投资者代码。
+            user_id (str): 用户代码。
+            batch_exchanges (iterable): 支持 ReqBatchOrderAction 的交易所，空集合表示总是逐笔撤单。
+            clock (callable): 记录撤单时间（ManagedOrder.cancel_time）的时钟函数。
+            requests (RequestManager): 分配请求ID的请求管理器，与其他请求共用以保证请求ID不重复。
+        """
+        self.td_api = td_api
+        self.order_manager = order_manager
+        self.batch_exchanges = frozenset(batch_exchanges)
+        self.clock = clock
+        self.requests = requests if requests is not None else RequestManager()
+        self._batches = {}  # 请求ID -> 用 ReqBatchOrderAction 撤销的报单列表
+        self._lock = threading.Lock()
+
+        # 撤单请求结构体只创建一次，静态字段只设置一次（CTP 在请求函数返回前已拷贝请求内容）
+        self._action = CThostFtdcInputOrderActionField()
+        self._action.BrokerID = broker_id
+        self._action.InvestorID = investor_id
+        self._action.UserID = user_id
+        self._action.ActionFlag = ACTION_DELETE
+        self._batch_action = CThostFtdcInputBatchOrderActionField()
+        self._batch_action.BrokerID = broker_id
+        self._batch_action.InvestorID = investor_id
+        self._batch_action.UserID = user_id
+
+    def select(self, instrument_id=None, strategy=None, direction=None, include_foreign=False):
+        """按过滤条件选出可以撤销的挂单（已发出撤单请求的除外）。
+
+        Args:
+            instrument_id (str): 合约代码，None 表示全部合约。
+            strategy (str): 策略名称，None 表示全部策略。
+            direction (str): 买卖方向，'0' 买、'1' 卖，None 表示两个方向。
+            include_foreign (bool): 是否包括不是本进程发出的报单（其他会话、其他进程、重启前的挂单）。
+
+        Returns:
+            list: ManagedOrder 列表。
+        """
+        return [order for order in self.order_manager.working_orders(instrument_id)
+                if order.cancel_time is None
+                and (include_foreign or order.own)
+                and (strategy is None or order.strategy == strategy)
+                and (direction is None or order.direction == direction)]
+
+    def cancel(self, instrument_id=None, strategy=None, direction=None, include_foreign=False):
+        """撤销符合过滤条件的全部挂单，不等待应答。
+
+        Args:
+            instrument_id (str): 合约代码，None 表示全部合约。
+            strategy (str): 策略名称，None 表示全部策略。
+            direction (str): 买卖方向，'0' 买、'1' 卖，None 表示两个方向。
+            include_foreign (bool): 是否也撤销不是本进程发出的报单。
+
+        Returns:
+            CancelBatch: 本次撤单涉及的报单。
+        """
+        batch = CancelBatch()
+        orders = self.select(instrument_id, strategy, direction, include_foreign)
+        if not orders:
+            return batch
+        remaining = orders
+        if self.batch_exchanges and instrument_id is None and strategy is None and direction is None:
+            remaining = self._cancel_by_exchange(orders, batch)
+        with self._lock:
+            for order in remaining:
+                self._send_order_action(order, batch)
+        return batch
+
+    def cancel_order(self, order):
+        """撤销一笔报单。
+
+        Args:
+            order (ManagedOrder): 要撤销的报单。
+
+        Returns:
+            bool: 是否发出了撤单请求（已完成或已在撤单中的报单不再发送）。
+        """
+        if not order.is_working or order.cancel_time is not None:
+            return False
+        with self._lock:
+            return self._send_order_action(order, None) == 0
+
+    def _cancel_by_exchange(self, orders, batch):
+        """本会话在支持批量操作的交易所的报单用 ReqBatchOrderAction 撤销，返回其余需要逐笔撤销的报单"""
+        manager = self.order_manager
+        own = {}  # ExchangeID -> 本会话的报单
+        remaining = []
+        for order in orders:
+            if order.exchange_id in self.batch_exchanges and order.front_id == manager.front_id \
+                    and order.session_id == manager.session_id:
+                own.setdefault(order.exchange_id, []).append(order)
+            else:
+                remaining.append(order)
+        with self._lock:
+            # 已全部完成的批量撤单不会再有应答，不再保留
+            self._batches = {request_id: batch_orders for request_id, batch_orders in self._batches.items()
+                             if any(order.is_working for order in batch_orders)}
+            action = self._batch_action
+            for exchange_id, exchange_orders in own.items():
+                request_id = self.requests.next_id()
+                action.FrontID = manager.front_id
+                action.SessionID = manager.session_id
+                action.ExchangeID = exchange_id
+                action.RequestID = request_id
+                self._batches[request_id] = exchange_orders
+                now = self.clock()
+                for order in exchange_orders:
+                    order.cancel_time = now  # 先标记再发送，撤单被拒绝的回报可能先于函数返回到达
+                ret = self.td_api.ReqBatchOrderAction(action, request_id)
+                if ret != 0:
+                    del self._batches[request_id]
+                    for order in exchange_orders:
+                        order.cancel_time = None
+                    remaining.extend(exchange_orders)
+                    continue
+                batch.batch_requests += 1
+                batch.orders.extend(exchange_orders)
+        return remaining
+
+    def _send_order_action(self, order, batch):
+        """发送一笔 ReqOrderAction，调用方持有锁"""
+        action = self._action
+        action.InstrumentID = order.instrument_id
+        action.ExchangeID = order.exchange_id
+        action.OrderSysID = order.order_sys_id
+        action.FrontID = order.front_id
+        action.SessionID = order.session_id
+        action.OrderRef = order.order_ref
+        request_id = self.requests.next_id()
+        action.RequestID = request_id
+        order.cancel_time = self.clock()  # 先标记再发送，撤单被拒绝的回报可能先于函数返回到达
+        ret = self.td_api.ReqOrderAction(action, request_id)
+        if ret != 0:
+            order.cancel_time = None
+            logger.error(f"撤单请求发送失败: {order.key}, 返回码: {ret}")
+            return ret
+        if batch is not None:
+            batch.order_requests += 1
+            batch.orders.append(order)
+        return ret
+
+    # ---------- 由交易 SPI 回调驱动 ----------
+
+    def on_rsp_batch_order_action(self, request_id, pRspInfo):
+        """OnRspBatchOrderAction / OnErrRtnBatchOrderAction 中调用，批量撤单被拒绝时退回逐笔撤单。
+
+        Args:
+            request_id (int): 批量撤单的请求ID。
+            pRspInfo: 响应信息。
+        """
+        if pRspInfo is None or pRspInfo.ErrorID == 0:
+            return
+        with self._lock:
+            orders = self._batches.pop(request_id, None)
+            if orders is None:
+                return
+            logger.warning(f"批量撤单失败, 改为逐笔撤单: {pRspInfo.ErrorMsg}")
+            for order in orders:
+                if order.is_working:
+                    self._send_order_action(order, None)
@@ -0,0 +1,399 @@
+"""价格-时间优先的模拟撮合引擎。
+
+接收 CThostFtdcInputOrderField（如 AutoTradeSpi.PlaceOrder 发出的报单），与回放的深度行情
+（CThostFtdcDepthMarketDataField / TickSnapshot）撮合，用于纸面交易，不必受 SimNow 的流控限制。
+
+撮合规则：
+    - 主动报单与最新一笔行情的对手方五档挂单撮合，按档位价格成交；同一笔行情内被吃掉的挂单量
+      会被扣减，直到下一笔行情到来。
+    - 剩余部分按价格-时间优先挂在本地订单簿上，排队位置取挂单时该价位的行情挂单量（排在它们之后）。
+    - 之后每笔行情：
+        对手价达到或越过挂单价，或最新价越过挂单价：挂单全部成交；
+        最新价等于挂单价：按累计成交量的增量先消耗排在前面的量，剩余部分成交给挂单；
+        该价位的行情挂单量减少到排队量以下时，视为前面有撤单，排队量随之减少。
+    - 本地的报单之间不互相撮合（同一账户自成交会被交易所限制）。
+    - 立即完成否则撤销（TimeCondition='1'）的剩余部分撤销；全部成交否则撤销（VolumeCondition='3'）
+      的报单在可成交量不足时整笔撤销；任意价（OrderPriceType='1'）按立即完成否则撤销处理。
+
+引擎本身不加锁，多线程使用时由调用方加锁（如 ctp_simulator.CTPSimulator）。
+"""
+import random
+import time
+from bisect import bisect_left, insort
+from collections import deque
+
+from tick_snapshot import TickSnapshot, DEPTH_MARKET_DATA_FIELDS
+
+# 报单状态（THOST_FTDC_OST_*）
+ORDER_ALL_TRADED = '0'
+ORDER_PART_TRADED_QUEUEING = '1'
+ORDER_NO_TRADE_QUEUEING = '3'
+ORDER_CANCELED = '5'
+
+DIRECTION_BUY = '0'
+DIRECTION_SELL = '1'
+PRICE_TYPE_ANY = '1'  # THOST_FTDC_OPT_AnyPrice
+TIME_CONDITION_IOC = '1'  # THOST_FTDC_TC_IOC
+VOLUME_CONDITION_CV = '3'  # THOST_FTDC_VC_CV，全部数量
+
+_BID_PRICES = tuple(f'BidPrice{level}' for level in range(1, 6))
+_BID_VOLUMES = tuple(f'BidVolume{level}' for level in range(1, 6))
+_ASK_PRICES = tuple(f'AskPrice{level}' for level in range(1, 6))
+_ASK_VOLUMES = tuple(f'AskVolume{level}' for level in range(1, 6))
+
+
+class EngineOrder:
+    """引擎中的一笔报单。
+
+    Attributes:
+        order_id (int): 引擎内的序号，也是时间优先的依据。
+        owner: 调用方附带的对象，引擎不使用。
+        instrument_id (str): 合约代码。
+        direction (str): 买卖方向，'0' 买，'1' 卖。
+        price (float): 限价。
+        volume (int): 报单数量。
+        traded (int): 已成交数量。
+        status (str): 报单状态（THOST_FTDC_OST_*）。
+        queue_ahead (int): 挂单时排在前面的行情挂单量。
+    """
+    __slots__ = ('order_id', 'owner', 'instrument_id', 'direction', 'price', 'volume', 'traded', 'status',
+                 'queue_ahead', 'ioc', 'all_or_none')
+
+    def __init__(self, order_id, owner, instrument_id, direction, price, volume, ioc, all_or_none):
+        self.order_id = order_id
+        self.owner = owner
+        self.instrument_id = instrument_id
+        self.direction = direction
+        self.price = price
+        self.volume = volume
+        self.traded = 0
+        self.status = ORDER_NO_TRADE_QUEUEING
+        self.queue_ahead = 0
+        self.ioc = ioc
+        self.all_or_none = all_or_none
+
+    @property
+    def remaining(self):
+        return self.volume - self.traded
+
+    @property
+    def is_active(self):
+        return self.status in (ORDER_NO_TRADE_QUEUEING, ORDER_PART_TRADED_QUEUEING)
+
+    def __repr__(self):
+        return (f"EngineOrder({self.order_id} {self.instrument_id} {'买' if self.direction == DIRECTION_BUY else '卖'} "
+                f"{self.traded}/{self.volume}@{self.price} 状态={self.status} 排队={self.queue_ahead})")
+
+
+class _OrderBook:
+    """单个合约的本地挂单簿和最新行情"""
+    __slots__ = ('bids', 'asks', 'bid_prices', 'ask_prices', 'quote', 'last_volume', 'trading_day',
+                 'bid_levels', 'ask_levels')
+
+    def __init__(self):
+        self.bids = {}  # 价格 -> deque[EngineOrder]
+        self.asks = {}
+        self.bid_prices = []  # 升序，最后一个为最高买价
+        self.ask_prices = []  # 升序，第一个为最低卖价
+        self.quote = None
+        self.last_volume = None
+        self.trading_day = None
+        self.bid_levels = []  # 最新行情的买方五档 [[价格, 剩余可成交量], ...]，主动卖单成交后扣减
+        self.ask_levels = []
+
+
+def _levels(quote, prices, volumes):
+    levels = []
+    for price_field, volume_field in zip(prices, volumes):
+        volume = getattr(quote, volume_field)
+        if volume > 0:
+            levels.append([getattr(quote, price_field), volume])
+    return levels
+
+
+class MatchingEngine:
+    """按合约撮合本地报单与行情。
+
+    Attributes:
+        events (int): 处理过的报单事件数（报单、撤单）。
+        fills (int): 成交笔数。
+    """
+
+    def __init__(self, on_order=None, on_trade=None):
+        """初始化撮合引擎。
+
+        Args:
+            on_order (callable): 报单状态变化（成交、撤单）时的回调，参数为 EngineOrder。
+            on_trade (callable): 成交回调，参数为 (EngineOrder, 成交价, 成交量)，在对应的 on_order 之后调用。
+        """
+        self.on_order = on_order
+        self.on_trade = on_trade
+        self._books = {}  # InstrumentID -> _OrderBook
+        self._next_id = 0
+        self.events = 0
+        self.fills = 0
+
+    def _book(self, instrument_id):
+        book = self._books.get(instrument_id)
+        if book is None:
+            book = self._books[instrument_id] = _OrderBook()
+        return book
+
+    def insert(self, req, owner=None):
+        """报单。
+
+        Args:
+            req: CThostFtdcInputOrderField 或带相同字段的对象（InstrumentID、Direction、LimitPrice、
+                VolumeTotalOriginal、OrderPriceType、TimeCondition、VolumeCondition）。
+            owner: 附带在 EngineOrder 上的对象，回调时原样带回。
+
+        Returns:
+            EngineOrder: 引擎中的报单，立即成交或撤销时状态已更新。
+        """
+        self.events += 1
+        self._next_id += 1
+        buy = req.Direction == DIRECTION_BUY
+        any_price = req.OrderPriceType == PRICE_TYPE_ANY
+        price = (float('inf') if buy else float('-inf')) if any_price else req.LimitPrice
+        order = EngineOrder(self._next_id, owner, req.InstrumentID, req.Direction, price,
+                            req.VolumeTotalOriginal, any_price or req.TimeCondition == TIME_CONDITION_IOC,
+                            req.VolumeCondition == VOLUME_CONDITION_CV)
+        book = self._book(order.instrument_id)
+        levels = book.ask_levels if buy else book.bid_levels
+
+        # 全部成交否则撤销：先检查对手方可成交量
+        if order.all_or_none:
+            available = 0
+            for level_price, level_volume in levels:
+                if (level_price > price) if buy else (level_price < price):
+                    break
+                available += level_volume
+            if available < order.volume:
+                self._finish(order, ORDER_CANCELED)
+                return order
+
+        # 与最新行情的对手方五档撮合
+        for level in levels:
+            if order.traded == order.volume:
+                break
+            level_price, level_volume = level
+            if (level_price > price) if buy else (level_price < price):
+                break
+            if level_volume <= 0:
+                continue
+            volume = min(level_volume, order.volume - order.traded)
+            level[1] -= volume
+            self._fill(order, level_price, volume)
+
+        if order.traded == order.volume:
+            return order
+        if order.ioc:
+            self._finish(order, ORDER_CANCELED)
+            return order
+
+        # 剩余部分挂单，排在该价位的行情挂单量之后
+        quote = book.quote
+        if quote is not None:
+            prices, volumes = (_BID_PRICES, _BID_VOLUMES) if buy else (_ASK_PRICES, _ASK_VOLUMES)
+            for price_field, volume_field in zip(prices, volumes):
+                if getattr(quote, price_field) == price:
+                    order.queue_ahead = getattr(quote, volume_field)
+                    break
+        side, prices = (book.bids, book.bid_prices) if buy else (book.asks, book.ask_prices)
+        queue = side.get(price)
+        if queue is None:
+            queue = side[price] = deque()
+            insort(prices, price)
+        queue.append(order)
+        return order
+
+    def cancel(self, order):
+        """撤单。
+
+        Args:
+            order (EngineOrder): insert() 返回的报单。
+
+        Returns:
+            bool: 是否撤单成功，报单已全部成交或已撤销时返回 False。
+        """
+        self.events += 1
+        if not order.is_active:
+            return False
+        book = self._books[order.instrument_id]
+        side, prices = (book.bids, book.bid_prices) if order.direction == DIRECTION_BUY else \
+            (book.asks, book.ask_prices)
+        queue = side[order.price]
+        queue.remove(order)
+        if not queue:
+            del side[order.price]
+            del prices[bisect_left(prices, order.price)]
+        self._finish(order, ORDER_CANCELED)
+        return True
+
+    def on_quote(self, quote):
+        """用一笔行情撮合挂单。
+
+        Args:
+            quote: CThostFtdcDepthMarketDataField 或 TickSnapshot。
+        """
+        book = self._book(quote.InstrumentID)
+        if book.trading_day == quote.TradingDay and book.last_volume is not None:
+            traded = max(quote.Volume - book.last_volume, 0)
+        else:
+            traded = 0
+            book.trading_day = quote.TradingDay
+        book.last_volume = quote.Volume
+        book.quote = quote
+        book.bid_levels = _levels(quote, _BID_PRICES, _BID_VOLUMES)
+        book.ask_levels = _levels(quote, _ASK_PRICES, _ASK_VOLUMES)
+        last_price = quote.LastPrice
+        if book.bid_prices:
+            self._match_side(book, book.bids, book.bid_prices, True, quote.AskPrice1, last_price, traded,
+                             _BID_PRICES, _BID_VOLUMES, quote)
+        if book.ask_prices:
+            self._match_side(book, book.asks, book.ask_prices, False, quote.BidPrice1, last_price, traded,
+                             _ASK_PRICES, _ASK_VOLUMES, quote)
+
+    def _match_side(self, book, side, prices, buy, opposite, last_price, traded, price_fields, volume_fields,
+                    quote):
+        # 从最优价开始，逐档检查是否被对手价或最新价穿过
+        while prices:
+            price = prices[-1] if buy else prices[0]
+            if buy:
+                through = (opposite > 0 and opposite <= price) or last_price < price
+            else:
+                through = (opposite > 0 and opposite >= price) or last_price > price
+            if through:
+                for order in side.pop(price):
+                    self._fill(order, price, order.volume - order.traded)
+                prices.pop(-1 if buy else 0)
+                continue
+            if last_price == price and traded > 0:
+                # 成交量先消耗排在前面的量，超出部分按时间先后成交给挂单
+                queue = side[price]
+                left = traded
+                filled = False
+                for order in queue:
+                    if left <= 0:
+                        break
+                    ahead = order.queue_ahead
+                    order.queue_ahead = max(ahead - left, 0)
+                    if left > ahead:
+                        volume = min(left - ahead, order.volume - order.traded)
+                        left -= volume
+                        self._fill(order, price, volume)
+                        filled = filled or order.status == ORDER_ALL_TRADED
+                if filled:
+                    queue = deque(order for order in queue if order.status != ORDER_ALL_TRADED)
+                    if queue:
+                        side[price] = queue
+                    else:
+                        del side[price]
+                        prices.pop(-1 if buy else 0)
+            break
+
+        # 行情中仍可见的价位：挂单量少于排队量时，视为前面有撤单
+        for price_field, volume_field in zip(price_fields, volume_fields):
+            queue = side.get(getattr(quote, price_field))
+            if queue:
+                visible = getattr(quote, volume_field)
+                for order in queue:
+                    if order.queue_ahead > visible:
+                        order.queue_ahead = visible
+
+    def _fill(self, order, price, volume):
+        order.traded += volume
+        order.status = ORDER_ALL_TRADED if order.traded == order.volume else ORDER_PART_TRADED_QUEUEING
+        self.fills += 1
+        if self.on_order is not None:
+            self.on_order(order)
+        if self.on_trade is not None:
+            self.on_trade(order, price, volume)
+
+    def _finish(self, order, status):
+        order.status = status
+        if self.on_order is not None:
+            self.on_order(order)
+
+    def orders(self, instrument_id):
+        """合约的全部挂单，买单按价格从高到低、卖单按价格从低到高，同价位按时间先后"""
+        book = self._books.get(instrument_id)
+        if book is None:
+            return []
+        result = [order for price in reversed(book.bid_prices) for order in book.bids[price]]
+        result.extend(order for price in book.ask_prices for order in book.asks[price])
+        return result
+
+
+class _InputOrder:
+    """benchmark 使用的报单字段"""
+    __slots__ = ('InstrumentID', 'Direction', 'LimitPrice', 'VolumeTotalOriginal', 'OrderPriceType',
+                 'TimeCondition', 'VolumeCondition')
+
+    def __init__(self, instrument_id, direction, price, volume):
+        self.InstrumentID = instrument_id
+        self.Direction = direction
+        self.LimitPrice = price
+        self.VolumeTotalOriginal = volume
+        self.OrderPriceType = '2'
+        self.TimeCondition = '3'
+        self.VolumeCondition = '1'
+
+
+def benchmark(events=200000, quote_every=20, seed=1):
+    """测量撮合引擎每秒处理的报单事件数。
+
+    随机生成报单和撤单（约三分之一为撤单），每 quote_every 个事件推送一笔随机游走行情。
+
+    Args:
+        events (int): 报单事件数。
+        quote_every (int): 每多少个报单事件推送一笔行情。
+        seed (int): 随机数种子。
+
+    Returns:
+        dict: 事件数、行情数、成交笔数、耗时和每秒事件数。
+    """
+    rnd = random.Random(seed)
+    engine = MatchingEngine()
+    base = dict.fromkeys(DEPTH_MARKET_DATA_FIELDS, 0.0)
+    base.update(TradingDay='20240801', InstrumentID='rb2410')
+    mid = 3500.0
+    volume = 0
+    quotes = []
+    for _ in range(events // quote_every + 1):
+        mid += rnd.choice((-1.0, 0.0, 1.0))
+        volume += rnd.randint(0, 20)
+        values = dict(base, LastPrice=mid + rnd.choice((-0.5, 0.5)), Volume=volume)
+        for level in range(1, 6):
+            values[f'BidPrice{level}'] = mid - 0.5 - level + 1
+            values[f'AskPrice{level}'] = mid + 0.5 + level - 1
+            values[f'BidVolume{level}'] = rnd.randint(1, 30)
+            values[f'AskVolume{level}'] = rnd.randint(1, 30)
+        quotes.append(TickSnapshot(**values))
+    requests = [_InputOrder('rb2410', rnd.choice((DIRECTION_BUY, DIRECTION_SELL)),
+                            3500.5 + rnd.randint(-8, 8), rnd.randint(1, 5)) for _ in range(events)]
+    cancels = [rnd.random() < 0.35 for _ in range(events)]
+
+    live = []
+    started = time.perf_counter()
+    for i in range(events):
+        if i % quote_every == 0:
+            engine.on_quote(quotes[i // quote_every])
+        if cancels[i] and live:
+            engine.cancel(live.pop(rnd.randrange(len(live))))
+        else:
+            order = engine.insert(requests[i])
+            if order.is_active:
+                live.append(order)
+    elapsed = time.perf_counter() - started
+    return {
+        'events': engine.events,
+        'quotes': events // quote_every,
+        'fills': engine.fills,
+        'elapsed': elapsed,
+        'events_per_second': engine.events / elapsed,
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,259 @@
+"""asyncio 行情接口。
+
+CTP 的回调在 API 自己的线程中执行，这里把回调转交给事件循环：回调线程只把行情放进待处理队列，
+一批行情只调用一次 loop.call_soon_threadsafe 唤醒事件循环，由事件循环分发给各个 stream。
+这样多个策略以及风控、持久化、监控等 I/O 任务可以在一个进程的一个事件循环里协作运行，
+不需要每个脚本一个线程、再用 while ...: time.sleep(1) 轮询。
+
+用法：
+    async def main():
+        md = AsyncMdSpi()
+        await md.start()
+        async for tick in md.stream("rb2410"):
+            print(tick.LastPrice)
+
+    asyncio.run(main())
+"""
+import asyncio
+import logging
+import threading
+from collections import deque
+
+from login_cpi import MdSpiImpl
+from tick_snapshot import snapshot
+
+logger = logging.getLogger('market_data_logger')
+
+
+class AsyncMdSpi(MdSpiImpl):
+    """把行情回调桥接到 asyncio 事件循环的行情 SPI。
+
+    Attributes:
+        loop: 事件循环，start() 时绑定。
+        wakeups (int): 唤醒事件循环的次数。
+        delivered (int): 分发给事件循环的行情数。
+    """
+
+    def __init__(self, log_path="logs"):
+        super().__init__(log_path)
+        self.loop = None
+        self._login_future = None
+        self._sub_futures = {}  # InstrumentID -> [Future]
+        self._streams = {}  # InstrumentID（None 表示全部合约）-> set(_TickStream)
+        self._pending = deque()  # 回调线程放入、事件循环取出的行情
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self.wakeups = 0
+        self.delivered = 0
+
+    async def start(self, timeout=None):
+        """初始化行情 API 并等待登录成功。
+
+        Args:
+            timeout (float): 登录超时时间，单位秒，None 表示一直等待。
+
+        Raises:
+            RuntimeError: 登录失败。
+            asyncio.TimeoutError: 登录超时。
+        """
+        self.loop = asyncio.get_running_loop()
+        self._login_future = self.loop.create_future()
+        self.initialize()
+        await asyncio.wait_for(asyncio.shield(self._login_future), timeout)
+
+    async def subscribe(self, instruments_id, timeout=None):
+        """订阅行情并等待 OnRspSubMarketData 确认。
+
+        Args:
+            instruments_id (list): 合约代码列表。
+            timeout (float): 等待确认的超时时间，单位秒。
+
+        Raises:
+            RuntimeError: 有合约订阅失败。
+            asyncio.TimeoutError: 等待确认超时。
+        """
+        futures = []
+        for instrument in instruments_id:
+            if instrument in self.subscriptions.confirmed:
+                continue
+            future = self.loop.create_future()
+            self._sub_futures.setdefault(instrument, []).append(future)
+            futures.append(future)
+        self.SubscribeMarketData(instruments_id)
+        if futures:
+            await asyncio.wait_for(asyncio.gather(*futures), timeout)
+
+    def stream(self, instrument_id=None, maxsize=10000):
+        """某个合约的行情流，未订阅的合约会自动订阅。
+
+        Args:
+            instrument_id (str): 合约代码，None 表示已订阅的全部合约。
+            maxsize (int): 未消费行情的上限，超过后丢弃最旧的行情。
+
+        Returns:
+            _TickStream: 异步迭代器，用 async for 逐笔读取 TickSnapshot。
+        """
+        if instrument_id is not None:
+            self.SubscribeMarketData([instrument_id])
+        tick_stream = _TickStream(self, instrument_id, maxsize)
+        self._streams.setdefault(instrument_id, set()).add(tick_stream)
+        return tick_stream
+
+    def close(self):
+        """关闭所有行情流并释放 API"""
+        for streams in list(self._streams.values()):
+            for tick_stream in list(streams):
+                tick_stream.close()
+        super().close()
+
+    # ---------- 以下在 CTP 回调线程中执行 ----------
+
+    def OnRspUserLogin(self, pRspUserLogin, pRspInfo, nRequestID, bIsLast):
+        super().OnRspUserLogin(pRspUserLogin, pRspInfo, nRequestID, bIsLast)
+        if pRspInfo is not None and pRspInfo.ErrorID != 0:
+            error = RuntimeError(f"行情API登录失败. {pRspInfo.ErrorMsg}")
+            self._call_soon(self._resolve_login, error)
+        else:
+            self._call_soon(self._resolve_login, None)
+
+    def OnRspSubMarketData(self, pSpecificInstrument, pRspInfo, nRequestID, bIsLast):
+        super().OnRspSubMarketData(pSpecificInstrument, pRspInfo, nRequestID, bIsLast)
+        if pSpecificInstrument is None:
+            return
+        error = None
+        if pRspInfo is not None and pRspInfo.ErrorID != 0:
+            error = RuntimeError(f"订阅行情失败: {pSpecificInstrument.InstrumentID}, {pRspInfo.ErrorMsg}")
+        self._call_soon(self._resolve_subscribe, pSpecificInstrument.InstrumentID, error)
+
+    def OnRtnDepthMarketData(self, pDepthMarketData):
+        """逐笔行情回报：拷贝后放入待处理队列，一批行情只唤醒一次事件循环"""
+        tick = snapshot(pDepthMarketData)
+        if self.journal is not None:
+            self.journal.append(tick)
+        with self._lock:
+            self._pending.append(tick)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._call_soon(self._drain)
+
+    def _call_soon(self, callback, *args):
+        if self.loop is None or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    # ---------- 以下在事件循环中执行 ----------
+
+    def _resolve_login(self, error):
+        future = self._login_future
+        if future is None or future.done():
+            return  # 断线重连后的再次登录
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(True)
+
+    def _resolve_subscribe(self, instrument_id, error):
+        for future in self._sub_futures.pop(instrument_id, ()):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(instrument_id)
+
+    def _drain(self):
+        """取出回调线程积累的一批行情，分发给各个行情流"""
+        with self._lock:
+            ticks = self._pending
+            self._pending = deque()
+            self._scheduled = False
+        self.wakeups += 1
+        self.delivered += len(ticks)
+        streams = self._streams
+        all_streams = streams.get(None)
+        for tick in ticks:
+            instrument_streams = streams.get(tick.InstrumentID)
+            if instrument_streams:
+                for tick_stream in instrument_streams:
+                    tick_stream.put(tick)
+            if all_streams:
+                for tick_stream in all_streams:
+                    tick_stream.put(tick)
+
+    def _remove_stream(self, tick_stream):
+        streams = self._streams.get(tick_stream.instrument_id)
+        if streams is not None:
+            streams.discard(tick_stream)
+            if not streams:
+                del self._streams[tick_stream.instrument_id]
+
+
+class _TickStream:
+    """单个行情流，只在事件循环中使用。
+
+    Attributes:
+        instrument_id (str): 合约代码，None 表示全部合约。
+        dropped (int): 消费太慢被丢弃的行情数。
+    """
+
+    def __init__(self, md, instrument_id, maxsize):
+        self._md = md
+        self.instrument_id = instrument_id
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._ticks = deque()
+        self._waiter = None
+        self._closed = False
+
+    def put(self, tick):
+        if len(self._ticks) >= self.maxsize:
+            self._ticks.popleft()
+            self.dropped += 1
+        self._ticks.append(tick)
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def close(self):
+        """结束行情流，正在等待的 async for 随即退出"""
+        if self._closed:
+            return
+        self._closed = True
+        self._md._remove_stream(self)
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._ticks:
+            if self._closed:
+                raise StopAsyncIteration
+            self._waiter = self._md.loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._ticks.popleft()
+
+
+async def main(instrument_id="rb2410"):
+    """示例：登录后打印一个合约的行情"""
+    md = AsyncMdSpi()
+    await md.start(timeout=30)
+    await md.subscribe([instrument_id], timeout=30)
+    try:
+        async for tick in md.stream(instrument_id):
+            print(f"买一价: {tick.BidPrice1}, 最新价: {tick.LastPrice}, 卖一价: {tick.AskPrice1}, 成交量: {tick.Volume}")
+    finally:
+        md.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("停止行情订阅")
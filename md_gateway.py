@@ -0,0 +1,287 @@
+"""行情网关：一个进程连接行情前置，多个策略进程通过共享内存读取行情。
+
+网关进程基于 MdSpiImpl 登录并订阅行情，把每笔行情按 tick_journal 的定长记录格式
+写入一块全局的共享内存环形缓冲区；策略进程用 MarketDataSubscriber 挂到同一块共享内存上，
+各自按序号读取，不需要再各自建立 CThostFtdcMdApi 连接和登录，也不受网关进程 GIL 的影响。
+
+共享内存结构：
+    头部（HEADER_SIZE 字节）：魔数、版本、槽长度、容量、已发布的行情数。
+    槽区：capacity 个槽，每个槽是 8 字节序号加一条 TICK_RECORD 记录。
+
+只有网关一个写者。第 n 笔行情（从 0 开始）写入第 n % capacity 个槽：
+写之前先把槽序号清零，写完记录后再写入 n + 1，最后更新头部的已发布数。
+读者读一个槽前后各读一次槽序号，两次都等于 n + 1 才说明读到的是完整的第 n 笔行情；
+否则说明读得太慢、槽已被覆盖，跳到最旧的有效行情继续读，并计入 dropped。
+
+用法：
+    网关进程：python md_gateway.py 螺纹钢 沪铜
+    策略进程：
+        with MarketDataSubscriber(instruments=['rb2410']) as subscriber:
+            for tick in subscriber:
+                ...
+"""
+import logging
+import struct
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+from login_cpi import MdSpiImpl
+from tick_journal import RECORD_SIZE, INSTRUMENT_OFFSET, pack_tick, unpack_tick
+from config import get_product_id, get_mainproduct_id
+
+logger = logging.getLogger('market_data_logger')
+
+DEFAULT_NAME = 'ctp_md'
+MAGIC = b'CTPMDSHM'
+VERSION = 1
+
+HEADER = struct.Struct('<8sIIQQ')  # 魔数、版本、槽长度、容量、已发布的行情数
+_PUBLISHED_OFFSET = struct.calcsize('<8sIIQ')  # 头部中已发布行情数的偏移
+HEADER_SIZE = 64
+SEQ = struct.Struct('<Q')
+SLOT_SIZE = (SEQ.size + RECORD_SIZE + 7) // 8 * 8  # 按 8 字节对齐，保证槽序号的读写不被拆开
+
+
+class TickPublisher:
+    """共享内存行情发布端，由网关进程持有。"""
+
+    def __init__(self, name=DEFAULT_NAME, capacity=65536):
+        """创建共享内存。同名的共享内存已存在时（如网关上次异常退出）先删除再重新创建。
+
+        Args:
+            name (str): 共享内存名称。
+            capacity (int): 槽数，即读者最多可以落后的行情笔数。
+        """
+        size = HEADER_SIZE + capacity * SLOT_SIZE
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+        self.capacity = capacity
+        self.published = 0
+        self._buf = self._shm.buf
+        HEADER.pack_into(self._buf, 0, MAGIC, VERSION, SLOT_SIZE, capacity, 0)
+
+    def publish(self, tick):
+        """发布一笔行情。
+
+        Args:
+            tick: TickSnapshot 或 CThostFtdcDepthMarketDataField。
+        """
+        n = self.published
+        buf = self._buf
+        offset = HEADER_SIZE + (n % self.capacity) * SLOT_SIZE
+        SEQ.pack_into(buf, offset, 0)  # 写入过程中槽序号为 0，读者据此丢弃不完整的记录
+        pack_tick(tick, buf, offset + SEQ.size)
+        SEQ.pack_into(buf, offset, n + 1)
+        self.published = n + 1
+        SEQ.pack_into(buf, _PUBLISHED_OFFSET, n + 1)
+
+    def close(self):
+        """关闭并删除共享内存，已挂载的读者会在下次读取时读不到新的行情"""
+        if self._shm is not None:
+            self._buf = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class MarketDataSubscriber:
+    """共享内存行情订阅端，在策略进程中使用。
+
+    Attributes:
+        instruments (frozenset): 只接收这些合约，None 表示全部。
+        received (int): 已读取的行情数（过滤前）。
+        dropped (int): 因读取太慢被覆盖而丢失的行情数。
+    """
+
+    def __init__(self, name=DEFAULT_NAME, instruments=None, from_start=False, poll_interval=0.0005):
+        """挂载网关创建的共享内存。
+
+        Args:
+            name (str): 共享内存名称，与网关一致。
+            instruments (list): 只接收这些合约，None 表示全部。
+            from_start (bool): 是否从缓冲区中最旧的行情开始读，默认只读挂载之后的新行情。
+            poll_interval (float): 没有新行情时的轮询间隔，单位秒。
+        """
+        self._shm = shared_memory.SharedMemory(name=name)
+        _unregister(self._shm)
+        self._buf = self._shm.buf
+        magic, version, slot_size, capacity, published = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION or slot_size != SLOT_SIZE:
+            self.close()
+            raise ValueError(f"不是有效的行情共享内存: {name}")
+        self.capacity = capacity
+        self.instruments = frozenset(instruments) if instruments is not None else None
+        self._filter = None if instruments is None else frozenset(
+            instrument.encode('utf-8')[:32].ljust(32, b'\0') for instrument in instruments)
+        self.poll_interval = poll_interval
+        self.received = 0
+        self.dropped = 0
+        self._next = max(published - capacity, 0) if from_start else published
+
+    def _published(self):
+        return SEQ.unpack_from(self._buf, _PUBLISHED_OFFSET)[0]
+
+    def poll(self, max_count=1024):
+        """读取已发布的新行情，不等待。
+
+        Args:
+            max_count (int): 最多读取的行情数（过滤前）。
+
+        Returns:
+            list: TickSnapshot 列表，按发布顺序排列。
+        """
+        buf = self._buf
+        capacity = self.capacity
+        wanted = self._filter
+        ticks = []
+        count = 0
+        end = min(self._published(), self._next + max_count)
+        n = self._next
+        while n < end:
+            offset = HEADER_SIZE + (n % capacity) * SLOT_SIZE
+            record = offset + SEQ.size
+            if SEQ.unpack_from(buf, offset)[0] != n + 1:
+                n = self._skip_lapped(n)
+                end = min(self._published(), n + max_count)
+                continue
+            if wanted is not None and \
+                    bytes(buf[record + INSTRUMENT_OFFSET:record + INSTRUMENT_OFFSET + 32]) not in wanted:
+                tick = None
+            else:
+                tick = unpack_tick(buf, record)
+            if SEQ.unpack_from(buf, offset)[0] != n + 1:  # 读取过程中被覆盖
+                n = self._skip_lapped(n)
+                end = min(self._published(), n + max_count)
+                continue
+            if tick is not None:
+                ticks.append(tick)
+            n += 1
+            count += 1
+        self.received += count
+        self._next = n
+        return ticks
+
+    def _skip_lapped(self, n):
+        """读者落后超过一圈，跳到最旧的有效行情"""
+        oldest = max(self._published() - self.capacity + 1, n + 1)  # 留一个槽给正在写入的行情
+        self.dropped += oldest - n
+        return oldest
+
+    def wait(self, timeout=None):
+        """等待新行情。
+
+        Args:
+            timeout (float): 最长等待时间，None 表示一直等待。
+
+        Returns:
+            list: TickSnapshot 列表，超时返回空列表。
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            ticks = self.poll()
+            if ticks:
+                return ticks
+            if deadline is not None and time.monotonic() >= deadline:
+                return ticks
+            time.sleep(self.poll_interval)
+
+    def __iter__(self):
+        while True:
+            yield from self.wait()
+
+    def close(self):
+        if self._shm is not None:
+            self._buf = None
+            self._shm.close()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _unregister(shm):
+    """读者进程退出时不删除共享内存（Python 的 resource_tracker 默认会删除挂载过的共享内存）"""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except (ImportError, AttributeError, KeyError):
+        pass
+
+
+class MdGatewaySpi(MdSpiImpl):
+    """行情网关 SPI，把行情发布到共享内存。"""
+
+    def __init__(self, instruments, name=DEFAULT_NAME, capacity=65536, log_path="logs"):
+        """初始化行情网关。
+
+        Args:
+            instruments (list): 需要订阅的合约代码列表。
+            name (str): 共享内存名称。
+            capacity (int): 共享内存槽数。
+            log_path (str): 日志文件夹路径。
+        """
+        super().__init__(log_path)
+        self.publisher = TickPublisher(name, capacity)
+        self.SubscribeMarketData(instruments)  # 登录成功后由订阅管理器发送
+
+    def OnRtnDepthMarketData(self, pDepthMarketData):
+        """逐笔行情回报：写入共享内存，开启记录模式时同时写入行情日志"""
+        self.publisher.publish(pDepthMarketData)
+        if self.journal is not None:
+            self.journal.append(pDepthMarketData)
+
+    def close(self):
+        super().close()
+        self.publisher.close()
+
+
+def main(product_names, record=False):
+    """行情网关主程序。
+
+    Args:
+        product_names (list): 产品名称列表，如 ["螺纹钢", "沪铜"]，订阅各自的主力合约。
+        record (bool): 是否同时把行情写入行情日志。
+    """
+    instruments = []
+    for product_name in product_names:
+        product_id = get_product_id(product_name)
+        if not product_id:
+            print(f"未找到产品名称对应的ID: {product_name}")
+            logger.error(f"未找到产品名称对应的ID: {product_name}")
+            continue
+        instruments.append(get_mainproduct_id(product_id))
+    if not instruments:
+        return
+
+    gateway = MdGatewaySpi(instruments)
+    print(f"行情网关已启动, 共享内存: {gateway.publisher.name}, 合约: {instruments}")
+    logger.info(f"行情网关已启动, 共享内存: {gateway.publisher.name}, 合约: {instruments}")
+    if record:
+        gateway.enable_recorder()
+    gateway.initialize()
+
+    md_thread = threading.Thread(target=gateway.api.Join, daemon=True)
+    md_thread.start()
+    try:
+        while md_thread.is_alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("停止行情网关")
+        logger.info(f"停止行情网关, 共发布行情: {gateway.publisher.published}")
+    finally:
+        gateway.close()  # 释放 API、停止批量投递，再关闭共享内存
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or ["螺纹钢"])
@@ -0,0 +1,415 @@
+"""报单管理。
+
+    - OrderRefAllocator：按登录应答中的 MaxOrderRef 起算，单调递增地分配报单引用 OrderRef，
+      同一会话内的报单不会再因为 OrderRef 为空而互相覆盖。
+    - OrderManager：按 (FrontID, SessionID, OrderRef)、(ExchangeID, OrderSysID) 和合约三种方式索引报单，
+      查找和更新都是 O(1)；另外单独维护一份未完成报单（挂单）集合，批量查询不需要遍历全部历史报单。
+
+每笔报单有一个状态机，由交易 SPI 的回调驱动：
+
+    NEW ──OnRtnOrder──> ACCEPTED ──OnRtnTrade/OnRtnOrder──> PARTIALLY_FILLED ──> FILLED
+     │                     │                                    │
+     │                     └──────────OnRtnOrder（已撤单）──────┴──> CANCELLED
+     └──OnRspOrderInsert/OnErrRtnOrderInsert/OnRtnOrder（报单被拒绝）、ReqOrderInsert 返回非 0──> REJECTED
+
+    - FILLED、CANCELLED、REJECTED 为终态，之后乱序到达的回报不会让状态倒退。
+    - 成交量取 OnRtnOrder 的 VolumeTraded 与 OnRtnTrade 累计成交量（按 TradeID 去重）中较大的一个，
+      两种回报谁先到都不会重复计算。
+    - 撤单失败（OnRspOrderAction/OnErrRtnOrderAction）不改变报单状态，只清除撤单标记，允许再次撤单。
+
+报单在 ReqOrderInsert 之前通过 new_order() 登记；其他会话（如另一个策略进程）的报单在第一次收到
+OnRtnOrder 时自动登记（ManagedOrder.own 为 False），has_working() 默认只看本进程发出的报单。on_update/on_trade 回调在交易回调线程中、状态更新之后调用，
+策略可以在收到成交的那一次回调里直接处理，不需要等待或轮询。
+"""
+import threading
+
+# 报单状态（THOST_FTDC_OST_*）
+ORDER_ALL_TRADED = '0'
+ORDER_PART_TRADED_QUEUEING = '1'
+ORDER_PART_TRADED_NOT_QUEUEING = '2'
+ORDER_NO_TRADE_QUEUEING = '3'
+ORDER_NO_TRADE_NOT_QUEUEING = '4'
+ORDER_CANCELED = '5'
+ORDER_UNKNOWN = 'a'
+SUBMIT_INSERT_REJECTED = '4'  # 报单提交状态 THOST_FTDC_OSS_InsertRejected
+
+# 报单状态机的状态
+STATE_NEW = 'new'  # 已发送，尚未收到回报
+STATE_ACCEPTED = 'accepted'  # CTP 或交易所已接受，未成交
+STATE_PARTIALLY_FILLED = 'partially_filled'
+STATE_FILLED = 'filled'
+STATE_CANCELLED = 'cancelled'
+STATE_REJECTED = 'rejected'
+
+TERMINAL_STATES = frozenset((STATE_FILLED, STATE_CANCELLED, STATE_REJECTED))
+
+_STATUS_STATES = {
+    ORDER_ALL_TRADED: STATE_FILLED,
+    ORDER_PART_TRADED_QUEUEING: STATE_PARTIALLY_FILLED,
+    ORDER_PART_TRADED_NOT_QUEUEING: STATE_CANCELLED,  # 部分成交，剩余部分不再排队
+    ORDER_NO_TRADE_QUEUEING: STATE_ACCEPTED,
+    ORDER_NO_TRADE_NOT_QUEUEING: STATE_CANCELLED,
+    ORDER_CANCELED: STATE_CANCELLED,
+    ORDER_UNKNOWN: STATE_ACCEPTED,  # CTP 已接受，尚未报到交易所
+}
+
+
+class OrderRefAllocator:
+    """报单引用分配器，线程安全。"""
+
+    def __init__(self, start=0):
+        self._last = start
+        self._lock = threading.Lock()
+
+    def seed(self, max_order_ref):
+        """用登录应答中的 MaxOrderRef 重新起算，只会向前推进，不会回退。
+
+        Args:
+            max_order_ref (str): 登录应答中的最大报单引用，可能为空字符串。
+        """
+        value = int(max_order_ref) if str(max_order_ref).strip().isdigit() else 0
+        with self._lock:
+            if value > self._last:
+                self._last = value
+
+    def next(self):
+        """分配下一个报单引用"""
+        with self._lock:
+            self._last += 1
+            return str(self._last)
+
+    @property
+    def last(self):
+        return self._last
+
+
+class ManagedOrder:
+    """被管理的一笔报单。
+
+    Attributes:
+        front_id (int): 前置编号。
+        session_id (int): 会话编号。
+        order_ref (str): 报单引用。
+        exchange_id (str): 交易所代码，收到 OnRtnOrder 后才有。
+        order_sys_id (str): 报单编号，交易所接受后才有。
+        instrument_id (str): 合约代码。
+        direction (str): 买卖方向。
+        offset (str): 开平标志。
+        price (float): 限价。
+        volume (int): 报单数量。
+        traded (int): 已成交数量。
+        trade_volume (int): OnRtnTrade 累计的成交量。
+        state (str): 状态机状态（STATE_*）。
+        status (str): 最近一次回报的报单状态（THOST_FTDC_OST_*），未收到回报时为 ORDER_UNKNOWN。
+        status_msg (str): 最近一次回报或错误的说明。
+        strategy (str): 发出报单的策略名称。
+        insert_time (datetime): 报单时间。
+        cancel_time (datetime): 发出撤单请求的时间，未撤单或撤单失败时为 None。
+        own (bool): 是否由本进程通过 new_order() 发出；其他会话、其他进程或重启前的报单为 False。
+    """
+    __slots__ = ('front_id', 'session_id', 'order_ref', 'exchange_id', 'order_sys_id', 'instrument_id',
+                 'direction', 'offset', 'price', 'volume', 'traded', 'trade_volume', 'state', 'status',
+                 'status_msg', 'strategy', 'insert_time', 'cancel_time', 'own')
+
+    def __init__(self, front_id, session_id, order_ref, instrument_id, direction, offset, price, volume,
+                 strategy=None, insert_time=None):
+        self.front_id = front_id
+        self.session_id = session_id
+        self.order_ref = order_ref
+        self.exchange_id = ""
+        self.order_sys_id = ""
+        self.instrument_id = instrument_id
+        self.direction = direction
+        self.offset = offset
+        self.price = price
+        self.volume = volume
+        self.traded = 0
+        self.trade_volume = 0
+        self.state = STATE_NEW
+        self.status = ORDER_UNKNOWN
+        self.status_msg = ""
+        self.strategy = strategy
+        self.insert_time = insert_time
+        self.cancel_time = None
+        self.own = False
+
+    @property
+    def key(self):
+        return self.front_id, self.session_id, self.order_ref
+
+    @property
+    def is_working(self):
+        """是否仍可能成交（未全部成交、未撤单、未被拒绝）"""
+        return self.state not in TERMINAL_STATES
+
+    @property
+    def remaining(self):
+        return self.volume - self.traded
+
+    def __repr__(self):
+        return (f"ManagedOrder({self.front_id}/{self.session_id}/{self.order_ref} {self.instrument_id} "
+                f"{self.direction}{self.offset} {self.traded}/{self.volume}@{self.price} {self.state})")
+
+
+class OrderManager:
+    """报单索引和状态机，线程安全（行情/策略线程报单，交易回调线程更新）。"""
+
+    def __init__(self, on_update=None, on_trade=None):
+        """初始化报单管理器。
+
+        Args:
+            on_update (callable): 报单状态变化时的回调，参数为 ManagedOrder。
+            on_trade (callable): 成交回调，参数为 (ManagedOrder, CThostFtdcTradeField)。
+        """
+        self.allocator = OrderRefAllocator()
+        self.front_id = 0
+        self.session_id = 0
+        self.on_update = on_update
+        self.on_trade = on_trade
+        self._by_ref = {}  # (FrontID, SessionID, OrderRef) -> ManagedOrder
+        self._by_sys = {}  # (ExchangeID, OrderSysID) -> ManagedOrder
+        self._by_instrument = {}  # InstrumentID -> {(FrontID, SessionID, OrderRef): ManagedOrder}
+        self._working = {}  # InstrumentID -> {(FrontID, SessionID, OrderRef): ManagedOrder}，未完成的报单
+        self._trade_ids = set()  # 已处理的 (ExchangeID, TradeID, 买卖方向)，私有流重传时去重
+        self._lock = threading.RLock()
+
+    def on_login(self, front_id, session_id, max_order_ref):
+        """交易登录成功后调用，记录本会话并按 MaxOrderRef 起算报单引用。
+
+        Args:
+            front_id (int): 登录应答中的 FrontID。
+            session_id (int): 登录应答中的 SessionID。
+            max_order_ref (str): 登录应答中的 MaxOrderRef。
+        """
+        with self._lock:
+            self.front_id = front_id
+            self.session_id = session_id
+            self.allocator.seed(max_order_ref)
+
+    def new_order(self, req, strategy=None, insert_time=None):
+        """为即将发送的报单分配 OrderRef 并登记。
+
+        Args:
+            req: CThostFtdcInputOrderField，OrderRef 会被设置为新分配的报单引用。
+            strategy (str): 策略名称。
+            insert_time (datetime): 报单时间。
+
+        Returns:
+            ManagedOrder: 登记的报单，状态为 STATE_NEW。
+        """
+        order_ref = self.allocator.next()
+        req.OrderRef = order_ref
+        order = ManagedOrder(self.front_id, self.session_id, order_ref, req.InstrumentID, req.Direction,
+                             req.CombOffsetFlag[:1], req.LimitPrice, req.VolumeTotalOriginal, strategy, insert_time)
+        order.own = True
+        with self._lock:
+            self._add(order)
+        return order
+
+    def _add(self, order):
+        key = order.key
+        self._by_ref[key] = order
+        self._by_instrument.setdefault(order.instrument_id, {})[key] = order
+        if order.is_working:
+            self._working.setdefault(order.instrument_id, {})[key] = order
+
+    def _transition(self, order, state):
+        """切换状态，终态不再改变。返回状态是否发生变化"""
+        if order.state == state or order.state in TERMINAL_STATES:
+            return False
+        order.state = state
+        if state in TERMINAL_STATES:
+            working = self._working.get(order.instrument_id)
+            if working is not None:
+                working.pop(order.key, None)
+        return True
+
+    def _notify(self, order):
+        if self.on_update is not None:
+            self.on_update(order)
+
+    # ---------- 由交易 SPI 回调驱动 ----------
+
+    def on_rtn_order(self, pOrder):
+        """OnRtnOrder 中调用，更新报单状态和索引。
+
+        Args:
+            pOrder: CThostFtdcOrderField。
+
+        Returns:
+            ManagedOrder: 更新后的报单。
+        """
+        key = (pOrder.FrontID, pOrder.SessionID, pOrder.OrderRef)
+        with self._lock:
+            order = self._by_ref.get(key)
+            if order is None:  # 其他会话的报单，或重连后私有流重传的报单
+                order = ManagedOrder(pOrder.FrontID, pOrder.SessionID, pOrder.OrderRef, pOrder.InstrumentID,
+                                     pOrder.Direction, pOrder.CombOffsetFlag[:1], pOrder.LimitPrice,
+                                     pOrder.VolumeTotalOriginal)
+                self._add(order)
+            if pOrder.OrderSysID and not order.order_sys_id:
+                order.order_sys_id = pOrder.OrderSysID
+                self._by_sys[(pOrder.ExchangeID, pOrder.OrderSysID)] = order
+            order.exchange_id = pOrder.ExchangeID or order.exchange_id
+            order.status = pOrder.OrderStatus
+            order.status_msg = pOrder.StatusMsg
+            if pOrder.VolumeTraded > order.traded:
+                order.traded = pOrder.VolumeTraded
+            if pOrder.OrderSubmitStatus == SUBMIT_INSERT_REJECTED:
+                state = STATE_REJECTED
+            else:
+                state = _STATUS_STATES.get(pOrder.OrderStatus, order.state)
+                if state == STATE_ACCEPTED and order.traded > 0:
+                    state = STATE_PARTIALLY_FILLED
+            changed = self._transition(order, state)
+        if changed:
+            self._notify(order)
+        return order
+
+    def on_rtn_trade(self, pTrade):
+        """OnRtnTrade 中调用，累计成交量。
+
+        Args:
+            pTrade: CThostFtdcTradeField。
+
+        Returns:
+            ManagedOrder: 成交对应的报单，找不到或重复的成交返回 None。
+        """
+        with self._lock:
+            trade_key = (pTrade.ExchangeID, pTrade.TradeID, pTrade.Direction)
+            if trade_key in self._trade_ids:
+                return None
+            self._trade_ids.add(trade_key)
+            order = self._by_sys.get((pTrade.ExchangeID, pTrade.OrderSysID))
+            if order is None:
+                order = self.get_own(pTrade.OrderRef)
+            if order is None:
+                return None
+            order.trade_volume += pTrade.Volume
+            if order.trade_volume > order.traded:
+                order.traded = order.trade_volume
+            changed = self._transition(order, STATE_FILLED if order.traded >= order.volume
+                                       else STATE_PARTIALLY_FILLED)
+        if changed:
+            self._notify(order)
+        if self.on_trade is not None:
+            self.on_trade(order, pTrade)
+        return order
+
+    def on_rsp_order_insert(self, pInputOrder, pRspInfo):
+        """OnRspOrderInsert / OnErrRtnOrderInsert 中调用：CTP 拒绝报单。
+
+        Args:
+            pInputOrder: CThostFtdcInputOrderField。
+            pRspInfo: 响应信息，ErrorID 为 0 时不做处理。
+
+        Returns:
+            ManagedOrder: 被拒绝的报单，找不到时返回 None。
+        """
+        if pRspInfo is None or pRspInfo.ErrorID == 0 or pInputOrder is None:
+            return None
+        with self._lock:
+            order = self.get_own(pInputOrder.OrderRef)
+            if order is None:
+                return None
+            order.status_msg = pRspInfo.ErrorMsg
+            changed = self._transition(order, STATE_REJECTED)
+        if changed:
+            self._notify(order)
+        return order
+
+    def on_send_failed(self, order, ret):
+        """ReqOrderInsert 返回非 0 时调用：报单没有发出，不会再有任何回报，直接置为拒绝。
+
+        Args:
+            order (ManagedOrder): new_order() 登记的报单。
+            ret (int): ReqOrderInsert 的返回码。
+
+        Returns:
+            ManagedOrder: 被拒绝的报单。
+        """
+        with self._lock:
+            order.status_msg = f"发送报单失败, 返回码: {ret}"
+            changed = self._transition(order, STATE_REJECTED)
+        if changed:
+            self._notify(order)
+        return order
+
+    def on_rsp_order_action(self, pOrderAction, pRspInfo):
+        """OnRspOrderAction / OnErrRtnOrderAction 中调用：撤单被拒绝，清除撤单标记以便再次撤单。
+
+        Args:
+            pOrderAction: CThostFtdcInputOrderActionField 或 CThostFtdcOrderActionField。
+            pRspInfo: 响应信息，ErrorID 为 0 时不做处理。
+
+        Returns:
+            ManagedOrder: 撤单对应的报单，找不到时返回 None。
+        """
+        if pRspInfo is None or pRspInfo.ErrorID == 0 or pOrderAction is None:
+            return None
+        with self._lock:
+            order = None
+            if pOrderAction.OrderRef:
+                order = self.get(pOrderAction.FrontID, pOrderAction.SessionID, pOrderAction.OrderRef)
+            if order is None and pOrderAction.OrderSysID:
+                order = self.get_by_sys_id(pOrderAction.ExchangeID, pOrderAction.OrderSysID)
+            if order is None:
+                return None
+            order.cancel_time = None
+            order.status_msg = pRspInfo.ErrorMsg
+        return order
+
+    # ---------- 查询 ----------
+
+    def get(self, front_id, session_id, order_ref):
+        """按 (FrontID, SessionID, OrderRef) 查找报单"""
+        return self._by_ref.get((front_id, session_id, order_ref))
+
+    def get_own(self, order_ref):
+        """按 OrderRef 查找本会话的报单"""
+        return self._by_ref.get((self.front_id, self.session_id, order_ref))
+
+    def get_by_sys_id(self, exchange_id, order_sys_id):
+        """按 (ExchangeID, OrderSysID) 查找报单"""
+        return self._by_sys.get((exchange_id, order_sys_id))
+
+    def orders(self, instrument_id):
+        """某个合约的全部报单"""
+        with self._lock:
+            return list(self._by_instrument.get(instrument_id, {}).values())
+
+    def working_orders(self, instrument_id=None):
+        """未完成的报单。
+
+        Args:
+            instrument_id (str): 只返回该合约的报单，None 表示全部合约。
+
+        Returns:
+            list: ManagedOrder 列表。
+        """
+        with self._lock:
+            if instrument_id is None:
+                return [order for working in self._working.values() for order in working.values()]
+            return list(self._working.get(instrument_id, {}).values())
+
+    def has_working(self, instrument_id, include_foreign=False):
+        """合约是否有未完成的报单。
+
+        私有流从头重传（SubscribePrivateTopic(0)）时，其他会话和重启前的挂单也会登记为未完成报单，
+        这些报单没有超时撤单，默认不计入，否则一笔遗留的挂单会让策略一直不下单。
+
+        Args:
+            instrument_id (str): 合约代码。
+            include_foreign (bool): 是否计入不是本进程发出的报单。
+
+        Returns:
+            bool: 是否有未完成的报单。
+        """
+        with self._lock:
+            working = self._working.get(instrument_id)
+            if not working:
+                return False
+            return include_foreign or any(order.own for order in working.values())
+
+    def __len__(self):
+        return len(self._by_ref)
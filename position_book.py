@@ -0,0 +1,311 @@
+"""持仓簿：由成交回报增量维护持仓和盈亏。
+
+启动时用一次 ReqQryInvestorPosition 的应答初始化（seed），之后每笔 OnRtnTrade 在 O(1) 时间内更新持仓，
+每笔行情按最新价在 O(1) 时间内重算对应合约的持仓盈亏，不需要再反复调用受流控限制的持仓查询。
+
+每个合约分多头、空头两个方向，每个方向分今仓、昨仓，按开仓均价计算持仓成本：
+    - 开仓（OffsetFlag '0'）：计入今仓，按成交价加权更新开仓均价。
+    - 平今（'3'）只减今仓，平昨（'4'）只减昨仓；平仓（'1'）和强平等其他开平标志先减昨仓、再减今仓，
+      与非上期所交易所的平仓顺序一致（上期所、能源中心的 '1' 本就只平昨仓）。
+    - 平仓按开仓均价结转平仓盈亏，剩余持仓的均价不变。
+
+合约乘数：优先使用合约查询（ReqQryInstrument）应答中的 VolumeMultiple（update_multipliers），
+其次是配置文件中按产品配置的乘数；都没有时记录错误日志并按 default_multiplier 计算，这些合约的均价和盈亏不准确。
+
+初始化与私有流重传：交易 API 以 SubscribePrivateTopic(0) 订阅私有流时，登录后会重传当日全部成交，
+这些成交已经包含在持仓查询的结果中。初始化完成之前收到的成交只记录 TradeID、不计入持仓，
+初始化完成之后按 TradeID 去重，同一笔成交不会被计入两次。
+"""
+import logging
+import threading
+
+logger = logging.getLogger('trading_data_logger')
+
+# 持仓多空方向（THOST_FTDC_PD_*）
+POSITION_LONG = '2'
+POSITION_SHORT = '3'
+# 持仓日期（THOST_FTDC_PSD_*）
+POSITION_DATE_TODAY = '1'
+POSITION_DATE_HISTORY = '2'
+# 买卖方向与开平标志（THOST_FTDC_D_* / THOST_FTDC_OF_*）
+DIRECTION_BUY = '0'
+OFFSET_OPEN = '0'
+OFFSET_CLOSE_TODAY = '3'
+OFFSET_CLOSE_YESTERDAY = '4'
+
+
+class Position:
+    """某个合约一个方向上的持仓。
+
+    Attributes:
+        instrument_id (str): 合约代码。
+        direction (str): 持仓方向，'2' 多头，'3' 空头。
+        today (int): 今仓数量。
+        yesterday (int): 昨仓数量。
+        cost (float): 持仓的开仓金额（价格 × 数量，不含合约乘数）。
+        realized (float): 平仓盈亏（已乘合约乘数）。
+        unrealized (float): 按最新价计算的持仓盈亏（已乘合约乘数）。
+    """
+    __slots__ = ('instrument_id', 'direction', 'multiplier', 'today', 'yesterday', 'cost', 'realized',
+                 'unrealized')
+
+    def __init__(self, instrument_id, direction, multiplier):
+        self.instrument_id = instrument_id
+        self.direction = direction
+        self.multiplier = multiplier
+        self.today = 0
+        self.yesterday = 0
+        self.cost = 0.0
+        self.realized = 0.0
+        self.unrealized = 0.0
+
+    @property
+    def volume(self):
+        """总持仓数量"""
+        return self.today + self.yesterday
+
+    @property
+    def avg_price(self):
+        """开仓均价，没有持仓时为 0"""
+        volume = self.today + self.yesterday
+        return self.cost / volume if volume else 0.0
+
+    def _profit(self, price, volume):
+        """按开仓均价计算 volume 手在 price 价格上的盈亏"""
+        diff = price - self.avg_price
+        if self.direction == POSITION_SHORT:
+            diff = -diff
+        return diff * volume * self.multiplier
+
+    def __repr__(self):
+        return (f"Position({self.instrument_id}, {self.direction}, today={self.today}, "
+                f"yesterday={self.yesterday}, avg_price={self.avg_price:.4f}, "
+                f"realized={self.realized:.2f}, unrealized={self.unrealized:.2f})")
+
+
+class PositionBook:
+    """按合约、方向维护的持仓簿，线程安全。
+
+    成交回报在交易回调线程中调用 on_trade()，行情在策略线程中调用 mark()，查询方法可以在任意线程调用。
+
+    Attributes:
+        seeded (bool): 是否已经用持仓查询的结果完成初始化。
+        realized (float): 全部合约的平仓盈亏。
+        unrealized (float): 全部合约的持仓盈亏，每次 mark() 增量更新。
+    """
+
+    def __init__(self, multipliers=None, default_multiplier=1):
+        """初始化持仓簿。
+
+        Args:
+            multipliers (dict): 合约代码或产品代码 -> 合约乘数，用于把价差换算成金额。
+            default_multiplier (int): 查不到合约乘数时使用的乘数，使用时会记录错误日志。
+        """
+        self.multipliers = dict(multipliers or {})
+        self.default_multiplier = default_multiplier
+        self.missing_multipliers = set()  # 查不到合约乘数的合约
+        self.seeded = False
+        self.realized = 0.0
+        self.unrealized = 0.0
+        self._positions = {}  # (InstrumentID, 方向) -> Position
+        self._last_prices = {}  # InstrumentID -> 最新价
+        self._trade_ids = set()  # 已处理的 (ExchangeID, TradeID, Direction)
+        self._seed_rows = []
+        self._lock = threading.Lock()
+
+    def multiplier(self, instrument_id):
+        """合约乘数：先按合约代码查，再按产品代码（合约代码去掉数字）查，都查不到时记录错误并使用默认乘数"""
+        multiplier = self.multipliers.get(instrument_id)
+        if multiplier is None:
+            multiplier = self.multipliers.get(instrument_id.rstrip('0123456789'))
+        if multiplier is None:
+            if instrument_id not in self.missing_multipliers:
+                self.missing_multipliers.add(instrument_id)
+                logger.error(f"没有合约乘数: {instrument_id}, 按 {self.default_multiplier} 计算, 均价和盈亏不准确")
+            multiplier = self.default_multiplier
+        return multiplier
+
+    def update_multipliers(self, instruments):
+        """用合约查询的应答更新合约乘数，需要在 seed() 之前调用。
+
+        Args:
+            instruments (iterable): CThostFtdcInstrumentField 或其快照，使用 InstrumentID 和 VolumeMultiple。
+        """
+        with self._lock:
+            for instrument in instruments:
+                if instrument is not None and instrument.VolumeMultiple > 0:
+                    self.multipliers[instrument.InstrumentID] = instrument.VolumeMultiple
+
+    # ---------- 初始化 ----------
+
+    def seed(self, pInvestorPosition, bIsLast=True):
+        """用持仓查询的应答初始化，按 OnRspQryInvestorPosition 的参数逐条调用。
+
+        同一合约同一方向可能有多条记录（上期所按今仓、昨仓分开返回，套保标志不同也分开返回），
+        全部累加。收到最后一条（bIsLast）后一次性替换当前持仓。
+
+        Args:
+            pInvestorPosition: CThostFtdcInvestorPositionField，没有持仓时为 None。
+            bIsLast (bool): 是否最后一条应答。
+        """
+        with self._lock:
+            if pInvestorPosition is not None:
+                self._seed_rows.append((
+                    pInvestorPosition.InstrumentID, pInvestorPosition.PosiDirection,
+                    pInvestorPosition.PositionDate, pInvestorPosition.Position,
+                    pInvestorPosition.TodayPosition, pInvestorPosition.OpenCost,
+                ))
+            if not bIsLast:
+                return
+            positions = {}
+            for instrument_id, direction, position_date, volume, today, open_cost in self._seed_rows:
+                if direction not in (POSITION_LONG, POSITION_SHORT) or volume <= 0:
+                    continue  # 净持仓（'1'）只用于期权等特殊品种，这里不处理
+                position = positions.get((instrument_id, direction))
+                if position is None:
+                    position = positions[(instrument_id, direction)] = Position(
+                        instrument_id, direction, self.multiplier(instrument_id))
+                if position_date == POSITION_DATE_HISTORY:
+                    position.yesterday += volume
+                else:
+                    today = min(today, volume)
+                    position.today += today
+                    position.yesterday += volume - today
+                position.cost += open_cost / position.multiplier
+            self._seed_rows = []
+            self._positions = positions
+            self.unrealized = 0.0
+            for position in positions.values():
+                price = self._last_prices.get(position.instrument_id)
+                if price is not None:
+                    position.unrealized = position._profit(price, position.volume)
+                    self.unrealized += position.unrealized
+            self.seeded = True
+
+    # ---------- 成交 ----------
+
+    def on_trade(self, pTrade):
+        """按一笔成交回报更新持仓，O(1)。
+
+        Args:
+            pTrade: CThostFtdcTradeField。
+
+        Returns:
+            float: 这笔成交结转的平仓盈亏，开仓、重复或初始化之前的成交返回 0。
+        """
+        trade_key = (pTrade.ExchangeID, pTrade.TradeID, pTrade.Direction)
+        with self._lock:
+            if trade_key in self._trade_ids:
+                return 0.0
+            self._trade_ids.add(trade_key)
+            if not self.seeded:
+                return 0.0  # 已包含在持仓查询的结果中
+            return self._apply(pTrade.InstrumentID, pTrade.Direction, pTrade.OffsetFlag,
+                               pTrade.Price, pTrade.Volume)
+
+    def _apply(self, instrument_id, direction, offset, price, volume):
+        buy = direction == DIRECTION_BUY
+        if offset == OFFSET_OPEN:
+            position = self._get(instrument_id, POSITION_LONG if buy else POSITION_SHORT)
+            position.today += volume
+            position.cost += price * volume
+            self._remark(position)
+            return 0.0
+
+        # 买平减空头，卖平减多头
+        position = self._get(instrument_id, POSITION_SHORT if buy else POSITION_LONG)
+        if offset == OFFSET_CLOSE_TODAY:
+            from_today, from_yesterday = min(volume, position.today), 0
+        elif offset == OFFSET_CLOSE_YESTERDAY:
+            from_today, from_yesterday = 0, min(volume, position.yesterday)
+        else:
+            from_yesterday = min(volume, position.yesterday)
+            from_today = min(volume - from_yesterday, position.today)
+        closed = from_today + from_yesterday
+        if closed == 0:
+            return 0.0
+        profit = position._profit(price, closed)
+        position.cost -= position.avg_price * closed
+        position.today -= from_today
+        position.yesterday -= from_yesterday
+        if position.volume == 0:
+            position.cost = 0.0
+        position.realized += profit
+        self.realized += profit
+        self._remark(position)
+        return profit
+
+    def _get(self, instrument_id, direction):
+        position = self._positions.get((instrument_id, direction))
+        if position is None:
+            position = self._positions[(instrument_id, direction)] = Position(
+                instrument_id, direction, self.multiplier(instrument_id))
+        return position
+
+    def _remark(self, position):
+        """持仓变化后按最新价重算这个方向的持仓盈亏"""
+        price = self._last_prices.get(position.instrument_id)
+        unrealized = position._profit(price, position.volume) if price is not None else 0.0
+        self.unrealized += unrealized - position.unrealized
+        position.unrealized = unrealized
+
+    # ---------- 行情 ----------
+
+    def mark(self, tick):
+        """按最新价重算对应合约的持仓盈亏，O(1)。
+
+        Args:
+            tick: TickSnapshot 或 CThostFtdcDepthMarketDataField。
+        """
+        instrument_id = tick.InstrumentID
+        price = tick.LastPrice
+        with self._lock:
+            self._last_prices[instrument_id] = price
+            positions = self._positions
+            for direction in (POSITION_LONG, POSITION_SHORT):
+                position = positions.get((instrument_id, direction))
+                if position is not None and position.volume:
+                    self._remark(position)
+
+    # ---------- 查询 ----------
+
+    def get(self, instrument_id, direction):
+        """某个合约某个方向的持仓，没有则返回 None"""
+        return self._positions.get((instrument_id, direction))
+
+    def long(self, instrument_id):
+        """多头持仓数量"""
+        position = self._positions.get((instrument_id, POSITION_LONG))
+        return position.volume if position is not None else 0
+
+    def short(self, instrument_id):
+        """空头持仓数量"""
+        position = self._positions.get((instrument_id, POSITION_SHORT))
+        return position.volume if position is not None else 0
+
+    def net(self, instrument_id):
+        """净持仓：多头数量减空头数量"""
+        return self.long(instrument_id) - self.short(instrument_id)
+
+    def pnl(self, instrument_id=None):
+        """平仓盈亏与持仓盈亏之和。
+
+        Args:
+            instrument_id (str): 合约代码，None 表示全部合约。
+
+        Returns:
+            float: 盈亏金额。
+        """
+        if instrument_id is None:
+            return self.realized + self.unrealized
+        total = 0.0
+        for direction in (POSITION_LONG, POSITION_SHORT):
+            position = self._positions.get((instrument_id, direction))
+            if position is not None:
+                total += position.realized + position.unrealized
+        return total
+
+    def positions(self):
+        """全部有持仓的 Position 列表"""
+        with self._lock:
+            return [position for position in self._positions.values() if position.volume]
@@ -3,8 +3,20 @@ import threading
 import time
 from datetime import datetime
 from thostmduserapi import CThostFtdcMdApi, CThostFtdcMdSpi, CThostFtdcReqUserLoginField
-from thosttraderapi import CThostFtdcTraderApi, CThostFtdcTraderSpi, CThostFtdcReqAuthenticateField, CThostFtdcReqUserLoginField, CThostFtdcInputOrderField, CThostFtdcOrderActionField
-from config import get_product_id, get_trading_sessions, get_mainproduct_id, MARKET_DATA_ADDRESS, TRADING_ADDRESS, BROKER_ID, USER_ID, PASSWORD, INVESTOR_ID, APP_ID, AUTH_CODE
+from thosttraderapi import CThostFtdcTraderApi, CThostFtdcTraderSpi, CThostFtdcReqAuthenticateField, CThostFtdcReqUserLoginField, CThostFtdcQryInvestorPositionField, CThostFtdcQryInstrumentField
+from config import get_product_id, get_trading_calendar, get_mainproduct_id, get_volume_multiples, MARKET_DATA_ADDRESS, TRADING_ADDRESS, BROKER_ID, USER_ID, PASSWORD, INVESTOR_ID, APP_ID, AUTH_CODE
+from tick_snapshot import snapshot
+from tick_queue import TickRingBuffer, StrategyThread, DROP_OLDEST
+from tick_store import TickStore
+from bar_aggregator import BarAggregator
+from subscription_manager import SubscriptionManager
+from order_manager import OrderManager
+from request_manager import RequestManager
+from query_scheduler import QueryScheduler
+from position_book import PositionBook
+from timer_wheel import TimerWheel, TimerThread
+from mass_cancel import MassCanceller
+from order_templates import OrderTemplates
 import logging
 
 # 设置工作目录
@@ -37,6 +49,9 @@ class MarketDataSpi(CThostFtdcMdSpi):
         super().__init__()
         self.md_api = md_api  # 行情API实例
         self.auto_trade = auto_trade  # 自动交易实例
+        self.verbose = True  # 是否逐笔打印和记录行情，回放和压测时关闭
+        self.subscriptions = SubscriptionManager(self._send_subscribe)  # 订阅管理
+        self.subscriptions.subscribe([auto_trade.main_contract])
 
     def OnFrontConnected(self):
         """行情API连接成功的回调函数"""
@@ -59,7 +74,38 @@ class MarketDataSpi(CThostFtdcMdSpi):
             return
         print("行情API登录成功")
         md_logger.info("行情API登录成功")
-        self.md_api.SubscribeMarketData([self.auto_trade.main_contract.encode('utf-8')], 1)
+        self.subscriptions.on_login()  # 登录（含断线重连后的登录）后按差集补订阅
+
+    def OnFrontDisconnected(self, nReason):
+        """连接断开，API 会自动重连，重连登录后再重新订阅
+
+        Args:
+            nReason (int): 断开原因
+        """
+        print(f"行情API连接断开, 原因: {nReason}")
+        md_logger.warning(f"行情API连接断开, 原因: {nReason}")
+        self.subscriptions.on_disconnected()
+
+    def OnRspSubMarketData(self, pSpecificInstrument, pRspInfo, nRequestID, bIsLast):
+        """订阅行情应答
+
+        Args:
+            pSpecificInstrument: 合约信息
+            pRspInfo: 响应信息
+            nRequestID: 请求ID
+            bIsLast: 是否最后一条响应
+        """
+        if pSpecificInstrument is None:
+            return
+        if pRspInfo is not None and pRspInfo.ErrorID != 0:
+            md_logger.error(f"订阅行情失败: {pSpecificInstrument.InstrumentID}, {pRspInfo.ErrorMsg}")
+            self.subscriptions.on_rsp_sub(pSpecificInstrument.InstrumentID, pRspInfo.ErrorID, pRspInfo.ErrorMsg)
+            return
+        self.subscriptions.on_rsp_sub(pSpecificInstrument.InstrumentID)
+
+    def _send_subscribe(self, instruments_id):
+        instruments = [x.encode('utf-8') for x in instruments_id]
+        return self.md_api.SubscribeMarketData(instruments, len(instruments))
 
     def OnRtnDepthMarketData(self, pDepthMarketData):
         """逐笔行情数据返回时调用
@@ -67,17 +113,20 @@ class MarketDataSpi(CThostFtdcMdSpi):
         Args:
             pDepthMarketData: 深度行情数据
         """
-        print(f"接收到行情数据: {pDepthMarketData}")
-        md_logger.info(f"接收到行情数据: {pDepthMarketData}")
-        current_time = datetime.now().time()  # 获取当前时间
-        # 检查当前时间是否在交易时间段内
-        if not any(session[0] <= current_time <= session[1] for session in self.auto_trade.trading_sessions):
+        verbose = self.verbose
+        if verbose:
+            print(f"接收到行情数据: {pDepthMarketData}")
+            md_logger.info(f"接收到行情数据: {pDepthMarketData}")
+        tick = snapshot(pDepthMarketData)  # 一次本地调用取出全部字段
+        # 按行情自身的交易所时间查表判断是否在交易时间段内（支持跨午夜的夜盘）
+        if not self.auto_trade.calendar.is_trading(tick.InstrumentID, tick):
             return  # 非交易时间，忽略数据
 
-        print(f"买一价: {pDepthMarketData.BidPrice1}, 最新价: {pDepthMarketData.LastPrice}, 卖一价: {pDepthMarketData.AskPrice1}, 成交量: {pDepthMarketData.Volume}")
-        logging.info(f"买一价: {pDepthMarketData.BidPrice1}, 最新价: {pDepthMarketData.LastPrice}, 卖一价: {pDepthMarketData.AskPrice1}, 成交量: {pDepthMarketData.Volume}")
+        if verbose:
+            print(f"买一价: {tick.BidPrice1}, 最新价: {tick.LastPrice}, 卖一价: {tick.AskPrice1}, 成交量: {tick.Volume}")
+            logging.info(f"买一价: {tick.BidPrice1}, 最新价: {tick.LastPrice}, 卖一价: {tick.AskPrice1}, 成交量: {tick.Volume}")
 
-        self.auto_trade.on_market_data(pDepthMarketData)
+        self.auto_trade.tick_buffer.push(tick)  # 交给策略线程处理，不阻塞行情回调线程
 
     def UserLogin(self):
         """用户登录"""
@@ -85,7 +134,7 @@ class MarketDataSpi(CThostFtdcMdSpi):
         login_field.BrokerID = BROKER_ID
         login_field.UserID = USER_ID
         login_field.Password = PASSWORD
-        self.md_api.ReqUserLogin(login_field, 0)
+        self.md_api.ReqUserLogin(login_field, self.auto_trade.requests.next_id())
 
 
 class TraderSpi(CThostFtdcTraderSpi):
@@ -99,6 +148,9 @@ class TraderSpi(CThostFtdcTraderSpi):
         super().__init__()
         self.td_api = td_api  # 交易API实例
         self.auto_trade = auto_trade  # 自动交易实例
+        self.requests = auto_trade.requests  # 请求ID与行情、报单、撤单共用一个分配器
+        self.queries = QueryScheduler(self._send_query, requests=self.requests)  # 查询调度，按流控发送并自动重试
+        self.seed_retry_delay = 5  # 持仓查询最终失败后的重试间隔，单位秒
 
     def OnFrontConnected(self):
         """交易API连接成功的回调函数"""
@@ -138,7 +190,78 @@ class TraderSpi(CThostFtdcTraderSpi):
             return
         print("交易API登录成功")
         md_logger.info("交易API登录成功")
-        # 在这里可以进行进一步操作
+        # 按本会话的 FrontID/SessionID 和 MaxOrderRef 起算报单引用
+        self.auto_trade.order_manager.on_login(pRspUserLogin.FrontID, pRspUserLogin.SessionID,
+                                               pRspUserLogin.MaxOrderRef)
+        self.queries.on_login()  # 登录（含断线重连后的登录）后开始发送排队中的查询
+        if not self.auto_trade.position_book.seeded:
+            self.QueryInstruments()  # 只在启动时查询一次合约乘数和持仓，之后由成交回报增量更新
+
+    def OnFrontDisconnected(self, nReason):
+        """连接断开，API 会自动重连，在途的查询在重新登录后重发
+
+        Args:
+            nReason (int): 断开原因
+        """
+        print(f"交易API连接断开, 原因: {nReason}")
+        md_logger.warning(f"交易API连接断开, 原因: {nReason}")
+        self.queries.on_disconnected()
+
+    def OnRspQryInstrument(self, pInstrument, pRspInfo, nRequestID, bIsLast):
+        """查询合约响应，交给查询调度器汇总，全部应答到达后由 _on_instruments 更新合约乘数
+
+        Args:
+            pInstrument: 合约信息
+            pRspInfo: 响应信息
+            nRequestID: 请求ID
+            bIsLast: 是否最后一条响应
+        """
+        self.queries.on_rsp(nRequestID, pRspInfo, bIsLast, pInstrument)
+
+    def _on_instruments(self, request):
+        """合约查询完成，用 VolumeMultiple 更新持仓簿的合约乘数，再查询持仓
+
+        Args:
+            request (QueryRequest): 完成的查询
+        """
+        error = request.future.exception()
+        if error is not None:
+            # 没有查到的合约退回配置文件中的乘数，仍然缺失的在初始化持仓时记录错误
+            print(f"查询合约失败: {error.error_msg}")
+            md_logger.error(f"查询合约失败: {error.error_msg}")
+        else:
+            self.auto_trade.position_book.update_multipliers(request.future.result())
+        self.QueryPosition()
+
+    def OnRspQryInvestorPosition(self, pInvestorPosition, pRspInfo, nRequestID, bIsLast):
+        """查询持仓响应，交给查询调度器汇总，全部应答到达后由 _on_positions 初始化持仓簿
+
+        Args:
+            pInvestorPosition: 持仓信息
+            pRspInfo: 响应信息
+            nRequestID: 请求ID
+            bIsLast: 是否最后一条响应
+        """
+        self.queries.on_rsp(nRequestID, pRspInfo, bIsLast, pInvestorPosition)
+
+    def _on_positions(self, request):
+        """持仓查询完成（查询未就绪、被限流时已由查询调度器重试），用全部应答初始化持仓簿
+
+        Args:
+            request (QueryRequest): 完成的查询
+        """
+        error = request.future.exception()
+        if error is not None:
+            # 持仓簿初始化之前策略不会下单，不能只记日志了事
+            print(f"查询持仓失败, {self.seed_retry_delay}秒后重试: {error.error_msg}")
+            md_logger.error(f"查询持仓失败, {self.seed_retry_delay}秒后重试: {error.error_msg}")
+            self.auto_trade.timers.call_later(self.seed_retry_delay, self.QueryPosition)
+            return
+        position_book = self.auto_trade.position_book
+        for pos in request.future.result():
+            position_book.seed(pos, False)  # 同一合约同一方向的今仓、昨仓记录合并
+        position_book.seed(None, True)
+        md_logger.info(f"持仓簿初始化完成: {position_book.positions()}")
 
     def OnRtnOrder(self, pOrder):
         """报单回调函数
@@ -146,14 +269,19 @@ class TraderSpi(CThostFtdcTraderSpi):
         Args:
             pOrder: 报单信息
         """
-        if pOrder.OrderStatus == '0':  # 订单已成交
-            print(f"订单成交: {pOrder.OrderSysID}")
-            md_logger.info(f"订单成交: {pOrder.OrderSysID}")
-            self.auto_trade.unfilled_orders.pop(pOrder.OrderRef, None)
-            self.auto_trade.pending_order = False
+        # 更新报单状态机，保存订单系统ID和交易所ID，用于撤销订单
+        self.auto_trade.order_manager.on_rtn_order(pOrder)
 
-        # 保存订单系统ID和交易所ID，用于撤销订单
-        self.auto_trade.order_info[pOrder.OrderRef] = (pOrder.OrderSysID, pOrder.ExchangeID)
+    def OnRtnTrade(self, pTrade):
+        """成交回调函数
+
+        Args:
+            pTrade: 成交信息
+        """
+        print(f"订单成交: {pTrade.OrderSysID}, 价格: {pTrade.Price}, 数量: {pTrade.Volume}")
+        md_logger.info(f"订单成交: {pTrade.OrderSysID}, 价格: {pTrade.Price}, 数量: {pTrade.Volume}")
+        self.auto_trade.position_book.on_trade(pTrade)  # 先更新持仓，策略线程看到成交时持仓已是最新
+        self.auto_trade.order_manager.on_rtn_trade(pTrade)
 
     def OnRspOrderInsert(self, pInputOrder, pRspInfo, nRequestID, bIsLast):
         """订单录入响应
@@ -167,11 +295,70 @@ class TraderSpi(CThostFtdcTraderSpi):
         if pRspInfo is not None and pRspInfo.ErrorID != 0:
             print(f"订单录入失败: {pRspInfo.ErrorMsg}")
             md_logger.error(f"订单录入失败: {pRspInfo.ErrorMsg}")
-            self.auto_trade.pending_order = False
+            self.auto_trade.order_manager.on_rsp_order_insert(pInputOrder, pRspInfo)
             return
         print(f"订单录入成功: {pInputOrder.OrderRef}")
         md_logger.info(f"订单录入成功: {pInputOrder.OrderRef}")
 
+    def OnErrRtnOrderInsert(self, pInputOrder, pRspInfo):
+        """报单录入错误回报
+
+        Args:
+            pInputOrder: 订单信息
+            pRspInfo: 响应信息
+        """
+        print(f"报单录入错误回报: {pRspInfo.ErrorMsg}")
+        md_logger.error(f"报单录入错误回报: {pRspInfo.ErrorMsg}")
+        self.auto_trade.order_manager.on_rsp_order_insert(pInputOrder, pRspInfo)
+
+    def OnRspOrderAction(self, pInputOrderAction, pRspInfo, nRequestID, bIsLast):
+        """撤单响应，只在撤单被 CTP 拒绝时回调
+
+        Args:
+            pInputOrderAction: 撤单信息
+            pRspInfo: 响应信息
+            nRequestID: 请求ID
+            bIsLast: 是否最后一条响应
+        """
+        if pRspInfo is not None and pRspInfo.ErrorID != 0:
+            print(f"撤单失败: {pRspInfo.ErrorMsg}")
+            md_logger.error(f"撤单失败: {pRspInfo.ErrorMsg}")
+            self.auto_trade.order_manager.on_rsp_order_action(pInputOrderAction, pRspInfo)
+
+    def OnErrRtnOrderAction(self, pOrderAction, pRspInfo):
+        """撤单错误回报
+
+        Args:
+            pOrderAction: 撤单信息
+            pRspInfo: 响应信息
+        """
+        print(f"撤单错误回报: {pRspInfo.ErrorMsg}")
+        md_logger.error(f"撤单错误回报: {pRspInfo.ErrorMsg}")
+        self.auto_trade.order_manager.on_rsp_order_action(pOrderAction, pRspInfo)
+
+    def OnRspBatchOrderAction(self, pInputBatchOrderAction, pRspInfo, nRequestID, bIsLast):
+        """批量撤单响应，只在批量撤单被 CTP 拒绝时回调
+
+        Args:
+            pInputBatchOrderAction: 批量撤单信息
+            pRspInfo: 响应信息
+            nRequestID: 请求ID
+            bIsLast: 是否最后一条响应
+        """
+        if pRspInfo is not None and pRspInfo.ErrorID != 0:
+            md_logger.error(f"批量撤单失败: {pRspInfo.ErrorMsg}")
+            self.auto_trade.mass_cancel.on_rsp_batch_order_action(nRequestID, pRspInfo)  # 改为逐笔撤单
+
+    def OnErrRtnBatchOrderAction(self, pBatchOrderAction, pRspInfo):
+        """批量撤单错误回报
+
+        Args:
+            pBatchOrderAction: 批量撤单信息
+            pRspInfo: 响应信息
+        """
+        md_logger.error(f"批量撤单错误回报: {pRspInfo.ErrorMsg}")
+        self.auto_trade.mass_cancel.on_rsp_batch_order_action(pBatchOrderAction.RequestID, pRspInfo)
+
     def ReqAuthenticate(self):
         """请求认证"""
         auth_field = CThostFtdcReqAuthenticateField()
@@ -179,7 +366,29 @@ class TraderSpi(CThostFtdcTraderSpi):
         auth_field.UserID = USER_ID
         auth_field.AuthCode = AUTH_CODE
         auth_field.AppID = APP_ID
-        self.td_api.ReqAuthenticate(auth_field, 0)
+        self.td_api.ReqAuthenticate(auth_field, self.requests.next_id())
+
+    def _send_query(self, method, req, request_id):
+        return getattr(self.td_api, method)(req, request_id)
+
+    def QueryInstruments(self):
+        """查询全部合约，用于取得合约乘数，完成后查询持仓
+
+        Returns:
+            QueryRequest: 排队中的查询
+        """
+        return self.queries.submit('ReqQryInstrument', CThostFtdcQryInstrumentField(), self._on_instruments)
+
+    def QueryPosition(self):
+        """查询持仓，由查询调度器按流控发送，返回码 -1/-2/-3 或查询未就绪时自动重试
+
+        Returns:
+            QueryRequest: 排队中的查询
+        """
+        req = CThostFtdcQryInvestorPositionField()
+        req.BrokerID = BROKER_ID
+        req.InvestorID = INVESTOR_ID
+        return self.queries.submit('ReqQryInvestorPosition', req, self._on_positions)
 
     def UserLogin(self):
         """用户登录"""
@@ -187,34 +396,51 @@ class TraderSpi(CThostFtdcTraderSpi):
         login_field.BrokerID = BROKER_ID
         login_field.UserID = USER_ID
         login_field.Password = PASSWORD
-        self.td_api.ReqUserLogin(login_field, 0)
+        self.td_api.ReqUserLogin(login_field, self.requests.next_id())
 
 
 class AutoTradeSpi:
-    def __init__(self, product_name):
+    def __init__(self, product_name, tick_capacity=4096, overflow=DROP_OLDEST, md_api=None, td_api=None):
         """初始化AutoTradeSpi类
 
         Args:
             product_name (str): 产品名称
+            tick_capacity (int): 行情队列容量
+            overflow (str): 行情队列满时的处理方式 ('drop_oldest', 'block', 'conflate')
+            md_api: 行情API实例，默认连接 SimNow 前置；测试和压测时可传入 ctp_simulator 创建的实例
+            td_api: 交易API实例，同上
         """
         self.main_contract = get_product_id(product_name)  # 获取产品ID
         self.main_contract = get_mainproduct_id(self.main_contract)  # 获取主力合约ID
-        self.md_api = CThostFtdcMdApi.CreateFtdcMdApi()  # 创建行情API实例
-        self.td_api = CThostFtdcTraderApi.CreateFtdcTraderApi()  # 创建交易API实例
+        self.md_api = md_api if md_api is not None else CThostFtdcMdApi.CreateFtdcMdApi()  # 创建行情API实例
+        self.td_api = td_api if td_api is not None else CThostFtdcTraderApi.CreateFtdcTraderApi()  # 创建交易API实例
+        self.requests = RequestManager()  # 分配请求ID，行情、交易请求共用
         self.md_spi = MarketDataSpi(self.md_api, self)  # 创建行情SPI实例
         self.td_spi = TraderSpi(self.td_api, self)  # 创建交易SPI实例
-        self.current_position = 0  # 当前持仓
-        self.pending_order = False  # 待成交订单状态
-        self.last_tick_time = None  # 上一个tick时间
-        self.last_tick_price = None  # 上一个tick价格
-        self.unfilled_orders = {}  # 未成交订单
-        self.order_info = {}  # 存储订单的系统ID和交易所ID
+        self.order_manager = OrderManager(on_update=self.on_order_update)  # 报单状态机，分配报单引用并跟踪未成交订单
+        self.position_book = PositionBook(get_volume_multiples())  # 持仓簿，启动时查询一次，之后由成交回报更新
         self.last_2_ticks = []  # 最近2个tick的价格
-        self.trading_sessions = get_trading_sessions(get_product_id(product_name))  # 获取交易时间段
+        self.tick_store = TickStore()  # 按合约保存当日全部行情，供向量化计算使用
+        self.bar_aggregator = BarAggregator(intervals=(1, 60, 300), on_bar=self.on_bar)  # 1秒/1分钟/5分钟K线
+        self.calendar = get_trading_calendar()  # 编译好的交易时段日历
         self.next_order = None  # 下一个订单信息
+        self.clock = datetime.now  # 时钟，回放时替换为行情自身的交易所时间
+        self.tick_buffer = TickRingBuffer(tick_capacity, overflow)  # 行情回调线程与策略线程之间的队列
+        self.strategy_thread = StrategyThread(self.tick_buffer, self.on_market_data)  # 策略线程
+        self.order_timeout = 20  # 报单超时撤单的时间，单位秒
+        # 报单超时等定时任务，由定时器线程推进，不依赖行情到达；时间取自 self.clock，回放时跟随行情时间
+        self.timers = TimerWheel(clock=self._timer_clock)
+        self.timer_thread = TimerThread(self.timers)  # 定时器线程
+        self._order_timers = {}  # (FrontID, SessionID, OrderRef) -> 超时撤单的定时器
+        # 撤单，支持批量撤单和按条件撤单
+        self.mass_cancel = MassCanceller(self.td_api, self.order_manager, BROKER_ID, INVESTOR_ID, INVESTOR_ID,
+                                         clock=lambda: self.clock(), requests=self.requests)
+        self.order_templates = OrderTemplates(BROKER_ID, INVESTOR_ID)  # 按合约预先填好静态字段的报单结构体池
 
     def initialize(self):
         """初始化行情和交易SPI"""
+        self.strategy_thread.start()  # 先启动策略线程，再接收行情
+        self.timer_thread.start()
         self.initialize_md()
         self.initialize_td()
 
@@ -232,17 +458,30 @@ class AutoTradeSpi:
         self.td_api.SubscribePrivateTopic(0)  # 订阅私有流
         self.td_api.Init()  # 初始化交易API
 
+    def _timer_clock(self):
+        """时间轮使用的时钟：self.clock 返回的时刻转换成秒数，回放开始前 clock 返回 None 时取当前时间"""
+        now = self.clock()
+        return time.time() if now is None else now.timestamp()
+
+    @property
+    def current_position(self):
+        """主力合约的净持仓（多头减空头）"""
+        return self.position_book.net(self.main_contract)
+
     def on_market_data(self, pDepthMarketData):
         """处理市场数据
 
         Args:
             pDepthMarketData: 深度行情数据
         """
-        current_time = datetime.now()
-        if self.last_tick_time and (current_time - self.last_tick_time).seconds >= 20:
-            self.CancelAllOrders()  # 撤销所有订单
-
-        if self.pending_order:  # 如果有待成交的订单，则不操作
+        self.timers.advance()  # 先触发这笔行情时刻之前到期的定时器（回放时行情时间远快于定时器线程）
+        self.tick_store.append(pDepthMarketData)
+        self.bar_aggregator.update(pDepthMarketData)
+        self.position_book.mark(pDepthMarketData)  # 按最新价更新持仓盈亏
+        if not self.position_book.seeded:
+            return  # 持仓尚未初始化，不下单
+
+        if self.order_manager.has_working(self.main_contract):  # 如果本进程有待成交的订单，则不操作
             return
 
         # 更新最近两个tick的价格
@@ -273,8 +512,25 @@ class AutoTradeSpi:
             elif self.current_position < 0:
                 self.PlaceOrder(pDepthMarketData.AskPrice1, 'buy_close')
 
-        self.last_tick_time = current_time
-        self.last_tick_price = pDepthMarketData.LastPrice
+    def on_bar(self, bar):
+        """K线完成时调用
+
+        Args:
+            bar (Bar): 已完成的K线
+        """
+        if bar.period != '1s':
+            md_logger.info(f"K线完成: {bar}")
+
+    def on_order_update(self, order):
+        """报单状态变化，在交易回调线程中调用，报单完成后取消超时撤单的定时器
+
+        Args:
+            order (ManagedOrder): 状态变化的报单
+        """
+        if not order.is_working:
+            timer = self._order_timers.pop(order.key, None)
+            if timer is not None:
+                timer.cancel()
 
     def PlaceOrder(self, price, direction):
         """下单函数
@@ -283,48 +539,51 @@ class AutoTradeSpi:
             price (float): 订单价格
             direction (str): 交易方向 ('buy', 'sell', 'buy_close', 'sell_close')
         """
-        order = CThostFtdcInputOrderField()  # 创建订单对象
-        order.BrokerID = BROKER_ID
-        order.InvestorID = INVESTOR_ID
-        order.InstrumentID = self.main_contract
-        order.LimitPrice = price
-        order.VolumeTotalOriginal = 1
-        order.OrderPriceType = '2'
-        order.Direction = '0' if direction == 'buy' else '1'
-        order.CombOffsetFlag = '0' if direction in ['buy', 'sell'] else '1'
-        order.CombHedgeFlag = '1'
-        order.ContingentCondition = '1'
-        order.ForceCloseReason = '0'
-        order.IsAutoSuspend = 0
-        order.TimeCondition = '3'
-        order.VolumeCondition = '1'
-        order.MinVolume = 1
-        order.StopPrice = 0
-        order.RequestID = 0
-        order.UserForceClose = 0
-
-        self.td_api.ReqOrderInsert(order, 0)
-        self.pending_order = True
-        self.unfilled_orders[order.OrderRef] = datetime.now()
-
-    def CancelAllOrders(self):
-        """撤销所有未成交订单"""
-        for order_ref, order_time in list(self.unfilled_orders.items()):
-            if (datetime.now() - order_time).seconds >= 20:
-                if order_ref in self.order_info:
-                    cancel_order = CThostFtdcOrderActionField()
-                    cancel_order.BrokerID = BROKER_ID
-                    cancel_order.InvestorID = INVESTOR_ID
-                    cancel_order.UserID = INVESTOR_ID
-                    cancel_order.OrderRef = order_ref
-                    cancel_order.ActionFlag = '0'
-
-                    # 获取 OrderSysID 和 ExchangeID
-                    cancel_order.OrderSysID, cancel_order.ExchangeID = self.order_info[order_ref]
-
-                    self.td_api.ReqOrderAction(cancel_order, 0)
-                    self.unfilled_orders.pop(order_ref)
-                    self.pending_order = False
+        template = self.order_templates.get(self.main_contract)
+        # 从结构体池取出预先填好静态字段的报单，只设置价格、数量、方向和开平
+        order = template.prepare(price, 1,
+                                 '0' if direction in ['buy', 'buy_close'] else '1',
+                                 '0' if direction in ['buy', 'sell'] else '1')
+        try:
+            managed_order = self.order_manager.new_order(order, insert_time=self.clock())  # 分配报单引用
+            # 发送报单之前设好超时撤单，避免回报先于定时器登记到达
+            self._order_timers[managed_order.key] = self.timers.call_later(
+                self.order_timeout, self.CancelOrder, managed_order)
+            ret = self.td_api.ReqOrderInsert(order, self.requests.next_id())
+            if ret != 0:
+                print(f"发送报单失败, 返回码: {ret}")
+                md_logger.error(f"发送报单失败, 返回码: {ret}")
+                self.order_manager.on_send_failed(managed_order, ret)  # 置为拒绝，on_order_update 取消超时撤单定时器
+        finally:
+            template.release(order)  # CTP 在 ReqOrderInsert 返回前已拷贝请求内容
+
+    def CancelOrder(self, order):
+        """撤销一笔报单，报单超时由定时器线程调用
+
+        Args:
+            order (ManagedOrder): 要撤销的报单
+        """
+        self._order_timers.pop(order.key, None)
+        self.mass_cancel.cancel_order(order)  # 已经完成或已经发出撤单请求的报单不再撤
+
+    def CancelAllOrders(self, instrument_id=None, strategy=None, direction=None, include_foreign=False):
+        """立即撤销本进程发出的所有符合条件的未成交订单，连续发送不等待应答（超时撤单由定时器逐笔触发）
+
+        Args:
+            instrument_id (str): 合约代码，None 表示全部合约（条件全为 None 时可以按交易所批量撤单）
+            strategy (str): 策略名称，None 表示全部策略
+            direction (str): 买卖方向，'0' 买、'1' 卖，None 表示两个方向
+            include_foreign (bool): 是否也撤销其他会话、其他进程的挂单，默认不撤
+
+        Returns:
+            CancelBatch: 本次撤单涉及的报单，撤单结果由报单状态机确认
+        """
+        batch = self.mass_cancel.cancel(instrument_id, strategy, direction, include_foreign)
+        for order in batch.orders:
+            timer = self._order_timers.pop(order.key, None)
+            if timer is not None:
+                timer.cancel()
+        return batch
 
 def main(product_name):
     """主函数
@@ -346,6 +605,10 @@ def main(product_name):
             time.sleep(1)  # 等待一秒钟
     except KeyboardInterrupt:
         print("停止自动交易")  # 打印停止消息
+        auto_trade_spi.strategy_thread.stop()  # 停止策略线程
+        auto_trade_spi.timer_thread.stop()  # 停止定时器线程
+        md_logger.info(f"行情队列统计: {auto_trade_spi.tick_buffer.stats()}")
+        md_logger.info(f"持仓: {auto_trade_spi.position_book.positions()}, 盈亏: {auto_trade_spi.position_book.pnl()}")
         auto_trade_spi.md_api.Release()  # 释放行情API资源
         auto_trade_spi.td_api.Release()  # 释放交易API资源
 
@@ -0,0 +1,327 @@
+"""交易查询调度。
+
+CTP 对交易查询（ReqQry*）有流控：每秒最多约 1 个查询，且同一时间只能有 1 个查询在途（未收到最后一条应答），
+超出时 ReqQry* 直接返回 -2（未处理请求超过许可数）或 -3（每秒发送请求数超过许可数），
+查询核心繁忙时应答的 pRspInfo.ErrorID 为 90（查询未就绪）或 154（查询核心忙），需要稍后重试。
+
+QueryScheduler 把所有 ReqQry* 放进一个队列，由一个发送线程按令牌桶限速、并保证在途查询数不超过上限，
+上一个查询收到最后一条应答后立即发送下一个，不需要各个脚本自己 sleep 重试：
+    - 排队中的相同查询（同一个方法、请求字段完全相同）合并为一个，完成时通知所有提交者；
+    - 返回码 -1/-2/-3 以及 ErrorID 90/154 的查询放回队首，间隔 retry_delay 秒后重试；
+    - 断线时在途的查询放回队首，重新登录后继续发送。
+
+请求ID由 RequestManager 分配，应答汇总到每个查询的 future（concurrent.futures.Future），
+收到最后一条应答后以应答快照列表完成。
+
+用法：
+    scheduler = QueryScheduler(send_query)  # send_query(method, req, request_id) -> 返回码
+    scheduler.on_login()
+    scheduler.submit('ReqQryInvestorPosition', req, callback)
+    # 交易 SPI 的 OnRspQry* 中调用 scheduler.on_rsp(nRequestID, pRspInfo, bIsLast, pData)
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from ctp_struct import struct_fields
+from request_manager import RequestManager, RequestError
+
+logger = logging.getLogger('trading_data_logger')
+
+RETRY_RETURN_CODES = frozenset((-1, -2, -3))  # 网络连接失败、未处理请求超过许可数、每秒发送请求数超过许可数
+RETRY_ERROR_IDS = frozenset((90, 154))  # error.xml: NEED_RETRY 查询未就绪、QK_BUSY 查询核心忙
+
+
+class TokenBucket:
+    """令牌桶限速器。
+
+    Attributes:
+        rate (float): 每秒补充的令牌数。
+        capacity (float): 桶容量，即最多可以连续发送的请求数。
+    """
+
+    def __init__(self, rate=1.0, capacity=1.0, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self._updated = clock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self):
+        """距离下一个令牌可用的秒数，0 表示现在就可以发送"""
+        self._refill(self.clock())
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        """取走一个令牌"""
+        self._refill(self.clock())
+        self.tokens -= 1
+
+    def penalize(self):
+        """被前置限流后清空令牌，等满一个周期再发"""
+        self._refill(self.clock())
+        self.tokens = min(self.tokens, 0.0)
+
+
+class QueryRequest:
+    """一个排队中或在途的查询。
+
+    Attributes:
+        method (str): 查询方法名，如 'ReqQryInvestorPosition'。
+        req: 查询请求结构体。
+        request_id (int): 本次发送使用的请求ID，重试时重新分配。
+        retries (int): 重试次数。
+        error: 最终失败时的 pRspInfo（发送失败时为 ReqQry* 的返回码），成功为 None。
+        future (Future): 以应答快照列表完成，失败时抛出 RequestError。
+        done (threading.Event): 查询完成（收到最后一条应答或最终失败）后置位。
+    """
+    __slots__ = ('method', 'req', 'key', 'request_id', 'callbacks', 'retries', 'not_before', 'error', 'future',
+                 'done')
+
+    def __init__(self, method, req, key):
+        self.method = method
+        self.req = req
+        self.key = key
+        self.request_id = 0
+        self.callbacks = []
+        self.retries = 0
+        self.not_before = 0.0
+        self.error = None
+        self.future = Future()
+        self.done = threading.Event()
+
+    def __repr__(self):
+        return f"QueryRequest({self.method}, request_id={self.request_id}, retries={self.retries})"
+
+
+def query_key(method, req):
+    """查询的合并键：方法名加上请求结构体全部字段的值"""
+    if req is None:
+        return (method,)
+    if isinstance(req, SimpleNamespace):
+        return (method,) + tuple(sorted(vars(req).items()))
+    return (method,) + tuple(getattr(req, name) for name in struct_fields(type(req)))
+
+
+class QueryScheduler:
+    """交易查询调度器，线程安全。
+
+    Attributes:
+        sent (int): 已发送的查询数（含重试）。
+        retried (int): 因流控或查询未就绪而重试的次数。
+        coalesced (int): 被合并掉的重复查询数。
+    """
+
+    def __init__(self, send_query, rate=1.0, burst=1, max_in_flight=1, retry_delay=1.0, requests=None,
+                 clock=time.monotonic):
+        """初始化查询调度器。
+
+        Args:
+            send_query (callable): 发送查询的函数，参数为 (方法名, 请求结构体, 请求ID)，返回 ReqQry* 的返回码。
+            rate (float): 每秒最多发送的查询数。
+            burst (int): 令牌桶容量。
+            max_in_flight (int): 同时在途的查询数上限。
+            retry_delay (float): 被限流或查询未就绪后的重试间隔，单位秒。
+            requests (RequestManager): 分配请求ID、汇总应答的请求管理器，与其他请求共用以保证请求ID不重复。
+            clock (callable): 时钟函数。
+        """
+        self.send_query = send_query
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.max_in_flight = max_in_flight
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.requests = requests if requests is not None else RequestManager()
+        self.sent = 0
+        self.retried = 0
+        self.coalesced = 0
+        self._queue = deque()
+        self._pending = {}  # 合并键 -> 排队中的 QueryRequest
+        self._in_flight = {}  # 请求ID -> 在途的 QueryRequest
+        self._logged_in = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, method, req=None, callback=None):
+        """提交一个查询。与排队中的查询相同时合并为一个。
+
+        Args:
+            method (str): 查询方法名，如 'ReqQryInvestorPosition'。
+            req: 查询请求结构体。
+            callback (callable): 查询完成时在交易回调线程中调用，参数为 QueryRequest。
+
+        Returns:
+            QueryRequest: 排队中的查询，可以等待其 done 事件。
+        """
+        key = query_key(method, req)
+        with self._cond:
+            request = self._pending.get(key)
+            if request is not None:
+                self.coalesced += 1
+            else:
+                request = self._pending[key] = QueryRequest(method, req, key)
+                self._queue.append(request)
+                self._cond.notify()
+            if callback is not None:
+                request.callbacks.append(callback)
+            self._ensure_thread()
+        return request
+
+    def __getattr__(self, name):
+        """scheduler.ReqQryXxx(req, callback) 等同于 scheduler.submit('ReqQryXxx', req, callback)"""
+        if name.startswith('ReqQry'):
+            return lambda req=None, callback=None: self.submit(name, req, callback)
+        raise AttributeError(name)
+
+    def join(self, timeout=None):
+        """等待队列中和在途的查询全部完成。
+
+        Args:
+            timeout (float): 最长等待时间，None 表示一直等待。
+
+        Returns:
+            bool: 是否全部完成。
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._cond:
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - self.clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def __len__(self):
+        """排队中和在途的查询数"""
+        return len(self._queue) + len(self._in_flight)
+
+    # ---------- 由交易 SPI 回调驱动 ----------
+
+    def on_login(self):
+        """交易登录成功后调用，开始发送查询"""
+        with self._cond:
+            self._logged_in = True
+            self._ensure_thread()
+            self._cond.notify_all()
+
+    def on_disconnected(self):
+        """连接断开后调用，暂停发送，在途的查询放回队首，重新登录后重发"""
+        with self._cond:
+            self._logged_in = False
+            for request in sorted(self._in_flight.values(), key=lambda r: r.request_id, reverse=True):
+                self.requests.discard(request.request_id)
+                self._requeue(request, 0.0)
+            self._in_flight.clear()
+
+    def on_rsp(self, nRequestID, pRspInfo, bIsLast, pData=None):
+        """OnRspQry* 中调用，汇总应答，最后一条应答到达后释放在途名额。
+
+        Args:
+            nRequestID (int): 应答的请求ID。
+            pRspInfo: 响应信息。
+            bIsLast (bool): 是否最后一条应答。
+            pData: 应答数据。
+
+        Returns:
+            QueryRequest: 对应的查询，不是由本调度器发出的请求返回 None。
+        """
+        error = pRspInfo is not None and pRspInfo.ErrorID != 0
+        with self._cond:
+            request = self._in_flight.get(nRequestID)
+        if request is None:
+            return None
+        self.requests.on_rsp(pData, pRspInfo, nRequestID, bIsLast)  # 先完成 future，查询回调中可以直接取结果
+        with self._cond:
+            if self._in_flight.get(nRequestID) is not request:
+                return request  # 断线后已放回队列
+            if error and pRspInfo.ErrorID in RETRY_ERROR_IDS:
+                del self._in_flight[nRequestID]
+                self.retried += 1
+                logger.info(f"查询未就绪, {self.retry_delay}秒后重试: {request.method}, {pRspInfo.ErrorMsg}")
+                self._requeue(request, self.retry_delay)
+                self._cond.notify_all()
+                return request
+            if not bIsLast and not error:
+                return request
+            del self._in_flight[nRequestID]
+            if error:
+                request.error = pRspInfo
+            self._cond.notify_all()
+        self._finish(request)
+        return request
+
+    # ---------- 发送线程 ----------
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="query_scheduler", daemon=True)
+            self._thread.start()
+
+    def _requeue(self, request, delay):
+        """放回队首，调用方持有锁"""
+        request.retries += 1 if delay else 0
+        request.not_before = self.clock() + delay
+        self._queue.appendleft(request)
+        self._pending.setdefault(request.key, request)
+
+    def _next_request(self):
+        """等待可以发送的查询，调用方持有锁"""
+        while True:
+            if not self._logged_in or not self._queue or len(self._in_flight) >= self.max_in_flight:
+                self._cond.wait()
+                continue
+            wait = max(self.bucket.delay(), self._queue[0].not_before - self.clock())
+            if wait > 0:
+                self._cond.wait(wait)
+                continue
+            request = self._queue.popleft()
+            if self._pending.get(request.key) is request:
+                del self._pending[request.key]  # 发出之后再提交的相同查询重新排队
+            self.bucket.take()
+            request.request_id = self.requests.next_id()
+            self.requests.register(request.request_id, request.future, RETRY_ERROR_IDS)
+            self._in_flight[request.request_id] = request
+            return request
+
+    def _run(self):
+        while True:
+            with self._cond:
+                request = self._next_request()
+            try:
+                ret = self.send_query(request.method, request.req, request.request_id)
+            except Exception:
+                logger.exception(f"发送查询出错: {request.method}")
+                ret = None
+            with self._cond:
+                self.sent += 1
+                if ret == 0 or request.request_id not in self._in_flight:
+                    continue  # 发送成功，或应答已经先到达
+                del self._in_flight[request.request_id]
+                self.requests.discard(request.request_id)
+                self._cond.notify_all()
+                if ret in RETRY_RETURN_CODES:
+                    self.retried += 1
+                    self.bucket.penalize()
+                    self._requeue(request, self.retry_delay)
+                    continue
+            logger.error(f"发送查询失败: {request.method}, 返回码: {ret}")
+            request.error = ret
+            if not request.future.done():
+                request.future.set_exception(RequestError(ret, "发送查询失败", request.request_id))
+            self._finish(request)
+
+    def _finish(self, request):
+        for callback in request.callbacks:
+            try:
+                callback(request)
+            except Exception:
+                logger.exception(f"查询回调出错: {request.method}")
+        request.done.set()
@@ -0,0 +1,150 @@
+"""请求与应答的关联。
+
+CTP 的每个请求都带一个请求ID（nRequestID），对应的 OnRsp* 回调原样带回这个ID，一个请求可能有多条应答，
+最后一条的 bIsLast 为 True。RequestManager 为每个请求分配唯一的请求ID，并返回一个
+concurrent.futures.Future：收集该请求的全部应答（用 ctp_struct.copy_struct 拷贝成快照），
+收到最后一条后以快照列表完成；pRspInfo.ErrorID 不为 0 时以 RequestError 失败。
+
+调用方不再需要在 SPI 上保存临时列表和 threading.Event，可以同时发出多个请求再分别等待：
+    futures = [requests.call(api.ReqQryInstrument, req1), requests.call(api.ReqQryOrder, req2)]
+    instruments, orders = [future.result() for future in futures]
+
+在 asyncio 中：
+    rows = await requests.acall(api.ReqQryInstrument, req)
+"""
+import asyncio
+import itertools
+import threading
+from concurrent.futures import Future
+
+from ctp_struct import copy_struct
+
+
+class RequestError(RuntimeError):
+    """请求失败：发送时返回码不为 0，或应答的 ErrorID 不为 0。
+
+    Attributes:
+        error_id (int): 应答的 ErrorID，发送失败时为 ReqXxx 的返回码。
+        error_msg (str): 错误信息。
+        request_id (int): 请求ID。
+    """
+
+    def __init__(self, error_id, error_msg, request_id=None):
+        super().__init__(f"请求失败: {error_id}, {error_msg}, 请求ID: {request_id}")
+        self.error_id = error_id
+        self.error_msg = error_msg
+        self.request_id = request_id
+
+
+class _Pending:
+    __slots__ = ('future', 'rows', 'ignore_errors')
+
+    def __init__(self, future, ignore_errors):
+        self.future = future
+        self.rows = []
+        self.ignore_errors = ignore_errors
+
+
+class RequestManager:
+    """分配请求ID并把应答汇总到 Future，线程安全。"""
+
+    def __init__(self, first_id=1):
+        """初始化请求管理器。
+
+        Args:
+            first_id (int): 第一个请求ID。
+        """
+        self._ids = itertools.count(first_id)
+        self._pending = {}  # 请求ID -> _Pending
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        """分配一个新的请求ID"""
+        with self._lock:
+            return next(self._ids)
+
+    def register(self, request_id, future=None, ignore_errors=()):
+        """登记一个已分配的请求ID，之后该ID的应答汇总到 future。
+
+        Args:
+            request_id (int): 请求ID。
+            future (Future): 汇总应答的 Future，None 表示新建一个。
+            ignore_errors (iterable): 这些 ErrorID 的应答只丢弃登记、不让 Future 失败（由调用方重发）。
+
+        Returns:
+            Future: 汇总应答的 Future。
+        """
+        if future is None:
+            future = Future()
+        with self._lock:
+            self._pending[request_id] = _Pending(future, frozenset(ignore_errors))
+        return future
+
+    def discard(self, request_id):
+        """放弃等待某个请求ID的应答（如请求被重发、连接断开），对应的 Future 保持未完成"""
+        with self._lock:
+            self._pending.pop(request_id, None)
+
+    def call(self, func, req):
+        """分配请求ID并发送请求。
+
+        Args:
+            func (callable): API 的请求方法，如 api.ReqQryInstrument。
+            req: 请求结构体。
+
+        Returns:
+            Future: 以应答快照列表完成的 Future。
+        """
+        request_id = self.next_id()
+        future = self.register(request_id)
+        ret = func(req, request_id)
+        if ret != 0:
+            self.discard(request_id)
+            future.set_exception(RequestError(ret, "发送请求失败", request_id))
+        return future
+
+    async def acall(self, func, req):
+        """call() 的 asyncio 版本，等待并返回应答快照列表"""
+        return await asyncio.wrap_future(self.call(func, req))
+
+    def on_rsp(self, pData, pRspInfo, nRequestID, bIsLast):
+        """OnRsp* 回调中调用，收集应答。
+
+        Args:
+            pData: 应答数据，没有数据时为 None。
+            pRspInfo: 响应信息。
+            nRequestID (int): 请求ID。
+            bIsLast (bool): 是否最后一条应答。
+
+        Returns:
+            bool: 是否是登记过的请求。
+        """
+        with self._lock:
+            pending = self._pending.get(nRequestID)
+            if pending is None:
+                return False
+            if pRspInfo is not None and pRspInfo.ErrorID != 0:
+                del self._pending[nRequestID]
+                if pRspInfo.ErrorID in pending.ignore_errors:
+                    return True
+                error = RequestError(pRspInfo.ErrorID, pRspInfo.ErrorMsg, nRequestID)
+                rows = None
+            else:
+                if pData is not None:
+                    pending.rows.append(copy_struct(pData))
+                if not bIsLast:
+                    return True
+                del self._pending[nRequestID]
+                error = None
+                rows = pending.rows
+        # 在锁外完成 Future，done 回调中可以再发请求
+        if not pending.future.done():
+            if error is not None:
+                pending.future.set_exception(error)
+            else:
+                pending.future.set_result(rows)
+        return True
+
+    def __len__(self):
+        """等待应答的请求数"""
+        return len(self._pending)
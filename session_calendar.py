@@ -0,0 +1,191 @@
+"""交易时段日历。
+
+把 SimNowID.yaml 中的 trading_sessions 预先编译成每个产品一张按秒索引的表（86400 字节），
+判断某一时刻是否在交易时段内只需要一次查表，跨午夜的夜盘（如 cu 的 [21, 0, 1, 0]、
+au 的 [21, 0, 2, 30]）也能正确处理。时间取行情自身的交易所时间，而不是本机时钟。
+
+交易时段包含开始和结束两个时刻，与原来 start <= t <= end 的判断一致。
+不考虑周末和节假日。
+"""
+import re
+from bisect import bisect_right
+from datetime import datetime, time as dtime, timedelta
+
+import yaml
+
+DAY_SECONDS = 24 * 3600
+TRADING_DAY_START = 18 * 3600  # 交易日从前一天 18:00 开始计算，夜盘和次日日盘属于同一个交易日
+
+_PRODUCT_PATTERN = re.compile(r'[A-Za-z]+')
+
+
+def product_of(instrument_id):
+    """合约代码对应的产品代码，如 rb2410 -> rb"""
+    match = _PRODUCT_PATTERN.match(instrument_id)
+    return match.group(0) if match else instrument_id
+
+
+def trading_seconds(seconds):
+    """把当日秒数换算成从交易日开始（前一天 18:00）算起的秒数，跨午夜时保持递增"""
+    return (seconds - TRADING_DAY_START) % DAY_SECONDS
+
+
+def seconds_of(ts):
+    """取一个时刻的当日秒数。
+
+    Args:
+        ts: datetime、time、当日秒数，或带 UpdateTime 字段的行情。
+
+    Returns:
+        int: 当日秒数。
+    """
+    if isinstance(ts, int):
+        return ts
+    if isinstance(ts, (datetime, dtime)):
+        return ts.hour * 3600 + ts.minute * 60 + ts.second
+    t = ts.UpdateTime
+    return int(t[0:2]) * 3600 + int(t[3:5]) * 60 + int(t[6:8])
+
+
+def _session_seconds(session):
+    """把 [开始时, 开始分, 结束时, 结束分] 或 (开始时间, 结束时间) 换算成当日秒数"""
+    if len(session) == 4:
+        start_hour, start_minute, end_hour, end_minute = session
+        return start_hour * 3600 + start_minute * 60, end_hour * 3600 + end_minute * 60
+    start, end = session
+    return seconds_of(start), seconds_of(end)
+
+
+class ProductSessions:
+    """单个产品编译后的交易时段。
+
+    Attributes:
+        product (str): 产品代码。
+        table (bytearray): 按当日秒数索引，0 表示非交易时间，否则为交易时段序号加 1。
+        sessions (list): 按交易日先后排序的 [(开始, 结束), ...]，单位为交易日秒数。
+        opens (list): 各时段开始的当日秒数，升序。
+        close_of_open (dict): 时段开始的当日秒数 -> 结束的当日秒数。
+    """
+
+    def __init__(self, product, sessions):
+        self.product = product
+        clock_sessions = sorted((_session_seconds(session) for session in sessions),
+                                key=lambda session: trading_seconds(session[0]))
+        self.sessions = [(trading_seconds(start), trading_seconds(end)) for start, end in clock_sessions]
+        self.table = bytearray(DAY_SECONDS)
+        for index, (start, end) in enumerate(clock_sessions):
+            if start <= end:
+                self.table[start:end + 1] = bytes([index + 1]) * (end + 1 - start)
+            else:  # 跨午夜
+                self.table[start:] = bytes([index + 1]) * (DAY_SECONDS - start)
+                self.table[:end + 1] = bytes([index + 1]) * (end + 1)
+        self.opens = sorted(start for start, _ in clock_sessions)
+        self.close_of_open = {start: end for start, end in clock_sessions}
+
+    def session_at(self, seconds):
+        """当日秒数所在的交易时段序号，非交易时间返回 -1"""
+        return self.table[seconds] - 1
+
+
+class TradingCalendar:
+    """按产品查询交易时段。"""
+
+    def __init__(self, trading_sessions=None):
+        """编译交易时段。
+
+        Args:
+            trading_sessions (dict): 产品代码 -> 交易时段列表，格式同 SimNowID.yaml 中的 trading_sessions。
+        """
+        self._products = {}
+        self._instruments = {}  # 合约代码 -> ProductSessions 的缓存
+        for product, sessions in (trading_sessions or {}).items():
+            self.add(product, sessions)
+
+    @classmethod
+    def from_yaml(cls, yaml_file='SimNowID.yaml'):
+        """从 YAML 配置文件编译交易日历"""
+        with open(yaml_file, 'r', encoding='utf-8') as file:
+            data = yaml.safe_load(file)
+        return cls(data['trading_sessions'])
+
+    def add(self, product, sessions):
+        """添加或替换一个产品的交易时段。
+
+        Args:
+            product (str): 产品代码。
+            sessions (list): [[开始时, 开始分, 结束时, 结束分], ...] 或 [(开始时间, 结束时间), ...]。
+        """
+        self._products[product] = ProductSessions(product, sessions)
+        self._instruments.clear()
+
+    def sessions(self, product):
+        """产品（或合约）编译后的交易时段，找不到时返回 None"""
+        compiled = self._instruments.get(product)
+        if compiled is None:
+            compiled = self._products.get(product)
+            if compiled is None:
+                compiled = self._products.get(product_of(product))
+            if compiled is None:
+                return None
+            self._instruments[product] = compiled
+        return compiled
+
+    def __contains__(self, product):
+        return self.sessions(product) is not None
+
+    def is_trading(self, product, ts):
+        """某一时刻是否在交易时段内。
+
+        Args:
+            product (str): 产品代码或合约代码。
+            ts: datetime、time、当日秒数，或带 UpdateTime 字段的行情（取交易所时间）。
+
+        Returns:
+            bool: 是否在交易时段内，没有配置交易时段的产品返回 False。
+        """
+        compiled = self.sessions(product)
+        return compiled is not None and compiled.table[seconds_of(ts)] != 0
+
+    def next_open(self, product, ts):
+        """ts 之后下一个交易时段的开始时间（不含 ts 本身）。
+
+        Args:
+            product (str): 产品代码或合约代码。
+            ts (datetime): 参考时间。
+
+        Returns:
+            datetime: 开始时间，没有配置交易时段的产品返回 None。
+        """
+        compiled = self.sessions(product)
+        if compiled is None:
+            return None
+        seconds = seconds_of(ts)
+        i = bisect_right(compiled.opens, seconds)
+        base = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+        if i < len(compiled.opens):
+            return base + timedelta(seconds=compiled.opens[i])
+        return base + timedelta(days=1, seconds=compiled.opens[0])
+
+    def next_close(self, product, ts):
+        """当前交易时段的结束时间；非交易时间时返回下一个交易时段的结束时间。
+
+        Args:
+            product (str): 产品代码或合约代码。
+            ts (datetime): 参考时间。
+
+        Returns:
+            datetime: 结束时间，没有配置交易时段的产品返回 None。
+        """
+        compiled = self.sessions(product)
+        if compiled is None:
+            return None
+        seconds = seconds_of(ts)
+        base = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+        if compiled.table[seconds]:
+            # 交易时段内：按交易日秒数算出距当前时段结束还有多久
+            end_trading = compiled.sessions[compiled.table[seconds] - 1][1]
+            return base + timedelta(seconds=seconds + end_trading - trading_seconds(seconds))
+        open_time = self.next_open(product, ts)
+        open_seconds = seconds_of(open_time)
+        end = compiled.close_of_open[open_seconds]
+        return open_time + timedelta(seconds=(end - open_seconds) % DAY_SECONDS)
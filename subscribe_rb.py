@@ -2,8 +2,9 @@ import os
 import threading  # 导入线程模块
 import time  # 导入时间模块
 import logging  # 导入 logging 模块
-from datetime import datetime  # 导入日期时间模块
 from login_cpi import MdSpiImpl  # 从 answer1_login_cpi 导入 MdSpiImpl 类
+from tick_snapshot import snapshot  # 一次性拷贝整条行情
+from session_calendar import TradingCalendar  # 交易时段日历
 from config import get_product_id, get_trading_sessions, get_mainproduct_id  # 从 config.py 导入 get_product_id 和 get_trading_sessions 函数
 
 # %% 设置工作目录
@@ -24,7 +25,7 @@ class CustomMdSpi(MdSpiImpl):
     Attributes:
         instruments (list): 合约列表。
         product_id (str): 产品ID。
-        trading_sessions (list): 交易时间段列表。
+        calendar (TradingCalendar): 编译好的交易时段日历。
     """
 
     def __init__(self, product_id, trading_sessions):
@@ -37,7 +38,7 @@ class CustomMdSpi(MdSpiImpl):
         super().__init__()
         self.instruments = []  # 初始化合约列表
         self.product_id = product_id  # 保存产品ID
-        self.trading_sessions = trading_sessions  # 保存交易时间段
+        self.calendar = TradingCalendar({product_id: trading_sessions})  # 预先编译交易时间段，逐笔查表判断
 
     def OnRspUserLogin(self, pRspUserLogin, pRspInfo, nRequestID, bIsLast):
         """用户登录响应"""
@@ -57,23 +58,27 @@ class CustomMdSpi(MdSpiImpl):
         Args:
             pDepthMarketData: 深度行情数据。
         """
-        print(f"接收到行情数据: {pDepthMarketData}")
-        logging.info(f"接收到行情数据: {pDepthMarketData}")
-        current_time = datetime.now().time()  # 获取当前时间
-
-        # 检查当前时间是否在交易时间段内
-        if not any(session[0] <= current_time <= session[1] for session in self.trading_sessions):
+        tick = snapshot(pDepthMarketData)  # 一次本地调用取出全部字段
+        if self.journal is not None:
+            self.journal.append(tick)  # 记录模式：写入定长二进制记录，不再逐笔格式化日志
+        else:
+            print(f"接收到行情数据: {tick}")
+            logging.info(f"接收到行情数据: {tick}")
+
+        # 按行情自身的交易所时间查表判断是否在交易时间段内（支持跨午夜的夜盘）
+        if not self.calendar.is_trading(self.product_id, tick):
             return  # 非交易时间，忽略数据
 
-        print(f"买一价: {pDepthMarketData.BidPrice1}, 最新价: {pDepthMarketData.LastPrice}, 卖一价: {pDepthMarketData.AskPrice1}, 成交量: {pDepthMarketData.Volume}")
-        logging.info(f"买一价: {pDepthMarketData.BidPrice1}, 最新价: {pDepthMarketData.LastPrice}, 卖一价: {pDepthMarketData.AskPrice1}, 成交量: {pDepthMarketData.Volume}")
+        print(f"买一价: {tick.BidPrice1}, 最新价: {tick.LastPrice}, 卖一价: {tick.AskPrice1}, 成交量: {tick.Volume}")
+        logging.info(f"买一价: {tick.BidPrice1}, 最新价: {tick.LastPrice}, 卖一价: {tick.AskPrice1}, 成交量: {tick.Volume}")
         # super().OnRtnDepthMarketData()
 
-def main(product_name):
+def main(product_name, record=False):
     """主程序。
     初始化自定义行情 SPI 实例，启动事件循环线程并查询合约。
     Args:
         product_name (str): 要查询的产品名称。
+        record (bool): 是否开启记录模式，把逐笔行情写入 logs/market_data/ticks 下的二进制日志。
     """
     # 获取产品id
     product_id = get_product_id(product_name)  # 获取产品ID
@@ -97,6 +102,8 @@ def main(product_name):
     product_id = get_mainproduct_id(product_id) # 此处应该接入一个主力合约计算函数
 
     md_spi = CustomMdSpi(product_id, trading_sessions)  # 创建自定义行情 SPI 实例，传入产品ID和交易时间段
+    if record:
+        md_spi.enable_recorder()  # 开启行情记录
     md_spi.initialize()  # 初始化行情 API
 
     # 启动行情 API 事件循环的线程
@@ -109,7 +116,7 @@ def main(product_name):
     except KeyboardInterrupt:
         print("停止行情订阅")
         logging.info("停止行情订阅")
-        md_spi.api.Release()  # 释放 API
+        md_spi.close()  # 释放 API，停止批量投递并关闭行情日志文件
 
 if __name__ == "__main__":
     product_name = "螺纹钢"  # 定义要查询的产品名称
@@ -0,0 +1,172 @@
+"""行情订阅管理。
+
+记录需要订阅的合约集合，去掉重复请求，把大批量合约分批发给前置，
+通过 OnRspSubMarketData 确认每个合约的订阅结果；断线重连登录后按差集重新订阅，
+订阅全市场两千多个合约时不会一次性把请求全部压给前置，也不会在重连后悄悄漏掉合约。
+
+批次按滑动窗口发送：在途（已发送、未确认）的合约数不超过 batch_size，
+收到确认把窗口腾出一半后再发送下一批。发送失败（如网络未就绪）的批次放回队首，retry_delay 秒后重试。
+"""
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger('market_data_logger')
+
+
+class SubscriptionManager:
+    """行情订阅管理器。
+
+    Attributes:
+        desired (set): 需要订阅的合约。
+        confirmed (set): 当前会话中已确认订阅成功的合约。
+        pending (set): 已发送、尚未确认的合约。
+        failed (dict): 订阅失败的合约 -> 错误信息。
+    """
+
+    def __init__(self, send_subscribe, send_unsubscribe=None, batch_size=500, retry_delay=1.0):
+        """初始化订阅管理器。
+
+        Args:
+            send_subscribe (callable): 发送订阅请求的函数，参数为合约代码列表，返回 CTP 的返回值（0 表示成功）。
+            send_unsubscribe (callable): 发送退订请求的函数，参数同上。
+            batch_size (int): 在途合约数上限，也是单次请求的最大合约数。
+            retry_delay (float): 订阅请求发送失败后的重试间隔，单位秒。
+        """
+        self.send_subscribe = send_subscribe
+        self.send_unsubscribe = send_unsubscribe
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.desired = set()
+        self.confirmed = set()
+        self.pending = set()
+        self.failed = {}
+        self.logged_in = False
+        self._queue = deque()  # 等待发送的合约
+        self._queued = set()
+        self._retry = None  # 发送失败后的重试定时器
+        self._lock = threading.Lock()
+
+    def subscribe(self, instruments):
+        """添加需要订阅的合约，已登录时立即按批次发送，未登录时等登录后发送。
+
+        Args:
+            instruments (list): 合约代码列表，重复的合约会被忽略。
+        """
+        with self._lock:
+            for instrument in instruments:
+                if not instrument or instrument in self.desired:
+                    continue
+                self.desired.add(instrument)
+                self.failed.pop(instrument, None)
+                self._enqueue(instrument)
+        self._pump()
+
+    def unsubscribe(self, instruments):
+        """取消订阅。
+
+        Args:
+            instruments (list): 合约代码列表。
+        """
+        with self._lock:
+            to_send = []
+            for instrument in instruments:
+                if instrument not in self.desired:
+                    continue
+                self.desired.discard(instrument)
+                self.failed.pop(instrument, None)
+                if instrument in self.confirmed or instrument in self.pending:
+                    to_send.append(instrument)
+                self.confirmed.discard(instrument)
+                self.pending.discard(instrument)
+            send = self.logged_in and self.send_unsubscribe is not None
+        if send:
+            for i in range(0, len(to_send), self.batch_size):
+                self.send_unsubscribe(to_send[i:i + self.batch_size])
+        self._pump()
+
+    def on_login(self):
+        """登录成功后调用：把尚未确认的合约（差集）重新排队发送"""
+        with self._lock:
+            self.logged_in = True
+            for instrument in self.desired:
+                if instrument not in self.confirmed and instrument not in self.pending:
+                    self._enqueue(instrument)
+        self._pump()
+
+    def on_disconnected(self):
+        """断线时调用：前置不会保留旧会话的订阅，清空确认状态，等重新登录后再订阅"""
+        with self._lock:
+            self.logged_in = False
+            self.confirmed.clear()
+            self.pending.clear()
+            self._queue.clear()
+            self._queued.clear()
+            if self._retry is not None:
+                self._retry.cancel()  # 重新登录时 on_login 会重新排队发送
+                self._retry = None
+
+    def on_rsp_sub(self, instrument, error_id=0, error_msg=""):
+        """OnRspSubMarketData 中调用，确认一个合约的订阅结果。
+
+        Args:
+            instrument (str): 合约代码。
+            error_id (int): 错误代码，0 表示成功。
+            error_msg (str): 错误信息。
+        """
+        with self._lock:
+            self.pending.discard(instrument)
+            if instrument in self.desired:
+                if error_id == 0:
+                    self.confirmed.add(instrument)
+                else:
+                    self.failed[instrument] = error_msg
+        self._pump()
+
+    def missing(self):
+        """需要订阅但尚未确认的合约"""
+        with self._lock:
+            return self.desired - self.confirmed
+
+    def _enqueue(self, instrument):
+        if instrument not in self._queued:
+            self._queued.add(instrument)
+            self._queue.append(instrument)
+
+    def _pump(self):
+        """在途合约不超过窗口一半时，发送下一批"""
+        while True:
+            with self._lock:
+                if not self.logged_in or not self._queue or len(self.pending) > self.batch_size // 2:
+                    return
+                batch = []
+                while self._queue and len(self.pending) + len(batch) < self.batch_size:
+                    instrument = self._queue.popleft()
+                    self._queued.discard(instrument)
+                    if instrument in self.desired and instrument not in self.confirmed \
+                            and instrument not in self.pending:
+                        batch.append(instrument)
+                self.pending.update(batch)
+            if not batch:
+                continue
+            ret = self.send_subscribe(batch)
+            if ret:
+                # 发送失败（如网络未就绪），放回队首，retry_delay 秒后重试；不能只等下一个确认触发，
+                # 没有其他在途合约时不会再有确认到达
+                logger.error(f"订阅请求发送失败, 返回值: {ret}, 合约数: {len(batch)}, {self.retry_delay}秒后重试")
+                with self._lock:
+                    self.pending.difference_update(batch)
+                    for instrument in reversed(batch):
+                        if instrument not in self._queued:
+                            self._queued.add(instrument)
+                            self._queue.appendleft(instrument)
+                    if self._retry is None:
+                        self._retry = threading.Timer(self.retry_delay, self._on_retry)
+                        self._retry.daemon = True
+                        self._retry.start()
+                return
+
+    def _on_retry(self):
+        with self._lock:
+            self._retry = None
+        self._pump()
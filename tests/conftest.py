@@ -0,0 +1,172 @@
+"""测试公共部分：用 ctp_simulator 的模拟交易 API 驱动 OrderManager 和 PositionBook。
+
+模拟器不自动推送行情（tick_rate=None），每笔行情由测试用 quote() 构造、push_tick() 推送；
+每个请求之后调用 wait_idle() 等回调线程执行完全部回报，结果是确定的。
+"""
+import itertools
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ctp_simulator import CTPSimulator
+from order_manager import OrderManager
+from position_book import PositionBook
+from timer_wheel import TimerWheel
+
+INSTRUMENT = 'rb2410'
+
+
+class TraderSpi:
+    """最小的交易 SPI：把回报转给 OrderManager 和 PositionBook，并按顺序记录回调名称"""
+
+    def __init__(self, order_manager, position_book):
+        self.order_manager = order_manager
+        self.position_book = position_book
+        self.callbacks = []
+        self.trades = []
+
+    def OnRspUserLogin(self, pRspUserLogin, pRspInfo, nRequestID, bIsLast):
+        self.order_manager.on_login(pRspUserLogin.FrontID, pRspUserLogin.SessionID, pRspUserLogin.MaxOrderRef)
+
+    def OnRtnOrder(self, pOrder):
+        self.callbacks.append('OnRtnOrder')
+        self.order_manager.on_rtn_order(pOrder)
+
+    def OnRtnTrade(self, pTrade):
+        self.callbacks.append('OnRtnTrade')
+        self.trades.append(pTrade)
+        self.order_manager.on_rtn_trade(pTrade)
+        self.position_book.on_trade(pTrade)
+
+    def OnRspOrderAction(self, pInputOrderAction, pRspInfo, nRequestID, bIsLast):
+        self.callbacks.append('OnRspOrderAction')
+        self.order_manager.on_rsp_order_action(pInputOrderAction, pRspInfo)
+
+    def OnErrRtnOrderAction(self, pOrderAction, pRspInfo):
+        self.callbacks.append('OnErrRtnOrderAction')
+        self.order_manager.on_rsp_order_action(pOrderAction, pRspInfo)
+
+    def OnRspQryInvestorPosition(self, pInvestorPosition, pRspInfo, nRequestID, bIsLast):
+        self.position_book.seed(pInvestorPosition, bIsLast)
+
+
+class Trader:
+    """一个已登录的模拟交易会话。
+
+    Attributes:
+        sim (CTPSimulator): 模拟器。
+        api (FakeTraderApi): 模拟交易 API。
+        spi (TraderSpi): 交易 SPI。
+        order_manager (OrderManager): 报单管理器，states 记录每次状态变化。
+        position_book (PositionBook): 持仓簿，螺纹钢合约乘数为 10。
+        now (float): timers 使用的时钟，由测试手动推进。
+        timers (TimerWheel): 超时撤单的时间轮。
+    """
+
+    def __init__(self):
+        self.sim = CTPSimulator(instruments=(INSTRUMENT,), tick_rate=None, seed=1,
+                                start_time=datetime(2024, 7, 1, 9, 0, 0))
+        self.states = []
+        self.now = 1000.0
+        self.timers = TimerWheel(clock=lambda: self.now)
+        self._order_timers = {}
+        self.order_manager = OrderManager(on_update=self._on_order_update)
+        self.position_book = PositionBook({'rb': 10})
+        self.spi = TraderSpi(self.order_manager, self.position_book)
+        self.api = self.sim.CreateFtdcTraderApi()
+        self.api.RegisterSpi(self.spi)
+        self._request_ids = itertools.count(1)
+        self._volume = 0
+        self.api.Init()
+        self.api.ReqUserLogin(SimpleNamespace(BrokerID='9999', UserID='000001'), next(self._request_ids))
+        self.api.wait_idle()
+
+    def _on_order_update(self, order):
+        # 与 AutoTradeSpi.on_order_update 相同：报单完成后取消超时撤单的定时器
+        self.states.append(order.state)
+        if not order.is_working:
+            timer = self._order_timers.pop(order.key, None)
+            if timer is not None:
+                timer.cancel()
+
+    def quote(self, last_price, traded=0, bid=None, bid_volume=10, ask=None, ask_volume=10):
+        """推送一笔行情，五档价格从一档起按最小变动价位展开，二到五档挂单量为 50。
+
+        Args:
+            last_price (float): 最新价。
+            traded (int): 与上一笔行情相比新增的成交量。
+            bid (float): 买一价，默认为最新价减一个价位。
+            bid_volume (int): 买一量。
+            ask (float): 卖一价，默认为买一价加一个价位。
+            ask_volume (int): 卖一量。
+        """
+        self._volume += traded
+        bid = last_price - 1 if bid is None else bid
+        ask = bid + 1 if ask is None else ask
+        values = {'LastPrice': last_price, 'Volume': self._volume}
+        for level in range(1, 6):
+            values[f'BidPrice{level}'] = bid - (level - 1)
+            values[f'AskPrice{level}'] = ask + (level - 1)
+            values[f'BidVolume{level}'] = bid_volume if level == 1 else 50
+            values[f'AskVolume{level}'] = ask_volume if level == 1 else 50
+        tick = self.sim._make_tick(INSTRUMENT, last_price, self._volume)._replace(**values)
+        self.sim.push_tick(tick)
+        self.api.wait_idle()
+
+    def send(self, direction, offset, price, volume, time_condition='3', volume_condition='1', timeout=None):
+        """按 AutoTradeSpi.PlaceOrder 的顺序报单，返回 OrderManager 登记的 ManagedOrder。
+
+        Args:
+            timeout (float): 超时撤单的时间，单位秒，None 表示不设定时器。
+        """
+        req = SimpleNamespace(
+            BrokerID='9999', InvestorID='000001', InstrumentID=INSTRUMENT, OrderRef="", Direction=direction,
+            CombOffsetFlag=offset, CombHedgeFlag='1', LimitPrice=price, VolumeTotalOriginal=volume,
+            OrderPriceType='2', TimeCondition=time_condition, VolumeCondition=volume_condition,
+        )
+        order = self.order_manager.new_order(req)
+        if timeout is not None:
+            self._order_timers[order.key] = self.timers.call_later(timeout, self.cancel, order)
+        ret = self.api.ReqOrderInsert(req, next(self._request_ids))
+        if ret != 0:
+            self.order_manager.on_send_failed(order, ret)
+        self.api.wait_idle()
+        return order
+
+    def cancel(self, order):
+        """撤单，与 mass_cancel.MassCanceller.cancel_order 填写相同的字段"""
+        self._order_timers.pop(order.key, None)
+        order.cancel_time = self.sim.exchange_time
+        action = SimpleNamespace(
+            BrokerID='9999', InvestorID='000001', InstrumentID=order.instrument_id, ActionFlag='0',
+            FrontID=order.front_id, SessionID=order.session_id, OrderRef=order.order_ref,
+            ExchangeID=order.exchange_id, OrderSysID=order.order_sys_id,
+        )
+        self.api.ReqOrderAction(action, next(self._request_ids))
+        self.api.wait_idle()
+
+    def query_positions(self):
+        """用 ReqQryInvestorPosition 的应答初始化持仓簿"""
+        self.api.ReqQryInvestorPosition(SimpleNamespace(InstrumentID=""), next(self._request_ids))
+        self.api.wait_idle()
+
+    def advance(self, seconds):
+        """时钟前进 seconds 秒并推进时间轮，返回触发的定时器个数"""
+        self.now += seconds
+        return self.timers.advance()
+
+    def engine_order(self, order):
+        """ManagedOrder 在撮合引擎中对应的报单"""
+        return self.sim._orders[order.key].engine_order
+
+
+@pytest.fixture
+def trader():
+    trader = Trader()
+    yield trader
+    trader.api.Release()
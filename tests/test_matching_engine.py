@@ -0,0 +1,80 @@
+"""撮合引擎：通过模拟器报单、推送行情，检查排队位置和部分成交"""
+from matching_engine import ORDER_ALL_TRADED, ORDER_CANCELED, ORDER_NO_TRADE_QUEUEING, ORDER_PART_TRADED_QUEUEING
+
+BUY = '0'
+OPEN = '0'
+
+
+def test_marketable_order_fills_against_book_levels(trader):
+    trader.quote(3500, bid=3499, ask=3500, ask_volume=3)
+    order = trader.send(BUY, OPEN, 3501, 5)
+    assert [(trade.Price, trade.Volume) for trade in trader.spi.trades] == [(3500, 3), (3501, 2)]
+    assert trader.engine_order(order).status == ORDER_ALL_TRADED
+
+
+def test_resting_order_queues_behind_visible_volume(trader):
+    trader.quote(3500, bid=3499, bid_volume=10)
+    order = trader.send(BUY, OPEN, 3499, 5)
+    engine_order = trader.engine_order(order)
+    assert engine_order.status == ORDER_NO_TRADE_QUEUEING
+    assert engine_order.queue_ahead == 10
+
+    # 成交量先消耗排在前面的量
+    trader.quote(3499, traded=6, bid=3499, bid_volume=10)
+    assert engine_order.queue_ahead == 4
+    assert engine_order.traded == 0
+
+    # 超出排队量的部分成交给挂单
+    trader.quote(3499, traded=7, bid=3499, bid_volume=10)
+    assert engine_order.queue_ahead == 0
+    assert engine_order.traded == 3
+    assert engine_order.status == ORDER_PART_TRADED_QUEUEING
+    assert [(trade.Price, trade.Volume) for trade in trader.spi.trades] == [(3499, 3)]
+
+    # 对手价越过挂单价，剩余部分全部成交
+    trader.quote(3498, bid=3497, ask=3498)
+    assert engine_order.status == ORDER_ALL_TRADED
+    assert [(trade.Price, trade.Volume) for trade in trader.spi.trades] == [(3499, 3), (3499, 2)]
+    assert trader.sim.engine.orders('rb2410') == []
+
+
+def test_cancels_ahead_shorten_queue(trader):
+    trader.quote(3500, bid=3499, bid_volume=10)
+    order = trader.send(BUY, OPEN, 3499, 1)
+    engine_order = trader.engine_order(order)
+    trader.quote(3500, bid=3499, bid_volume=2)  # 没有成交，挂单量减少视为前面有撤单
+    assert engine_order.queue_ahead == 2
+    trader.quote(3499, traded=3, bid=3499, bid_volume=2)
+    assert engine_order.status == ORDER_ALL_TRADED
+
+
+def test_same_price_orders_fill_in_time_priority(trader):
+    trader.quote(3500, bid=3499, bid_volume=10)
+    first = trader.engine_order(trader.send(BUY, OPEN, 3499, 5))
+    second = trader.engine_order(trader.send(BUY, OPEN, 3499, 5))
+    assert trader.sim.engine.orders('rb2410') == [first, second]
+
+    trader.quote(3499, traded=13, bid=3499, bid_volume=10)
+    assert (first.traded, second.traded) == (3, 0)
+
+    trader.quote(3499, traded=4, bid=3499, bid_volume=10)
+    assert (first.traded, second.traded) == (5, 2)
+    assert trader.sim.engine.orders('rb2410') == [second]
+
+
+def test_ioc_remainder_is_cancelled(trader):
+    trader.quote(3500, bid=3499, ask=3500, ask_volume=2)
+    order = trader.send(BUY, OPEN, 3500, 5, time_condition='1')
+    engine_order = trader.engine_order(order)
+    assert engine_order.traded == 2
+    assert engine_order.status == ORDER_CANCELED
+    assert trader.sim.engine.orders('rb2410') == []
+
+
+def test_all_or_none_without_enough_volume_is_cancelled(trader):
+    trader.quote(3500, bid=3499, ask=3500, ask_volume=2)
+    order = trader.send(BUY, OPEN, 3500, 5, volume_condition='3')
+    engine_order = trader.engine_order(order)
+    assert engine_order.traded == 0
+    assert engine_order.status == ORDER_CANCELED
+    assert trader.spi.trades == []
@@ -0,0 +1,122 @@
+"""报单状态机和超时撤单：通过模拟器的回报驱动 OrderManager"""
+from order_manager import STATE_ACCEPTED, STATE_CANCELLED, STATE_FILLED, STATE_PARTIALLY_FILLED, \
+    STATE_REJECTED
+
+BUY = '0'
+SELL = '1'
+OPEN = '0'
+
+
+def test_login_seeds_session(trader):
+    assert trader.order_manager.front_id == trader.api.front_id
+    assert trader.order_manager.session_id == trader.api.session_id
+    trader.quote(3500)
+    order = trader.send(BUY, OPEN, 3490, 1)
+    assert order.order_ref == '1'
+    assert trader.order_manager.get_own('1') is order
+
+
+def test_new_accepted_partially_filled_filled(trader):
+    trader.quote(3500, bid=3499, bid_volume=10)
+    order = trader.send(BUY, OPEN, 3499, 5)
+    assert trader.states == [STATE_ACCEPTED]
+    assert order.order_sys_id
+    assert trader.order_manager.has_working('rb2410')
+
+    trader.quote(3499, traded=12, bid=3499, bid_volume=10)
+    assert order.state == STATE_PARTIALLY_FILLED
+    assert order.traded == order.trade_volume == 2
+
+    trader.quote(3498, bid=3497, ask=3498)
+    assert trader.states == [STATE_ACCEPTED, STATE_PARTIALLY_FILLED, STATE_FILLED]
+    assert order.traded == order.trade_volume == 5
+    assert not trader.order_manager.has_working('rb2410')
+    assert trader.spi.callbacks[-2:] == ['OnRtnOrder', 'OnRtnTrade']
+
+
+def test_immediate_fill_goes_straight_to_filled(trader):
+    trader.quote(3500, bid=3499, ask=3500, ask_volume=10)
+    order = trader.send(BUY, OPEN, 3500, 3)
+    assert trader.states == [STATE_ACCEPTED, STATE_FILLED]
+    assert order.traded == 3
+
+
+def test_cancel_working_order(trader):
+    trader.quote(3500)
+    order = trader.send(SELL, OPEN, 3510, 2)
+    trader.cancel(order)
+    assert trader.states == [STATE_ACCEPTED, STATE_CANCELLED]
+    assert trader.order_manager.working_orders() == []
+
+
+def test_cancel_filled_order_is_rejected(trader):
+    trader.quote(3500, bid=3499, ask=3500)
+    order = trader.send(BUY, OPEN, 3500, 1)
+    trader.cancel(order)
+    assert trader.spi.callbacks[-2:] == ['OnRspOrderAction', 'OnErrRtnOrderAction']
+    assert order.state == STATE_FILLED
+    assert order.cancel_time is None  # 撤单被拒绝后清除撤单标记
+    assert order.status_msg.startswith('CTP:报单已全成交')
+
+
+def test_send_failed_is_rejected(trader, monkeypatch):
+    monkeypatch.setattr(trader.api, 'ReqOrderInsert', lambda pInputOrder, nRequestID: -3)
+    order = trader.send(BUY, OPEN, 3490, 1)
+    assert order.state == STATE_REJECTED
+    assert trader.states == [STATE_REJECTED]
+    assert not trader.order_manager.has_working('rb2410')
+
+
+def test_terminal_state_is_final(trader):
+    trader.quote(3500)
+    order = trader.send(BUY, OPEN, 3490, 1)
+    trader.cancel(order)
+    trader.cancel(order)  # 第二次撤单被拒绝，状态不变
+    assert order.state == STATE_CANCELLED
+    assert trader.states == [STATE_ACCEPTED, STATE_CANCELLED]
+
+
+def test_timeout_cancels_resting_order(trader):
+    trader.quote(3500)
+    order = trader.send(BUY, OPEN, 3490, 1, timeout=20)
+    assert len(trader.timers) == 1
+
+    assert trader.advance(19.9) == 0
+    assert order.state == STATE_ACCEPTED
+
+    assert trader.advance(0.2) == 1
+    assert order.state == STATE_CANCELLED
+    assert order.cancel_time is not None
+    assert trader.states == [STATE_ACCEPTED, STATE_CANCELLED]
+    assert len(trader.timers) == 0
+
+
+def test_timeout_after_partial_fill_cancels_remainder(trader):
+    trader.quote(3500, bid=3499, bid_volume=0)
+    order = trader.send(BUY, OPEN, 3499, 3, timeout=20)
+    trader.quote(3499, traded=1, bid=3499, bid_volume=0)
+    assert order.state == STATE_PARTIALLY_FILLED
+
+    trader.advance(20)
+    assert order.state == STATE_CANCELLED
+    assert order.traded == 1
+    assert trader.states == [STATE_ACCEPTED, STATE_PARTIALLY_FILLED, STATE_CANCELLED]
+
+
+def test_filled_order_cancels_its_timeout(trader):
+    trader.quote(3500, bid=3499, bid_volume=1)
+    order = trader.send(BUY, OPEN, 3499, 1, timeout=20)
+    trader.quote(3499, traded=2, bid=3499, bid_volume=1)
+    assert order.state == STATE_FILLED
+    assert len(trader.timers) == 0
+
+    requests = trader.api.request_count
+    assert trader.advance(30) == 0
+    assert trader.api.request_count == requests  # 没有发出撤单
+
+
+def test_send_failed_cancels_its_timeout(trader, monkeypatch):
+    monkeypatch.setattr(trader.api, 'ReqOrderInsert', lambda pInputOrder, nRequestID: -3)
+    order = trader.send(BUY, OPEN, 3490, 1, timeout=20)
+    assert order.state == STATE_REJECTED
+    assert len(trader.timers) == 0
@@ -0,0 +1,85 @@
+"""持仓簿：通过模拟器的成交回报检查平今、平昨和平仓的顺序"""
+from types import SimpleNamespace
+
+import pytest
+
+from position_book import POSITION_LONG
+
+BUY = '0'
+SELL = '1'
+OPEN = '0'
+CLOSE = '1'
+CLOSE_TODAY = '3'
+CLOSE_YESTERDAY = '4'
+
+
+def position_row(position_date, volume, today, open_cost):
+    """上期所按今仓、昨仓分开返回的一条多头持仓"""
+    return SimpleNamespace(InstrumentID='rb2410', PosiDirection='2', PositionDate=position_date, Position=volume,
+                           TodayPosition=today, OpenCost=open_cost)
+
+
+@pytest.fixture
+def seeded(trader):
+    """昨仓 3 手多头（均价 3490）、今仓 1 手多头（均价 3500），最新价 3500"""
+    book = trader.position_book
+    book.seed(position_row('2', 3, 0, 3490 * 3 * 10), False)
+    book.seed(position_row('1', 1, 1, 3500 * 1 * 10), True)
+    trader.quote(3500, bid=3499, bid_volume=50, ask=3500, ask_volume=50)
+    return trader
+
+
+def long_position(trader):
+    position = trader.position_book.get('rb2410', POSITION_LONG)
+    return position.today, position.yesterday
+
+
+def test_seed_splits_today_and_yesterday(seeded):
+    assert long_position(seeded) == (1, 3)
+    assert seeded.position_book.get('rb2410', POSITION_LONG).avg_price == pytest.approx(3492.5)
+
+
+def test_open_adds_to_today(seeded):
+    seeded.send(BUY, OPEN, 3500, 2)
+    assert long_position(seeded) == (3, 3)
+
+
+def test_close_today_only_reduces_today(seeded):
+    seeded.send(SELL, CLOSE_TODAY, 3499, 1)
+    assert long_position(seeded) == (0, 3)
+    assert seeded.position_book.realized == pytest.approx((3499 - 3492.5) * 10)
+
+    seeded.send(SELL, CLOSE_TODAY, 3499, 1)  # 没有今仓，不减昨仓
+    assert long_position(seeded) == (0, 3)
+
+
+def test_close_yesterday_only_reduces_yesterday(seeded):
+    seeded.send(SELL, CLOSE_YESTERDAY, 3499, 2)
+    assert long_position(seeded) == (1, 1)
+    assert seeded.position_book.realized == pytest.approx((3499 - 3492.5) * 2 * 10)
+
+
+def test_close_reduces_yesterday_first(seeded):
+    seeded.send(SELL, CLOSE, 3499, 4)
+    assert long_position(seeded) == (0, 0)
+    assert seeded.position_book.get('rb2410', POSITION_LONG).cost == 0.0
+
+    seeded.send(BUY, OPEN, 3500, 2)
+    seeded.send(SELL, CLOSE, 3499, 1)
+    assert long_position(seeded) == (1, 0)
+
+
+def test_trades_before_seed_are_in_query_result(trader):
+    trader.quote(3500, bid=3499, ask=3500, ask_volume=50)
+    trader.send(BUY, OPEN, 3500, 2)
+    assert not trader.position_book.seeded
+
+    trader.query_positions()  # 持仓查询的结果已包含这两手，私有流重传的成交不再计入
+    assert trader.position_book.seeded
+    assert long_position(trader) == (2, 0)
+    for trade in trader.spi.trades:
+        trader.position_book.on_trade(trade)
+    assert long_position(trader) == (2, 0)
+
+    trader.send(SELL, CLOSE_TODAY, 3499, 1)
+    assert long_position(trader) == (1, 0)
@@ -0,0 +1,278 @@
+"""逐笔行情二进制日志。
+
+每个交易日一个文件，文件预先分配好空间并通过 mmap 写入，每笔行情是一条定长记录，
+可以原样读回成 TickSnapshot，供回放和分析使用。
+
+文件结构：
+    文件头（HEADER_SIZE 字节）：魔数、版本、记录长度、容量、记录数、交易日，以及按合约的索引
+        （合约代码、记录数、第一条和最后一条记录的序号）。
+    记录区：从 HEADER_SIZE 开始，每条 RECORD_SIZE 字节，字段顺序与 TickSnapshot 一致。
+"""
+import mmap
+import os
+import struct
+
+from tick_snapshot import TickSnapshot, DEPTH_MARKET_DATA_FIELDS, snapshot
+
+MAGIC = b'CTPTICK1'
+VERSION = 1
+
+# 与 DEPTH_MARKET_DATA_FIELDS 一一对应；InstrumentID/ExchangeInstID 只保留 32 字节
+TICK_RECORD = struct.Struct(
+    '<9s9s' + 'd' * 7 + 'i' + 'd' * 8 + '9si' + 'didi' * 5 + 'd' + '9s32s32s' + 'dd'
+)
+RECORD_SIZE = TICK_RECORD.size
+INSTRUMENT_OFFSET = struct.calcsize('<9s9s' + 'd' * 7 + 'i' + 'd' * 8 + '9si' + 'didi' * 5 + 'd' + '9s')  # InstrumentID 在记录中的偏移
+_STRING_FIELDS = tuple(DEPTH_MARKET_DATA_FIELDS.index(name) for name in (
+    'TradingDay', 'ExchangeID', 'UpdateTime', 'ActionDay', 'InstrumentID', 'ExchangeInstID'))
+
+HEADER = struct.Struct('<8sIIIQQ9s')  # 魔数、版本、记录长度、索引条数上限、容量、记录数、交易日
+_COUNT_OFFSET = struct.calcsize('<8sIIIQ')  # 文件头中记录数的偏移
+INDEX_ENTRY = struct.Struct('<32sQQQ')  # 合约代码、记录数、第一条序号、最后一条序号
+MAX_INDEX_ENTRIES = 256
+HEADER_SIZE = 16384
+assert HEADER.size + INDEX_ENTRY.size * MAX_INDEX_ENTRIES <= HEADER_SIZE
+
+
+def pack_tick(tick, buffer=None, offset=0):
+    """把一笔行情打包成定长记录。
+
+    Args:
+        tick: TickSnapshot 或 CThostFtdcDepthMarketDataField。
+        buffer: 可写缓冲区，为 None 时返回 bytes。
+        offset (int): 写入缓冲区的偏移。
+
+    Returns:
+        bytes: buffer 为 None 时返回打包后的记录。
+    """
+    values = list(snapshot(tick))
+    for i in _STRING_FIELDS:
+        values[i] = values[i].encode('utf-8')
+    if buffer is None:
+        return TICK_RECORD.pack(*values)
+    TICK_RECORD.pack_into(buffer, offset, *values)
+
+
+def unpack_tick(buffer, offset=0):
+    """从定长记录还原 TickSnapshot"""
+    values = list(TICK_RECORD.unpack_from(buffer, offset))
+    for i in _STRING_FIELDS:
+        values[i] = values[i].rstrip(b'\0').decode('utf-8')
+    return TickSnapshot._make(values)
+
+
+def journal_path(directory, trading_day):
+    """某个交易日的日志文件路径"""
+    return os.path.join(directory, f"{trading_day}.tick")
+
+
+class _IndexEntry:
+    __slots__ = ('slot', 'count', 'first', 'last')
+
+    def __init__(self, slot, count, first, last):
+        self.slot = slot
+        self.count = count
+        self.first = first
+        self.last = last
+
+
+class TickJournalWriter:
+    """单个交易日的日志文件写入器。"""
+
+    def __init__(self, path, trading_day, capacity=100000):
+        """打开或创建日志文件，已存在时在末尾继续追加。
+
+        Args:
+            path (str): 文件路径。
+            trading_day (str): 交易日。
+            capacity (int): 新建文件时预先分配的记录数，写满后翻倍。
+        """
+        self.path = path
+        self.trading_day = trading_day
+        self.initial_capacity = max(capacity, 1)  # 重新打开的文件可能已被 close() 截断到 0 条记录，扩容时至少扩到这么多
+        self._index = {}  # InstrumentID -> _IndexEntry
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+            self._load_header()
+        else:
+            self.capacity = capacity
+            self.count = 0
+            self._file.truncate(HEADER_SIZE + capacity * RECORD_SIZE)
+            self._mmap = mmap.mmap(self._file.fileno(), 0)
+            self._write_header()
+
+    def _load_header(self):
+        magic, version, record_size, _, _, count, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+            raise ValueError(f"不是有效的行情日志文件: {self.path}")
+        self.count = count
+        self.capacity = (len(self._mmap) - HEADER_SIZE) // RECORD_SIZE
+        for slot in range(MAX_INDEX_ENTRIES):
+            instrument, n, first, last = INDEX_ENTRY.unpack_from(self._mmap, HEADER.size + slot * INDEX_ENTRY.size)
+            if not n:
+                break
+            self._index[instrument.rstrip(b'\0').decode('utf-8')] = _IndexEntry(slot, n, first, last)
+
+    def _write_header(self):
+        HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, RECORD_SIZE, MAX_INDEX_ENTRIES,
+                         self.capacity, self.count, self.trading_day.encode('utf-8'))
+
+    def _grow(self):
+        """容量翻倍（至少为 initial_capacity）：先解除映射，再扩大文件并重新映射"""
+        self._mmap.flush()
+        self._mmap.close()
+        self.capacity = max(self.capacity * 2, self.initial_capacity)
+        self._file.truncate(HEADER_SIZE + self.capacity * RECORD_SIZE)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._write_header()
+
+    def append(self, tick):
+        """追加一笔行情。
+
+        Args:
+            tick: TickSnapshot 或 CThostFtdcDepthMarketDataField。
+        """
+        if self.count == self.capacity:
+            self._grow()
+        seq = self.count
+        pack_tick(tick, self._mmap, HEADER_SIZE + seq * RECORD_SIZE)
+        self.count = seq + 1
+        struct.pack_into('<Q', self._mmap, _COUNT_OFFSET, self.count)  # 只更新文件头中的记录数
+
+        entry = self._index.get(tick.InstrumentID)
+        if entry is None:
+            if len(self._index) < MAX_INDEX_ENTRIES:
+                entry = self._index[tick.InstrumentID] = _IndexEntry(len(self._index), 0, seq, seq)
+            else:
+                return  # 索引已满，记录照常写入，只是不进索引
+        entry.count += 1
+        entry.last = seq
+        INDEX_ENTRY.pack_into(self._mmap, HEADER.size + entry.slot * INDEX_ENTRY.size,
+                              tick.InstrumentID.encode('utf-8'), entry.count, entry.first, entry.last)
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        """关闭文件，并把文件截断到实际写入的长度"""
+        if self._mmap.closed:
+            return
+        self.capacity = self.count
+        self._write_header()
+        self._mmap.flush()
+        self._mmap.close()
+        self._file.truncate(HEADER_SIZE + self.count * RECORD_SIZE)
+        self._file.close()
+
+
+class TickJournal:
+    """按交易日自动切换文件的行情记录器。"""
+
+    def __init__(self, directory, capacity=100000):
+        """初始化记录器。
+
+        Args:
+            directory (str): 日志文件目录，文件名为 <交易日>.tick。
+            capacity (int): 每个文件预先分配的记录数。
+        """
+        self.directory = directory
+        self.capacity = capacity
+        self.writer = None
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def append(self, tick):
+        """记录一笔行情，交易日变化时切换到新文件"""
+        writer = self.writer
+        if writer is None or writer.trading_day != tick.TradingDay:
+            if writer is not None:
+                writer.close()
+            writer = self.writer = TickJournalWriter(
+                journal_path(self.directory, tick.TradingDay), tick.TradingDay, self.capacity)
+        writer.append(tick)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class TickJournalReader:
+    """读取单个交易日的行情日志。"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, _, _, count, trading_day = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+            raise ValueError(f"不是有效的行情日志文件: {path}")
+        self.count = count
+        self.trading_day = trading_day.rstrip(b'\0').decode('utf-8')
+
+    def index(self):
+        """文件头中的合约索引。
+
+        Returns:
+            dict: InstrumentID -> (记录数, 第一条序号, 最后一条序号)。
+        """
+        result = {}
+        for slot in range(MAX_INDEX_ENTRIES):
+            instrument, n, first, last = INDEX_ENTRY.unpack_from(self._mmap, HEADER.size + slot * INDEX_ENTRY.size)
+            if not n:
+                break
+            result[instrument.rstrip(b'\0').decode('utf-8')] = (n, first, last)
+        return result
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, seq):
+        if not 0 <= seq < self.count:
+            raise IndexError(seq)
+        return unpack_tick(self._mmap, HEADER_SIZE + seq * RECORD_SIZE)
+
+    def __iter__(self):
+        return self.read()
+
+    def read(self, instruments=None):
+        """按写入顺序读出行情。
+
+        Args:
+            instruments: 只读取这些合约，None 表示全部。
+
+        Yields:
+            TickSnapshot: 行情快照。
+        """
+        start, stop = 0, self.count
+        keys = None
+        if instruments is not None:
+            instruments = set(instruments)
+            index = self.index()
+            ranges = [index[k] for k in instruments if k in index]
+            if len(ranges) == len(instruments) or len(index) < MAX_INDEX_ENTRIES:
+                # 索引未满时，不在索引中的合约就是没有记录；只扫描索引覆盖的区间
+                if not ranges:
+                    return
+                start = min(first for _, first, _ in ranges)
+                stop = max(last for _, _, last in ranges) + 1
+            # 索引已满时，索引之外的合约可能也有记录，只能扫描全部记录
+            # 按记录中 InstrumentID 的原始字节过滤，不是要读的合约不解包
+            keys = {instrument.encode('utf-8')[:32].ljust(32, b'\0') for instrument in instruments}
+        mm = self._mmap
+        for offset in range(HEADER_SIZE + start * RECORD_SIZE, HEADER_SIZE + stop * RECORD_SIZE, RECORD_SIZE):
+            if keys is not None and mm[offset + INSTRUMENT_OFFSET:offset + INSTRUMENT_OFFSET + 32] not in keys:
+                continue
+            yield unpack_tick(mm, offset)
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,248 @@
+"""行情回调线程与策略线程之间的单生产者/单消费者环形队列。
+
+MdApi 回调线程只负责把行情快照放进队列，策略在独立线程中取出处理，
+策略处理变慢时不会阻塞 CTP 的网络线程。
+
+生产者只写 _tail，消费者只写 _head，两边都不加锁（依赖 CPython 中单个赋值的原子性）。
+队列满时的处理方式：
+    drop_oldest: 覆盖最旧的一笔，消费者发现被覆盖后跳过并计入 dropped。
+    block: 生产者等待消费者腾出空间。
+    conflate: 同一合约只保留最新一笔，等消费者取走后再恢复正常入队。
+"""
+import logging
+import threading
+import time
+
+DROP_OLDEST = 'drop_oldest'
+BLOCK = 'block'
+CONFLATE = 'conflate'
+OVERFLOW_POLICIES = (DROP_OLDEST, BLOCK, CONFLATE)
+
+
+class TickRingBuffer:
+    """有界 SPSC 环形队列。
+
+    Attributes:
+        capacity (int): 队列容量。
+        overflow (str): 队列满时的处理方式。
+        pushed (int): 入队总数。
+        popped (int): 出队总数。
+        dropped (int): 因覆盖而丢弃的行情数。
+        conflated (int): 被同合约更新行情合并掉的行情数。
+        blocked (int): 生产者因队列满而等待的次数。
+        max_depth (int): 出现过的最大积压深度。
+    """
+
+    def __init__(self, capacity=4096, overflow=DROP_OLDEST):
+        """初始化队列。
+
+        Args:
+            capacity (int): 队列容量。
+            overflow (str): 队列满时的处理方式，取值见 OVERFLOW_POLICIES。
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive.")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow}")
+        self.capacity = capacity
+        self.overflow = overflow
+        self._slots = [None] * capacity  # 预先分配的槽位，每个槽位保存 (序号, 行情)
+        self._head = 0  # 下一个要读取的序号，只由消费者修改
+        self._tail = 0  # 下一个要写入的序号，只由生产者修改
+        self._latest = {}  # conflate 模式下按合约合并的行情
+        self._not_empty = threading.Event()
+        self._not_full = threading.Event()
+        self.pushed = 0
+        self.popped = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.blocked = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self):
+        """当前积压的行情数"""
+        return min(self._tail - self._head, self.capacity) + len(self._latest)
+
+    def stats(self):
+        """返回队列计数器"""
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'pushed': self.pushed,
+            'popped': self.popped,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+            'blocked': self.blocked,
+        }
+
+    def push(self, tick, timeout=None):
+        """生产者放入一笔行情，只能在行情回调线程中调用。
+
+        Args:
+            tick: 行情快照，conflate 模式下需要有 InstrumentID 字段。
+            timeout (float): block 模式下的最长等待秒数，None 表示一直等待。
+
+        Returns:
+            bool: 是否成功放入（block 模式等待超时返回 False）。
+        """
+        self.pushed += 1
+        if self.overflow == CONFLATE:
+            instrument_id = tick.InstrumentID
+            if instrument_id in self._latest or self._tail - self._head >= self.capacity:
+                # 该合约已有待合并的行情，或者队列已满：只保留最新一笔
+                if instrument_id in self._latest:
+                    self.conflated += 1
+                self._latest[instrument_id] = tick
+                self._wake_consumer()
+                return True
+        elif self.overflow == BLOCK and self._tail - self._head >= self.capacity:
+            self.blocked += 1
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._tail - self._head >= self.capacity:
+                self._not_full.clear()
+                if self._tail - self._head < self.capacity:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.pushed -= 1
+                    return False
+                self._not_full.wait(remaining if remaining is not None else 0.1)
+
+        tail = self._tail
+        self._slots[tail % self.capacity] = (tail, tick)  # 序号与行情一起写入，便于消费者识别被覆盖的槽位
+        self._tail = tail + 1  # 写完槽位之后再发布序号
+        depth = self._tail - self._head
+        if depth > self.max_depth:
+            self.max_depth = min(depth, self.capacity)
+        self._wake_consumer()
+        return True
+
+    def pop(self):
+        """消费者取出一笔行情，只能在策略线程中调用。
+
+        Returns:
+            队列中最早的一笔行情，队列为空时返回 None。
+        """
+        while True:
+            head = self._head
+            tail = self._tail
+            if head == tail:
+                break
+            if tail - head > self.capacity:
+                # 生产者已经覆盖了最旧的槽位，跳到仍然有效的位置
+                self.dropped += tail - head - self.capacity
+                self._head = head = tail - self.capacity
+            seq, tick = self._slots[head % self.capacity]
+            self._head = head + 1
+            if seq != head:
+                self.dropped += 1  # 读取期间该槽位被生产者覆盖
+                continue
+            self.popped += 1
+            if self.overflow == BLOCK and not self._not_full.is_set():
+                self._not_full.set()
+            return tick
+        if self._latest:
+            # 队列里的行情都比合并区的行情旧，取完队列之后再取合并区
+            try:
+                _, tick = self._latest.popitem()
+            except KeyError:
+                return None
+            self.popped += 1
+            return tick
+        return None
+
+    def drain(self, max_items=None):
+        """取出当前积压的全部行情。
+
+        Args:
+            max_items (int): 最多取出的数量，None 表示不限制。
+
+        Returns:
+            list: 行情列表。
+        """
+        ticks = []
+        while max_items is None or len(ticks) < max_items:
+            tick = self.pop()
+            if tick is None:
+                break
+            ticks.append(tick)
+        return ticks
+
+    def wait(self, timeout=None):
+        """消费者等待新的行情。
+
+        Args:
+            timeout (float): 最长等待秒数。
+
+        Returns:
+            bool: 队列中是否有行情。
+        """
+        if self._tail != self._head or self._latest:
+            return True
+        self._not_empty.clear()
+        if self._tail != self._head or self._latest:  # clear 之后再检查一次，避免错过唤醒
+            return True
+        return self._not_empty.wait(timeout)
+
+    def _wake_consumer(self):
+        if not self._not_empty.is_set():
+            self._not_empty.set()
+
+
+class StrategyThread(threading.Thread):
+    """从 TickRingBuffer 中取出行情并交给策略处理的线程。"""
+
+    def __init__(self, buffer, handler, name="strategy", poll_interval=0.5):
+        """初始化策略线程。
+
+        Args:
+            buffer (TickRingBuffer): 行情队列。
+            handler (callable): 策略处理函数，参数为一笔行情。
+            name (str): 线程名称。
+            poll_interval (float): 队列为空时的最长等待秒数，用于检查停止标志。
+        """
+        super().__init__(name=name, daemon=True)
+        self.buffer = buffer
+        self.handler = handler
+        self.poll_interval = poll_interval
+        self.processed = 0  # 已处理完的行情数
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            if not self.buffer.wait(self.poll_interval):
+                continue
+            self.process_pending()
+
+    def process_pending(self):
+        """处理队列中积压的全部行情。
+
+        线程没有启动时（例如回放）也可以在调用方线程中直接调用，同步处理行情。
+
+        Returns:
+            int: 本次处理的行情数。
+        """
+        count = 0
+        tick = self.buffer.pop()
+        while tick is not None:
+            try:
+                self.handler(tick)
+            except Exception:
+                logging.exception("策略处理行情出错")
+            self.processed += 1
+            count += 1
+            tick = self.buffer.pop()
+        return count
+
+    @property
+    def idle(self):
+        """放入队列的行情都已处理完（或被丢弃、合并）"""
+        buffer = self.buffer
+        # 生产者先累加 pushed 再写槽位，dropped 在消费者取出时才累加，这样判断不会在行情仍在处理时提前成立
+        return self.processed + buffer.dropped + buffer.conflated >= buffer.pushed
+
+    def stop(self, timeout=None):
+        """停止线程并等待退出"""
+        self._stopped.set()
+        self.join(timeout)
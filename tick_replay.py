@@ -0,0 +1,203 @@
+"""逐笔行情回放。
+
+从 tick_journal 记录的日志（或任意行情序列）读出行情，直接调用 SPI 的 OnRtnDepthMarketData，
+不需要连接 SimNow 前置即可回测 CustomMdSpi、MarketDataSpi/AutoTradeSpi 等现有类。
+
+回放速度：
+    speed=None: 不等待，尽可能快地回放。
+    speed=1.0: 按行情的交易所时间实时回放。
+    speed>1: 加速回放，例如 speed=60 表示 1 秒回放 1 分钟的行情。
+
+回放时 SPI 的 clock 会被替换成 ReplayClock.now，返回当前行情自身的交易所时间，
+代替 datetime.now()。AutoTradeSpi 的行情由策略线程异步处理，它的时钟跟随策略线程正在处理的那一笔，
+而不是最近放入队列的那一笔；run() 等策略线程处理完全部行情后才返回。策略线程没有启动时，
+每放入一笔行情就在回放线程中同步处理；策略线程在运行时，回放期间行情队列临时改为 block，
+队列满时回放等待策略，不会丢行情。
+
+SPI 有 verbose 属性（如 quant_trade.MarketDataSpi）时，回放期间关闭逐笔打印和日志，
+否则每秒只能回放几千笔行情。
+"""
+import glob
+import os
+import time
+
+from tick_journal import TickJournalReader
+from tick_queue import BLOCK
+from tick_snapshot import tick_datetime
+
+
+class ReplayClock:
+    """回放时钟，now() 返回当前回放行情的交易所时间。"""
+
+    def __init__(self):
+        self.tick = None  # 当前回放的行情
+
+    def now(self):
+        if self.tick is None:
+            return None
+        return tick_datetime(self.tick)  # 只在被调用时才计算，回放本身不为此付出开销
+
+
+def iter_journal_ticks(directory, start_day=None, end_day=None, instruments=None):
+    """按交易日顺序读出目录下的行情日志。
+
+    Args:
+        directory (str): tick_journal 日志目录。
+        start_day (str): 起始交易日（含），如 "20240801"。
+        end_day (str): 结束交易日（含）。
+        instruments: 只读取这些合约，None 表示全部。
+
+    Yields:
+        TickSnapshot: 行情快照。
+    """
+    for path in sorted(glob.glob(os.path.join(directory, "*.tick"))):
+        trading_day = os.path.splitext(os.path.basename(path))[0]
+        if start_day is not None and trading_day < start_day:
+            continue
+        if end_day is not None and trading_day > end_day:
+            continue
+        with TickJournalReader(path) as reader:
+            yield from reader.read(instruments)
+
+
+class TickReplayer:
+    """把行情回放给 CThostFtdcMdSpi 子类。
+
+    Attributes:
+        spi: 接收行情的 SPI，需要有 OnRtnDepthMarketData 方法。
+        speed (float): 回放倍速，None 表示尽可能快。
+        max_gap (float): 两笔行情之间最多等待的交易所时间秒数，用于跳过午休和夜盘之间的空档。
+        clock (ReplayClock): 回放时钟。
+        strategy_clock (ReplayClock): 策略线程的时钟，spi 没有 auto_trade.strategy_thread 时为 None。
+        count (int): 已回放的行情数。
+    """
+
+    def __init__(self, spi, speed=None, max_gap=None, clock_targets=None, verbose=False):
+        """初始化回放器。
+
+        Args:
+            spi: 接收行情的 SPI。
+            speed (float): 回放倍速，None 表示尽可能快，1.0 表示实时。
+            max_gap (float): 两笔行情之间最多等待的交易所时间秒数，None 表示不限制。
+            clock_targets (list): 需要替换 clock 的对象，默认为 spi 以及 spi.auto_trade（如果有）。
+            verbose (bool): 是否保留 SPI 的逐笔打印和日志（spi.verbose），默认关闭。
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive.")
+        self.spi = spi
+        self.speed = speed
+        self.max_gap = max_gap
+        self.clock = ReplayClock()
+        self.count = 0
+        if hasattr(spi, 'verbose'):
+            spi.verbose = verbose
+        auto_trade = getattr(spi, 'auto_trade', None)
+        self.strategy_thread = getattr(auto_trade, 'strategy_thread', None)
+        self.strategy_clock = None
+        if self.strategy_thread is not None:
+            self.strategy_clock = ReplayClock()
+            self.strategy_thread.handler = self._clocked(self.strategy_thread.handler, self.strategy_clock)
+        if clock_targets is None:
+            clock_targets = [spi]
+            if auto_trade is not None:
+                clock_targets.append(auto_trade)
+        for target in clock_targets:
+            # 用行情自身的时间代替 datetime.now
+            if target is auto_trade and self.strategy_clock is not None:
+                target.clock = self.strategy_clock.now
+            else:
+                target.clock = self.clock.now
+
+    @staticmethod
+    def _clocked(handler, clock):
+        """包装策略处理函数，处理每笔行情之前把时钟设为这一笔"""
+        def handle(tick):
+            clock.tick = tick
+            handler(tick)
+        return handle
+
+    def run(self, ticks):
+        """回放一组行情。
+
+        Args:
+            ticks: 行情序列，例如 iter_journal_ticks() 的返回值。
+
+        Returns:
+            dict: 回放统计，包括行情数、耗时和每秒行情数。
+        """
+        on_tick = self.spi.OnRtnDepthMarketData
+        strategy_thread = self.strategy_thread
+        overflow = None
+        if strategy_thread is not None:
+            if strategy_thread.is_alive():
+                overflow = strategy_thread.buffer.overflow
+                strategy_thread.buffer.overflow = BLOCK  # 队列满时等策略线程，不丢行情
+            else:
+                on_tick = self._synchronous(on_tick, strategy_thread)
+        clock = self.clock
+        count = 0
+        started = time.perf_counter()
+        try:
+            if self.speed is None:
+                for tick in ticks:
+                    clock.tick = tick
+                    on_tick(tick)
+                    count += 1
+            else:
+                count = self._run_paced(ticks, on_tick)
+            self.wait_idle()
+        finally:
+            if overflow is not None:
+                strategy_thread.buffer.overflow = overflow
+        elapsed = time.perf_counter() - started
+        self.count += count
+        return {
+            'ticks': count,
+            'elapsed': elapsed,
+            'ticks_per_second': count / elapsed if elapsed > 0 else float('inf'),
+        }
+
+    @staticmethod
+    def _synchronous(on_tick, strategy_thread):
+        """策略线程没有启动时，放入队列之后立即在回放线程中处理"""
+        def handle(tick):
+            on_tick(tick)
+            strategy_thread.process_pending()
+        return handle
+
+    def wait_idle(self, poll_interval=0.001):
+        """等待策略线程处理完队列中的全部行情。
+
+        Args:
+            poll_interval (float): 检查间隔秒数。
+        """
+        strategy_thread = self.strategy_thread
+        if strategy_thread is None:
+            return
+        while not strategy_thread.idle and strategy_thread.is_alive():
+            time.sleep(poll_interval)
+
+    def _run_paced(self, ticks, on_tick):
+        """按交易所时间间隔（除以倍速）回放"""
+        clock = self.clock
+        speed = self.speed
+        max_gap = self.max_gap
+        count = 0
+        last_time = None
+        target = time.perf_counter()
+        for tick in ticks:
+            exchange_time = tick_datetime(tick)
+            if last_time is not None:
+                gap = (exchange_time - last_time).total_seconds()
+                if gap > 0:
+                    if max_gap is not None and gap > max_gap:
+                        gap = max_gap
+                    target += gap / speed
+                    delay = target - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+            last_time = exchange_time
+            clock.tick = tick
+            on_tick(tick)
+            count += 1
+        return count
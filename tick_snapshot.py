@@ -0,0 +1,117 @@
+"""逐笔行情快照。
+
+CTP 回调中的 pDepthMarketData 是 SWIG 代理对象，每读一个字段都要进入一次 _thosttraderapi，
+字符字段还要经过 GB18030 转码。这里把整条行情一次性拷贝成一个轻量的 namedtuple，
+回调返回后仍然有效，可以放心地交给其他线程或缓存起来。
+"""
+import timeit
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# 与 ThostFtdcUserApiStruct.h 中 CThostFtdcDepthMarketDataField 的字段顺序一致（去掉了 reserve1/reserve2）
+# 即 gen_struct_methods.py 生成的 CThostFtdcDepthMarketDataField.fields，to_tuple() 按此顺序返回
+DEPTH_MARKET_DATA_FIELDS = (
+    'TradingDay', 'ExchangeID',
+    'LastPrice', 'PreSettlementPrice', 'PreClosePrice', 'PreOpenInterest',
+    'OpenPrice', 'HighestPrice', 'LowestPrice', 'Volume', 'Turnover', 'OpenInterest',
+    'ClosePrice', 'SettlementPrice', 'UpperLimitPrice', 'LowerLimitPrice',
+    'PreDelta', 'CurrDelta', 'UpdateTime', 'UpdateMillisec',
+    'BidPrice1', 'BidVolume1', 'AskPrice1', 'AskVolume1',
+    'BidPrice2', 'BidVolume2', 'AskPrice2', 'AskVolume2',
+    'BidPrice3', 'BidVolume3', 'AskPrice3', 'AskVolume3',
+    'BidPrice4', 'BidVolume4', 'AskPrice4', 'AskVolume4',
+    'BidPrice5', 'BidVolume5', 'AskPrice5', 'AskVolume5',
+    'AveragePrice', 'ActionDay', 'InstrumentID', 'ExchangeInstID',
+    'BandingUpperPrice', 'BandingLowerPrice',
+)
+
+TickSnapshot = namedtuple('TickSnapshot', DEPTH_MARKET_DATA_FIELDS)
+
+
+def snapshot(pDepthMarketData):
+    """把深度行情拷贝成 TickSnapshot。
+
+    重新编译过的 SWIG 模块提供 to_tuple()，一次本地调用即可取出全部字段；
+    旧版本的 _thosttraderapi 没有该方法时退回到逐字段读取。
+
+    Args:
+        pDepthMarketData: CThostFtdcDepthMarketDataField 或 TickSnapshot。
+
+    Returns:
+        TickSnapshot: 行情快照。
+    """
+    if isinstance(pDepthMarketData, TickSnapshot):
+        return pDepthMarketData
+    to_tuple = getattr(pDepthMarketData, 'to_tuple', None)
+    if to_tuple is not None:
+        return TickSnapshot._make(to_tuple())
+    return TickSnapshot._make([getattr(pDepthMarketData, name) for name in DEPTH_MARKET_DATA_FIELDS])
+
+
+def tick_seconds(tick):
+    """行情的交易所时间（UpdateTime）距当日零点的秒数"""
+    t = tick.UpdateTime
+    return int(t[0:2]) * 3600 + int(t[3:5]) * 60 + int(t[6:8])
+
+
+_day_cache = {}  # 'YYYYMMDD' -> 当日零点的 datetime
+
+
+def tick_datetime(tick):
+    """行情的交易所时间。
+
+    使用 ActionDay（业务日期）加 UpdateTime 和 UpdateMillisec，不依赖本机时钟；
+    个别交易所 ActionDay 为空时退回 TradingDay。
+
+    Args:
+        tick: TickSnapshot 或 CThostFtdcDepthMarketDataField。
+
+    Returns:
+        datetime: 交易所时间。
+    """
+    day = tick.ActionDay or tick.TradingDay
+    midnight = _day_cache.get(day)
+    if midnight is None:
+        midnight = _day_cache[day] = datetime(int(day[0:4]), int(day[4:6]), int(day[6:8]))
+    return midnight + timedelta(seconds=tick_seconds(tick), milliseconds=tick.UpdateMillisec)
+
+
+def benchmark(number=100000):
+    """对比逐字段读取与 snapshot 的单笔开销。
+
+    Args:
+        number (int): 每种方式的重复次数。
+
+    Returns:
+        dict: 每种方式的单笔耗时，单位微秒。
+    """
+    from thostmduserapi import CThostFtdcDepthMarketDataField
+
+    field = CThostFtdcDepthMarketDataField()
+    field.InstrumentID = "rb2410"
+    field.ExchangeID = "SHFE"
+    field.UpdateTime = "09:00:00"
+    field.LastPrice = 3500.0
+    field.BidPrice1 = 3499.0
+    field.AskPrice1 = 3501.0
+    field.Volume = 100
+
+    def read_properties():
+        # 与 OnRtnDepthMarketData 中的读取方式相同
+        return (field.InstrumentID, field.UpdateTime, field.BidPrice1, field.LastPrice,
+                field.AskPrice1, field.Volume)
+
+    def read_all_properties():
+        return [getattr(field, name) for name in DEPTH_MARKET_DATA_FIELDS]
+
+    results = {
+        '逐字段读取(6个字段)': timeit.timeit(read_properties, number=number),
+        '逐字段读取(全部字段)': timeit.timeit(read_all_properties, number=number),
+        'snapshot(全部字段)': timeit.timeit(lambda: snapshot(field), number=number),
+    }
+    return {name: cost / number * 1e6 for name, cost in results.items()}
+
+
+if __name__ == "__main__":
+    for name, cost in benchmark().items():
+        print(f"{name}: {cost:.2f} 微秒/笔")
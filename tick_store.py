@@ -0,0 +1,142 @@
+"""按合约保存逐笔行情的列式存储。
+
+每个合约一块预先分配的 NumPy 结构化数组，空间不够时容量翻倍，
+一个交易日的行情可以直接做向量化计算，不再为每笔行情保留一个 Python 对象。
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from tick_snapshot import tick_datetime
+
+TICK_DTYPE = np.dtype([
+    ('exchange_time', 'datetime64[ms]'),  # 交易所时间 ActionDay + UpdateTime + UpdateMillisec
+    ('trading_day', 'i4'),  # 交易日，如 20240801
+    ('last_price', 'f8'),
+    ('volume', 'i8'),  # 累计成交量
+    ('turnover', 'f8'),  # 累计成交额
+    ('open_interest', 'f8'),
+    ('average_price', 'f8'),
+    ('bid_price1', 'f8'), ('bid_volume1', 'i4'), ('ask_price1', 'f8'), ('ask_volume1', 'i4'),
+    ('bid_price2', 'f8'), ('bid_volume2', 'i4'), ('ask_price2', 'f8'), ('ask_volume2', 'i4'),
+    ('bid_price3', 'f8'), ('bid_volume3', 'i4'), ('ask_price3', 'f8'), ('ask_volume3', 'i4'),
+    ('bid_price4', 'f8'), ('bid_volume4', 'i4'), ('ask_price4', 'f8'), ('ask_volume4', 'i4'),
+    ('bid_price5', 'f8'), ('bid_volume5', 'i4'), ('ask_price5', 'f8'), ('ask_volume5', 'i4'),
+])
+
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def tick_record(tick):
+    """把一笔行情转换成与 TICK_DTYPE 对应的元组。
+
+    Args:
+        tick: TickSnapshot 或 CThostFtdcDepthMarketDataField。
+
+    Returns:
+        tuple: 一行记录。
+    """
+    exchange_time = (tick_datetime(tick) - _EPOCH) // _MILLISECOND
+    return (
+        exchange_time, int(tick.TradingDay or 0), tick.LastPrice, tick.Volume, tick.Turnover,
+        tick.OpenInterest, tick.AveragePrice,
+        tick.BidPrice1, tick.BidVolume1, tick.AskPrice1, tick.AskVolume1,
+        tick.BidPrice2, tick.BidVolume2, tick.AskPrice2, tick.AskVolume2,
+        tick.BidPrice3, tick.BidVolume3, tick.AskPrice3, tick.AskVolume3,
+        tick.BidPrice4, tick.BidVolume4, tick.AskPrice4, tick.AskVolume4,
+        tick.BidPrice5, tick.BidVolume5, tick.AskPrice5, tick.AskVolume5,
+    )
+
+
+class TickColumns:
+    """单个合约的行情列。
+
+    Attributes:
+        instrument_id (str): 合约代码。
+        size (int): 已写入的行情数。
+    """
+
+    def __init__(self, instrument_id, capacity):
+        self.instrument_id = instrument_id
+        self.size = 0
+        self._data = np.zeros(capacity, dtype=TICK_DTYPE)
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def append(self, record):
+        """追加一行记录，容量不足时翻倍"""
+        if self.size == len(self._data):
+            grown = np.zeros(len(self._data) * 2, dtype=TICK_DTYPE)
+            grown[:self.size] = self._data
+            self._data = grown
+        self._data[self.size] = record
+        self.size += 1
+
+    def view(self):
+        """已写入部分的视图（不拷贝），再次追加并扩容后旧视图不会更新"""
+        return self._data[:self.size]
+
+    def last(self, n):
+        """最近 n 笔行情的视图"""
+        return self._data[max(self.size - n, 0):self.size]
+
+    def __len__(self):
+        return self.size
+
+
+class TickStore:
+    """按 InstrumentID 保存逐笔行情。"""
+
+    def __init__(self, initial_capacity=4096):
+        """初始化行情存储。
+
+        Args:
+            initial_capacity (int): 每个合约的初始容量。
+        """
+        self.initial_capacity = initial_capacity
+        self._columns = {}  # InstrumentID -> TickColumns
+
+    def append(self, tick):
+        """追加一笔行情。
+
+        Args:
+            tick: TickSnapshot 或 CThostFtdcDepthMarketDataField。
+        """
+        columns = self._columns.get(tick.InstrumentID)
+        if columns is None:
+            columns = self._columns[tick.InstrumentID] = TickColumns(tick.InstrumentID, self.initial_capacity)
+        columns.append(tick_record(tick))
+
+    def get(self, instrument_id):
+        """某个合约的全部行情，没有行情时返回空数组"""
+        columns = self._columns.get(instrument_id)
+        if columns is None:
+            return np.zeros(0, dtype=TICK_DTYPE)
+        return columns.view()
+
+    def last(self, instrument_id, n):
+        """某个合约最近 n 笔行情"""
+        columns = self._columns.get(instrument_id)
+        if columns is None:
+            return np.zeros(0, dtype=TICK_DTYPE)
+        return columns.last(n)
+
+    def instruments(self):
+        """已有行情的合约列表"""
+        return list(self._columns)
+
+    def clear(self, instrument_id=None):
+        """清空某个合约或全部合约的行情（例如换交易日时）"""
+        if instrument_id is None:
+            self._columns.clear()
+        else:
+            self._columns.pop(instrument_id, None)
+
+    def __len__(self):
+        return sum(len(columns) for columns in self._columns.values())
+
+    def __contains__(self, instrument_id):
+        return instrument_id in self._columns
@@ -0,0 +1,315 @@
+"""分层时间轮定时器。
+
+用于报单超时撤单、定时任务等：
+    - 设置和取消定时器都是 O(1)，与当前定时器数量无关；
+    - 由自己的线程（TimerThread）或 asyncio 事件循环（TimerWheel.run）按固定精度推进，
+      不依赖行情到达，行情清淡时超时撤单也能按时触发；
+    - 支持周期任务（call_every）。
+
+结构：levels 层、每层 wheel_size 个槽（2 的幂）。第 0 层每个槽对应一个精度单位（resolution 秒），
+第 L 层每个槽对应 wheel_size ** L 个精度单位。定时器按到期时刻与当前时刻之差放入能容纳它的最低一层；
+第 0 层转完一圈时，把上一层当前槽中的定时器按剩余时间重新分配到下层（级联），到期的定时器总在第 0 层触发。
+默认 10 毫秒精度、4 层 256 槽，可覆盖约 497 天，更远的定时器放在最高层，级联时继续下放。
+
+用法：
+    wheel = TimerWheel()
+    TimerThread(wheel).start()
+    timer = wheel.call_later(20, cancel_order, order)
+    timer.cancel()
+"""
+import asyncio
+import logging
+import threading
+import time
+
+
+class Timer:
+    """一个定时器，由 TimerWheel.call_at/call_later/call_every 创建。
+
+    Attributes:
+        deadline (float): 到期时刻，与时间轮的 clock 同一时间基准。
+        interval (float): 周期任务的间隔，单次定时器为 None。
+        cancelled (bool): 是否已取消。
+    """
+    __slots__ = ('wheel', 'deadline', 'callback', 'args', 'interval', 'cancelled', '_expires', '_bucket')
+
+    def __init__(self, wheel, deadline, callback, args, interval=None):
+        self.wheel = wheel
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+        self._expires = 0  # 到期的精度单位序号
+        self._bucket = None  # 所在的槽
+
+    def cancel(self):
+        """取消定时器，O(1)。已触发的单次定时器取消后无任何效果"""
+        self.wheel.cancel(self)
+
+    def __repr__(self):
+        return f"Timer(deadline={self.deadline:.3f}, callback={self.callback!r}, cancelled={self.cancelled})"
+
+
+class TimerWheel:
+    """分层时间轮，线程安全。定时器回调在推进时间轮的线程（TimerThread 或事件循环）中执行。
+
+    Attributes:
+        resolution (float): 精度，单位秒。
+        fired (int): 已触发的回调次数。
+    """
+
+    def __init__(self, resolution=0.01, wheel_size=256, levels=4, clock=time.monotonic):
+        """初始化时间轮。
+
+        Args:
+            resolution (float): 精度，单位秒。
+            wheel_size (int): 每层的槽数，必须是 2 的幂。
+            levels (int): 层数。
+            clock (callable): 返回当前时刻（秒）的函数，默认 time.monotonic。
+        """
+        if wheel_size < 2 or wheel_size & (wheel_size - 1):
+            raise ValueError(f"wheel_size 必须是 2 的幂: {wheel_size}")
+        self.resolution = resolution
+        self.clock = clock
+        self._bits = wheel_size.bit_length() - 1
+        self._mask = wheel_size - 1
+        self._levels = [[set() for _ in range(wheel_size)] for _ in range(levels)]
+        self._max_ticks = (1 << (self._bits * levels)) - 1  # 最高层能容纳的最大间隔
+        self._current = self._ticks(clock())  # 下一个待处理的精度单位
+        self._count = 0
+        self._lock = threading.Lock()
+        self.fired = 0
+
+    def _ticks(self, when):
+        return int(when / self.resolution)
+
+    def __len__(self):
+        """未触发、未取消的定时器数量"""
+        return self._count
+
+    # ---------- 设置与取消 ----------
+
+    def call_at(self, when, callback, *args):
+        """在 when 时刻调用 callback(*args)。
+
+        Args:
+            when (float): 到期时刻，与 clock 同一时间基准。
+            callback (callable): 回调函数。
+
+        Returns:
+            Timer: 定时器，可用于取消。
+        """
+        timer = Timer(self, when, callback, args)
+        with self._lock:
+            self._resync()
+            self._insert(timer)
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        """delay 秒后调用 callback(*args)。
+
+        Args:
+            delay (float): 延迟时间，单位秒。
+            callback (callable): 回调函数。
+
+        Returns:
+            Timer: 定时器，可用于取消。
+        """
+        return self.call_at(self.clock() + delay, callback, *args)
+
+    def call_every(self, interval, callback, *args, delay=None):
+        """每隔 interval 秒调用一次 callback(*args)，直到取消。
+
+        Args:
+            interval (float): 间隔时间，单位秒，不能小于精度。
+            callback (callable): 回调函数。
+            delay (float): 第一次调用的延迟，默认等于 interval。
+
+        Returns:
+            Timer: 定时器，可用于取消。
+        """
+        if interval < self.resolution:
+            raise ValueError(f"周期不能小于时间轮精度: {interval} < {self.resolution}")
+        timer = Timer(self, self.clock() + (interval if delay is None else delay), callback, args, interval)
+        with self._lock:
+            self._resync()
+            self._insert(timer)
+        return timer
+
+    def cancel(self, timer):
+        """取消定时器，O(1)。
+
+        Args:
+            timer (Timer): 要取消的定时器。
+        """
+        with self._lock:
+            timer.cancelled = True
+            bucket = timer._bucket
+            if bucket is not None:
+                bucket.discard(timer)
+                timer._bucket = None
+                self._count -= 1
+
+    def _resync(self):
+        """没有定时器时把当前位置对齐到 clock()，调用方持有锁。
+
+        clock 可能被替换（例如回放时换成行情时间），时刻会往回跳；没有定时器时直接对齐，
+        避免新定时器因为到期时刻早于旧的当前位置而被立即触发。
+        """
+        if self._count == 0:
+            self._current = self._ticks(self.clock())
+
+    def _insert(self, timer):
+        """按到期时刻放入对应层的槽，调用方持有锁"""
+        current = self._current
+        expires = max(self._ticks(timer.deadline), current)  # 已过期的定时器在下一次推进时触发
+        timer._expires = expires
+        diff = min(expires - current, self._max_ticks)
+        bits = self._bits
+        level = 0
+        while diff >> (bits * (level + 1)):
+            level += 1
+        if level:
+            expires = min(expires, current + self._max_ticks)
+        bucket = self._levels[level][(expires >> (bits * level)) & self._mask]
+        bucket.add(timer)
+        timer._bucket = bucket
+        self._count += 1
+
+    # ---------- 推进 ----------
+
+    def advance(self, now=None):
+        """把时间轮推进到 now，触发所有到期的定时器。
+
+        Args:
+            now (float): 当前时刻，默认取 clock()。
+
+        Returns:
+            int: 本次触发的回调次数。
+        """
+        target = self._ticks(self.clock() if now is None else now)
+        due = []
+        with self._lock:
+            if self._count == 0:
+                self._current = target + 1  # 没有定时器，直接跳到当前时刻（时钟往回跳时也对齐）
+                return 0
+            levels = self._levels
+            mask = self._mask
+            while self._current <= target:
+                current = self._current
+                index = current & mask
+                if index == 0:
+                    self._cascade(current)
+                bucket = levels[0][index]
+                if bucket:
+                    for timer in bucket:
+                        timer._bucket = None
+                    self._count -= len(bucket)
+                    due.extend(bucket)
+                    bucket.clear()
+                self._current = current + 1
+                if self._count == 0 and not due:
+                    self._current = target + 1
+                    break
+            for timer in due:
+                if timer.interval is not None:
+                    # 周期任务先排好下一次，回调中可以取消；落后太多时不补触发
+                    timer.deadline = max(timer.deadline + timer.interval, target * self.resolution)
+                    self._insert(timer)
+        fired = 0
+        for timer in due:
+            if timer.cancelled:
+                continue  # 取出之后、回调之前被取消
+            try:
+                timer.callback(*timer.args)
+            except Exception:
+                logging.exception(f"定时任务出错: {timer!r}")
+            fired += 1
+        self.fired += fired
+        return fired
+
+    def _cascade(self, current):
+        """第 0 层转完一圈，把上面各层当前槽中的定时器重新分配到下层，调用方持有锁"""
+        bits = self._bits
+        mask = self._mask
+        for level in range(1, len(self._levels)):
+            index = (current >> (bits * level)) & mask
+            bucket = self._levels[level][index]
+            timers = list(bucket)
+            bucket.clear()
+            self._count -= len(timers)
+            for timer in timers:
+                self._insert(timer)
+            if index != 0:
+                break
+
+    async def run(self):
+        """在 asyncio 事件循环中推进时间轮，回调在事件循环中执行。
+
+        用法：
+            task = asyncio.create_task(wheel.run())
+        """
+        while True:
+            self.advance()
+            await asyncio.sleep(self.resolution)
+
+
+class TimerThread(threading.Thread):
+    """按精度推进时间轮的线程，回调在该线程中执行。"""
+
+    def __init__(self, wheel, name="timer"):
+        """初始化定时器线程。
+
+        Args:
+            wheel (TimerWheel): 时间轮。
+            name (str): 线程名称。
+        """
+        super().__init__(name=name, daemon=True)
+        self.wheel = wheel
+        self._stopped = threading.Event()
+
+    def run(self):
+        wheel = self.wheel
+        while not self._stopped.wait(wheel.resolution):
+            wheel.advance()
+
+    def stop(self, timeout=None):
+        """停止线程并等待退出"""
+        self._stopped.set()
+        self.join(timeout)
+
+
+def benchmark(orders=100000, resolution=0.01):
+    """测量设置/取消报单超时定时器的开销。
+
+    Args:
+        orders (int): 定时器数量。
+        resolution (float): 时间轮精度。
+
+    Returns:
+        dict: 每秒设置、取消的定时器数，以及推进一个空精度单位的耗时。
+    """
+    wheel = TimerWheel(resolution)
+    started = time.perf_counter()
+    timers = [wheel.call_later(20 + i % 1000 * 0.01, None) for i in range(orders)]
+    armed = time.perf_counter() - started
+    started = time.perf_counter()
+    for timer in timers:
+        timer.cancel()
+    cancelled = time.perf_counter() - started
+    wheel.call_later(3600, None)
+    started = time.perf_counter()
+    now = wheel.clock()
+    for i in range(1000):
+        wheel.advance(now + i * resolution)
+    advanced = time.perf_counter() - started
+    return {
+        'arm_per_second': orders / armed,
+        'cancel_per_second': orders / cancelled,
+        'advance_seconds': advanced / 1000,
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
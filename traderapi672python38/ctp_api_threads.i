@@ -0,0 +1,126 @@
+// 由 gen_struct_methods.py 根据 ThostFtdcTraderApi.h / ThostFtdcMdApi.h 生成，不要手工修改
+// 这些调用会阻塞或向前置发送请求，执行期间释放 GIL，其他 Python 线程（策略、回调、I/O）可以同时运行
+%threadallow CThostFtdcTraderApi::Release;
+%threadallow CThostFtdcTraderApi::Init;
+%threadallow CThostFtdcTraderApi::Join;
+%threadallow CThostFtdcTraderApi::ReqAuthenticate;
+%threadallow CThostFtdcTraderApi::ReqUserLogin;
+%threadallow CThostFtdcTraderApi::ReqUserLogout;
+%threadallow CThostFtdcTraderApi::ReqUserPasswordUpdate;
+%threadallow CThostFtdcTraderApi::ReqTradingAccountPasswordUpdate;
+%threadallow CThostFtdcTraderApi::ReqUserAuthMethod;
+%threadallow CThostFtdcTraderApi::ReqGenUserCaptcha;
+%threadallow CThostFtdcTraderApi::ReqGenUserText;
+%threadallow CThostFtdcTraderApi::ReqUserLoginWithCaptcha;
+%threadallow CThostFtdcTraderApi::ReqUserLoginWithText;
+%threadallow CThostFtdcTraderApi::ReqUserLoginWithOTP;
+%threadallow CThostFtdcTraderApi::ReqOrderInsert;
+%threadallow CThostFtdcTraderApi::ReqParkedOrderInsert;
+%threadallow CThostFtdcTraderApi::ReqParkedOrderAction;
+%threadallow CThostFtdcTraderApi::ReqOrderAction;
+%threadallow CThostFtdcTraderApi::ReqQryMaxOrderVolume;
+%threadallow CThostFtdcTraderApi::ReqSettlementInfoConfirm;
+%threadallow CThostFtdcTraderApi::ReqRemoveParkedOrder;
+%threadallow CThostFtdcTraderApi::ReqRemoveParkedOrderAction;
+%threadallow CThostFtdcTraderApi::ReqExecOrderInsert;
+%threadallow CThostFtdcTraderApi::ReqExecOrderAction;
+%threadallow CThostFtdcTraderApi::ReqForQuoteInsert;
+%threadallow CThostFtdcTraderApi::ReqQuoteInsert;
+%threadallow CThostFtdcTraderApi::ReqQuoteAction;
+%threadallow CThostFtdcTraderApi::ReqBatchOrderAction;
+%threadallow CThostFtdcTraderApi::ReqOptionSelfCloseInsert;
+%threadallow CThostFtdcTraderApi::ReqOptionSelfCloseAction;
+%threadallow CThostFtdcTraderApi::ReqCombActionInsert;
+%threadallow CThostFtdcTraderApi::ReqQryOrder;
+%threadallow CThostFtdcTraderApi::ReqQryTrade;
+%threadallow CThostFtdcTraderApi::ReqQryInvestorPosition;
+%threadallow CThostFtdcTraderApi::ReqQryTradingAccount;
+%threadallow CThostFtdcTraderApi::ReqQryInvestor;
+%threadallow CThostFtdcTraderApi::ReqQryTradingCode;
+%threadallow CThostFtdcTraderApi::ReqQryInstrumentMarginRate;
+%threadallow CThostFtdcTraderApi::ReqQryInstrumentCommissionRate;
+%threadallow CThostFtdcTraderApi::ReqQryExchange;
+%threadallow CThostFtdcTraderApi::ReqQryProduct;
+%threadallow CThostFtdcTraderApi::ReqQryInstrument;
+%threadallow CThostFtdcTraderApi::ReqQryDepthMarketData;
+%threadallow CThostFtdcTraderApi::ReqQryTraderOffer;
+%threadallow CThostFtdcTraderApi::ReqQrySettlementInfo;
+%threadallow CThostFtdcTraderApi::ReqQryTransferBank;
+%threadallow CThostFtdcTraderApi::ReqQryInvestorPositionDetail;
+%threadallow CThostFtdcTraderApi::ReqQryNotice;
+%threadallow CThostFtdcTraderApi::ReqQrySettlementInfoConfirm;
+%threadallow CThostFtdcTraderApi::ReqQryInvestorPositionCombineDetail;
+%threadallow CThostFtdcTraderApi::ReqQryCFMMCTradingAccountKey;
+%threadallow CThostFtdcTraderApi::ReqQryEWarrantOffset;
+%threadallow CThostFtdcTraderApi::ReqQryInvestorProductGroupMargin;
+%threadallow CThostFtdcTraderApi::ReqQryExchangeMarginRate;
+%threadallow CThostFtdcTraderApi::ReqQryExchangeMarginRateAdjust;
+%threadallow CThostFtdcTraderApi::ReqQryExchangeRate;
+%threadallow CThostFtdcTraderApi::ReqQrySecAgentACIDMap;
+%threadallow CThostFtdcTraderApi::ReqQryProductExchRate;
+%threadallow CThostFtdcTraderApi::ReqQryProductGroup;
+%threadallow CThostFtdcTraderApi::ReqQryMMInstrumentCommissionRate;
+%threadallow CThostFtdcTraderApi::ReqQryMMOptionInstrCommRate;
+%threadallow CThostFtdcTraderApi::ReqQryInstrumentOrderCommRate;
+%threadallow CThostFtdcTraderApi::ReqQrySecAgentTradingAccount;
+%threadallow CThostFtdcTraderApi::ReqQrySecAgentCheckMode;
+%threadallow CThostFtdcTraderApi::ReqQrySecAgentTradeInfo;
+%threadallow CThostFtdcTraderApi::ReqQryOptionInstrTradeCost;
+%threadallow CThostFtdcTraderApi::ReqQryOptionInstrCommRate;
+%threadallow CThostFtdcTraderApi::ReqQryExecOrder;
+%threadallow CThostFtdcTraderApi::ReqQryForQuote;
+%threadallow CThostFtdcTraderApi::ReqQryQuote;
+%threadallow CThostFtdcTraderApi::ReqQryOptionSelfClose;
+%threadallow CThostFtdcTraderApi::ReqQryInvestUnit;
+%threadallow CThostFtdcTraderApi::ReqQryCombInstrumentGuard;
+%threadallow CThostFtdcTraderApi::ReqQryCombAction;
+%threadallow CThostFtdcTraderApi::ReqQryTransferSerial;
+%threadallow CThostFtdcTraderApi::ReqQryAccountregister;
+%threadallow CThostFtdcTraderApi::ReqQryContractBank;
+%threadallow CThostFtdcTraderApi::ReqQryParkedOrder;
+%threadallow CThostFtdcTraderApi::ReqQryParkedOrderAction;
+%threadallow CThostFtdcTraderApi::ReqQryTradingNotice;
+%threadallow CThostFtdcTraderApi::ReqQryBrokerTradingParams;
+%threadallow CThostFtdcTraderApi::ReqQryBrokerTradingAlgos;
+%threadallow CThostFtdcTraderApi::ReqQueryCFMMCTradingAccountToken;
+%threadallow CThostFtdcTraderApi::ReqFromBankToFutureByFuture;
+%threadallow CThostFtdcTraderApi::ReqFromFutureToBankByFuture;
+%threadallow CThostFtdcTraderApi::ReqQueryBankAccountMoneyByFuture;
+%threadallow CThostFtdcTraderApi::ReqQryClassifiedInstrument;
+%threadallow CThostFtdcTraderApi::ReqQryCombPromotionParam;
+%threadallow CThostFtdcTraderApi::ReqQryRiskSettleInvstPosition;
+%threadallow CThostFtdcTraderApi::ReqQryRiskSettleProductStatus;
+%threadallow CThostFtdcTraderApi::ReqQrySPBMFutureParameter;
+%threadallow CThostFtdcTraderApi::ReqQrySPBMOptionParameter;
+%threadallow CThostFtdcTraderApi::ReqQrySPBMIntraParameter;
+%threadallow CThostFtdcTraderApi::ReqQrySPBMInterParameter;
+%threadallow CThostFtdcTraderApi::ReqQrySPBMPortfDefinition;
+%threadallow CThostFtdcTraderApi::ReqQrySPBMInvestorPortfDef;
+%threadallow CThostFtdcTraderApi::ReqQryInvestorPortfMarginRatio;
+%threadallow CThostFtdcTraderApi::ReqQryInvestorProdSPBMDetail;
+%threadallow CThostFtdcTraderApi::ReqQryInvestorCommoditySPMMMargin;
+%threadallow CThostFtdcTraderApi::ReqQryInvestorCommodityGroupSPMMMargin;
+%threadallow CThostFtdcTraderApi::ReqQrySPMMInstParam;
+%threadallow CThostFtdcTraderApi::ReqQrySPMMProductParam;
+%threadallow CThostFtdcTraderApi::ReqQrySPBMAddOnInterParameter;
+%threadallow CThostFtdcTraderApi::ReqQryRCAMSCombProductInfo;
+%threadallow CThostFtdcTraderApi::ReqQryRCAMSInstrParameter;
+%threadallow CThostFtdcTraderApi::ReqQryRCAMSIntraParameter;
+%threadallow CThostFtdcTraderApi::ReqQryRCAMSInterParameter;
+%threadallow CThostFtdcTraderApi::ReqQryRCAMSShortOptAdjustParam;
+%threadallow CThostFtdcTraderApi::ReqQryRCAMSInvestorCombPosition;
+%threadallow CThostFtdcTraderApi::ReqQryInvestorProdRCAMSMargin;
+%threadallow CThostFtdcTraderApi::ReqQryRULEInstrParameter;
+%threadallow CThostFtdcTraderApi::ReqQryRULEIntraParameter;
+%threadallow CThostFtdcTraderApi::ReqQryRULEInterParameter;
+%threadallow CThostFtdcTraderApi::ReqQryInvestorProdRULEMargin;
+%threadallow CThostFtdcMdApi::Release;
+%threadallow CThostFtdcMdApi::Init;
+%threadallow CThostFtdcMdApi::Join;
+%threadallow CThostFtdcMdApi::SubscribeMarketData;
+%threadallow CThostFtdcMdApi::UnSubscribeMarketData;
+%threadallow CThostFtdcMdApi::SubscribeForQuoteRsp;
+%threadallow CThostFtdcMdApi::UnSubscribeForQuoteRsp;
+%threadallow CThostFtdcMdApi::ReqUserLogin;
+%threadallow CThostFtdcMdApi::ReqUserLogout;
+%threadallow CThostFtdcMdApi::ReqQryMulticastInstrument;
@@ -0,0 +1,400 @@
+"""生成 CTP 结构体的批量转换方法。
+
+SWIG 把结构体的每个字段包装成一对 getter/setter，逐个字段读写都要进入一次扩展模块。
+本脚本解析 ThostFtdcUserApiDataType.h 和 ThostFtdcUserApiStruct.h，为每个结构体生成 %extend：
+    - to_tuple()：一次调用按 fields 的顺序取出全部字段；
+    - to_dict()：一次调用取出 {字段名: 值}；
+    - from_dict(values)：一次调用按字典设置字段，字典中没有的字段保持不变，多余的键忽略；
+    - fields：字段名元组，顺序与头文件中的声明顺序一致（去掉 reserve* 保留字段）；
+    - raw()：结构体内存的 memoryview（不拷贝），与 ctp_dtypes 中的 NumPy dtype 内存布局一致。
+
+生成的 ctp_struct_methods.i 由 thosttraderapi.i 和 thostmduserapi.i 引用，字符串字段使用两个 .i 文件中的
+ctp_gb18030_to_py 转码；同时在项目根目录生成 ctp_dtypes.py，包含每个结构体对应的 NumPy 结构化 dtype。
+
+另外解析 ThostFtdcTraderApi.h 和 ThostFtdcMdApi.h，生成 ctp_api_threads.i：两个 .i 文件默认 %nothreadallow，
+只有 Init、Join、Release、全部 Req* 和行情/询价订阅这些会阻塞或发送网络请求的调用用 %threadallow 在执行期间释放 GIL。
+
+更新 CTP 头文件后重新运行：
+    python gen_struct_methods.py
+"""
+import os
+import re
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+HEADER_ENCODING = 'gb18030'
+OUTPUT_FILE = 'ctp_struct_methods.i'
+THREADS_FILE = 'ctp_api_threads.i'
+API_HEADERS = ('ThostFtdcTraderApi.h', 'ThostFtdcMdApi.h')
+DTYPES_FILE = os.path.join(os.path.dirname(current_dir), 'ctp_dtypes.py')
+
+# 头文件中的基本类型 -> ctp_struct_methods.i 中的字段类型代码
+TYPE_CODES = {'char': 'c', 'double': 'd', 'int': 'i', 'short': 'h'}
+STRING_CODE = 's'
+# 类型代码 -> NumPy 类型，字符串保持头文件中的 GB18030 字节，不足长度以 '\0' 补齐
+NUMPY_TYPES = {'c': 'S1', 'd': 'f8', 'i': 'i4', 'h': 'i2'}
+
+TYPEDEF_PATTERN = re.compile(r'^typedef\s+(\w+)\s+(\w+)(?:\[(\d+)\])?;', re.M)
+STRUCT_PATTERN = re.compile(r'^struct\s+(\w+)\s*\{(.*?)\};', re.M | re.S)
+FIELD_PATTERN = re.compile(r'^\s*(\w+)\s+(\w+);', re.M)
+API_CLASS_PATTERN = re.compile(r'^class\s+(?:\w+\s+)?(CThostFtdc\w+Api)\b', re.M)
+# 执行期间释放 GIL 的 API 方法：启动/等待/释放 API，以及所有发往前置的请求
+THREAD_METHOD_PATTERN = re.compile(
+    r'^\s*virtual\s+\w+\s+(Init|Join|Release|Req\w+|(?:Un)?Subscribe(?:MarketData|ForQuoteRsp))\s*\(', re.M)
+
+RUNTIME = r'''%{
+#include <cstddef>
+#include <cstring>
+#include <climits>
+
+// 结构体字段描述：类型代码 's' 字符串、'c' 字符、'd' double、'i' int、'h' short
+struct CtpField {
+    const char *name;
+    char type;
+    size_t offset;
+    size_t size;
+    PyObject *key;  // 驻留的字段名，第一次使用时创建
+};
+
+static PyObject *ctp_field_key(CtpField *field)
+{
+    if (field->key == NULL)
+        field->key = PyUnicode_InternFromString(field->name);
+    return field->key;
+}
+
+static PyObject *ctp_field_get(const char *base, const CtpField *field)
+{
+    const char *p = base + field->offset;
+    switch (field->type) {
+    case 's':
+        return ctp_gb18030_to_py(p, strnlen(p, field->size));
+    case 'c':
+        return PyUnicode_DecodeUTF8(p, 1, "surrogateescape");  // 与 SWIG 的 char 字段一致
+    case 'd':
+        return PyFloat_FromDouble(*reinterpret_cast<const double *>(p));
+    case 'i':
+        return PyLong_FromLong(*reinterpret_cast<const int *>(p));
+    case 'h':
+        return PyLong_FromLong(*reinterpret_cast<const short *>(p));
+    }
+    PyErr_Format(PyExc_SystemError, "unknown field type: %s", field->name);
+    return NULL;
+}
+
+// 取出 str/bytes 的字节，str 按 UTF-8 编码（与 SWIG 的 char 数组 setter 一致）
+static int ctp_field_bytes(PyObject *value, const CtpField *field, const char **data, Py_ssize_t *size)
+{
+    if (PyUnicode_Check(value)) {
+        *data = PyUnicode_AsUTF8AndSize(value, size);
+        return *data == NULL ? -1 : 0;
+    }
+    if (PyBytes_Check(value)) {
+        *data = PyBytes_AS_STRING(value);
+        *size = PyBytes_GET_SIZE(value);
+        return 0;
+    }
+    PyErr_Format(PyExc_TypeError, "%s: expected str or bytes", field->name);
+    return -1;
+}
+
+static int ctp_field_set(char *base, const CtpField *field, PyObject *value)
+{
+    char *p = base + field->offset;
+    const char *data;
+    Py_ssize_t size;
+    long number;
+    switch (field->type) {
+    case 's':
+        if (ctp_field_bytes(value, field, &data, &size) < 0)
+            return -1;
+        if ((size_t)size > field->size) {
+            PyErr_Format(PyExc_ValueError, "%s: longer than %zu bytes", field->name, field->size);
+            return -1;
+        }
+        memcpy(p, data, size);
+        memset(p + size, 0, field->size - size);
+        return 0;
+    case 'c':
+        if (ctp_field_bytes(value, field, &data, &size) < 0)
+            return -1;
+        if (size > 1) {
+            PyErr_Format(PyExc_ValueError, "%s: expected a single character", field->name);
+            return -1;
+        }
+        *p = size ? data[0] : '\0';
+        return 0;
+    case 'd':
+        *reinterpret_cast<double *>(p) = PyFloat_AsDouble(value);
+        return PyErr_Occurred() ? -1 : 0;
+    case 'i':
+    case 'h':
+        number = PyLong_AsLong(value);
+        if (number == -1 && PyErr_Occurred())
+            return -1;
+        if (field->type == 'i' ? (number < INT_MIN || number > INT_MAX) : (number < SHRT_MIN || number > SHRT_MAX)) {
+            PyErr_Format(PyExc_OverflowError, "%s: out of range", field->name);
+            return -1;
+        }
+        if (field->type == 'i')
+            *reinterpret_cast<int *>(p) = (int)number;
+        else
+            *reinterpret_cast<short *>(p) = (short)number;
+        return 0;
+    }
+    PyErr_Format(PyExc_SystemError, "unknown field type: %s", field->name);
+    return -1;
+}
+
+static PyObject *ctp_struct_to_tuple(const void *self, const CtpField *fields, Py_ssize_t count)
+{
+    PyObject *result = PyTuple_New(count);
+    if (result == NULL)
+        return NULL;
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        PyObject *value = ctp_field_get(static_cast<const char *>(self), &fields[i]);
+        if (value == NULL) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        PyTuple_SET_ITEM(result, i, value);
+    }
+    return result;
+}
+
+static PyObject *ctp_struct_to_dict(const void *self, CtpField *fields, Py_ssize_t count)
+{
+    PyObject *result = PyDict_New();
+    if (result == NULL)
+        return NULL;
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        PyObject *key = ctp_field_key(&fields[i]);
+        PyObject *value = key == NULL ? NULL : ctp_field_get(static_cast<const char *>(self), &fields[i]);
+        if (value == NULL || PyDict_SetItem(result, key, value) < 0) {
+            Py_XDECREF(value);
+            Py_DECREF(result);
+            return NULL;
+        }
+        Py_DECREF(value);
+    }
+    return result;
+}
+
+static PyObject *ctp_struct_from_dict(void *self, CtpField *fields, Py_ssize_t count, PyObject *values)
+{
+    if (!PyDict_Check(values)) {
+        PyErr_SetString(PyExc_TypeError, "from_dict() expects a dict");
+        return NULL;
+    }
+    for (Py_ssize_t i = 0; i < count; ++i) {
+        PyObject *key = ctp_field_key(&fields[i]);
+        if (key == NULL)
+            return NULL;
+        PyObject *value = PyDict_GetItemWithError(values, key);
+        if (value == NULL) {
+            if (PyErr_Occurred())
+                return NULL;
+            continue;
+        }
+        if (ctp_field_set(static_cast<char *>(self), &fields[i], value) < 0)
+            return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+// 结构体内存的可写 memoryview，不拷贝；结构体对象释放后不能再使用
+static PyObject *ctp_struct_raw(void *self, Py_ssize_t size)
+{
+    return PyMemoryView_FromMemory(static_cast<char *>(self), size, PyBUF_WRITE);
+}
+%}
+'''
+
+DTYPES_HEADER = '''"""CTP 结构体的 NumPy 结构化 dtype。
+
+由 traderapi672python38/gen_struct_methods.py 根据 ThostFtdcUserApiStruct.h 生成，不要手工修改。
+
+每个 dtype 与 C++ 结构体的内存布局完全一致（按自然对齐，包含 reserve* 保留字段），
+结构体的 raw() 返回其内存的 memoryview，一次 memcpy 即可拷贝进结构化数组，不需要逐个字段读取：
+    records = np.empty(n, dtype=STRUCT_DTYPES['CThostFtdcDepthMarketDataField'])
+    rows = byte_rows(records)
+    copy_into(rows, i, pDepthMarketData)
+字符串字段是头文件约定的 GB18030 字节（numpy.bytes_），需要时再 decode('gb18030')。
+"""
+import numpy as np
+
+
+def struct_dtype(struct):
+    """结构体对应的 dtype。
+
+    Args:
+        struct: 结构体类、结构体对象或结构体类名。
+
+    Returns:
+        numpy.dtype: 结构化 dtype。
+    """
+    if not isinstance(struct, str):
+        struct = struct.__name__ if isinstance(struct, type) else type(struct).__name__
+    return STRUCT_DTYPES[struct]
+
+
+def to_record(obj):
+    """把结构体拷贝成一条 NumPy 记录（numpy.void），回调返回后仍然有效"""
+    return np.frombuffer(obj.raw(), dtype=struct_dtype(obj))[0].copy()
+
+
+def byte_rows(records):
+    """结构化数组的字节视图（不拷贝），每行对应一条记录，供 copy_into 使用"""
+    return records.view(np.uint8).reshape(len(records), records.dtype.itemsize)
+
+
+def copy_into(rows, index, obj):
+    """把结构体按字节拷贝到第 index 行。
+
+    Args:
+        rows (numpy.ndarray): byte_rows() 返回的字节视图，对应数组的 dtype 为 struct_dtype(obj)。
+        index (int): 行号。
+        obj: 结构体对象。
+    """
+    rows[index] = obj.raw()
+
+
+'''
+
+
+def parse_typedefs(text):
+    """解析数据类型头文件。
+
+    Args:
+        text (str): ThostFtdcUserApiDataType.h 的内容。
+
+    Returns:
+        dict: 类型名 -> (基本类型, 数组长度)，不是数组时长度为 None。
+    """
+    return {match.group(2): (match.group(1), match.group(3)) for match in TYPEDEF_PATTERN.finditer(text)}
+
+
+def parse_structs(text, typedefs):
+    """解析结构体头文件。
+
+    Args:
+        text (str): ThostFtdcUserApiStruct.h 的内容。
+        typedefs (dict): parse_typedefs() 的结果。
+
+    Returns:
+        list: [(结构体名, [(字段名, 类型代码, 数组长度), ...]), ...]，按头文件中的顺序排列，包含 reserve* 字段。
+    """
+    structs = []
+    for match in STRUCT_PATTERN.finditer(text):
+        fields = []
+        for type_name, name in FIELD_PATTERN.findall(match.group(2)):
+            base, length = typedefs.get(type_name, (type_name, None))
+            if base not in TYPE_CODES:
+                raise ValueError(f"不支持的字段类型: {match.group(1)}.{name} {type_name}")
+            fields.append((name, STRING_CODE if length else TYPE_CODES[base], int(length) if length else None))
+        structs.append((match.group(1), fields))
+    return structs
+
+
+def is_reserved(name):
+    """保留的无效字段，只在 dtype 中占位"""
+    return name.startswith('reserve')
+
+
+def parse_thread_methods(text):
+    """解析 API 头文件中需要释放 GIL 的方法。
+
+    Args:
+        text (str): ThostFtdcTraderApi.h 或 ThostFtdcMdApi.h 的内容。
+
+    Returns:
+        list: ['CThostFtdcTraderApi::Init', ...]，按头文件中的顺序排列。
+    """
+    match = API_CLASS_PATTERN.search(text)
+    if match is None:
+        return []
+    return [f'{match.group(1)}::{name}' for name in THREAD_METHOD_PATTERN.findall(text, match.end())]
+
+
+def render_threads(methods):
+    """生成 ctp_api_threads.i 的内容"""
+    lines = [
+        '// 由 gen_struct_methods.py 根据 ThostFtdcTraderApi.h / ThostFtdcMdApi.h 生成，不要手工修改',
+        '// 这些调用会阻塞或向前置发送请求，执行期间释放 GIL，其他 Python 线程（策略、回调、I/O）可以同时运行',
+    ]
+    lines.extend(f'%threadallow {method};' for method in methods)
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def render(structs):
+    """生成 ctp_struct_methods.i 的内容"""
+    lines = [
+        '// 由 gen_struct_methods.py 根据 ThostFtdcUserApiStruct.h 生成，不要手工修改',
+        '// 每个结构体的 to_tuple()/to_dict()/from_dict() 一次调用完成全部字段的转换，fields 为字段顺序',
+        '',
+        RUNTIME,
+    ]
+    for struct, fields in structs:
+        fields = [(name, code) for name, code, _ in fields if not is_reserved(name)]
+        table = f'ctp_fields_{struct}'
+        lines.append('%{')
+        lines.append(f'static CtpField {table}[] = {{')
+        for name, code in fields:
+            lines.append(f'    {{"{name}", \'{code}\', offsetof({struct}, {name}), sizeof((({struct} *)0)->{name}), NULL}},')
+        lines.append('};')
+        lines.append('%}')
+        count = f'sizeof({table}) / sizeof(CtpField)'
+        names = ''.join(f"'{name}', " for name, _ in fields).rstrip(' ')
+        lines.extend([
+            f'%extend {struct} {{',
+            f'    PyObject *to_tuple() {{ return ctp_struct_to_tuple($self, {table}, {count}); }}',
+            f'    PyObject *to_dict() {{ return ctp_struct_to_dict($self, {table}, {count}); }}',
+            f'    PyObject *from_dict(PyObject *values) {{ return ctp_struct_from_dict($self, {table}, {count}, values); }}',
+            f'    PyObject *raw() {{ return ctp_struct_raw($self, sizeof({struct})); }}',
+            '    %pythoncode %{',
+            f'    fields = ({names})',
+            '    %}',
+            '}',
+            '',
+        ])
+    return '\n'.join(lines)
+
+
+def render_dtypes(structs):
+    """生成 ctp_dtypes.py 的内容"""
+    lines = [DTYPES_HEADER.rstrip('\n'), '', '', 'STRUCT_DTYPES = {']
+    for struct, fields in structs:
+        lines.append(f"    '{struct}': np.dtype([")
+        for name, code, length in fields:
+            numpy_type = f'S{length}' if code == STRING_CODE else NUMPY_TYPES[code]
+            lines.append(f"        ('{name}', '{numpy_type}'),")
+        lines.append('    ], align=True),')
+    lines.append('}')
+    lines.append('')
+    return '\n'.join(lines)
+
+
+def main():
+    with open(os.path.join(current_dir, 'ThostFtdcUserApiDataType.h'), encoding=HEADER_ENCODING) as f:
+        typedefs = parse_typedefs(f.read())
+    with open(os.path.join(current_dir, 'ThostFtdcUserApiStruct.h'), encoding=HEADER_ENCODING) as f:
+        structs = parse_structs(f.read(), typedefs)
+    with open(os.path.join(current_dir, OUTPUT_FILE), 'w', encoding='utf-8', newline='\r\n') as f:
+        f.write(render(structs))
+    with open(DTYPES_FILE, 'w', encoding='utf-8', newline='\r\n') as f:
+        f.write(render_dtypes(structs))
+    print(f"已生成 {OUTPUT_FILE} 和 ctp_dtypes.py: {len(structs)} 个结构体, "
+          f"{sum(len(fields) for _, fields in structs)} 个字段")
+
+    methods = []
+    for header in API_HEADERS:
+        with open(os.path.join(current_dir, header), encoding=HEADER_ENCODING) as f:
+            methods.extend(parse_thread_methods(f.read()))
+    with open(os.path.join(current_dir, THREADS_FILE), 'w', encoding='utf-8', newline='\r\n') as f:
+        f.write(render_threads(methods))
+    print(f"已生成 {THREADS_FILE}: {len(methods)} 个释放 GIL 的方法")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,43 @@
-%module(directors="1") thostmduserapi
+%module(directors="1", threads="1") thostmduserapi
 %{
 #include "ThostFtdcMdApi.h"
 #include <codecvt>
 #include <locale>
 #include <vector>
 #include <string>
+#include <cstring>
+#include <unordered_map>
 using namespace std;
 #ifdef _MSC_VER
 const static locale g_loc("zh-CN");
 #else
 const static locale g_loc("zh_CN.GB18030");
 #endif
-%}
 
-%typemap(out) char[ANY], char[] {
-    const std::string &gb2312($1);
+// 非 ASCII 字符串（ErrorMsg、InstrumentName、StatusMsg 等）转换结果的缓存，取值个数有限。
+// 读取字段时持有 GIL，不需要另外加锁
+static std::unordered_map<std::string, PyObject *> g_gb18030_cache;
+const static size_t GB18030_CACHE_SIZE = 4096;
+
+// GB18030 字符串转成 Python str（UTF-8）。
+// 合约代码、交易所代码、报单引用、时间等绝大多数字段是纯 ASCII，直接构造 str，不经过 locale 转换；
+// 含中文的字符串先查缓存，未命中时用 codecvt 转换后放入缓存。转换失败返回空字符串
+static PyObject *ctp_gb18030_to_py(const char *data, size_t size)
+{
+    size_t i = 0;
+    while (i < size && !(static_cast<unsigned char>(data[i]) & 0x80))
+        ++i;
+    if (i == size)
+        return PyUnicode_DecodeASCII(data, size, NULL);
+
+    std::string gb2312(data, size);
+    auto it = g_gb18030_cache.find(gb2312);
+    if (it != g_gb18030_cache.end())
+    {
+        Py_INCREF(it->second);
+        return it->second;
+    }
+
     std::vector<wchar_t> wstr(gb2312.size());
     wchar_t* wstrEnd = nullptr;
     const char* gbEnd = nullptr;
@@ -24,17 +47,38 @@ const static locale g_loc("zh_CN.GB18030");
             gb2312.data(), gb2312.data() + gb2312.size(), gbEnd,
             wstr.data(), wstr.data() + wstr.size(), wstrEnd);
 
+    PyObject *result;
     if (codecvt_base::ok == res)
     {
         wstring_convert<codecvt_utf8<wchar_t>> cutf8;
-        std::string result = cutf8.to_bytes(wstring(wstr.data(), wstrEnd));
-        resultobj = SWIG_FromCharPtrAndSize(result.c_str(), result.size());
+        std::string utf8 = cutf8.to_bytes(wstring(wstr.data(), wstrEnd));
+        result = PyUnicode_DecodeUTF8(utf8.data(), utf8.size(), "replace");
     }
     else
     {
-        std::string result;
-        resultobj = SWIG_FromCharPtrAndSize(result.c_str(), result.size());
+        return PyUnicode_FromStringAndSize("", 0);
     }
+    if (result == NULL)
+        return NULL;
+    if (g_gb18030_cache.size() >= GB18030_CACHE_SIZE)
+    {
+        for (auto &entry : g_gb18030_cache)
+            Py_DECREF(entry.second);
+        g_gb18030_cache.clear();
+    }
+    Py_INCREF(result);
+    g_gb18030_cache.emplace(std::move(gb2312), result);
+    return result;
+}
+%}
+
+// 定长字符数组字段：最多读取数组长度个字节，字段写满时没有结尾的 '\0' 也不会越界
+%typemap(out) char[ANY] {
+    resultobj = ctp_gb18030_to_py($1, strnlen($1, $1_dim0));
+}
+
+%typemap(out) char[] {
+    resultobj = ctp_gb18030_to_py($1, $1 ? strlen($1) : 0);
 }
 
 %typemap(in) char *[] {
@@ -74,6 +118,216 @@ const static locale g_loc("zh_CN.GB18030");
 %ignore THOST_FTDC_FTC_BankLaunchBrokerToBank;
 %ignore THOST_FTDC_FTC_BrokerLaunchBrokerToBank;
 
+// 线程支持：director 回调进入 Python 前获取 GIL（threadblock）；默认调用期间不释放 GIL（结构体字段读写等），
+// 只有 ctp_api_threads.i 中列出的阻塞调用和请求在执行期间释放 GIL
+%nothreadallow;
+%include "ctp_api_threads.i"
+
+// 结构体的 to_tuple()/to_dict()/from_dict()/fields，由 gen_struct_methods.py 生成
+%include "ctp_struct_methods.i"
+
+// 原生层的行情过滤与批量投递：注册给 CThostFtdcMdApi 代替 Python 的 SPI，
+// 深度行情在 C++ 层按合约白名单过滤后拷贝进队列，由投递线程按批次一次调用 Python 的 on_batch(list)，
+// 列表元素是与 CThostFtdcDepthMarketDataField.fields 顺序一致的元组；其他回调直接转交原来的 SPI
+%{
+#include <chrono>
+#include <condition_variable>
+#include <mutex>
+#include <thread>
+#include <unordered_set>
+
+class CtpBatchingMdSpi : public CThostFtdcMdSpi
+{
+public:
+    // max_latency_us：队列中最早一笔行情的最长等待时间（微秒）；max_batch：攒够这么多笔立即投递
+    CtpBatchingMdSpi(CThostFtdcMdSpi *spi, PyObject *on_batch, int max_latency_us = 5000, int max_batch = 1024)
+        : spi_(spi), on_batch_(on_batch), max_latency_(std::chrono::microseconds(max_latency_us > 0 ? max_latency_us : 0)),
+          max_batch_(max_batch > 0 ? max_batch : 1), filter_(false), stopping_(false), filtered_(0)
+    {
+        Py_INCREF(on_batch_);
+        thread_ = std::thread(&CtpBatchingMdSpi::run, this);
+    }
+
+    virtual ~CtpBatchingMdSpi()
+    {
+        Stop();
+        Py_DECREF(on_batch_);
+    }
+
+    // 设置合约白名单，None 表示不过滤
+    PyObject *SetInstruments(PyObject *instruments)
+    {
+        std::unordered_set<std::string> allowed;
+        if (instruments != Py_None) {
+            PyObject *iterator = PyObject_GetIter(instruments);
+            if (iterator == NULL)
+                return NULL;
+            PyObject *item;
+            while ((item = PyIter_Next(iterator)) != NULL) {
+                const char *instrument = PyUnicode_AsUTF8(item);
+                Py_DECREF(item);
+                if (instrument == NULL) {
+                    Py_DECREF(iterator);
+                    return NULL;
+                }
+                allowed.insert(instrument);
+            }
+            Py_DECREF(iterator);
+            if (PyErr_Occurred())
+                return NULL;
+        }
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            instruments_.swap(allowed);
+            filter_ = instruments != Py_None;
+        }
+        Py_RETURN_NONE;
+    }
+
+    // 投递完队列中剩余的行情后停止投递线程
+    void Stop()
+    {
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            stopping_ = true;
+        }
+        cond_.notify_one();
+        if (!thread_.joinable())
+            return;
+        if (PyGILState_Check()) {
+            // 投递线程可能正在等待 GIL
+            Py_BEGIN_ALLOW_THREADS
+            thread_.join();
+            Py_END_ALLOW_THREADS
+        } else {
+            thread_.join();
+        }
+    }
+
+    // 被白名单过滤掉的行情数
+    long long Filtered()
+    {
+        std::lock_guard<std::mutex> lock(mutex_);
+        return filtered_;
+    }
+
+    virtual void OnRtnDepthMarketData(CThostFtdcDepthMarketDataField *pDepthMarketData)
+    {
+        if (pDepthMarketData == NULL)
+            return;
+        bool notify;
+        {
+            std::lock_guard<std::mutex> lock(mutex_);
+            if (stopping_)
+                return;
+            if (filter_ && instruments_.find(pDepthMarketData->InstrumentID) == instruments_.end()) {
+                ++filtered_;
+                return;
+            }
+            if (queue_.empty())
+                deadline_ = std::chrono::steady_clock::now() + max_latency_;
+            queue_.push_back(*pDepthMarketData);
+            notify = queue_.size() == 1 || queue_.size() >= max_batch_;
+        }
+        if (notify)
+            cond_.notify_one();
+    }
+
+    virtual void OnFrontConnected() { spi_->OnFrontConnected(); }
+    virtual void OnFrontDisconnected(int nReason) { spi_->OnFrontDisconnected(nReason); }
+    virtual void OnHeartBeatWarning(int nTimeLapse) { spi_->OnHeartBeatWarning(nTimeLapse); }
+    virtual void OnRspUserLogin(CThostFtdcRspUserLoginField *pRspUserLogin, CThostFtdcRspInfoField *pRspInfo, int nRequestID, bool bIsLast)
+    { spi_->OnRspUserLogin(pRspUserLogin, pRspInfo, nRequestID, bIsLast); }
+    virtual void OnRspUserLogout(CThostFtdcUserLogoutField *pUserLogout, CThostFtdcRspInfoField *pRspInfo, int nRequestID, bool bIsLast)
+    { spi_->OnRspUserLogout(pUserLogout, pRspInfo, nRequestID, bIsLast); }
+    virtual void OnRspQryMulticastInstrument(CThostFtdcMulticastInstrumentField *pMulticastInstrument, CThostFtdcRspInfoField *pRspInfo, int nRequestID, bool bIsLast)
+    { spi_->OnRspQryMulticastInstrument(pMulticastInstrument, pRspInfo, nRequestID, bIsLast); }
+    virtual void OnRspError(CThostFtdcRspInfoField *pRspInfo, int nRequestID, bool bIsLast)
+    { spi_->OnRspError(pRspInfo, nRequestID, bIsLast); }
+    virtual void OnRspSubMarketData(CThostFtdcSpecificInstrumentField *pSpecificInstrument, CThostFtdcRspInfoField *pRspInfo, int nRequestID, bool bIsLast)
+    { spi_->OnRspSubMarketData(pSpecificInstrument, pRspInfo, nRequestID, bIsLast); }
+    virtual void OnRspUnSubMarketData(CThostFtdcSpecificInstrumentField *pSpecificInstrument, CThostFtdcRspInfoField *pRspInfo, int nRequestID, bool bIsLast)
+    { spi_->OnRspUnSubMarketData(pSpecificInstrument, pRspInfo, nRequestID, bIsLast); }
+    virtual void OnRspSubForQuoteRsp(CThostFtdcSpecificInstrumentField *pSpecificInstrument, CThostFtdcRspInfoField *pRspInfo, int nRequestID, bool bIsLast)
+    { spi_->OnRspSubForQuoteRsp(pSpecificInstrument, pRspInfo, nRequestID, bIsLast); }
+    virtual void OnRspUnSubForQuoteRsp(CThostFtdcSpecificInstrumentField *pSpecificInstrument, CThostFtdcRspInfoField *pRspInfo, int nRequestID, bool bIsLast)
+    { spi_->OnRspUnSubForQuoteRsp(pSpecificInstrument, pRspInfo, nRequestID, bIsLast); }
+    virtual void OnRtnForQuoteRsp(CThostFtdcForQuoteRspField *pForQuoteRsp) { spi_->OnRtnForQuoteRsp(pForQuoteRsp); }
+
+private:
+    void run()
+    {
+        std::vector<CThostFtdcDepthMarketDataField> batch;
+        std::unique_lock<std::mutex> lock(mutex_);
+        for (;;) {
+            if (queue_.empty()) {
+                if (stopping_)
+                    break;
+                cond_.wait(lock);
+                continue;
+            }
+            if (!stopping_ && queue_.size() < max_batch_ && std::chrono::steady_clock::now() < deadline_) {
+                cond_.wait_until(lock, deadline_);
+                continue;
+            }
+            batch.swap(queue_);  // 交换后队列沿用上一批的内存
+            lock.unlock();
+            deliver(batch);
+            batch.clear();
+            lock.lock();
+        }
+    }
+
+    void deliver(const std::vector<CThostFtdcDepthMarketDataField> &batch)
+    {
+        if (!Py_IsInitialized())
+            return;
+        PyGILState_STATE state = PyGILState_Ensure();
+        const Py_ssize_t count = sizeof(ctp_fields_CThostFtdcDepthMarketDataField) / sizeof(CtpField);
+        PyObject *ticks = PyList_New(batch.size());
+        for (size_t i = 0; ticks != NULL && i < batch.size(); ++i) {
+            PyObject *tick = ctp_struct_to_tuple(&batch[i], ctp_fields_CThostFtdcDepthMarketDataField, count);
+            if (tick == NULL)
+                Py_CLEAR(ticks);
+            else
+                PyList_SET_ITEM(ticks, i, tick);
+        }
+        PyObject *result = ticks == NULL ? NULL : PyObject_CallFunctionObjArgs(on_batch_, ticks, NULL);
+        if (result == NULL)
+            PyErr_WriteUnraisable(on_batch_);
+        Py_XDECREF(result);
+        Py_XDECREF(ticks);
+        PyGILState_Release(state);
+    }
+
+    CThostFtdcMdSpi *spi_;
+    PyObject *on_batch_;
+    std::chrono::steady_clock::duration max_latency_;
+    size_t max_batch_;
+    std::mutex mutex_;
+    std::condition_variable cond_;
+    std::vector<CThostFtdcDepthMarketDataField> queue_;
+    std::chrono::steady_clock::time_point deadline_;
+    std::unordered_set<std::string> instruments_;
+    bool filter_;
+    bool stopping_;
+    long long filtered_;
+    std::thread thread_;
+};
+%}
+
 %include "ThostFtdcUserApiDataType.h"
 %include "ThostFtdcUserApiStruct.h"
 %include "ThostFtdcMdApi.h"
+
+// Python 中可见的部分，见上方 CtpBatchingMdSpi 的实现
+%feature("nodirector") CtpBatchingMdSpi;
+class CtpBatchingMdSpi : public CThostFtdcMdSpi
+{
+public:
+    CtpBatchingMdSpi(CThostFtdcMdSpi *spi, PyObject *on_batch, int max_latency_us = 5000, int max_batch = 1024);
+    ~CtpBatchingMdSpi();
+    PyObject *SetInstruments(PyObject *instruments);
+    void Stop();
+    long long Filtered();
+};
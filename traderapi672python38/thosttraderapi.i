@@ -1,20 +1,43 @@
-%module(directors="1") thosttraderapi
+%module(directors="1", threads="1") thosttraderapi
 %{
 #include "ThostFtdcTraderApi.h"
 #include <codecvt>
 #include <locale>
 #include <vector>
 #include <string>
+#include <cstring>
+#include <unordered_map>
 using namespace std;
 #ifdef _MSC_VER
 const static locale g_loc("zh-CN");
 #else
 const static locale g_loc("zh_CN.GB18030");
 #endif
-%}
 
-%typemap(out) char[ANY], char[] {
-    const std::string &gb2312($1);
+// 非 ASCII 字符串（ErrorMsg、InstrumentName、StatusMsg 等）转换结果的缓存，取值个数有限。
+// 读取字段时持有 GIL，不需要另外加锁
+static std::unordered_map<std::string, PyObject *> g_gb18030_cache;
+const static size_t GB18030_CACHE_SIZE = 4096;
+
+// GB18030 字符串转成 Python str（UTF-8）。
+// 合约代码、交易所代码、报单引用、时间等绝大多数字段是纯 ASCII，直接构造 str，不经过 locale 转换；
+// 含中文的字符串先查缓存，未命中时用 codecvt 转换后放入缓存。转换失败返回空字符串
+static PyObject *ctp_gb18030_to_py(const char *data, size_t size)
+{
+    size_t i = 0;
+    while (i < size && !(static_cast<unsigned char>(data[i]) & 0x80))
+        ++i;
+    if (i == size)
+        return PyUnicode_DecodeASCII(data, size, NULL);
+
+    std::string gb2312(data, size);
+    auto it = g_gb18030_cache.find(gb2312);
+    if (it != g_gb18030_cache.end())
+    {
+        Py_INCREF(it->second);
+        return it->second;
+    }
+
     std::vector<wchar_t> wstr(gb2312.size());
     wchar_t* wstrEnd = nullptr;
     const char* gbEnd = nullptr;
@@ -24,17 +47,38 @@ const static locale g_loc("zh_CN.GB18030");
             gb2312.data(), gb2312.data() + gb2312.size(), gbEnd,
             wstr.data(), wstr.data() + wstr.size(), wstrEnd);
 
+    PyObject *result;
     if (codecvt_base::ok == res)
     {
         wstring_convert<codecvt_utf8<wchar_t>> cutf8;
-        std::string result = cutf8.to_bytes(wstring(wstr.data(), wstrEnd));
-        resultobj = SWIG_FromCharPtrAndSize(result.c_str(), result.size());
+        std::string utf8 = cutf8.to_bytes(wstring(wstr.data(), wstrEnd));
+        result = PyUnicode_DecodeUTF8(utf8.data(), utf8.size(), "replace");
     }
     else
     {
-        std::string result;
-        resultobj = SWIG_FromCharPtrAndSize(result.c_str(), result.size());
+        return PyUnicode_FromStringAndSize("", 0);
+    }
+    if (result == NULL)
+        return NULL;
+    if (g_gb18030_cache.size() >= GB18030_CACHE_SIZE)
+    {
+        for (auto &entry : g_gb18030_cache)
+            Py_DECREF(entry.second);
+        g_gb18030_cache.clear();
     }
+    Py_INCREF(result);
+    g_gb18030_cache.emplace(std::move(gb2312), result);
+    return result;
+}
+%}
+
+// 定长字符数组字段：最多读取数组长度个字节，字段写满时没有结尾的 '\0' 也不会越界
+%typemap(out) char[ANY] {
+    resultobj = ctp_gb18030_to_py($1, strnlen($1, $1_dim0));
+}
+
+%typemap(out) char[] {
+    resultobj = ctp_gb18030_to_py($1, $1 ? strlen($1) : 0);
 }
 %feature("director") CThostFtdcTraderSpi;
 %ignore THOST_FTDC_VTC_BankBankToFuture;
@@ -46,6 +90,14 @@ const static locale g_loc("zh_CN.GB18030");
 %ignore THOST_FTDC_FTC_BankLaunchBrokerToBank;
 %ignore THOST_FTDC_FTC_BrokerLaunchBrokerToBank;
 %feature("director") CThostFtdcTraderSpi;
+// 线程支持：director 回调进入 Python 前获取 GIL（threadblock）；默认调用期间不释放 GIL（结构体字段读写等），
+// 只有 ctp_api_threads.i 中列出的阻塞调用和请求在执行期间释放 GIL
+%nothreadallow;
+%include "ctp_api_threads.i"
+
+// 结构体的 to_tuple()/to_dict()/from_dict()/fields，由 gen_struct_methods.py 生成
+%include "ctp_struct_methods.i"
+
 %include "ThostFtdcUserApiDataType.h"
 %include "ThostFtdcUserApiStruct.h"
 %include "ThostFtdcTraderApi.h"
\ No newline at end of file